@@ -0,0 +1,552 @@
+"""
+Time each stage of annotation and search on local structure files, and keep
+a history of the results so that regressions are flagged.
+
+For each structure, a fresh Python process reads the file and runs the
+stages one after the other, timing each one and recording the peak memory
+of the process after it and how much the stage raised that peak:
+
+    parse        read the .cif or .pdb file into tables of atoms
+    components   make the nucleotides, amino acids and other components
+    hydrogens    infer hydrogens of bases, during component construction,
+                 and of amino acids
+    nt_nt        annotate nucleotide-nucleotide interactions
+    protein      annotate nucleotide-amino acid contacts and interactions
+    search       FR3D symbolic and geometric searches, with the time in each
+                 search phase as reported by fr3d.instrumentation
+    ordering     all-against-all discrepancy of the geometric candidates and
+                 ordering by similarity
+
+Searches run on unit and pair data made in memory from the annotation, so
+no data files are downloaded.  Stages whose modules cannot be imported,
+such as protein annotation without matplotlib, are reported as skipped.
+
+Without structure files, the bundled suite is used: the structures in
+BUNDLED_STRUCTURES, written by fr3d.synthetic with fixed seeds, so that
+every run times the same files.
+
+    python benchmarks/stage_benchmark.py --history stages.json
+    python benchmarks/stage_benchmark.py 1S72.cif.gz 4V9F.cif.gz
+    python benchmarks/stage_benchmark.py 1S72.cif.gz --history stages.json --pin
+
+With --history, the results are appended to a JSON file with one entry per
+run.  Each median is compared with the latest run marked with --pin as the
+baseline, or, when no run is pinned, with the median of the last --window
+runs on the same structure, so that a slow drift is flagged once it adds
+up.  The program exits with status 1 if any stage is more than
+--tolerance slower or uses more than --memory_tolerance more memory.
+"""
+
+import argparse
+import datetime
+import gzip
+import json
+import os
+import platform
+import shutil
+import subprocess
+import sys
+import tempfile
+from collections import defaultdict
+from collections import OrderedDict
+from time import perf_counter
+
+REPOSITORY = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+LEONTIS_WESTHOF_BASEPAIRS = ['cWW', 'cSS', 'cHH', 'cHS', 'cHW', 'cSH', 'cSW', 'cWH', 'cWS', 'tSS', 'tHH', 'tHS', 'tHW', 'tSH', 'tSW', 'tWH', 'tWS', 'tWW']
+
+# named queries from query_definitions.py; a geometric query is made from
+# the first three nucleotides of each structure
+SYMBOLIC_QUERIES = ["AU cWW", "stacked cWW"]
+GEOMETRIC_DISCREPANCY = 0.5
+
+# the bundled suite: file name and the arguments of fr3d.synthetic.write_structure
+BUNDLED_STRUCTURES = OrderedDict([
+    ("SYN_RNA.cif", {"nucleotides": 600, "seed": 1}),
+    ("SYN_RNP.cif", {"nucleotides": 400, "amino_acids": 150, "alt_fraction": 0.05,
+                     "modified_fraction": 0.05, "seed": 2}),
+])
+
+
+def peak_memory():
+    """
+    Peak resident set size of this process in megabytes, 0 if unknown.
+    """
+
+    from fr3d.instrumentation import memory_usage
+    from fr3d.instrumentation import MEGABYTE
+
+    current, peak = memory_usage()
+    return (peak or current or 0) / MEGABYTE
+
+
+class StageTimer(object):
+    """
+    Seconds, peak memory and growth of the peak for each stage.
+    """
+
+    def __init__(self):
+        self.stages = OrderedDict()
+
+    def run(self, name, function, *args):
+        before = peak_memory()
+        start = perf_counter()
+        result = function(*args)
+        self.add(name, perf_counter() - start, before)
+        return result
+
+    def add(self, name, seconds, before=None):
+        peak = peak_memory()
+        if before is None:
+            before = peak
+        stage = self.stages.setdefault(name, {"seconds": 0.0, "peakMB": 0.0, "growthMB": 0.0})
+        stage["seconds"] += seconds
+        stage["peakMB"] = peak
+        stage["growthMB"] += peak - before
+
+    def skip(self, name, reason):
+        self.stages[name] = {"skipped": reason}
+
+
+class MethodTimer(object):
+    """
+    Add up the time spent in one method of a class while in a with block,
+    for work that cannot be called on its own, such as the inference of
+    hydrogens inside the Component constructor.
+    """
+
+    def __init__(self, cls, name):
+        self.cls = cls
+        self.name = name
+        self.seconds = 0.0
+
+    def __enter__(self):
+        method = getattr(self.cls, self.name)
+        timer = self
+
+        def timed(*args, **kwargs):
+            start = perf_counter()
+            try:
+                return method(*args, **kwargs)
+            finally:
+                timer.seconds += perf_counter() - start
+
+        self.method = method
+        setattr(self.cls, self.name, timed)
+        return self
+
+    def __exit__(self, *args):
+        setattr(self.cls, self.name, self.method)
+        return False
+
+
+def read_tables(filename):
+    """
+    Reader object for a .cif, .cif.gz, .pdb or .pdb.gz file.
+    """
+
+    from fr3d.cif.reader import Cif
+    from fr3d.pdb.reader import PDB
+
+    pdbid = os.path.basename(filename).replace(".gz", "").replace(".cif", "").replace(".pdb", "")
+    if filename.lower().endswith(".gz"):
+        handle = gzip.open(filename, "rt")
+    else:
+        handle = open(filename, "r")
+    with handle:
+        if ".cif" in filename.lower():
+            return Cif(handle)
+        return PDB(handle, pdbid)
+
+
+def annotate_protein(structure):
+    """
+    Contacts and interactions between bases and amino acids, as the main
+    program of NA_protein_annotation.py finds them.
+    """
+
+    import NA_protein_annotation as protein
+
+    bases = structure.residues(sequence=protein.base_seq_list)
+    amino_acids = structure.residues(sequence=protein.aa_list)
+    protein.find_atom_atom_contacts(bases, amino_acids, protein.atom_atom_min_distance)
+    screen_distance = 10
+    baseCubeList, baseCubeNeighbors, aaCubeList = protein.find_neighbors(bases, amino_acids, screen_distance, "", "base", "aa_fg")
+    return protein.annotate_interactions(bases, amino_acids, screen_distance, baseCubeList, baseCubeNeighbors, aaCubeList)
+
+
+def search_data(structure, interaction_to_list_of_tuples):
+    """
+    The name and the data of one IFE with all nucleotides of the structure,
+    in the form that ifedata.readPositionsAndInteractions returns, made
+    from the structure instead of from data files.
+    """
+
+    import numpy as np
+    from ifedata import component_to_NA_type
+    from fr3d.search.pairs_index import compileNAPairsIndex
+
+    data = {"index_to_id": {}, "id_to_index": {}, "ids": [], "units": [], "models": []}
+    centers = []
+    chains = []
+    for nt in structure.residues(type=["RNA linking", "DNA linking"]):
+        if nt.rotation_matrix is None or len(nt.centers["glycosidic"]) != 3:
+            continue
+        unit_id = nt.unit_id()
+        index = len(data["ids"])
+        fields = unit_id.split("|")
+        data["index_to_id"][index] = unit_id
+        data["id_to_index"][unit_id] = index
+        data["ids"].append(unit_id)
+        data["models"].append(fields[1])
+        centers.append(nt.centers["glycosidic"])
+        data["units"].append({"centers": nt.centers["glycosidic"],
+                              "rotations": nt.rotation_matrix,
+                              "unitType": fields[3],
+                              "moleculeType": component_to_NA_type.get(fields[3], "RNA"),
+                              "chainindex": nt.index})
+        chain = "|".join(fields[0:3])
+        if not chain in chains:
+            chains.append(chain)
+    data["centers"] = np.array(centers).reshape(-1, 3)
+
+    table, description = compileNAPairsIndex(interaction_to_list_of_tuples)
+    return "+".join(chains), data, table, description
+
+
+def queries(data):
+    """
+    The named symbolic queries and a geometric query made from the first
+    three nucleotides.
+    """
+
+    from query_definitions import defineUserQuery
+
+    result = [defineUserQuery(name) for name in SYMBOLIC_QUERIES]
+    if len(data["units"]) >= 3:
+        Q = defaultdict(dict)
+        Q["name"] = "first three nucleotides"
+        Q["type"] = "geometric"
+        Q["numpositions"] = 3
+        Q["unitID"] = data["ids"][0:3]
+        Q["discrepancy"] = GEOMETRIC_DISCREPANCY
+        for i in range(3):
+            Q["queryMoleculeType"][i] = data["units"][i]["moleculeType"]
+            Q["requiredMoleculeType"][i] = [data["units"][i]["moleculeType"]]
+        Q["centers"] = [unit["centers"] for unit in data["units"][0:3]]
+        Q["rotations"] = [unit["rotations"] for unit in data["units"][0:3]]
+        result.append(Q)
+    return result
+
+
+def run_searches(ifename, data, table, description):
+    """
+    Run each query on the IFE and return the candidates of the geometric
+    query and the time in each search phase.
+    """
+
+    from copy import copy
+    from time import time
+    from fr3d.instrumentation import recorder
+    from fr3d.search.pairs_index import indexPairsForIFE
+    from query_processing import calculateQueryConstraints
+    from search import FR3D_search
+
+    phases = OrderedDict()
+    candidates = []
+    for Q in queries(data):
+        Q["searchFiles"] = [ifename]
+        Q["userMessage"] = []
+        Q["errorMessage"] = []
+        Q["MAXTIME"] = float("inf")
+        Q["FR3Dstarttime"] = time()
+        Q["CPUTimeUsed"] = 0
+        Q["MAXMEMORY"] = float("inf")
+        Q["server"] = True
+        Q = calculateQueryConstraints(Q)
+
+        ifedata = copy(data)
+        ifedata["interactionToPairs"], ifedata["pairToInteractions"], ifedata["pairToCrossingNumber"] = \
+            indexPairsForIFE(table, description, data["id_to_index"], Q["activeInteractions"])
+
+        before = recorder.snapshot()
+        Q, newCandidates, cpu = FR3D_search(Q, ifedata, ifename, recorder)
+        recorder.end_phase()
+        for name, total in recorder.to_dict(before)["totals"].items():
+            phases[name] = phases.get(name, 0) + total["seconds"]
+        if Q["type"] == "geometric":
+            candidates = newCandidates
+    return candidates, phases
+
+
+def order_candidates(candidates):
+    """
+    Order candidates by similarity, as FR3D.runQuery does.
+    """
+
+    from fr3d.geometry.discrepancy import matrix_discrepancy_all_vs_all
+    from orderBySimilarity import treePenalizedPathLength
+
+    if len(candidates) < 2:
+        return []
+    distance = matrix_discrepancy_all_vs_all([c["centers"] for c in candidates],
+                                             [c["rotations"] for c in candidates], processes=1)
+    return treePenalizedPathLength(distance, 100, 59)
+
+
+def benchmark_structure(filename):
+    """
+    Run every stage on one structure in this process.
+    """
+
+    # benchmark this copy of FR3D; the search and some classifiers use flat imports
+    sys.path.insert(0, REPOSITORY)
+    for directory in ["fr3d/classifiers", "fr3d/search"]:
+        sys.path.append(os.path.join(REPOSITORY, directory))
+
+    # import everything and load the tables first, so that no stage pays for that
+    from fr3d.data.components import Component
+    from fr3d.instrumentation import recorder
+    from fr3d.classifiers.hydrogen_bonds import load_ideal_basepair_hydrogen_bonds
+    import fr3d.classifiers.NA_pairwise_interactions as pairwise
+    try:
+        import NA_protein_annotation
+        protein_error = None
+    except ImportError as e:
+        protein_error = str(e)
+    try:
+        import search
+        import query_definitions
+        import query_processing
+        import orderBySimilarity
+        import ifedata
+        from fr3d.geometry.discrepancy import matrix_discrepancy_all_vs_all
+        search_error = None
+    except ImportError as e:
+        search_error = str(e)
+
+    categories = OrderedDict([("basepair", LEONTIS_WESTHOF_BASEPAIRS), ("stacking", []), ("sO", []), ("backbone", [])])
+    cutoffs = pairwise.focus_basepair_cutoffs(pairwise.load_nt_nt_cutoffs(), categories["basepair"])
+    ideal_hydrogen_bonds = load_ideal_basepair_hydrogen_bonds()
+
+    timer = StageTimer()
+    counts = OrderedDict()
+
+    reader = timer.run("parse", read_tables, filename)
+
+    before = peak_memory()
+    start = perf_counter()
+    with MethodTimer(Component, "infer_NA_hydrogens") as hydrogens:
+        structure = reader.structure()
+    seconds = perf_counter() - start
+    timer.add("components", seconds - hydrogens.seconds, before)
+    timer.add("hydrogens", hydrogens.seconds)
+    timer.run("hydrogens", structure.infer_amino_acid_hydrogens)
+    counts["units"] = sum(1 for unit in structure.residues())
+
+    interaction_to_list_of_tuples = timer.run("nt_nt", lambda: pairwise.annotate_nt_nt_in_structure(
+        structure, categories, cutoffs, ideal_hydrogen_bonds, timerData=recorder)[0])
+    recorder.end_phase()
+    counts["nt_nt interactions"] = sum(len(pairs) for pairs in interaction_to_list_of_tuples.values())
+
+    if protein_error:
+        timer.skip("protein", protein_error)
+    else:
+        list_base_aa = timer.run("protein", annotate_protein, structure)[0]
+        counts["nt_aa interactions"] = len(list_base_aa)
+
+    phases = {}
+    if search_error:
+        timer.skip("search", search_error)
+        timer.skip("ordering", search_error)
+    else:
+        ifename, data, table, description = search_data(structure, interaction_to_list_of_tuples)
+        candidates, phases = timer.run("search", run_searches, ifename, data, table, description)
+        timer.run("ordering", order_candidates, candidates)
+        counts["geometric candidates"] = len(candidates)
+
+    return {"stages": timer.stages, "search phases": phases, "counts": counts}
+
+
+def run_worker(filename):
+    output = subprocess.check_output([sys.executable, os.path.abspath(__file__), "--worker", filename],
+                                     universal_newlines=True)
+    return json.loads(output.strip().split("\n")[-1])
+
+
+def median(values):
+    values = sorted(values)
+    return values[len(values) // 2]
+
+
+def summarize(runs):
+    """
+    Median seconds and memory of each stage over several runs of one
+    structure.
+    """
+
+    stages = OrderedDict()
+    for name in runs[0]["stages"]:
+        if "skipped" in runs[0]["stages"][name]:
+            stages[name] = runs[0]["stages"][name]
+            continue
+        stages[name] = OrderedDict((key, median([run["stages"][name][key] for run in runs]))
+                                   for key in ["seconds", "peakMB", "growthMB"])
+    phases = OrderedDict((name, median([run["search phases"].get(name, 0) for run in runs]))
+                         for name in runs[0]["search phases"])
+    return {"stages": stages, "search phases": phases, "counts": runs[0]["counts"]}
+
+
+def git_commit():
+    try:
+        return subprocess.check_output(["git", "rev-parse", "--short", "HEAD"], cwd=REPOSITORY,
+                                       universal_newlines=True, stderr=subprocess.DEVNULL).strip()
+    except (OSError, subprocess.CalledProcessError):
+        return ""
+
+
+def write_bundled_structures(directory):
+    """
+    Write the structures of the bundled suite to directory and return
+    their file names.
+    """
+
+    sys.path.insert(0, REPOSITORY)
+    from fr3d.synthetic import write_structure
+
+    filenames = []
+    for name, options in BUNDLED_STRUCTURES.items():
+        filename = os.path.join(directory, name)
+        write_structure(filename, **options)
+        filenames.append(filename)
+    return filenames
+
+
+def reference_result(history, name, window):
+    """
+    The result to compare with for one structure and a description of it:
+    the latest pinned run, or else the median of each stage over the last
+    window runs.
+    """
+
+    for run in reversed(history):
+        if run.get("baseline") and name in run["structures"]:
+            return run["structures"][name], "the baseline of %s" % run["date"]
+
+    results = [run["structures"][name] for run in history if name in run["structures"]][-window:]
+    if not results:
+        return None, ""
+
+    stages = OrderedDict()
+    for stage in results[-1]["stages"]:
+        measured = [result["stages"][stage] for result in results
+                    if stage in result["stages"] and not "skipped" in result["stages"][stage]]
+        if measured:
+            stages[stage] = OrderedDict((key, median([values[key] for values in measured]))
+                                        for key in ["seconds", "peakMB", "growthMB"])
+    return {"stages": stages}, "the median of the last %d runs" % len(results)
+
+
+def compare(result, reference, tolerance, memory_tolerance, min_seconds):
+    """
+    Print each stage next to the reference result; return the list of
+    regressions beyond the tolerances.  Stages taking less than
+    min_seconds are not compared in time, since they are mostly noise.
+    """
+
+    regressions = []
+    for name, stage in result["stages"].items():
+        old = reference["stages"].get(name, {})
+        if "skipped" in stage or "skipped" in old or not old:
+            continue
+        change = stage["seconds"] / max(old["seconds"], 1e-9) - 1
+        memory_change = stage["growthMB"] - old["growthMB"]
+        flag = ""
+        if change > tolerance and max(stage["seconds"], old["seconds"]) >= min_seconds:
+            flag += "  SLOWER"
+            regressions.append((name, "time", change))
+        if memory_change > memory_tolerance * max(old["peakMB"], 1):
+            flag += "  MORE MEMORY"
+            regressions.append((name, "memory", memory_change))
+        print("  %-12s %8.3f s  was %8.3f s  %+6.1f%%  grew %7.1f MB  was %7.1f MB%s" %
+              (name, stage["seconds"], old["seconds"], 100 * change, stage["growthMB"], old["growthMB"], flag))
+    return regressions
+
+
+def print_result(name, result):
+    print(name)
+    for stage, values in result["stages"].items():
+        if "skipped" in values:
+            print("  %-12s skipped: %s" % (stage, values["skipped"]))
+        else:
+            print("  %-12s %8.3f s  peak %8.1f MB  grew %7.1f MB" % (stage, values["seconds"], values["peakMB"], values["growthMB"]))
+    for phase, seconds in result["search phases"].items():
+        print("    %-31s %8.3f s" % (phase, seconds))
+    for key, value in result["counts"].items():
+        print("  %s: %d" % (key, value))
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Time each stage of FR3D annotation and search")
+    parser.add_argument("structures", nargs="*", help=".cif or .pdb files, possibly gzipped; the bundled suite without any")
+    parser.add_argument("--repeats", type=int, default=3, help="Number of runs of each structure")
+    parser.add_argument("--history", help="JSON file to compare with and append the results to")
+    parser.add_argument("--tolerance", type=float, default=0.2, help="Allowed slowdown, as a fraction")
+    parser.add_argument("--memory_tolerance", type=float, default=0.2, help="Allowed growth in memory, as a fraction of the earlier peak")
+    parser.add_argument("--min_seconds", type=float, default=0.05, help="Stages faster than this are not compared in time")
+    parser.add_argument("--window", type=int, default=5, help="Number of earlier runs whose median is compared with, when no run is pinned")
+    parser.add_argument("--pin", action="store_true", help="Mark this run in the history as the baseline to compare later runs with")
+    parser.add_argument("--worker", action="store_true", help=argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    if args.worker:
+        print(json.dumps(benchmark_structure(args.structures[0])))
+        return
+
+    history = []
+    if args.history and os.path.exists(args.history):
+        with open(args.history) as f:
+            history = json.load(f)
+
+    structures = args.structures
+    bundled = None
+    if not structures:
+        bundled = tempfile.mkdtemp()
+        structures = write_bundled_structures(bundled)
+
+    run = OrderedDict([("date", datetime.datetime.now().isoformat(timespec="seconds")),
+                       ("commit", git_commit()),
+                       ("python", platform.python_version()),
+                       ("machine", platform.node()),
+                       ("baseline", args.pin),
+                       ("structures", OrderedDict())])
+    regressions = []
+    try:
+        for filename in structures:
+            name = os.path.basename(filename)
+            result = summarize([run_worker(filename) for i in range(args.repeats)])
+            run["structures"][name] = result
+            print_result(name, result)
+
+            reference, description = reference_result(history, name, args.window)
+            if reference:
+                print("Compared with %s:" % description)
+                regressions += [(name,) + r for r in compare(result, reference, args.tolerance, args.memory_tolerance, args.min_seconds)]
+    finally:
+        if bundled:
+            shutil.rmtree(bundled)
+
+    if args.history:
+        history.append(run)
+        with open(args.history, "w") as f:
+            json.dump(history, f, indent=1)
+
+    if regressions:
+        print("Regressions:")
+        for name, stage, kind, change in regressions:
+            print("  %s %s %s" % (name, stage, kind))
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,131 @@
+"""
+Measure how long FR3D takes to start up, in fresh Python processes.
+
+Each measurement runs a new interpreter, so the times include everything a
+short-lived worker or a command line run pays on every launch: importing
+the modules, loading the classification tables, and optionally reading and
+annotating one structure.  The first run of each measurement uses an empty
+table cache, the others a warm one.
+
+    python benchmarks/startup_benchmark.py
+    python benchmarks/startup_benchmark.py --structure 1S72.cif.gz --output startup.json
+    python benchmarks/startup_benchmark.py --compare startup.json
+
+With --compare, the medians are checked against an earlier output file and
+the program exits with status 1 if any is more than --tolerance slower.
+"""
+
+import argparse
+import json
+import os
+import shutil
+import subprocess
+import sys
+import tempfile
+
+# code run in each new process; it prints the elapsed seconds as JSON
+IMPORT_CODE = """
+import json, time
+start = time.perf_counter()
+import fr3d.classifiers.NA_pairwise_interactions as m
+imported = time.perf_counter()
+m.load_nt_nt_cutoffs()
+print(json.dumps({"import": imported - start, "tables": time.perf_counter() - imported}))
+"""
+
+ANNOTATE_CODE = """
+import json, sys, time
+start = time.perf_counter()
+import fr3d.classifiers.NA_pairwise_interactions as m
+categories = {"basepair": ["cWW"]}
+cutoffs = m.focus_basepair_cutoffs(m.load_nt_nt_cutoffs(), categories["basepair"])
+loaded = time.perf_counter()
+structure, messages = m.load_structure(sys.argv[1])
+read = time.perf_counter()
+m.annotate_nt_nt_in_structure(structure, categories, cutoffs)
+print(json.dumps({"startup": loaded - start, "read": read - loaded, "annotate": time.perf_counter() - read}))
+"""
+
+
+def run_once(code, arguments, cache_directory):
+    environment = dict(os.environ)
+    environment["FR3D_CACHE_DIR"] = cache_directory
+    output = subprocess.check_output([sys.executable, "-c", code] + arguments,
+                                     env=environment, universal_newlines=True)
+    return json.loads(output.strip().split("\n")[-1])
+
+
+def measure(code, arguments, repeats):
+    """
+    Run code once with an empty cache and repeats times with a warm one.
+    Return the cold times and the median of the warm times.
+    """
+
+    cache_directory = tempfile.mkdtemp()
+    try:
+        cold = run_once(code, arguments, cache_directory)
+        warm = [run_once(code, arguments, cache_directory) for i in range(repeats)]
+    finally:
+        shutil.rmtree(cache_directory)
+
+    median = {}
+    for key in cold:
+        times = sorted(w[key] for w in warm)
+        median[key] = times[len(times) // 2]
+    return {"cold": cold, "warm": median}
+
+
+def compare(results, baseline, tolerance):
+    """
+    Print each warm median next to the baseline; return False if any
+    is more than tolerance slower.
+    """
+
+    ok = True
+    for name in results:
+        if not name in baseline:
+            continue
+        for key, seconds in results[name]["warm"].items():
+            old = baseline[name]["warm"].get(key)
+            if not old:
+                continue
+            change = seconds / old - 1
+            flag = ""
+            if change > tolerance:
+                flag = "  SLOWER"
+                ok = False
+            print("%-10s %-10s %8.3f s  was %8.3f s  %+6.1f%%%s" % (name, key, seconds, old, 100 * change, flag))
+    return ok
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Measure FR3D startup time")
+    parser.add_argument("--structure", help="Also read and annotate this .cif or .pdb file")
+    parser.add_argument("--repeats", type=int, default=5, help="Number of warm runs")
+    parser.add_argument("--output", help="Write the results to this JSON file")
+    parser.add_argument("--compare", help="Compare with the results in this JSON file")
+    parser.add_argument("--tolerance", type=float, default=0.2, help="Allowed slowdown, as a fraction")
+    args = parser.parse_args()
+
+    results = {"import": measure(IMPORT_CODE, [], args.repeats)}
+    if args.structure:
+        results["annotate"] = measure(ANNOTATE_CODE, [args.structure], args.repeats)
+
+    for name in results:
+        for kind in ["cold", "warm"]:
+            for key, seconds in results[name][kind].items():
+                print("%-10s %-5s %-10s %8.3f s" % (name, kind, key, seconds))
+
+    if args.output:
+        with open(args.output, "w") as f:
+            json.dump(results, f, indent=1)
+
+    if args.compare:
+        with open(args.compare) as f:
+            baseline = json.load(f)
+        if not compare(results, baseline, args.tolerance):
+            sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
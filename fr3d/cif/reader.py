@@ -583,8 +583,8 @@ class Cif(object):
             ins_code = None #Maybe this should be "" in python 3
 
         alt_id = atom['label_alt_id'] if 'label_alt_id' in atom else '.'
-        if alt_id == '.':
-            alt_id = None
+        if alt_id == '.' or alt_id == '':
+            alt_id = None   # newer mmcif-pdbx versions read . as an empty string
 
         model = atom['pdbx_PDB_model_num'] if 'pdbx_PDB_model_num' in atom else 1
         component_id = atom['label_comp_id'] if 'label_comp_id' in atom else atom['auth_comp_id']
@@ -39,6 +39,13 @@ else:
     read_mode = 'rt'
     write_mode = 'wt'   # write as text
 
+from fr3d.instrumentation import timer as myTimer
+from fr3d.instrumentation import count as count_event
+from fr3d.instrumentation import recorder
+from fr3d.instrumentation import span
+from fr3d.instrumentation import check_memory_budget
+from fr3d.instrumentation import MemoryBudgetExceeded
+from fr3d.instrumentation import MEGABYTE
 from fr3d.definitions import NAbaseheavyatoms
 from fr3d.definitions import NAbasehydrogens
 from fr3d.definitions import NAbaseatoms
@@ -50,9 +57,23 @@ from fr3d.definitions import aa_backbone
 from fr3d.definitions import planar_atoms
 from fr3d.definitions import NAbaseMassiveAndHydrogens
 
-from fr3d.classifiers.class_limits_2023 import nt_nt_cutoffs   # use latest cutoffs
+from fr3d.table_cache import load_table
 from fr3d.classifiers.hydrogen_bonds import load_ideal_basepair_hydrogen_bonds
 from fr3d.classifiers.hydrogen_bonds import check_hydrogen_bond
+from fr3d.geometry.connectivity import atom_coordinates
+from fr3d.geometry.connectivity import backbone_links
+from fr3d.geometry.connectivity import previous_nucleotide
+from fr3d.geometry.connectivity import successive_nucleotides
+from fr3d.classifiers.ensemble import Ensemble
+from fr3d.classifiers.ensemble import interaction_frequencies
+from fr3d.classifiers.ensemble import pair_cubes
+from fr3d.classifiers.trajectory import Trajectory
+from fr3d.classifiers.trajectory import InteractionOccupancy
+from fr3d.classifiers.trajectory import read_frames
+from fr3d.manifest import Manifest
+from fr3d.manifest import MANIFEST_NAME
+from fr3d.classifiers.annotation_store import AnnotationStore
+from fr3d.classifiers.annotation_store import output_rows
 
 # Modified nucleotide mappings from atom_mappings_refined.py
 from fr3d.data.mapping import modified_base_atom_list,parent_atom_to_modified,modified_atom_to_parent,modified_base_to_parent
@@ -85,6 +106,72 @@ atom_atom_min_distance = 5    # minimum distance between atoms in nts to conside
 base_seq_list = []                     # for all nucleic acids, modified or not
 
 
+def load_nt_nt_cutoffs():
+    """
+    Return the latest basepair cutoffs, from class_limits_2023.py.
+    That module is thousands of lines of assignments, so it is only
+    imported when the cutoffs are first needed, and with FR3D_CACHE_DIR
+    set, later runs read the dictionary from the table cache.
+    """
+
+    global _nt_nt_cutoffs
+
+    if _nt_nt_cutoffs is None:
+        current_path,current_program = os.path.split(os.path.abspath(__file__))
+        source = os.path.join(current_path,"class_limits_2023.py")
+
+        def build():
+            from fr3d.classifiers.class_limits_2023 import nt_nt_cutoffs
+            return nt_nt_cutoffs
+
+        _nt_nt_cutoffs = load_table("nt_nt_cutoffs_2023", [source], build)
+
+    return _nt_nt_cutoffs
+
+_nt_nt_cutoffs = None
+
+
+def __getattr__(name):
+    # keep "from NA_pairwise_interactions import nt_nt_cutoffs" working
+    if name == "nt_nt_cutoffs":
+        return load_nt_nt_cutoffs()
+    raise AttributeError("module %s has no attribute %s" % (__name__, name))
+
+
+def classification_tables():
+    """
+    Source files of the tables that the classification depends on, by
+    name, for the manifest of incremental annotation.
+    """
+
+    current_path,current_program = os.path.split(os.path.abspath(__file__))
+    return {"class_limits_2023": os.path.join(current_path,"class_limits_2023.py"),
+            "hydrogen_bonds": os.path.join(current_path,"H_bonding_Atoms_from_Isostericity_Table.csv")}
+
+
+def annotation_output_files(outputNAPairwiseInteractions,pdbid,categories,output_format,ensemble=False,trajectory=""):
+    """
+    Files that generatePairwiseAnnotation writes for pdbid.
+    """
+
+    outputs = []
+    if trajectory:
+        for extension in [".txt",".npz"]:
+            outputs.append(os.path.join(outputNAPairwiseInteractions,pdbid + "_trajectory" + extension))
+    elif output_format == 'txt':
+        for category in categories:
+            if category != "near":
+                outputs.append(os.path.join(outputNAPairwiseInteractions,pdbid + "_" + category + ".txt"))
+    elif output_format == 'ebi_json':
+        # one file per chain and category
+        for filename in os.listdir(outputNAPairwiseInteractions or "."):
+            if filename.startswith(pdbid + "_") and filename.endswith(".json"):
+                outputs.append(os.path.join(outputNAPairwiseInteractions,filename))
+    if ensemble:
+        outputs.append(os.path.join(outputNAPairwiseInteractions,pdbid + "_ensemble.txt"))
+    return [output for output in outputs if os.path.exists(output)]
+
+
 def focus_basepair_cutoffs(basepair_cutoffs,interactions):
     """
     Reduce the dictionary of basepair cutoffs to just the pairs
@@ -135,40 +222,34 @@ def focus_basepair_cutoffs(basepair_cutoffs,interactions):
 
     return focused_basepair_cutoffs
 
-def myTimer(state,data={}):
-
-    # add elapsed time to the current state of the timer
-    if "currentState" in data:
-        currentState = data["currentState"]
-        data[currentState] += time() - data["lastTime"]
-
-    if state == "summary":
-        total = 0.000000000001
-        for state in data["allStates"]:
-            if not state == "lastTime" and not state == "currentState":
-                total += data[state]
 
-        print("Summary of time taken:")
-        for state in data["allStates"]:
-            if not state == "lastTime" and not state == "currentState":
-                print("%-31s: %10.3f seconds %10.3f minutes %10.3f%% of total" % (state,data[state],data[state]/60,100*data[state]/total))
-
-        print("%-31s: %10.3f seconds %10.3f minutes %10.3f%% of total" % ("Total",total,total/60,100))
+def estimate_structure_memory(filename):
+    """
+    Rough number of megabytes needed to read and annotate the structure in
+    filename, from the size of the file.  Parsing an mmCIF file takes about
+    15 times its size; gzipped files are about 5 times smaller than that.
+    Returns 0 when the file has not been downloaded yet.
+    """
 
+    for extension in ["",".cif.gz",".cif",".pdb.gz",".pdb"]:
+        if os.path.exists(filename+extension):
+            size = os.path.getsize(filename+extension)
+            if (filename+extension).endswith(".gz"):
+                size *= 5
+            return 15 * size / MEGABYTE
+    return 0
 
-    elif not state in data:
-        data[state] = 0
-        # keep track of states and the order in which they were seen
-        if "allStates" in data:
-            data["allStates"].append(state)
-        else:
-            data["allStates"] = [state]
 
-    # change to the state just starting now
-    data["currentState"] = state
-    data["lastTime"] = time()
+def find_structure_file(filename):
+    """
+    The file on disk for filename, which may leave out the extension
+    .cif.gz, .cif, .pdb.gz or .pdb, or None if there is none.
+    """
 
-    return data
+    for extension in ["",".cif.gz",".cif",".pdb.gz",".pdb"]:
+        if os.path.exists(filename+extension):
+            return filename+extension
+    return None
 
 
 def load_structure(filename,pdbid=""):
@@ -185,16 +266,7 @@ def load_structure(filename,pdbid=""):
     original_filename = filename
 
     # look for the file, possibly with extensions
-    if os.path.exists(filename):
-        pass
-    elif os.path.exists(filename+".cif.gz"):
-        filename = filename + ".cif.gz"
-    elif os.path.exists(filename+".cif"):
-        filename = filename + ".cif"
-    elif os.path.exists(filename+".pdb.gz"):
-        filename = filename + ".pdb.gz"
-    elif os.path.exists(filename+".pdb"):
-        filename = filename + ".pdb"
+    filename = find_structure_file(filename) or filename
 
     # if still not available, try to download from PDB and save locally
     # download .gz version when possible for speed and to save disk space
@@ -248,14 +320,18 @@ def load_structure(filename,pdbid=""):
                 structure = Cif(raw).structure()
         elif filename.lower().endswith('.pdb.gz'):
             with gzip.open(filename, rm) as raw:
-                from fr3d.pdb.pdb_reader import PDBStructure
-                structure = PDBStructure(pdbid,raw).structures()
-                message.append("No symmetry operators applied to .pdb files")
+                from fr3d.pdb.reader import PDB
+                reader = PDB(raw,pdbid)
+                structure = reader.structure()
+                if not reader.has_symmetry():
+                    message.append("No symmetry operators found in .pdb file")
         elif filename.lower().endswith('.pdb'):
             with open(filename, rm) as raw:
-                from fr3d.pdb.pdb_reader import PDBStructure
-                structure = PDBStructure(pdbid,raw).structures()
-                message.append("No symmetry operators applied to .pdb files")
+                from fr3d.pdb.reader import PDB
+                reader = PDB(raw,pdbid)
+                structure = reader.structure()
+                if not reader.has_symmetry():
+                    message.append("No symmetry operators found in .pdb file")
 
         message.append("Loaded " + filename)
         return structure, message
@@ -272,14 +348,18 @@ def load_structure(filename,pdbid=""):
                 structure = Cif(raw).structure()
         elif filename.lower().endswith('.pdb.gz'):
             with gzip.open(filename, rm) as raw:
-                from fr3d.pdb.pdb_reader import PDBStructure
-                structure = PDBStructure(pdbid,raw).structures()
-                print("  No symmetry operators applied to .pdb files")
+                from fr3d.pdb.reader import PDB
+                reader = PDB(raw,pdbid)
+                structure = reader.structure()
+                if not reader.has_symmetry():
+                    print("  No symmetry operators found in .pdb file")
         elif filename.lower().endswith('.pdb'):
             with open(filename, rm) as raw:
-                from fr3d.pdb.pdb_reader import PDBStructure
-                structure = PDBStructure(pdbid,raw).structures()
-                print("  No symmetry operators applied to .pdb files")
+                from fr3d.pdb.reader import PDB
+                reader = PDB(raw,pdbid)
+                structure = reader.structure()
+                if not reader.has_symmetry():
+                    print("  No symmetry operators found in .pdb file")
 
         message.append("Loaded " + filename)
         return structure, message
@@ -482,45 +562,28 @@ def map_unit_id_to_previous_O3(bases):
     Create a dictionary whose key is unit id and whose value
     is the 3d coordinates of the O3' atom of the previous nucleotide,
     if available, otherwise empty vector.
+    The previous nucleotide is the one whose O3' is covalently
+    bonded to the P of this one, found for all bases at once.
+    O3'-P links are often stretched in low resolution structures, so
+    nucleotides without a bonded O3' use the nucleotide just before them
+    in the same model, symmetry and chain, as they used to.
     """
 
-    list_of_nucleotides = []
-    for base in bases:
-        coordinates = get_one_atom_coordinates(base,"O3'")
-        P = get_one_atom_coordinates(base,"P")
-        t = (base.model,base.symmetry,base.chain,base.index,base.unit_id(),coordinates,P)
-        list_of_nucleotides.append(t)
-
-    list_of_nucleotides.sort()
-
-    previous_O3_coordinates = np.empty([1,3])
-    previous_model = None
-    previous_symmetry = None
-    previous_chain = None
-    previous_index = None
-    unit_id_to_previous_O3 = {}
+    bases = list(bases)
+    O3 = atom_coordinates(bases, "O3'")
+    links = backbone_links(bases, O3=O3)
+    previous = previous_nucleotide(len(bases), links)
 
-    for model,symmetry,chain,index,unit_id,O3_coordinates,P in list_of_nucleotides:
+    first, second, step = successive_nucleotides(bases)
+    adjacent = (step == 1) & (previous[second] < 0)
+    previous[second[adjacent]] = first[adjacent]
 
-        #print(model,symmetry,chain,index,unit_id,O3_coordinates)
-
-        if model == previous_model and symmetry == previous_symmetry and chain == previous_chain and index == previous_index + 1:
-            unit_id_to_previous_O3[unit_id] = previous_O3_coordinates
-
-            # if P.any():
-            #     print("%-20s distance from P to previous O3' is %f" % (unit_id,np.linalg.norm(P-previous_O3_coordinates)))
-            # else:
-            #     print(P)
+    unit_id_to_previous_O3 = {}
+    for base, p in zip(bases, previous.tolist()):
+        if p >= 0:
+            unit_id_to_previous_O3[base.unit_id()] = O3[p]
         else:
-            unit_id_to_previous_O3[unit_id] = np.empty([1,3])
-            # print("%-20s has no previous O3' see http://rna.bgsu.edu/rna3dhub/display3D/unitid/%s" % (unit_id,unit_id))
-
-        # save current values for next nucleotide
-        previous_model = model
-        previous_symmetry = symmetry
-        previous_chain = chain
-        previous_index = index
-        previous_O3_coordinates = O3_coordinates
+            unit_id_to_previous_O3[base.unit_id()] = np.array([])
 
     return unit_id_to_previous_O3
 
@@ -641,6 +704,9 @@ def annotate_nt_nt_interactions(bases, center_center_distance_cutoff, baseCubeLi
     """
 
     count_pair = 0
+    count_screened = 0        # pairs of nucleotides in neighboring cubes
+    count_close = 0           # pairs passing the center-center distance screen
+    count_basepair_checks = 0 # calls to check_basepair_cutoffs
 
     interaction_to_pair_list = defaultdict(list) # map interaction to list of pairs
     category_to_interactions = defaultdict(set)  # map category to list of observed interactions
@@ -692,6 +758,8 @@ def annotate_nt_nt_interactions(bases, center_center_distance_cutoff, baseCubeLi
                             print(nt2.centers["base"])
                             continue
 
+                        count_screened += 1
+
                         # vector displacement between base centers
                         displacement = abs(nt2.centers["base"]-nt1.centers["base"]) # center-center
 
@@ -723,6 +791,8 @@ def annotate_nt_nt_interactions(bases, center_center_distance_cutoff, baseCubeLi
                         if center_center_distance < 2:
                             continue
 
+                        count_close += 1
+
                         unit_id_pair = (nt1.unit_id(),nt2.unit_id())  # tuple for these nucleotides in this order
                         reversed_pair = (nt2.unit_id(),nt1.unit_id())
 
@@ -816,7 +886,7 @@ def annotate_nt_nt_interactions(bases, center_center_distance_cutoff, baseCubeLi
                             #     lastNT2 = ntDict[nt2.index-1]
 
                             # get coordinates of O3' of the nucleotide before nt2, part of the phosphate of nt2
-                            previousO3 = unit_id_to_previous_O3.get(nt2.unit_id(),np.empty([1,3]))
+                            previousO3 = unit_id_to_previous_O3.get(unit_id_pair[1],np.array([]))
                             interactionbPh, interactionbR, datapoint12 = check_base_backbone_interactions(nt1, nt2, previousO3, parent1, parent2, datapoint12)
 
                             if interactionbPh and len(interactionbPh) > 0:
@@ -861,6 +931,7 @@ def annotate_nt_nt_interactions(bases, center_center_distance_cutoff, baseCubeLi
 
                             timerData = myTimer("Check basepairing",timerData)
 
+                            count_basepair_checks += 1
                             cutoffs = focused_basepair_cutoffs[parent1+","+parent2]
                             hydrogen_bonds = ideal_hydrogen_bonds[parent1+","+parent2]
                             interaction12, subcategory12, quality12, datapoint12 = check_basepair_cutoffs(nt1,nt2,pair_data,cutoffs,hydrogen_bonds,datapoint12)
@@ -911,6 +982,7 @@ def annotate_nt_nt_interactions(bases, center_center_distance_cutoff, baseCubeLi
                                     category_to_interactions['coplanar'].add('cp')
 
                             timerData = myTimer("Check basepairing",timerData)
+                            count_basepair_checks += 1
                             cutoffs = focused_basepair_cutoffs[parent2+","+parent1]
                             hydrogen_bonds = ideal_hydrogen_bonds[parent2+","+parent1]
                             interaction21, subcategory21, quality21, datapoint21 = check_basepair_cutoffs(nt2,nt1,pair_data,cutoffs,hydrogen_bonds,datapoint21)
@@ -1045,6 +1117,11 @@ def annotate_nt_nt_interactions(bases, center_center_distance_cutoff, baseCubeLi
 
     print("  Found %d nucleotide-nucleotide interactions" % count_pair)
 
+    count_event("nt-nt pairs screened", count_screened)
+    count_event("nt-nt pairs within cutoff", count_close)
+    count_event("check_basepair_cutoffs calls", count_basepair_checks)
+    count_event("nt-nt interactions found", count_pair)
+
     if False:
         print("  Maximum screen distance for actual contacts is %8.4f" % max_center_center_distance)
 
@@ -1180,32 +1257,22 @@ def calculate_crossing_numbers(bases,interaction_to_pair_list):
 
 def annotate_covalent_connections(nucleotides, interaction_to_list_of_tuples, category_to_interactions, timerData):
     """
-    Loop through bases, sort by model, symmetry, chain, and
+    Sort bases by model, symmetry, chain, and
     record the distance in the chain between successive
     observed nucleotides.
     """
 
-    nts_to_sort = defaultdict(list)
-
-    # list the nucleotides by model, symmetry, chain, index
-    for nt in nucleotides:
-        nts_to_sort[(nt.model+" "+nt.symmetry+" "+nt.chain,nt.index)].append(nt.unit_id())
+    nucleotides = list(nucleotides)
+    first, second, chain_distance = successive_nucleotides(nucleotides)
 
-    sorted_keys = sorted(nts_to_sort.keys())
-
-    for i in range(0,len(sorted_keys)-1):
-        key1 = sorted_keys[i]
-        key2 = sorted_keys[i+1]
-
-        # same model, symmetry, chain
-        if key1[0] == key2[0]:
-            chain_distance = key2[1]-key1[1]
-            for u1 in nts_to_sort[key1]:
-                for u2 in nts_to_sort[key2]:
-                    interaction = "p_" + str(chain_distance)
-                    interaction_to_list_of_tuples[interaction].append((u1,u2,None))
-                    category_to_interactions["covalent"].add(interaction)
-                    #print("%s\t%s\t%s" % (u1,interaction,u2))
+    unit_ids = {}
+    for i, j, d in zip(first.tolist(), second.tolist(), chain_distance.tolist()):
+        for k in [i, j]:
+            if not k in unit_ids:
+                unit_ids[k] = nucleotides[k].unit_id()
+        interaction = "p_" + str(d)
+        interaction_to_list_of_tuples[interaction].append((unit_ids[i],unit_ids[j],None))
+        category_to_interactions["covalent"].add(interaction)
 
     return interaction_to_list_of_tuples, category_to_interactions, timerData
 
@@ -1217,7 +1284,7 @@ def annotate_nt_nt_in_structure(structure,categories,focused_basepair_cutoffs={}
     """
 
     if not focused_basepair_cutoffs:
-        focused_basepair_cutoffs = focus_basepair_cutoffs(nt_nt_cutoffs,categories['basepair'])
+        focused_basepair_cutoffs = focus_basepair_cutoffs(load_nt_nt_cutoffs(),categories['basepair'])
 
     if not ideal_hydrogen_bonds:
         ideal_hydrogen_bonds = load_ideal_basepair_hydrogen_bonds()
@@ -1243,6 +1310,94 @@ def annotate_nt_nt_in_structure(structure,categories,focused_basepair_cutoffs={}
     return interaction_to_list_of_tuples, category_to_interactions, timerData, pair_to_data
 
 
+def annotate_nt_nt_in_ensemble(structure,categories,focused_basepair_cutoffs={},ideal_hydrogen_bonds={},chains=[],timerData=None):
+    """
+    Annotate a structure with several models, such as an NMR ensemble.
+    The models are matched to one topology and the pairs close enough to
+    interact are screened for all models at once, instead of building
+    cubes for each model.  Only the screening is shared; each model is
+    then classified on its own screened pairs with the per-pair code, so
+    the time to classify grows with the number of models.  Returns the interactions of all models together, as
+    annotate_nt_nt_in_structure does, and the number of models in which
+    each interaction is found.  Residues that are not present in every
+    model are reported and left out.
+    """
+
+    if not focused_basepair_cutoffs:
+        focused_basepair_cutoffs = focus_basepair_cutoffs(load_nt_nt_cutoffs(),categories['basepair'])
+
+    if not ideal_hydrogen_bonds:
+        ideal_hydrogen_bonds = load_ideal_basepair_hydrogen_bonds()
+
+    if chains:
+        bases = structure.residues(chain = chains, type = ["RNA linking","DNA linking"])  # load all RNA/DNA nucleotides
+    else:
+        bases = structure.residues(type = ["RNA linking","DNA linking"])  # load all RNA/DNA nucleotides
+
+    if not timerData:
+        timerData = myTimer("start")
+
+    timerData = myTimer("Screening ensemble",timerData)
+    ensemble = Ensemble(bases)
+    points = ensemble.reference_points(nt_reference_point)
+    first, second, distances = ensemble.close_pairs(points, nt_nt_screen_distance)
+    count_event("ensemble models", len(ensemble.models))
+    count_event("ensemble pairs screened", len(first))
+    if ensemble.missing:
+        count_event("ensemble residues not in every model", len(ensemble.missing))
+        print("  %d residues are not present in every model and are not annotated: %s" % (len(ensemble.missing), " ".join(ensemble.missing)))
+
+    interaction_to_list_of_tuples = defaultdict(list)
+    category_to_interactions = defaultdict(set)
+    model_interactions = []
+
+    for m in range(len(ensemble.models)):
+        model_bases = ensemble.residues[m]
+        close = distances[m] <= nt_nt_screen_distance
+        baseCubeList, baseCubeNeighbors = pair_cubes(model_bases, first[close], second[close])
+
+        timerData = myTimer("Annotating interactions",timerData)
+        model_tuples, model_categories, timerData, pair_to_data = annotate_nt_nt_interactions(model_bases, nt_nt_screen_distance, baseCubeList, baseCubeNeighbors, categories, focused_basepair_cutoffs, ideal_hydrogen_bonds, timerData)
+        model_tuples, model_categories, timerData = annotate_covalent_connections(model_bases, model_tuples, model_categories, timerData)
+
+        model_interactions.append(model_tuples)
+        for interaction, tuples in model_tuples.items():
+            interaction_to_list_of_tuples[interaction].extend(tuples)
+        for category, interactions in model_categories.items():
+            category_to_interactions[category] |= interactions
+
+    timerData = myTimer("Counting interactions across models",timerData)
+    interaction_frequencies_across_models = interaction_frequencies(ensemble, model_interactions)
+
+    return interaction_to_list_of_tuples, category_to_interactions, timerData, interaction_frequencies_across_models, len(ensemble.models)
+
+
+def annotate_nt_nt_in_trajectory(trajectory,frames,categories,focused_basepair_cutoffs={},ideal_hydrogen_bonds={},chains=[],timerData=None):
+    """
+    Annotate each frame of a trajectory.  trajectory is a Trajectory made
+    from the topology and frames gives (keys, coordinates) for each frame,
+    as read_frames does.  The structure is not read again for each frame;
+    its atoms are moved to the coordinates of the frame and annotated as
+    annotate_nt_nt_in_structure does.  Yields the frame number, the
+    interactions and categories of the frame, and timerData.
+    """
+
+    if not focused_basepair_cutoffs:
+        focused_basepair_cutoffs = focus_basepair_cutoffs(load_nt_nt_cutoffs(),categories['basepair'])
+
+    if not ideal_hydrogen_bonds:
+        ideal_hydrogen_bonds = load_ideal_basepair_hydrogen_bonds()
+
+    for frame_number, (keys, coordinates) in enumerate(frames):
+        timerData = myTimer("Moving atoms to frame",timerData)
+        trajectory.set_frame(coordinates, keys)
+        count_event("trajectory frames")
+
+        interaction_to_list_of_tuples, category_to_interactions, timerData, pair_to_data = annotate_nt_nt_in_structure(trajectory.structure,categories,focused_basepair_cutoffs,ideal_hydrogen_bonds,chains,timerData)
+
+        yield frame_number, interaction_to_list_of_tuples, category_to_interactions, timerData
+
+
 def get_parent(sequence):
     """
     Look up parent sequence for RNA, DNA, and modified nucleotides
@@ -2398,6 +2553,7 @@ def check_basepair_cutoffs(nt1,nt2,pair_data,cutoffs,hydrogen_bonds,datapoint):
     # default is that there is no annotation
     hbond_annotation = ""
     hbond_badness = 9999
+    LW_bond_rank = []     # hydrogen bond sets from best to worst, only ranked with datapoint
 
     if datapoint:
         #print("Checking hydrogen bonds for http://rna.bgsu.edu/rna3dhub/display3D/unitid/%s,%s" % (nt1.unit_id(),nt2.unit_id()))
@@ -3000,9 +3156,11 @@ def write_unit_data_file(PDB,unit_data_path,structure):
     Write out data file(s) of nucleotide centers and rotation matrices,
     primarily for use by the FR3D motif search tool.
     If unit_data_path is empty, no files are written.
-    One file for each chain.
+    One file for each chain.  Returns the names of the files written.
     """
 
+    filenames = []
+
     if len(unit_data_path) > 0:
 
         nucleotides = structure.residues(type = ["RNA linking","DNA linking"])
@@ -3050,6 +3208,9 @@ def write_unit_data_file(PDB,unit_data_path,structure):
                 pickle.dump(rsset, fh, 2)
 
             print("  Wrote unit data file %s" % filename)
+            filenames.append(filename)
+
+    return filenames
 
 
 def write_txt_output_file(outputNAPairwiseInteractions,pdbid,interaction_to_list_of_tuples,categories,category_to_interactions):
@@ -3059,30 +3220,78 @@ def write_txt_output_file(outputNAPairwiseInteractions,pdbid,interaction_to_list
     Other than that, the interactions are listed in no particular order.
     """
 
-    if "near" in categories:
-        true_near = ["","n"]
-    else:
-        true_near = [""]
-
-    # loop over types of output files requested
+    # open one file for each category requested, even if nothing is written to it
+    files = {}
     for category in categories:
-        if category == "near":
-            continue
-        filename = os.path.join(outputNAPairwiseInteractions,pdbid + "_" + category + ".txt")
-        with open(filename,'w') as f:
-            # loop over all interactions found in this category
+        if category != "near":
+            files[category] = open(os.path.join(outputNAPairwiseInteractions,pdbid + "_" + category + ".txt"),'w')
+
+    try:
+        for category, inter, a, b, c in output_rows(interaction_to_list_of_tuples,categories,category_to_interactions):
+            files[category].write("%s\t%s\t%s\t%s\n" % (a,inter,b,c))
+    finally:
+        for f in files.values():
+            f.close()
+
+def write_ensemble_output_file(outputNAPairwiseInteractions,pdbid,interaction_frequencies_across_models,number_of_models,categories,category_to_interactions):
+    """
+    Write the interactions of the requested categories with the number and
+    fraction of models in which each is found.  Unit ids are those of the
+    first model.
+    """
 
+    filename = os.path.join(outputNAPairwiseInteractions,pdbid + "_ensemble.txt")
+    with open(filename,'w') as f:
+        for category in categories:
+            if category == "near":
+                continue
             for interaction in sorted(category_to_interactions[category]):
                 if category == 'basepair':
-                    # capitalize base edges to simplify
                     inter = interaction.replace("w","W").replace("s","S").replace("h","H")
                 else:
                     inter = interaction
 
-                # if this category has a restricted list of interactions to output
                 if len(categories[category]) == 0 or inter in categories[category] or ("near" in categories and "n" in interaction and inter.replace('n','') in categories[category]):
-                    for a,b,c in interaction_to_list_of_tuples[interaction]:
-                        f.write("%s\t%s\t%s\t%s\n" % (a,inter,b,c))
+                    for a,b,count in interaction_frequencies_across_models.get(interaction,[]):
+                        f.write("%s\t%s\t%s\t%d\t%0.3f\n" % (a,inter,b,count,float(count)/number_of_models))
+
+def write_trajectory_output_files(outputNAPairwiseInteractions,pdbid,occupancy,categories,category_to_interactions):
+    """
+    Write the interactions of the requested categories with the number and
+    fraction of frames in which each is found to PDB_trajectory.txt, and
+    the frame by frame occupancy of each to PDB_trajectory.npz, as a list
+    of (unit id, interaction, unit id) and a boolean array with one row
+    for each of them and one column per frame.
+    """
+
+    counts = occupancy.counts()
+    number_of_frames = max(len(occupancy),1)
+    interaction_to_keys = defaultdict(list)
+    for k, (a,interaction,b) in enumerate(occupancy.keys):
+        interaction_to_keys[interaction].append(k)
+    keep = []
+
+    filename = os.path.join(outputNAPairwiseInteractions,pdbid + "_trajectory.txt")
+    with open(filename,'w') as f:
+        for category in categories:
+            if category == "near":
+                continue
+            for interaction in sorted(category_to_interactions[category]):
+                if category == 'basepair':
+                    inter = interaction.replace("w","W").replace("s","S").replace("h","H")
+                else:
+                    inter = interaction
+
+                if len(categories[category]) == 0 or inter in categories[category] or ("near" in categories and "n" in interaction and inter.replace('n','') in categories[category]):
+                    for k in interaction_to_keys[interaction]:
+                        a,found,b = occupancy.keys[k]
+                        keep.append(k)
+                        f.write("%s\t%s\t%s\t%d\t%0.3f\n" % (a,inter,b,counts[k],float(counts[k])/number_of_frames))
+
+    series = occupancy.series()
+    np.savez_compressed(os.path.join(outputNAPairwiseInteractions,pdbid + "_trajectory.npz"),
+        pairs=np.array(["%s\t%s\t%s" % occupancy.keys[k] for k in keep], dtype=str),
+        occupancy=series[keep])
 
 def write_ebi_json_output_file(outputNAPairwiseInteractions,pdbid,interaction_to_list_of_tuples,categories,category_to_interactions,chain,unit_id_to_sequence_position,modified):
     """
@@ -3139,7 +3348,32 @@ def write_ebi_json_output_file(outputNAPairwiseInteractions,pdbid,interaction_to
 
 
 #=======================================================================
-def generatePairwiseAnnotation(entry_id, chain_id, inputPath, outputNAPairwiseInteractions, category, output_format):
+def generatePairwiseAnnotation(entry_id, chain_id, inputPath, outputNAPairwiseInteractions, category, output_format, instrumentationPath="", memoryBudget=float('inf'), ensemble=False, trajectory="", incremental=False, annotationStore=""):
+    """
+    Annotate each file in entry_id and write the interactions.
+    When instrumentationPath is given, write the timings, memory use and
+    counters for each structure to PDB_instrumentation.json there, and a
+    trace of the whole run to FR3D_trace.json, which chrome://tracing and
+    Perfetto read.
+    Structures that would take the process over memoryBudget megabytes are
+    skipped and reported at the end instead of running out of memory.
+    With ensemble, structures with several models are annotated as one
+    ensemble and PDB_ensemble.txt gives how often each interaction occurs;
+    close pairs are screened once for all models, but each model is still
+    classified separately.
+    With trajectory, the file read is the topology and trajectory names a
+    file of coordinate frames (multi-model .pdb, .npy or .npz); each frame
+    is annotated and PDB_trajectory.txt and PDB_trajectory.npz give how
+    often and in which frames each interaction occurs.
+    With incremental, structures whose input file, classifier version,
+    classification tables and options are unchanged since the outputs
+    were written, as recorded in FR3D_manifest.json in the output
+    folder, are skipped, unless annotationStore is given and does not
+    yet hold them with this version and these categories.
+    When annotationStore names an SQLite file, the interactions written to
+    the .txt files are also stored there, indexed for queries by unit,
+    chain and interaction; see annotation_store.py.
+    """
 
     if isinstance(entry_id,str):
         entry_id = [entry_id]
@@ -3202,7 +3436,7 @@ def generatePairwiseAnnotation(entry_id, chain_id, inputPath, outputNAPairwiseIn
         chains = []
 
     # restrict dictionary of cutoffs to just the basepairs needed here
-    focused_basepair_cutoffs = focus_basepair_cutoffs(nt_nt_cutoffs,categories['basepair'])
+    focused_basepair_cutoffs = focus_basepair_cutoffs(load_nt_nt_cutoffs(),categories['basepair'])
     ideal_hydrogen_bonds = load_ideal_basepair_hydrogen_bonds()
 
     """
@@ -3211,6 +3445,18 @@ def generatePairwiseAnnotation(entry_id, chain_id, inputPath, outputNAPairwiseIn
             print(combination, LW, ideal_hydrogen_bonds[combination][LW])
     """
 
+    if incremental:
+        manifest = Manifest(os.path.join(outputNAPairwiseInteractions,MANIFEST_NAME))
+        tables = classification_tables()
+        if trajectory:
+            tables["trajectory"] = trajectory
+        options = "categories=%s format=%s chains=%s ensemble=%s trajectory=%s" % (",".join(sorted(categories)),output_format,",".join(chains),ensemble,trajectory)
+
+    if annotationStore:
+        store = AnnotationStore(annotationStore)
+        # the manifest does not know about the store, so check it separately
+        stored = set(store.structures(categories,fr3d_classification_version))
+
     for path, PDB in PDBs:
         counter += 1
 
@@ -3219,22 +3465,67 @@ def generatePairwiseAnnotation(entry_id, chain_id, inputPath, outputNAPairwiseIn
 
         filename = os.path.join(path,PDB)
 
+        if incremental:
+            update, reason = manifest.needs_update(pdbid,find_structure_file(filename),fr3d_classification_version,tables,options)
+            if not update and annotationStore and not trajectory and not pdbid in stored:
+                update, reason = True, "not in annotation store"
+            if not update:
+                manifest.skip(pdbid)
+                continue
+
         print("Reading file %s, which is number %d out of %d" % (filename, counter, len(PDBs)))
         timerData = myTimer("Reading CIF files",timerData)
+        before = recorder.snapshot()
 
         # suppress error messages, but report failures at the end
-        structure, messages = load_structure(filename,pdbid)
+        try:
+            check_memory_budget(memoryBudget, "reading %s" % filename, estimate_structure_memory(filename))
+            with span("load_structure", pdbid=pdbid):
+                structure, messages = load_structure(filename,pdbid)
+        except MemoryBudgetExceeded as e:
+            failed_structures.append((pdbid,str(e)))
+            continue
 
         if not structure:
             for message in messages:
                 failed_structures.append((pdbid,message))
             continue
 
-        interaction_to_list_of_tuples, category_to_interactions, timerData, pair_to_data = annotate_nt_nt_in_structure(structure,categories,focused_basepair_cutoffs,ideal_hydrogen_bonds,chains,timerData)
+        try:
+            check_memory_budget(memoryBudget, "annotating %s" % pdbid)
+            number_of_models = 0
+            if trajectory:
+                with span("annotate_nt_nt_in_trajectory", pdbid=pdbid):
+                    occupancy = InteractionOccupancy()
+                    category_to_interactions = defaultdict(set)
+                    frames = read_frames(trajectory)
+                    for frame_number, frame_tuples, frame_categories, timerData in annotate_nt_nt_in_trajectory(Trajectory(structure),frames,categories,focused_basepair_cutoffs,ideal_hydrogen_bonds,chains,timerData):
+                        occupancy.add(frame_tuples)
+                        for category, interactions in frame_categories.items():
+                            category_to_interactions[category] |= interactions
+                print("  Annotated %d frames from %s" % (len(occupancy),trajectory))
+            else:
+                if ensemble:
+                    number_of_models = len(set(r.model for r in structure.residues(type = ["RNA linking","DNA linking"])))
+                if number_of_models > 1:
+                    with span("annotate_nt_nt_in_ensemble", pdbid=pdbid):
+                        interaction_to_list_of_tuples, category_to_interactions, timerData, interaction_frequencies_across_models, number_of_models = annotate_nt_nt_in_ensemble(structure,categories,focused_basepair_cutoffs,ideal_hydrogen_bonds,chains,timerData)
+                else:
+                    with span("annotate_nt_nt_in_structure", pdbid=pdbid):
+                        interaction_to_list_of_tuples, category_to_interactions, timerData, pair_to_data = annotate_nt_nt_in_structure(structure,categories,focused_basepair_cutoffs,ideal_hydrogen_bonds,chains,timerData)
+        except MemoryBudgetExceeded as e:
+            failed_structures.append((pdbid,str(e)))
+            structure = None
+            continue
         timerData = myTimer("Recording interactions",timerData)
         print("  Recording interactions in %s" % outputNAPairwiseInteractions)
 
-        if output_format == 'txt':
+        if number_of_models > 1:
+            write_ensemble_output_file(outputNAPairwiseInteractions,pdbid,interaction_frequencies_across_models,number_of_models,categories,category_to_interactions)
+
+        if trajectory:
+            write_trajectory_output_files(outputNAPairwiseInteractions,pdbid,occupancy,categories,category_to_interactions)
+        elif output_format == 'txt':
             write_txt_output_file(outputNAPairwiseInteractions,pdbid,interaction_to_list_of_tuples,categories,category_to_interactions)
         elif output_format == 'ebi_json':
             if chains:
@@ -3266,7 +3557,31 @@ def generatePairwiseAnnotation(entry_id, chain_id, inputPath, outputNAPairwiseIn
         else:
             print('Output format %s not recognized' % output_format)
 
-    myTimer("summary",timerData)
+        if annotationStore and not trajectory:
+            store.write_annotation(pdbid,interaction_to_list_of_tuples,categories,category_to_interactions,fr3d_classification_version)
+
+        if instrumentationPath:
+            recorder.write_json(os.path.join(instrumentationPath,pdbid+"_instrumentation.json"),before,pdbid=pdbid)
+
+        if incremental:
+            outputs = annotation_output_files(outputNAPairwiseInteractions,pdbid,categories,output_format,number_of_models > 1,trajectory)
+            manifest.record(pdbid,find_structure_file(filename),fr3d_classification_version,tables,options,outputs,reason)
+            # save now and then, so that an interrupted run keeps most of what it finished
+            if len(manifest.updated) % 100 == 0:
+                manifest.save()
+
+    print(myTimer("summary",timerData))
+
+    if incremental:
+        manifest.save()
+        manifest.report()
+
+    if annotationStore:
+        store.close()
+
+    if instrumentationPath:
+        recorder.end_phase()
+        recorder.write_chrome_trace(os.path.join(instrumentationPath,"FR3D_trace.json"))
 
     if len(failed_structures) > 0:
         print("Error messages:")
@@ -3292,6 +3607,12 @@ if __name__=="__main__":
     parser.add_argument('-c', "--category", help='Interaction category or categories (basepair,stacking,sO,backbone,coplanar,basepair_detail,covalent,sugar_ribose,near)')
     parser.add_argument('-f', "--format", help='Output format (txt,ebi_json)')
     parser.add_argument("--chain", help='Chain or chains separated by commas, no spaces; only for one PDB file')
+    parser.add_argument("--instrumentation", help='Folder for per-structure timing JSON files and a Chrome trace file')
+    parser.add_argument("--memory_budget", type=float, default=float('inf'), help='Megabytes the run may use; larger structures are skipped')
+    parser.add_argument("--ensemble", action='store_true', help='Annotate multi-model structures as one ensemble and write how often each interaction occurs')
+    parser.add_argument("--incremental", action='store_true', help='Skip structures whose input file, classifier version and classification tables are unchanged since their output files were written')
+    parser.add_argument("--store", default="", help='SQLite file in which to also store the interactions of all structures, for queries by unit, chain and interaction')
+    parser.add_argument("--trajectory", default="", help='File of coordinate frames (multi-model .pdb, .npy or .npz) for the topology in the one PDB file given; annotate every frame and write how often each interaction occurs')
 
     problem = False
     args = parser.parse_args()
@@ -3326,5 +3647,10 @@ if __name__=="__main__":
 
     entry_id = args.PDBfiles
 
-    generatePairwiseAnnotation(entry_id, chain_id, inputPath, outputNAPairwiseInteractions, category, outputFormat)
+    if args.instrumentation:
+        instrumentationPath = args.instrumentation
+    else:
+        instrumentationPath = ""
+
+    generatePairwiseAnnotation(entry_id, chain_id, inputPath, outputNAPairwiseInteractions, category, outputFormat, instrumentationPath, args.memory_budget, args.ensemble, args.trajectory, args.incremental, args.store)
 
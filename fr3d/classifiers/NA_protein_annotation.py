@@ -6,6 +6,7 @@ Name: RNA-protein detection
 
 """Detect and plot RNA base- amino acid interactions."""
 from fr3d.cif.reader import Cif
+from fr3d.instrumentation import timer as myTimer
 from fr3d.definitions import RNAconnections
 from fr3d.definitions import NAbaseheavyatoms
 from fr3d.definitions import NAbasehydrogens
@@ -23,6 +24,14 @@ from fr3d.definitions import planar_atoms
 from fr3d.definitions import HB_donors
 from fr3d.definitions import HB_weak_donors
 from fr3d.definitions import HB_acceptors
+from fr3d.classifiers.atom_contacts import AtomTable
+from fr3d.classifiers.atom_contacts import build_atom_to_unit_part_list
+from fr3d.classifiers.atom_contacts import contact_lines
+from fr3d.classifiers.atom_contacts import find_contacts
+from fr3d.classifiers.atom_contacts import interacting_atoms_by_residue_pair
+from fr3d.classifiers.standard_frame import StandardResidue
+from fr3d.classifiers.standard_frame import residue_arrays
+from fr3d.classifiers.standard_frame import to_base_frame
 
 from discrepancy import matrix_discrepancy
 import numpy as np
@@ -33,7 +42,6 @@ if sys.version_info[0] < 3:
 else:
     import urllib.request
 import pickle
-import math
 
 import matplotlib.pyplot as plt
 from collections import defaultdict
@@ -360,32 +368,6 @@ distance_limit_coulombic['ARG']['NH2'] = distance_for_atom_type_coulombic['NH2+'
 
 distance_limit_coulombic['TRP']['NE1'] = distance_for_atom_type_coulombic['NH']
 
-def myTimer(state,data={}):
-
-    # add elapsed time to the current state of the timer
-    if "currentState" in data:
-        currentState = data["currentState"]
-        data[currentState] += time() - data["lastTime"]
-
-    if state == "summary":
-        print("Summary of time taken:")
-        for state in data["allStates"]:
-            if not state == "lastTime" and not state == "currentState":
-                print("%-31s: %10.3f seconds %10.3f minutes" % (state,data[state],data[state]/60))
-    elif not state in data:
-        data[state] = 0
-        # keep track of states and the order in which they were seen
-        if "allStates" in data:
-            data["allStates"].append(state)
-        else:
-            data["allStates"] = [state]
-
-    # change to the state just starting now
-    data["currentState"] = state
-    data["lastTime"] = time()
-
-    return data
-
 def get_structure(filename):
 
     if ".pdb" in filename:
@@ -425,104 +407,18 @@ def get_structure(filename):
 
         return structure
 
-def build_atom_to_unit_part_list():
-
-    atom_to_part_list = defaultdict(lambda: "unknown")
-
-    for base in NAbaseheavyatoms.keys():
-        for atom in NAbaseheavyatoms[base]:
-            atom_to_part_list[(base,atom)] = "base"
-        for atom in NAbasehydrogens[base]:
-            atom_to_part_list[(base,atom)] = "base"
-        for atom in nt_phosphate[base]:
-            atom_to_part_list[(base,atom)] = "nt_phosphate"
-        for atom in nt_sugar[base]:
-            atom_to_part_list[(base,atom)] = "nt_sugar"
-
-    for aa in aa_backbone.keys():
-        for atom in aa_backbone[aa]:
-            atom_to_part_list[(aa,atom)] = "aa_backbone"
-        for atom in aa_linker[aa]:
-            atom_to_part_list[(aa,atom)] = "aa_linker"
-        for atom in aa_fg[aa]:
-            atom_to_part_list[(aa,atom)] = "aa_fg"
-
-#    print(atom_to_part_list)
-
-    return atom_to_part_list
-
-
 def find_atom_atom_contacts(bases,amino_acids,atom_atom_min_distance):
     """Find all atoms within atom_atom_min_distance of each other,
-    one from a nt, one from an aa, and report these"""
-    # build a set of cubes and record which bases are in which cube
-    # also record which other cubes are neighbors of each cube
-
-    atom_atom_min_distance_squared = atom_atom_min_distance**2
-    contact_list = []
+    one from a nt, one from an aa, in the same model.
+    Returns the two atom tables and arrays of atom indices and distances;
+    use contact_lines to format them for output."""
 
     atom_to_part_list = build_atom_to_unit_part_list()
+    nt_atoms = AtomTable(bases, atom_to_part_list=atom_to_part_list)
+    aa_atoms = AtomTable(amino_acids, atom_to_part_list=atom_to_part_list)
+    nt_index, aa_index, distances = find_contacts(nt_atoms, aa_atoms, atom_atom_min_distance)
 
-    # build a set of cubes and record which nt atoms are in which cube
-    ntAtomCubeList = {}
-    ntAtomCubeNeighbors = {}
-    for base in bases:
-        for atom in base.atoms():
-            center = atom.coordinates()
-            if len(center) == 3:
-                x = floor(center[0]/atom_atom_min_distance)
-                y = floor(center[1]/atom_atom_min_distance)
-                z = floor(center[2]/atom_atom_min_distance)
-                model = base.model
-                key = "%d,%d,%d,%s" % (x,y,z,model)
-                entry = (center[0],center[1],center[2],atom.name,base.unit_id(),atom_to_part_list[(base.sequence,atom.name)])
-                if key in ntAtomCubeList:
-                    ntAtomCubeList[key].append(entry)
-                else:
-                    ntAtomCubeList[key] = [entry]
-                    ntAtomCubeNeighbors[key] = []
-                    for a in [-1,0,1]:
-                        for b in [-1,0,1]:
-                            for c in [-1,0,1]:
-                                k = "%d,%d,%d,%s" % (x+a,y+b,z+c,model)
-                                ntAtomCubeNeighbors[key].append(k)
-
-    # build a set of cubes and record which amino acids are in which cube
-    aaAtomCubeList = {}
-    for aa in amino_acids:
-        for atom in aa.atoms():
-            center = atom.coordinates()
-            if len(center) == 3:
-                x = floor(center[0]/atom_atom_min_distance)
-                y = floor(center[1]/atom_atom_min_distance)
-                z = floor(center[2]/atom_atom_min_distance)
-                key = "%d,%d,%d" % (x,y,z)
-                entry = (center[0],center[1],center[2],atom.name,aa.unit_id(),atom_to_part_list[(aa.sequence,atom.name)])
-                if key in aaAtomCubeList:
-                    aaAtomCubeList[key].append(entry)
-                else:
-                    aaAtomCubeList[key] = [entry]
-
-    # loop over nt atoms and aa atoms and find those within atom_atom_min_distance
-    for key in ntAtomCubeList:                           # one nt atom cube
-        for aakey in ntAtomCubeNeighbors[key]:           # neighboring cube
-            if aakey in aaAtomCubeList:                  # if an aa atom lies in the neighbor cube
-                for ntAtom in ntAtomCubeList[key]:       # loop over nt atoms in first cube
-                    for aaAtom in aaAtomCubeList[aakey]: # and over aa atoms in neighbor cube
-                        x = abs(ntAtom[0] - aaAtom[0])   # coordinates are stored in 0, 1, 2 of entry
-                        y = abs(ntAtom[1] - aaAtom[1])   # coordinates are stored in 0, 1, 2 of entry
-                        z = abs(ntAtom[2] - aaAtom[2])   # coordinates are stored in 0, 1, 2 of entry
-
-                        if x > atom_atom_min_distance or \
-                           y > atom_atom_min_distance or \
-                           x*x + y*y + z*z > atom_atom_min_distance_squared:
-                            continue
-
-                        distance = math.sqrt(x*x + y*y + z*z)
-
-                        contact_list.append("%s\t%s\t%s\t%s\t%s\t%s\t%8.4f\n" % (ntAtom[4],ntAtom[5],ntAtom[3],aaAtom[4],aaAtom[5],aaAtom[3],distance))
-
-    return contact_list
+    return nt_atoms, aa_atoms, nt_index, aa_index, distances
 
 def find_neighbors(bases, amino_acids, screen_distance_cutoff, IFE, nt_reference="C1'", aa_reference="aa_fg"):
     """Finds all amino acids for which center of "aa_part" is within
@@ -573,64 +469,6 @@ def find_neighbors(bases, amino_acids, screen_distance_cutoff, IFE, nt_reference
 
     return baseCubeList, baseCubeNeighbors, aaCubeList
 
-# produce a list of interacting atoms marked by their group
-def get_interacting_atoms(nt_residue,aa_residue):
-
-    interacting_atoms = defaultdict(list)
-
-    atom_atom_min_distance_squared = atom_atom_min_distance**2
-    nt_parts = ['base','nt_sugar','nt_phosphate']
-    aa_parts = ['aa_fg','aa_backbone','aa_linker']
-    nt_parts = ['base']
-    aa_parts = ['aa_fg']
-    nt_atoms = []
-    aa_atoms = []
-
-    for nt_part in nt_parts:
-        if nt_part == "base" and nt_residue.sequence in NAbaseheavyatoms:
-            # important: start with an empty list and add this list,
-            # rather than making nt_atoms equal to NAbaseheavyatoms[...]
-            # and then appending, because that will append to the list
-            # in the dictionary, with unpredictable results.
-            nt_atoms += NAbaseheavyatoms[nt_residue.sequence]
-            if nt_residue.sequence in NAbasehydrogens:
-                nt_atoms += NAbasehydrogens[nt_residue.sequence]
-        elif nt_part == "nt_sugar" and nt_residue.sequence in nt_sugar:
-            nt_atoms += nt_sugar[nt_residue.sequence]
-        elif nt_residue.sequence in nt_phosphate:
-            nt_atoms += nt_phosphate[nt_residue.sequence]
-        else:
-            continue
-
-        for aa_part in aa_parts:
-            if aa_part == "aa_fg" and aa_residue.sequence in aa_fg:
-                aa_atoms += aa_fg[aa_residue.sequence]
-            elif aa_part == "aa_backbone" and aa_residue.sequence in aa_backbone:
-                aa_atoms += aa_backbone[aa_residue.sequence]
-            elif aa_residue.sequence in aa_linker:
-                aa_atoms += aa_linker[aa_residue.sequence]
-            else:
-                continue
-
-            for nt_atom in nt_residue.atoms(name=nt_atoms):
-                nt = nt_atom.coordinates()
-                for aa_atom in aa_residue.atoms(name=aa_atoms):
-                    aa = aa_atom.coordinates()
-                    x = abs(nt[0]-aa[0])
-                    y = abs(nt[1]-aa[1])
-                    z = abs(nt[2]-aa[2])
-
-                    if x <= atom_atom_min_distance and \
-                       y <= atom_atom_min_distance and \
-                       x**2 + y**2 + z**2 <= atom_atom_min_distance_squared:
-                        distance = math.sqrt(x**2 + y**2 + z**2)
-                        interacting_atoms[(nt_part,aa_part)].append((nt_atom,aa_atom,distance))
-
-#    if len(interacting_atoms) > 0:
-#        print(interacting_atoms)
-
-    return interacting_atoms
-
 def annotate_interactions(bases, amino_acids, screen_distance_cutoff, baseCubeList, baseCubeNeighbors, aaCubeList):
 
     # loop through base cubes, loop through neighboring amino acid cubes,
@@ -652,6 +490,16 @@ def annotate_interactions(bases, amino_acids, screen_distance_cutoff, baseCubeLi
 
     max_screen_distance = 0
 
+    # coordinates of each base in its own standard frame, and atom arrays of amino acids
+    base_coordinates_cache = {}
+    aa_arrays_cache = {}
+
+    # find base - aa_fg atom contacts for all residue pairs at once
+    base_atoms = AtomTable(bases, parts=["base"])
+    aa_fg_atoms = AtomTable(amino_acids, parts=["aa_fg"])
+    contacts = find_contacts(base_atoms, aa_fg_atoms, atom_atom_min_distance)
+    interacting_atoms_by_pair = interacting_atoms_by_residue_pair(base_atoms, aa_fg_atoms, *contacts)
+
     for key in baseCubeList:
         for aakey in baseCubeNeighbors[key]:
             if aakey in aaCubeList:
@@ -673,7 +521,7 @@ def annotate_interactions(bases, amino_acids, screen_distance_cutoff, baseCubeLi
                             continue
 
                         screen_distance = np.linalg.norm(displacement)
-                        interacting_atoms = get_interacting_atoms(base_residue,aa_residue)
+                        interacting_atoms = interacting_atoms_by_pair.get((id(base_residue),id(aa_residue)),{})
 
                         if len(interacting_atoms) > 0:
                             if screen_distance > max_screen_distance:
@@ -711,31 +559,26 @@ def annotate_interactions(bases, amino_acids, screen_distance_cutoff, baseCubeLi
 
                             count_pair = count_pair + 1
 
-                            rotation_matrix = base_residue.rotation_matrix
-
-                            # note:  translate_rotate_component is in components.py and calls infer_hydrogens
-
-                            # rotate base atoms into standard orientation
-                            base_coordinates = {}
-                            standard_base = base_residue.translate_rotate_component(base_residue)
-
-                            for base_atom in standard_base.atoms():
-                                base_coordinates[base_atom.name] = base_atom.coordinates()
-                                # heavy atoms are close to ideal, hydrogens are almost exactly right
-                                # print("Standard orientation " + base_atom.name + " coordinates")
-                                # print(base_atom.coordinates())
+                            # rotate base atoms into standard orientation, once per base
+                            # heavy atoms are close to ideal, hydrogens are almost exactly right
+                            if not id(base_residue) in base_coordinates_cache:
+                                names, coordinates = residue_arrays(base_residue)
+                                base_coordinates_cache[id(base_residue)] = dict(zip(names, to_base_frame(base_residue, coordinates)))
+                            base_coordinates = base_coordinates_cache[id(base_residue)]
 
-                            # rotate amino acid atoms into standard orientation
-                            aa_coordinates = {}
-                            standard_aa = base_residue.translate_rotate_component(aa_residue)
-                            for aa_atom in standard_aa.atoms():
-                                aa_coordinates[aa_atom.name] = aa_atom.coordinates()
+                            # rotate amino acid atoms into standard orientation with one matrix product
+                            if not id(aa_residue) in aa_arrays_cache:
+                                aa_arrays_cache[id(aa_residue)] = residue_arrays(aa_residue)
+                            names, coordinates = aa_arrays_cache[id(aa_residue)]
+                            standard_aa = StandardResidue(aa_residue.sequence, names, to_base_frame(base_residue, coordinates))
+                            aa_coordinates = standard_aa.coordinates_by_name()
 
                             standard_aa_center = standard_aa.centers[aa_part]
 
                             # get a preliminary annotation of the interaction
-#                            (interaction,interaction_parameters) = type_of_interaction(base_residue, aa_residue, aa_coordinates, standard_aa_center, base_atoms)
-                            (interaction,interaction_parameters) = type_of_interaction(standard_base, standard_aa, aa_coordinates, standard_aa_center, base_atoms)
+                            # distances and angles between planes do not change when both residues
+                            # are moved together, so those are computed from the original residues
+                            (interaction,interaction_parameters) = type_of_interaction(base_residue, aa_residue, aa_coordinates, standard_aa_center, base_atoms)
 
                             base_aa = None
                             edge = None
@@ -2085,9 +1928,9 @@ if __name__=="__main__":
             print("  Wrote output to " + outputBaseAAFG % PDB)
 
             with open(contact_list_file % PDB, 'w') as clf:
-                clf.writelines(contact_list)
+                clf.writelines(contact_lines(*contact_list))
 
-            myTimer("summary",timerData)
+            print(myTimer("summary",timerData))
 
         print("Recorded %d pairwise interactions" % count_pair)
 
@@ -2099,4 +1942,4 @@ if __name__=="__main__":
             writeAATwoBaseHTML(allAATwoBaseDictionary,outputHTML,version,aa_part)
             writeInteractionsHTML(allInteractionDictionary,outputHTML,version,aa_part)
 
-    myTimer("summary",timerData)
+    print(myTimer("summary",timerData))
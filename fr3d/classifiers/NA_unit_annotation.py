@@ -31,6 +31,11 @@ from fr3d.definitions import planar_atoms
 from fr3d.definitions import HB_donors
 from fr3d.definitions import HB_weak_donors
 from fr3d.definitions import HB_acceptors
+from fr3d.geometry.torsions import chi_angles
+from fr3d.geometry.torsions import classify_chi
+from fr3d.geometry.torsions import nucleotide_torsions
+
+TORSION_NAMES = ["alpha","beta","gamma","delta","epsilon","zeta","chi","nu0","nu1","nu2","nu3","nu4","pseudorotation","amplitude"]
 
 # read input and output paths from localpath.py
 # note that fr3d.localpath does not synchronize with Git, so you can change it locally to point to your own directory structure
@@ -46,117 +51,41 @@ from NA_pairwise_interactions import get_parent
 from NA_pairwise_interactions import myTimer
 
 def annotate_bond_orientation(structure,pipeline=False):
+    """
+    Compute the chi angle of every nucleotide in the structure and classify
+    the glycosidic bond as anti, syn or int_syn.  The angles for all
+    nucleotides are computed at once by fr3d.geometry.torsions.
+    """
 
     bond_annotations = []
     error_message = []
 
-    nts = structure.residues(type = ["RNA linking","DNA linking"])  # load all RNA/DNA nucleotides
+    nts = list(structure.residues(type = ["RNA linking","DNA linking"]))  # load all RNA/DNA nucleotides
 
-    num_nts = 0
-    for nt in nts:
-        num_nts += 1
+    # chi angle definition:
+    # O4*_C1*_N1_C2 (for pyrimidines)
+    # O4*_C1*_N9_C4 (for purines):
+    # sign of chi_degree matches Bevilacqua 2011 paper on syn and anti
+    # this definition matches the IUPAC definition from http://www.chem.qmul.ac.uk/iupac/misc/pnuc2.html#230
+    chi, messages = chi_angles(nts)
 
-        chi = None
-        classification = ""
+    # Giving nomenclature according to chi values: anti (most common), or syn
+    classification = classify_chi(chi)
 
-        N1N9 = np.empty( shape=(0, 0) )
-        C2C4 = np.empty( shape=(0, 0) )
-        parent = np.empty( shape=(0, 0) )
-
-        if nt.sequence in ['A','G','DA','DG']:
-            N1N9 = nt.centers["N9"]
-            C2C4 = nt.centers["C4"]
-            parent = nt.sequence
-        elif nt.sequence in ['C','U','DC','DT']:
-            N1N9 = nt.centers["N1"]
-            C2C4 = nt.centers["C2"]
-            parent = nt.sequence
-        else:
-            parent = get_parent(nt.sequence)
-            if parent in ['A','G','DA','DG']:
-                if "N9" in parent_atom_to_modified[nt.sequence]:
-                    N1N9 = nt.centers[parent_atom_to_modified[nt.sequence]["N9"]]
-                else:
-                    print('No N9 atom correspondence in %s, parent is %s' % (nt.sequence,parent))
-                if "C4" in parent_atom_to_modified[nt.sequence]:
-                    C2C4 = nt.centers[parent_atom_to_modified[nt.sequence]["C4"]]
-                else:
-                    print('No C4 atom correspondence in %s, parent is %s' % (nt.sequence,parent))
-            elif parent in ['C','U','DC','DT']:
-                if "N1" in parent_atom_to_modified[nt.sequence]:
-                    N1N9 = nt.centers[parent_atom_to_modified[nt.sequence]["N1"]]
-                else:
-                    print('No N1 atom correspondence in %s, parent is %s' % (nt.sequence,parent))
-                if "C2" in parent_atom_to_modified[nt.sequence]:
-                    C2C4 = nt.centers[parent_atom_to_modified[nt.sequence]["C2"]]
-                else:
-                    print('No C2 atom correspondence in %s, parent is %s' % (nt.sequence,parent))
+    for i, message in messages:
+        if message == "no identified parent":
+            if pipeline:
+                error_message.append("%s has no identified parent" % nts[i].unit_id())
             else:
-                if pipeline:
-                    error_message.append("%s has no identified parent" % nt.unit_id())
-                else:
-                    print("%s has no identified parent" % nt.unit_id())
-
-                N1N9 = nt.centers["N9"]      # maybe this is present
-                if len(N1N9) == 3:
-                    C2C4 = nt.centers["C4"]
-                else:
-                    N1N9 = nt.centers["N1"]
-                    C2C4 = nt.centers["C2"]
-
-        if len(N1N9) == 3 and len(C2C4) == 3:
-            C1P = nt.centers["C1'"]
-            O4P = nt.centers["O4'"]
-
-            if len(C1P) == 3 and len(O4P) == 3:
-                O4P_C1P = C1P - O4P
-                N1N9_C1P  = C1P - N1N9
-                C2C4_N1N9 = N1N9 - C2C4
-
-                # chi angle definition:
-                # O4*_C1*_N1_C2 (for pyrimidines)
-                # O4*_C1*_N9_C4 (for purines):
-
-                perp_to_sugar       = np.cross(O4P_C1P,N1N9_C1P)
-                norm_perp_to_sugar  = np.linalg.norm(perp_to_sugar)
-                if norm_perp_to_sugar != 0:
-                    perp_to_sugar   = perp_to_sugar/norm_perp_to_sugar
-
-                perp_to_base        = np.cross(-N1N9_C1P,C2C4_N1N9)
-                norm_perp_to_base   = np.linalg.norm(perp_to_base)
-                perp_to_base        = perp_to_base/norm_perp_to_base
-
-                cross_cross_chi = np.cross(perp_to_base,perp_to_sugar)
-
-                # Take the dot product of the vectors perp_to_base &
-                # perp_to_sugar to get cos(chi).
-                # Take norm(cross product) to get sin(chi).
-
-                cos_chi = np.dot(perp_to_sugar,perp_to_base)
-                if np.dot(cross_cross_chi,N1N9_C1P) > 0:
-                    sin_chi = np.linalg.norm(cross_cross_chi)
-                else:
-                    sin_chi = -np.linalg.norm(cross_cross_chi)
-
-                # sign of chi_degree matches Bevilacqua 2011 paper on syn and anti
-                # this definition matches the IUPAC definition from http://www.chem.qmul.ac.uk/iupac/misc/pnuc2.html#230
-
-                chi  = 180*math.atan2(sin_chi,cos_chi)/math.pi # glycosidic bond angle
-
-                # Giving nomenclature according to chi values: anti (most common), or syn
-                if chi > -90 and chi < -45:
-                    classification = 'int_syn'
-                elif chi >= -45 and chi < 90:
-                    classification = 'syn'
-                else:
-                    classification = 'anti'
-
-    #            print("%-20s has chi = %13.8f and classification %s" % (nt.unit_id(),chi,classification))
-
-        if classification:
+                print("%s has no identified parent" % nts[i].unit_id())
+        else:
+            print(message)
+
+    for nt, angle, orientation in zip(nts, chi.tolist(), classification):
+        if orientation:
             bond_annotations.append({'unit_id'    : nt.unit_id(),
-                                    'orientation' : classification,
-                                    'chi_degree'  : ("%0.3f" % chi)})
+                                    'orientation' : orientation,
+                                    'chi_degree'  : ("%0.3f" % angle)})
 
         else:
             if pipeline:
@@ -170,6 +99,29 @@ def annotate_bond_orientation(structure,pipeline=False):
 
     return bond_annotations, error_message
 
+def annotate_torsions(structure):
+    """
+    Backbone torsions alpha to zeta, chi, sugar torsions and pseudorotation
+    of every nucleotide, as a list of dictionaries with the unit id and
+    each angle in degrees, None where an angle is not defined.
+    """
+
+    nts = list(structure.residues(type = ["RNA linking","DNA linking"]))
+    torsions, messages = nucleotide_torsions(nts)
+
+    torsion_annotations = []
+    columns = [(name, torsions[name].tolist()) for name in TORSION_NAMES]
+    for i, nt in enumerate(nts):
+        annotation = {'unit_id': nt.unit_id()}
+        for name, values in columns:
+            if math.isnan(values[i]):
+                annotation[name] = None
+            else:
+                annotation[name] = values[i]
+        torsion_annotations.append(annotation)
+
+    return torsion_annotations
+
 def write_txt_output_file(outputNAPairwiseInteractions,PDBid,bond_annotations,categories):
     """
     Write interactions according to category, and within each
@@ -189,6 +141,16 @@ def write_txt_output_file(outputNAPairwiseInteractions,PDBid,bond_annotations,ca
                         f.write("%s\t%s\t%s\n" % (d['unit_id'],d['orientation'],d['chi_degree']))
                     else:
                         f.write("%s\t%s\t%s\n" % (d['unit_id'],d['orientation'],d['chi_degree']))
+            elif category == 'torsion':
+                f.write("unit_id\t" + "\t".join(TORSION_NAMES) + "\n")
+                for d in bond_annotations:
+                    values = []
+                    for name in TORSION_NAMES:
+                        if d[name] is None:
+                            values.append("NA")
+                        else:
+                            values.append("%0.3f" % d[name])
+                    f.write(d['unit_id'] + "\t" + "\t".join(values) + "\n")
 
 #=======================================================================
 
@@ -256,9 +218,16 @@ def generateUnitAnnotation(entry_id, chain_id, inputPath, outputNAPairwiseIntera
 
             timerData = myTimer("Recording interactions",timerData)
             print("  Recording interactions in %s" % outputNAPairwiseInteractions)
-            write_txt_output_file(outputNAPairwiseInteractions,PDBid,bond_annotations,category)
+            write_txt_output_file(outputNAPairwiseInteractions,PDBid,bond_annotations,{'glycosidic':[]})
+
+        if 'torsion' in category:
+            timerData = myTimer("Annotating torsions",timerData)
+            torsion_annotations = annotate_torsions(structure)
+
+            timerData = myTimer("Recording interactions",timerData)
+            write_txt_output_file(outputNAPairwiseInteractions,PDBid,torsion_annotations,{'torsion':[]})
 
-    myTimer("summary",timerData)
+    print(myTimer("summary",timerData))
 
     if len(failed_structures) > 0:
         print("Not able to read these files: %s" % failed_structures)
@@ -273,7 +242,7 @@ if __name__=="__main__":
     parser.add_argument('PDBfiles', type=str, nargs='+', help='.cif filename(s)')
     parser.add_argument('-o', "--output", help="Output Location of Pairwise Interactions")
     parser.add_argument('-i', "--input", help='Input Path')
-    parser.add_argument('-c', "--category", help='Interaction category or categories (glycosidic)')
+    parser.add_argument('-c', "--category", help='Interaction category or categories (glycosidic,torsion)')
     parser.add_argument('-f', "--format", help='Output format (txt)')
     parser.add_argument("--chain", help='Chain or chains separated by commas, no spaces; only for one PDB file')
 
@@ -294,7 +263,7 @@ if __name__=="__main__":
     category = {}
 
     if args.category:
-        for categ in args.category[0].split(","):
+        for categ in args.category.split(","):
             category[categ] = []
     else:
         category['glycosidic'] = {}
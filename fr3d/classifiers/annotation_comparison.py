@@ -0,0 +1,321 @@
+"""
+Comparison of basepair annotations made by different programs, such as
+FR3D, Matlab FR3D, DSSR, RNAView and the PDB.
+
+All annotations share one UnitIds dictionary that numbers the unit ids and
+the annotations themselves, so that the pairs annotated by each program
+are stored as integer arrays in an AnnotationTable, with one key per
+ordered pair.  Comparing two programs is then a join of sorted key arrays
+rather than a lookup of every pair in a dictionary:
+
+    units = UnitIds()
+    fr3d = AnnotationTable(units, 'FR3D')
+    dssr = AnnotationTable(units, 'DSSR')
+    for pdb_id in pdb_ids:
+        dssr.add_interaction_to_pairs(load_dssr_basepairs(pdb_id))
+        ...
+    agree, total = agreement_matrix([fr3d, dssr])
+    counts = confusion_counts(fr3d, dssr)
+
+Annotations are compared without regard to case, since FR3D uses upper and
+lower case letters to tell which part of an edge is used, as in cWw.
+"""
+
+from collections import OrderedDict
+
+import numpy as np
+
+# keys of ordered pairs are first * KEY_BASE + second
+KEY_BASE = 2**32
+
+
+class Numbering(object):
+    """
+    Dictionary from strings to consecutive numbers, and back.
+    """
+
+    def __init__(self):
+        self.values = []
+        self._index = {}
+
+    def __len__(self):
+        return len(self.values)
+
+    def index(self, value):
+        number = self._index.get(value)
+        if number is None:
+            number = len(self.values)
+            self._index[value] = number
+            self.values.append(value)
+        return number
+
+    def indices(self, values):
+        return np.array([self.index(value) for value in values], dtype=np.int64)
+
+    def lookup(self, codes):
+        """
+        Strings for an array of numbers, '' for -1.
+        """
+
+        strings = np.array(self.values + [''], dtype=object)
+        return strings[np.where(codes < 0, len(self.values), codes)]
+
+
+class UnitIds(Numbering):
+    """
+    Numbers of the unit ids and of the annotations, shared by all
+    annotation tables being compared.
+    """
+
+    def __init__(self):
+        Numbering.__init__(self)
+        self.annotations = Numbering()
+
+    @property
+    def unit_ids(self):
+        return self.values
+
+    def field(self, position):
+        """
+        Field at position of every unit id, such as 3 for the sequence,
+        in order of unit numbers, '' when there is none.
+        """
+
+        values = []
+        for unit_id in self.values:
+            fields = unit_id.split("|")
+            values.append(fields[position] if len(fields) > position else '')
+        return values
+
+    def annotation_codes(self, convert):
+        """
+        For each annotation number, the number of convert(annotation),
+        with -1 mapped to -1 at the end of the array.
+        """
+
+        codes = [self.annotations.index(convert(value)) for value in list(self.annotations.values)]
+        return np.array(codes + [-1], dtype=np.int64)
+
+
+class AnnotationTable(object):
+    """
+    Pairs of units annotated by one program and the number of the
+    annotation of each.  Pairs are added in chunks; when a pair is added
+    twice, the later annotation is kept, as when assigning to a dictionary.
+    """
+
+    def __init__(self, units, name=''):
+        self.units = units
+        self.name = name
+        self._chunks = []
+        self._arrays = None
+
+    def add(self, pairs, interactions):
+        pairs = list(pairs)
+        first = self.units.indices([pair[0] for pair in pairs])
+        second = self.units.indices([pair[1] for pair in pairs])
+        codes = self.units.annotations.indices(interactions)
+        self._chunks.append((first * KEY_BASE + second, codes))
+        self._arrays = None
+
+    def add_pair_to_interaction(self, pair_to_interaction):
+        """
+        Add a dictionary from (unit id, unit id) to annotation; empty
+        annotations are left out.
+        """
+
+        items = [(pair, interaction) for pair, interaction in pair_to_interaction.items() if interaction]
+        self.add([pair for pair, _ in items], [interaction for _, interaction in items])
+
+    def add_interaction_to_pairs(self, interaction_to_pairs, basepairs_only=True):
+        """
+        Add a dictionary from annotation to a list of (unit id, unit id)
+        or (unit id, unit id, crossing number) tuples, as the annotation
+        loaders return.  Only basepairs are kept unless basepairs_only is
+        False.
+        """
+
+        pairs = []
+        interactions = []
+        for interaction, tuples in interaction_to_pairs.items():
+            if basepairs_only and not ("c" in interaction or "t" in interaction):
+                continue
+            pairs.extend(tuples)
+            interactions.extend([interaction] * len(tuples))
+        self.add(pairs, interactions)
+
+    def arrays(self):
+        """
+        Sorted pair keys and the annotation number of each pair.
+        """
+
+        if self._arrays is None:
+            keys = np.concatenate([keys for keys, _ in self._chunks] + [np.zeros(0, dtype=np.int64)])
+            codes = np.concatenate([codes for _, codes in self._chunks] + [np.zeros(0, dtype=np.int64)])
+
+            # keep the last occurrence of each key
+            unique_keys, position = np.unique(keys[::-1], return_index=True)
+            self._arrays = (unique_keys, codes[::-1][position])
+            self._chunks = [self._arrays]
+        return self._arrays
+
+    def __len__(self):
+        return len(self.arrays()[0])
+
+    def codes(self, keys):
+        """
+        Annotation number of each of the sorted pair keys, -1 when the
+        pair is not annotated.
+        """
+
+        table_keys, codes = self.arrays()
+        result = np.full(len(keys), -1, dtype=np.int64)
+        if len(table_keys) == 0:
+            return result
+        position = np.minimum(np.searchsorted(table_keys, keys), len(table_keys) - 1)
+        found = table_keys[position] == keys
+        result[found] = codes[position[found]]
+        return result
+
+    def pairs(self, keys=None):
+        """
+        Lists of first and second unit ids for the pair keys, by default
+        all pairs of the table.
+        """
+
+        if keys is None:
+            keys = self.arrays()[0]
+        unit_ids = self.units.unit_ids
+        return [unit_ids[i] for i in (keys // KEY_BASE).tolist()], \
+            [unit_ids[i] for i in (keys % KEY_BASE).tolist()]
+
+
+def join(tables, keys=None):
+    """
+    Pair keys annotated by any of the tables, or the given keys, and the
+    annotation numbers of those pairs in each table, -1 where absent.
+    """
+
+    if keys is None:
+        keys = np.unique(np.concatenate([table.arrays()[0] for table in tables] + [np.zeros(0, dtype=np.int64)]))
+    return keys, [table.codes(keys) for table in tables]
+
+
+def lowercase(units, codes):
+    """
+    Annotation numbers of the lowercase annotations, -1 stays -1.
+    """
+
+    return units.annotation_codes(lambda value: value.lower())[codes]
+
+
+def agreement_matrix(tables):
+    """
+    For every two tables, the number of pairs on which they agree and the
+    number of pairs annotated by either one.
+    """
+
+    n = len(tables)
+    agree = np.zeros((n, n), dtype=np.int64)
+    total = np.zeros((n, n), dtype=np.int64)
+    if n == 0:
+        return agree, total
+    units = tables[0].units
+    lowered = [lowercase(units, codes) for codes in join(tables)[1]]
+    for i in range(n):
+        for j in range(n):
+            total[i, j] = np.sum((lowered[i] >= 0) | (lowered[j] >= 0))
+            agree[i, j] = np.sum((lowered[i] == lowered[j]) & (lowered[j] >= 0))
+    return agree, total
+
+
+def confusion_counts(table1, table2):
+    """
+    Number of pairs with each combination of lowercase annotations in the
+    two tables, '' for pairs that a table does not annotate, as a
+    dictionary from (annotation 1, annotation 2) to count.
+    """
+
+    units = table1.units
+    keys, (codes1, codes2) = join([table1, table2])
+    lower1 = lowercase(units, codes1)
+    lower2 = lowercase(units, codes2)
+    # shift by one so that -1 for a missing annotation becomes 0
+    size = len(units.annotations) + 1
+    combined, counts = np.unique((lower1 + 1) * size + (lower2 + 1), return_counts=True)
+    first = units.annotations.lookup(combined // size - 1)
+    second = units.annotations.lookup(combined % size - 1)
+    return OrderedDict(((a, b), count) for a, b, count in zip(first.tolist(), second.tolist(), counts.tolist()))
+
+
+def match_counts(units, codes1, codes2):
+    """
+    1 where the annotations agree, 0.6 where the second is part of the
+    first, as for near pairs, and 0 otherwise.
+    """
+
+    lower1 = lowercase(units, codes1)
+    lower2 = lowercase(units, codes2)
+
+    # whether each lowercase annotation contains each other one
+    values = [value.lower() for value in units.annotations.values]
+    contains = np.zeros((len(values) + 1, len(values) + 1), dtype=bool)
+    for a, value1 in enumerate(values):
+        for b, value2 in enumerate(values):
+            contains[a, b] = value2 in value1
+
+    present = lower2 >= 0
+    count = np.zeros(len(codes1))
+    equal = present & (lower1 == lower2)
+    count[equal] = 1
+    count[present & ~equal & contains[lower1, lower2]] = 0.6
+    return count
+
+
+def disagreements(table1, table2, keys=None):
+    """
+    Pairs on which the tables do not fully agree, among keys, by default
+    all pairs annotated by either table.  Returns a list of (unit id 1,
+    unit id 2, annotation 1, annotation 2, match count).
+    """
+
+    units = table1.units
+    keys, (codes1, codes2) = join([table1, table2], keys)
+    count = match_counts(units, codes1, codes2)
+    rows = np.nonzero(count < 1)[0]
+    first, second = table1.pairs(keys[rows])
+    ann1 = units.annotations.lookup(codes1[rows]).tolist()
+    ann2 = units.annotations.lookup(codes2[rows]).tolist()
+    return list(zip(first, second, ann1, ann2, count[rows].tolist()))
+
+
+def compared_keys(table):
+    """
+    Pairs annotated by the table that compare_annotations reports on,
+    leaving out pairs listed in the other order for asymmetric families and
+    pairs of the same base listed twice for symmetric families.
+    """
+
+    units = table.units
+    keys, codes = table.arrays()
+    pair_type = units.annotation_codes(lambda value: value.replace("n", ""))[codes]
+    pair_types = lambda names: units.annotations.indices(names)
+    keep = ~np.isin(pair_type, pair_types(['cHW', 'tHW', 'cSH', 'tSH', 'cSW', 'tSW']))
+
+    first = keys // KEY_BASE
+    second = keys % KEY_BASE
+    sequence = Numbering()
+    sequence_code = sequence.indices(units.field(3))
+    n = len(sequence)
+    base_combination = sequence.indices([a + b for a in sequence.values[:n] for b in sequence.values[:n]])
+    base_combination = base_combination.reshape(n, n)[sequence_code[first], sequence_code[second]]
+
+    symmetric = np.isin(pair_type, pair_types(['cWW', 'tWW', 'cSS', 'tSS', 'cHH', 'tHH', '0  ']))
+    keep &= ~(symmetric & np.isin(base_combination, sequence.indices(['UA', 'CG', 'UG', 'GA', 'CA', 'UC'])))
+
+    same_base = symmetric & np.isin(base_combination, sequence.indices(['AA', 'CC', 'GG', 'UU']))
+    if np.any(same_base):
+        number = np.array([int(value) if value else 0 for value in units.field(4)], dtype=np.int64)
+        keep[same_base & (number[first] >= number[second])] = False
+
+    return keys[keep]
@@ -0,0 +1,262 @@
+"""
+SQLite store of pairwise annotations, for queries across many structures.
+
+generatePairwiseAnnotation can write the interactions of every structure it
+annotates into one database file, next to or instead of the per-structure
+text files.  Units are stored once, with their PDB id, model, chain,
+sequence, number and the standard parent of modified nucleotides, and each
+interaction refers to two units.  The tables are indexed by PDB id, chain,
+unit, interaction family and crossing number, so that questions such as
+"all tSH pairs involving a modified G" are answered without reading the
+annotation of every structure:
+
+    store = AnnotationStore("annotations.sqlite")
+    rows = store.query(family="tSH", parent="G", modified=True)
+
+The database uses write-ahead logging, so that readers do not block the
+writer or each other.  The interactions of a structure are replaced in a
+single transaction, and readers see either the old or the new annotation.
+"""
+
+import os
+import sqlite3
+
+from fr3d.data.mapping import modified_base_to_parent
+
+STANDARD_BASES = ['A', 'C', 'G', 'U', 'DA', 'DC', 'DG', 'DT']
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS units (
+    id INTEGER PRIMARY KEY,
+    unit_id TEXT UNIQUE NOT NULL,
+    pdb TEXT,
+    model TEXT,
+    chain TEXT,
+    sequence TEXT,
+    number INTEGER,
+    parent TEXT,
+    modified INTEGER
+);
+CREATE TABLE IF NOT EXISTS interactions (
+    pdb TEXT NOT NULL,
+    category TEXT,
+    interaction TEXT,
+    family TEXT,
+    unit1 INTEGER REFERENCES units(id),
+    unit2 INTEGER REFERENCES units(id),
+    crossing INTEGER
+);
+CREATE TABLE IF NOT EXISTS structures (
+    pdb TEXT PRIMARY KEY,
+    categories TEXT,
+    version TEXT
+);
+CREATE INDEX IF NOT EXISTS units_pdb_chain ON units(pdb, chain);
+CREATE INDEX IF NOT EXISTS units_parent ON units(parent, modified);
+CREATE INDEX IF NOT EXISTS units_sequence ON units(sequence);
+CREATE INDEX IF NOT EXISTS interactions_pdb ON interactions(pdb);
+CREATE INDEX IF NOT EXISTS interactions_family ON interactions(family, crossing);
+CREATE INDEX IF NOT EXISTS interactions_unit1 ON interactions(unit1);
+CREATE INDEX IF NOT EXISTS interactions_unit2 ON interactions(unit2);
+CREATE INDEX IF NOT EXISTS interactions_crossing ON interactions(crossing);
+"""
+
+
+def output_rows(interaction_to_list_of_tuples, categories, category_to_interactions):
+    """
+    (category, interaction, unit id 1, unit id 2, crossing number) for the
+    interactions that are written out for each requested category, with
+    the edges of basepairs capitalized, as in the .txt output files.
+    """
+
+    for category in categories:
+        if category == "near":
+            continue
+        for interaction in sorted(category_to_interactions[category]):
+            if category == 'basepair':
+                # capitalize base edges to simplify
+                inter = interaction.replace("w","W").replace("s","S").replace("h","H")
+            else:
+                inter = interaction
+
+            # if this category has a restricted list of interactions to output
+            if len(categories[category]) == 0 or inter in categories[category] or ("near" in categories and "n" in interaction and inter.replace('n','') in categories[category]):
+                for a, b, c in interaction_to_list_of_tuples[interaction]:
+                    yield category, inter, a, b, c
+
+
+def interaction_family(interaction):
+    """
+    Family of an interaction without the n of near interactions, as in
+    tSH for ntSH.
+    """
+
+    if interaction.startswith('n') and len(interaction) > 1:
+        return interaction[1:]
+    return interaction
+
+
+def unit_fields(unit_id):
+    """
+    pdb, model, chain, sequence, number, parent and whether the unit is a
+    modified nucleotide, from a unit id.
+    """
+
+    fields = unit_id.split("|") + [''] * 5
+    sequence = fields[3]
+    try:
+        number = int(fields[4])
+    except ValueError:
+        number = None
+    if sequence in STANDARD_BASES:
+        parent, modified = sequence, 0
+    elif sequence in modified_base_to_parent:
+        parent, modified = modified_base_to_parent[sequence], 1
+    else:
+        parent, modified = '', 0
+    return fields[0], fields[1], fields[2], sequence, number, parent, modified
+
+
+class AnnotationStore(object):
+    """
+    Annotations of many structures in one SQLite database file.
+    """
+
+    def __init__(self, filename, timeout=60):
+        self.filename = filename
+        directory = os.path.dirname(os.path.abspath(filename))
+        if not os.path.exists(directory):
+            os.makedirs(directory)
+        self.connection = sqlite3.connect(filename, timeout=timeout)
+        self.connection.execute("PRAGMA journal_mode=WAL")
+        self.connection.execute("PRAGMA synchronous=NORMAL")
+        self.connection.executescript(SCHEMA)
+
+    def close(self):
+        self.connection.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *args):
+        self.close()
+
+    def unit_numbers(self, unit_ids):
+        """
+        Numbers of the unit ids in the units table, adding new ones.
+        Must be called inside a transaction.
+        """
+
+        cursor = self.connection.cursor()
+        unique = list(set(unit_ids))
+        cursor.executemany("INSERT OR IGNORE INTO units (unit_id, pdb, model, chain, sequence, number, parent, modified) VALUES (?,?,?,?,?,?,?,?)",
+                           [(u,) + unit_fields(u) for u in unique])
+        number_of = {}
+        # look up in chunks, within the limit on the number of parameters
+        for start in range(0, len(unique), 500):
+            chunk = unique[start:start+500]
+            query = "SELECT unit_id, id FROM units WHERE unit_id IN (%s)" % ",".join("?" * len(chunk))
+            for unit_id, number in cursor.execute(query, chunk):
+                number_of[unit_id] = number
+        return [number_of[u] for u in unit_ids]
+
+    def write(self, pdbid, rows, categories=(), version=""):
+        """
+        Replace the interactions of pdbid by rows of (category, interaction,
+        unit id 1, unit id 2, crossing number), as made by output_rows.
+        """
+
+        rows = list(rows)
+        with self.connection:
+            self.connection.execute("DELETE FROM interactions WHERE pdb = ?", (pdbid,))
+            numbers = self.unit_numbers([r[2] for r in rows] + [r[3] for r in rows])
+            n = len(rows)
+            self.connection.executemany(
+                "INSERT INTO interactions (pdb, category, interaction, family, unit1, unit2, crossing) VALUES (?,?,?,?,?,?,?)",
+                [(pdbid, category, interaction, interaction_family(interaction), numbers[i], numbers[n+i], crossing)
+                 for i, (category, interaction, a, b, crossing) in enumerate(rows)])
+            self.connection.execute("INSERT OR REPLACE INTO structures (pdb, categories, version) VALUES (?,?,?)",
+                                    (pdbid, ",".join(sorted(categories)), version))
+
+    def write_annotation(self, pdbid, interaction_to_list_of_tuples, categories, category_to_interactions, version=""):
+        """
+        Write the interactions of pdbid that the .txt output files would
+        list.
+        """
+
+        self.write(pdbid, output_rows(interaction_to_list_of_tuples, categories, category_to_interactions), categories, version)
+
+    def structures(self, categories=None, version=None):
+        """
+        PDB ids of the structures in the store, only those written with
+        the given categories and classifier version when these are given.
+        """
+
+        conditions = []
+        parameters = []
+        if categories is not None:
+            add_condition(conditions, parameters, "categories", ",".join(sorted(categories)))
+        add_condition(conditions, parameters, "version", version)
+        query = "SELECT pdb FROM structures"
+        if conditions:
+            query += " WHERE " + " AND ".join(conditions)
+        return [row[0] for row in self.connection.execute(query + " ORDER BY pdb", parameters)]
+
+    def query(self, interaction=None, family=None, category=None, pdb=None, chain=None,
+              unit=None, sequence=None, parent=None, modified=None,
+              min_crossing=None, max_crossing=None):
+        """
+        Interactions as (unit id 1, interaction, unit id 2, crossing number).
+        interaction, family, category and pdb can be a string or a list.
+        chain, unit, sequence, parent and modified select interactions in
+        which either unit matches all of them.
+        """
+
+        conditions = []
+        parameters = []
+        for column, value in [("i.interaction", interaction), ("i.family", family),
+                              ("i.category", category), ("i.pdb", pdb)]:
+            add_condition(conditions, parameters, column, value)
+        if min_crossing is not None:
+            conditions.append("i.crossing >= ?")
+            parameters.append(min_crossing)
+        if max_crossing is not None:
+            conditions.append("i.crossing <= ?")
+            parameters.append(max_crossing)
+
+        unit_conditions = []
+        unit_parameters = []
+        if modified is not None:
+            modified = int(bool(modified))
+        for column, value in [("unit_id", unit), ("chain", chain), ("sequence", sequence),
+                              ("parent", parent), ("modified", modified)]:
+            add_condition(unit_conditions, unit_parameters, column, value)
+        if unit_conditions:
+            # the pdb condition on units lets SQLite use the index on pdb and chain
+            add_condition(unit_conditions, unit_parameters, "pdb", pdb)
+            units = "SELECT id FROM units WHERE " + " AND ".join(unit_conditions)
+            conditions.append("(i.unit1 IN (%s) OR i.unit2 IN (%s))" % (units, units))
+            parameters.extend(unit_parameters + unit_parameters)
+
+        query = "SELECT u1.unit_id, i.interaction, u2.unit_id, i.crossing FROM interactions i " \
+                "JOIN units u1 ON u1.id = i.unit1 JOIN units u2 ON u2.id = i.unit2"
+        if conditions:
+            query += " WHERE " + " AND ".join(conditions)
+        query += " ORDER BY i.pdb, i.rowid"
+        return list(self.connection.execute(query, parameters))
+
+
+def add_condition(conditions, parameters, column, value):
+    """
+    Add column = value, or column IN values for a list, unless value is None.
+    """
+
+    if value is None:
+        return
+    if isinstance(value, (list, tuple, set)):
+        value = list(value)
+        conditions.append("%s IN (%s)" % (column, ",".join("?" * len(value))))
+        parameters.extend(value)
+    else:
+        conditions.append("%s = ?" % column)
+        parameters.append(value)
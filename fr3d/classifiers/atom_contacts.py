@@ -0,0 +1,217 @@
+"""
+Atom-atom contacts between nucleotides and amino acids, found with one
+KD-tree per molecule class instead of cubes keyed by strings.
+
+The atoms of a list of residues are gathered once into an AtomTable of
+numpy arrays: coordinates, the residue each atom belongs to, its model
+and the part of the residue it is in (base, nt_sugar, aa_fg, ...).
+find_contacts returns every nucleotide-amino acid atom pair within a
+distance as three arrays, and the summaries and text lines that used to
+be built inside the search loop are made from those arrays afterwards.
+
+    nt_atoms = AtomTable(bases)
+    aa_atoms = AtomTable(amino_acids)
+    nt_index, aa_index, distance = find_contacts(nt_atoms, aa_atoms, 4.5)
+    lines = contact_lines(nt_atoms, aa_atoms, nt_index, aa_index, distance)
+"""
+
+from collections import defaultdict
+
+import numpy as np
+
+from fr3d.definitions import NAbaseheavyatoms
+from fr3d.definitions import NAbasehydrogens
+from fr3d.definitions import nt_sugar
+from fr3d.definitions import nt_phosphate
+from fr3d.definitions import aa_fg
+from fr3d.definitions import aa_linker
+from fr3d.definitions import aa_backbone
+
+
+def build_atom_to_unit_part_list():
+    """
+    Dictionary from (sequence, atom name) to the part of the unit the atom
+    is in; "unknown" for atoms that are not listed.
+    """
+
+    atom_to_part_list = defaultdict(lambda: "unknown")
+
+    for base in NAbaseheavyatoms.keys():
+        for atom in NAbaseheavyatoms[base]:
+            atom_to_part_list[(base,atom)] = "base"
+        for atom in NAbasehydrogens[base]:
+            atom_to_part_list[(base,atom)] = "base"
+        for atom in nt_phosphate[base]:
+            atom_to_part_list[(base,atom)] = "nt_phosphate"
+        for atom in nt_sugar[base]:
+            atom_to_part_list[(base,atom)] = "nt_sugar"
+
+    for aa in aa_backbone.keys():
+        for atom in aa_backbone[aa]:
+            atom_to_part_list[(aa,atom)] = "aa_backbone"
+        for atom in aa_linker[aa]:
+            atom_to_part_list[(aa,atom)] = "aa_linker"
+        for atom in aa_fg[aa]:
+            atom_to_part_list[(aa,atom)] = "aa_fg"
+
+    return atom_to_part_list
+
+
+class AtomTable(object):
+    """
+    Atoms of a list of residues as parallel arrays.  Only atoms with three
+    coordinates are kept.  When parts is given, only atoms in those parts
+    of their residue are kept.
+    """
+
+    def __init__(self, residues, parts=None, atom_to_part_list=None):
+        if atom_to_part_list is None:
+            atom_to_part_list = build_atom_to_unit_part_list()
+
+        self.residues = []
+        self.atoms = []
+        self.part_names = []
+        part_code = {}
+        coordinates = []
+        residue_index = []
+        models = []
+        part_index = []
+
+        for residue in residues:
+            r = len(self.residues)
+            self.residues.append(residue)
+            for atom in residue.atoms():
+                part = atom_to_part_list[(residue.sequence,atom.name)]
+                if parts is not None and not part in parts:
+                    continue
+                center = atom.coordinates()
+                if len(center) != 3:
+                    continue
+                if not part in part_code:
+                    part_code[part] = len(self.part_names)
+                    self.part_names.append(part)
+                self.atoms.append(atom)
+                coordinates.append(center)
+                residue_index.append(r)
+                models.append(residue.model)
+                part_index.append(part_code[part])
+
+        self.coordinates = np.array(coordinates, dtype=float).reshape(-1, 3)
+        self.residue = np.array(residue_index, dtype=np.int64)
+        self.part = np.array(part_index, dtype=np.int64)
+
+        # models can be numbers or strings; compare them as integer codes
+        model_code = {}
+        self.model = np.array([model_code.setdefault(m, len(model_code)) for m in models], dtype=np.int64)
+        self.model_code = model_code
+
+        self._tree = None
+
+    def __len__(self):
+        return len(self.atoms)
+
+    def tree(self):
+        if self._tree is None:
+            from scipy.spatial import cKDTree
+            self._tree = cKDTree(self.coordinates)
+        return self._tree
+
+
+def find_contacts(nt_atoms, aa_atoms, distance):
+    """
+    All pairs of one atom from nt_atoms and one from aa_atoms, in the same
+    model, at most distance apart.  Returns atom indices into each table
+    and the distances, sorted by nucleotide atom and then amino acid atom.
+    """
+
+    if len(nt_atoms) == 0 or len(aa_atoms) == 0:
+        return np.zeros(0, dtype=np.int64), np.zeros(0, dtype=np.int64), np.zeros(0)
+
+    pairs = nt_atoms.tree().sparse_distance_matrix(aa_atoms.tree(), distance, output_type="ndarray")
+    nt_index = pairs["i"].astype(np.int64)
+    aa_index = pairs["j"].astype(np.int64)
+    distances = pairs["v"]
+
+    # keep pairs in the same model; the model codes of the two tables differ
+    aa_model_to_nt = np.full(len(aa_atoms.model_code), -1, dtype=np.int64)
+    for model, code in aa_atoms.model_code.items():
+        aa_model_to_nt[code] = nt_atoms.model_code.get(model, -2)
+    same_model = nt_atoms.model[nt_index] == aa_model_to_nt[aa_atoms.model[aa_index]]
+
+    nt_index = nt_index[same_model]
+    aa_index = aa_index[same_model]
+    distances = distances[same_model]
+
+    order = np.lexsort((aa_index, nt_index))
+    return nt_index[order], aa_index[order], distances[order]
+
+
+def residue_contacts(nt_atoms, aa_atoms, nt_index, aa_index, distances):
+    """
+    Group atom contacts by pair of residues.  Returns arrays of nucleotide
+    residue indices, amino acid residue indices, the number of atom
+    contacts and the smallest distance for each pair, and the start of
+    each pair's rows in the contact arrays after sorting by residue pair.
+    """
+
+    nt_residue = nt_atoms.residue[nt_index]
+    aa_residue = aa_atoms.residue[aa_index]
+    order = np.lexsort((aa_residue, nt_residue))
+
+    key = nt_residue[order] * (len(aa_atoms.residues) + 1) + aa_residue[order]
+    if len(key) == 0:
+        empty = np.zeros(0, dtype=np.int64)
+        return empty, empty, empty, np.zeros(0), order, empty
+
+    starts = np.concatenate(([0], np.nonzero(np.diff(key))[0] + 1))
+    counts = np.diff(np.append(starts, len(key)))
+    smallest = np.minimum.reduceat(distances[order], starts)
+
+    return nt_residue[order][starts], aa_residue[order][starts], counts, smallest, order, starts
+
+
+def interacting_atoms_by_residue_pair(nt_atoms, aa_atoms, nt_index, aa_index, distances):
+    """
+    Dictionary from (id(nucleotide), id(amino acid)) to a dictionary
+    from (nt part, aa part) to a list of (nt atom, aa atom, distance).  Components cannot be hashed,
+    so the keys are their ids.
+    """
+
+    nt_residue, aa_residue, counts, smallest, order, starts = residue_contacts(nt_atoms, aa_atoms, nt_index, aa_index, distances)
+    ends = np.append(starts[1:], len(order))
+
+    result = {}
+    for n, a, start, end in zip(nt_residue.tolist(), aa_residue.tolist(), starts.tolist(), ends.tolist()):
+        interacting_atoms = defaultdict(list)
+        for row in order[start:end].tolist():
+            i = nt_index[row]
+            j = aa_index[row]
+            parts = (nt_atoms.part_names[nt_atoms.part[i]], aa_atoms.part_names[aa_atoms.part[j]])
+            interacting_atoms[parts].append((nt_atoms.atoms[i], aa_atoms.atoms[j], float(distances[row])))
+        result[(id(nt_atoms.residues[n]), id(aa_atoms.residues[a]))] = interacting_atoms
+
+    return result
+
+
+def contact_lines(nt_atoms, aa_atoms, nt_index, aa_index, distances):
+    """
+    Tab-separated lines for the contact list file: nucleotide unit id,
+    part and atom, amino acid unit id, part and atom, and distance.
+    Unit ids are computed once per residue.
+    """
+
+    nt_unit_ids = {}
+    aa_unit_ids = {}
+    lines = []
+
+    for i, j, distance in zip(nt_index.tolist(), aa_index.tolist(), distances.tolist()):
+        n = nt_atoms.residue[i]
+        a = aa_atoms.residue[j]
+        if not n in nt_unit_ids:
+            nt_unit_ids[n] = nt_atoms.residues[n].unit_id()
+        if not a in aa_unit_ids:
+            aa_unit_ids[a] = aa_atoms.residues[a].unit_id()
+        lines.append("%s\t%s\t%s\t%s\t%s\t%s\t%8.4f\n" % (nt_unit_ids[n],nt_atoms.part_names[nt_atoms.part[i]],nt_atoms.atoms[i].name,
+                                                          aa_unit_ids[a],aa_atoms.part_names[aa_atoms.part[j]],aa_atoms.atoms[j].name,distance))
+
+    return lines
@@ -0,0 +1,411 @@
+"""
+Columnar store of the pair datapoints that annotate_nt_nt_in_structure
+returns as pair_to_data, for tuning the classification limits.
+
+Each pair is one row.  Numeric values of the datapoints, such as x, y, z,
+normal_Z, angle_in_plane and the gaps, become float columns with NaN where
+a pair has no value, text values such as basepair become string columns,
+and the hydrogen bonds of a pair are summarized in the columns
+hbond_count, hbond_max_badness, hbond_max_distance and hbond_min_angle.
+Since NaN in angle_in_plane cannot tell a missing angle from one that is
+NaN, which evaluate_pair_from_datapoint treats differently, the column
+has_angle_in_plane records which pairs have one.
+Unit ids, PDB id, chains and sequences of the two nucleotides are columns
+too, so that pairs can be selected by chain without splitting strings.
+
+Columns are saved with numpy in one .npz file, which can hold the pairs of
+a single PDB file or of a whole set of files:
+
+    columns = datapoints_to_columns(pair_to_data)
+    save_columns("all_pairs_v1.npz", concatenate_columns([columns, ...]))
+
+and a table of cutoffs like the one in class_limits_2023 is applied to all
+pairs at once:
+
+    columns = load_columns("all_pairs_v1.npz")
+    evaluation = evaluate_corpus(columns, nt_nt_cutoffs)
+"""
+
+from collections import OrderedDict
+
+import numpy as np
+
+IDENTITY_COLUMNS = ['unit_id1', 'unit_id2', 'pdb', 'chain1', 'chain2', 'sequence1', 'sequence2']
+
+HBOND_COLUMNS = ['hbond_count', 'hbond_max_badness', 'hbond_max_distance', 'hbond_min_angle']
+
+# 1 where a pair has an angle_in_plane, even NaN, and 0 where it has none
+ANGLE_PRESENT = 'has_angle_in_plane'
+
+# order in which evaluate_pair_from_datapoint lists the reasons for missing a category
+REASONS = ['xmin', 'xmax', 'ymin', 'ymax', 'radiusmax', 'zmin', 'zmax', 'nmin', 'nmax', 'angle', 'gap']
+
+# values that make_pretend_datapoint uses for missing data
+PRETEND_VALUES = {'x': 0.0, 'y': 0.0, 'z': 0.0, 'gap12': 0.0, 'gap21': 0.0, 'normal_Z': 0.0}
+
+
+def hbond_summary(hbonds):
+    """
+    Number of hydrogen bonds that could be checked, largest badness and
+    distance, and smallest angle, with the starting values that
+    evaluate_pair_from_datapoint uses when there are none.
+    """
+
+    count = 0
+    max_badness = -1.0
+    max_distance = -1.0
+    min_angle = 180.0
+    for hbond in hbonds:
+        if hbond["bond_checked"]:
+            count += 1
+            max_badness = max(max_badness, hbond["badness"])
+            max_distance = max(max_distance, hbond["distance"])
+            if not np.isnan(hbond["angle"]) and hbond["angle"] < min_angle:
+                min_angle = hbond["angle"]
+    return [count, max_badness, max_distance, min_angle]
+
+
+def datapoint_hbond_summary(datapoint):
+    """
+    hbond_summary of the hydrogen bonds of a datapoint, or the summary
+    it already carries when it was read back from columns.
+    """
+
+    if not 'hbond' in datapoint and 'hbond_max_badness' in datapoint:
+        return [datapoint.get('hbond_count', 0), datapoint['hbond_max_badness'],
+                datapoint.get('hbond_max_distance', -1.0), datapoint.get('hbond_min_angle', 180.0)]
+    return hbond_summary(datapoint.get('hbond', []))
+
+
+def is_number(value):
+    return isinstance(value, (int, float, np.integer, np.floating, np.bool_))
+
+
+def datapoints_to_columns(pair_to_data):
+    """
+    Dictionary from column name to array, with one row for each
+    (unit id, unit id) key of pair_to_data.  Values that are lists or
+    dictionaries, other than hbond, are not stored.
+    """
+
+    pairs = list(pair_to_data.keys())
+    columns = OrderedDict()
+
+    unit_ids1 = [pair[0] for pair in pairs]
+    unit_ids2 = [pair[1] for pair in pairs]
+    fields1 = [u.split("|") for u in unit_ids1]
+    fields2 = [u.split("|") for u in unit_ids2]
+    columns['unit_id1'] = np.array(unit_ids1, dtype=str)
+    columns['unit_id2'] = np.array(unit_ids2, dtype=str)
+    columns['pdb'] = np.array([f[0] for f in fields1], dtype=str)
+    columns['chain1'] = np.array(["|".join(f[0:3]) for f in fields1], dtype=str)
+    columns['chain2'] = np.array(["|".join(f[0:3]) for f in fields2], dtype=str)
+    columns['sequence1'] = np.array([f[3] if len(f) > 3 else '' for f in fields1], dtype=str)
+    columns['sequence2'] = np.array([f[3] if len(f) > 3 else '' for f in fields2], dtype=str)
+
+    hbonds = np.array([datapoint_hbond_summary(pair_to_data[pair]) for pair in pairs], dtype=float).reshape(len(pairs), 4)
+    for j, name in enumerate(HBOND_COLUMNS):
+        columns[name] = hbonds[:, j]
+    columns[ANGLE_PRESENT] = np.array([pair_to_data[pair].get('angle_in_plane') is not None for pair in pairs], dtype=float)
+
+    # the type of each column is set by the first value that is present
+    kinds = OrderedDict()
+    for pair in pairs:
+        for key, value in pair_to_data[pair].items():
+            if key in kinds or key in columns or value is None:
+                continue
+            if is_number(value):
+                kinds[key] = float
+            elif isinstance(value, str):
+                kinds[key] = str
+
+    for key, kind in kinds.items():
+        if kind is float:
+            values = np.full(len(pairs), np.nan)
+            for i, pair in enumerate(pairs):
+                value = pair_to_data[pair].get(key)
+                if is_number(value):
+                    values[i] = value
+        else:
+            values = [pair_to_data[pair].get(key) for pair in pairs]
+            values = np.array(['' if value is None else str(value) for value in values], dtype=str)
+        columns[key] = values
+
+    return columns
+
+
+def row_datapoints(columns, rows=None):
+    """
+    (unit id, unit id) and datapoint dictionary for each row, with the
+    values that are present, for code that works one pair at a time.
+    """
+
+    names = [name for name in columns.keys() if not name in IDENTITY_COLUMNS and name != ANGLE_PRESENT]
+    if rows is None:
+        rows = range(number_of_rows(columns))
+    lists = dict((name, columns[name].tolist()) for name in names + ['unit_id1', 'unit_id2'])
+    present = columns[ANGLE_PRESENT].tolist() if ANGLE_PRESENT in columns else None
+    for i in rows:
+        datapoint = {}
+        for name in names:
+            value = lists[name][i]
+            if isinstance(value, str):
+                if value:
+                    datapoint[name] = value
+            elif not np.isnan(value):
+                datapoint[name] = value
+        if present is not None and present[i] == 1 and not 'angle_in_plane' in datapoint:
+            datapoint['angle_in_plane'] = float('nan')
+        yield (lists['unit_id1'][i], lists['unit_id2'][i]), datapoint
+
+
+def read_datapoint_file(filename):
+    """
+    Columns from a .npz file written by save_columns, or from a pickled
+    pair_to_data dictionary.
+    """
+
+    if filename.endswith('.npz'):
+        return load_columns(filename)
+
+    import pickle
+    import sys
+    with open(filename, 'rb') as f:
+        if sys.version_info[0] < 3:
+            pair_to_data = pickle.load(f)
+        else:
+            pair_to_data = pickle.load(f, encoding='latin1')
+    return datapoints_to_columns(pair_to_data)
+
+
+def number_of_rows(columns):
+    for values in columns.values():
+        return len(values)
+    return 0
+
+
+def concatenate_columns(list_of_columns):
+    """
+    Stack the rows of several sets of columns, such as one per PDB file.
+    Columns missing from a set are filled with NaN or empty strings.
+    """
+
+    names = OrderedDict()
+    for columns in list_of_columns:
+        for name, values in columns.items():
+            if not name in names or names[name] is float and values.dtype.kind == 'U':
+                names[name] = str if values.dtype.kind == 'U' else float
+
+    combined = OrderedDict()
+    for name, kind in names.items():
+        parts = []
+        for columns in list_of_columns:
+            n = number_of_rows(columns)
+            if name in columns:
+                parts.append(columns[name].astype(str) if kind is str else columns[name].astype(float))
+            elif kind is str:
+                parts.append(np.full(n, '', dtype=str))
+            else:
+                parts.append(np.full(n, np.nan))
+        combined[name] = np.concatenate(parts) if parts else np.zeros(0)
+    return combined
+
+
+def select_rows(columns, rows):
+    """
+    Columns restricted to rows, a boolean mask or an array of indices.
+    """
+
+    return OrderedDict((name, values[rows]) for name, values in columns.items())
+
+
+def rows_in_chains(columns, chains):
+    """
+    Boolean mask of the pairs whose nucleotides are both in one of chains,
+    given as PDB|model|chain.
+    """
+
+    chains = np.array(sorted(chains), dtype=str)
+    return np.isin(columns['chain1'], chains) & np.isin(columns['chain2'], chains)
+
+
+def save_columns(filename, columns):
+    np.savez_compressed(filename, **columns)
+
+
+def load_columns(filename):
+    """
+    Columns saved by save_columns, in the order they were saved.
+    """
+
+    with np.load(filename, allow_pickle=False) as data:
+        return OrderedDict((name, data[name]) for name in data.files)
+
+
+def feature(columns, name, n):
+    """
+    Float column name, with the value make_pretend_datapoint uses where
+    it is missing.
+    """
+
+    if name in columns:
+        values = columns[name].astype(float)
+    else:
+        values = np.full(n, np.nan)
+    if name in PRETEND_VALUES:
+        values = np.where(np.isnan(values), PRETEND_VALUES[name], values)
+    return values
+
+
+def cutoff_distances(columns, cutoff):
+    """
+    How far each pair is from one subcategory of cutoffs, computed as
+    evaluate_pair_from_datapoint does, and a bit mask of the reasons
+    it misses the cutoffs, one bit for each entry of REASONS.
+    """
+
+    n = number_of_rows(columns)
+    x = feature(columns, 'x', n)
+    y = feature(columns, 'y', n)
+    z = feature(columns, 'z', n)
+    normal = feature(columns, 'normal_Z', n)
+    angle = feature(columns, 'angle_in_plane', n)
+    maxgap = np.maximum(feature(columns, 'gap12', n), feature(columns, 'gap21', n))
+
+    distance = np.zeros(n)
+    reasons = np.zeros(n, dtype=np.int64)
+
+    def miss(mask, amount, reason):
+        distance[mask] += amount[mask]
+        reasons[mask] |= 1 << REASONS.index(reason)
+
+    for name, values in [('x', x), ('y', y)]:
+        low = values < cutoff[name + 'min']
+        miss(low, cutoff[name + 'min'] - values, name + 'min')
+        miss(~low & (values > cutoff[name + 'max']), values - cutoff[name + 'max'], name + 'max')
+
+    if "radiusmax" in cutoff:
+        radius = np.sqrt(x**2 + y**2)
+        miss(radius > cutoff["radiusmax"], radius - cutoff["radiusmax"], 'radiusmax')
+
+    low = z < cutoff["zmin"]
+    miss(low, cutoff["zmin"] - z, 'zmin')
+    miss(~low & (z > cutoff["zmax"]), z - cutoff["zmax"], 'zmax')
+
+    # normals that point in different directions entirely
+    opposite = np.sign(normal) * np.sign(cutoff["normalmax"]) < 0
+    distance[opposite] += 100
+    low = ~opposite & (normal < cutoff["normalmin"])
+    miss(low, 3*(cutoff["normalmin"] - normal), 'nmin')
+    miss(~opposite & ~low & (normal > cutoff["normalmax"]), 3*(normal - cutoff["normalmax"]), 'nmax')
+
+    # an angle that is present but NaN meets any angle range, as in evaluate_pair_from_datapoint
+    missing = np.isnan(angle)
+    if ANGLE_PRESENT in columns:
+        present = columns[ANGLE_PRESENT].astype(float)
+        missing = np.where(np.isnan(present), missing, present == 0)
+    with np.errstate(invalid="ignore"):
+        if cutoff["anglemin"] < cutoff["anglemax"]:
+            miss(angle < cutoff["anglemin"], 0.05*(cutoff["anglemin"] - angle), 'angle')
+            miss(angle > cutoff["anglemax"], 0.05*(angle - cutoff["anglemax"]), 'angle')
+        else:
+            # min might be 260 and max might be -60, looking for angles above 260 or below -60
+            between = (angle < cutoff["anglemin"]) & (angle > cutoff["anglemax"])
+            miss(between, 0.05*np.minimum(cutoff["anglemin"] - angle, angle - cutoff["anglemax"]), 'angle')
+    miss(missing, np.ones(n), 'angle')
+
+    miss(maxgap > cutoff["gapmax"], 4*(maxgap - cutoff["gapmax"]), 'gap')
+
+    return distance, reasons
+
+
+def reason_text(mask):
+    return ",".join(reason for b, reason in enumerate(REASONS) if mask & (1 << b))
+
+
+def evaluate_cutoffs(columns, interaction, nt_nt_cutoffs_bc):
+    """
+    Best-matching category for every pair among the variations of
+    interaction in the cutoffs for one base combination, as found one
+    pair at a time by evaluate_pair_from_datapoint.  Returns a dictionary
+    of arrays best_interaction, best_subcategory, best_cutoff_distance,
+    reasons, disqualified_hbond and new_python_annotation, where reasons
+    is the bit mask of reason_text.
+    """
+
+    n = number_of_rows(columns)
+    best_distance = np.full(n, 9999.0)
+    best_interaction = np.full(n, '', dtype=object)
+    best_subcategory = np.full(n, -1, dtype=np.int64)
+    best_reasons = np.zeros(n, dtype=np.int64)
+
+    possible_interactions = [bp for bp in nt_nt_cutoffs_bc.keys() if interaction.lower() in bp.lower()]
+
+    for bp in possible_interactions:
+        for subcat in sorted(nt_nt_cutoffs_bc[bp].keys()):
+            distance, reasons = cutoff_distances(columns, nt_nt_cutoffs_bc[bp][subcat])
+            better = distance < best_distance
+            best_distance[better] = distance[better]
+            best_interaction[better] = bp
+            best_subcategory[better] = subcat
+            best_reasons[better] = reasons[better]
+
+    max_distance = columns['hbond_max_distance'] if 'hbond_max_distance' in columns else np.full(n, -1.0)
+    min_angle = columns['hbond_min_angle'] if 'hbond_min_angle' in columns else np.full(n, 180.0)
+    max_badness = columns['hbond_max_badness'] if 'hbond_max_badness' in columns else np.full(n, -1.0)
+    disqualified = (max_distance > 4) | (min_angle < 100) | (max_badness > 3)
+
+    # pairs within the cutoffs are annotated with the category, others with the reasons
+    annotation = best_interaction.copy()
+    missed = best_distance > 0
+    for mask in np.unique(best_reasons[missed]).tolist():
+        annotation[missed & (best_reasons == mask)] = reason_text(mask)
+    annotation[disqualified] = annotation[disqualified] + ',hbond'
+
+    return {'best_interaction': best_interaction,
+            'best_subcategory': best_subcategory,
+            'best_cutoff_distance': best_distance,
+            'reasons': best_reasons,
+            'disqualified_hbond': disqualified,
+            'new_python_annotation': annotation}
+
+
+def evaluate_corpus(columns, nt_nt_cutoffs, interactions=None):
+    """
+    Evaluate every pair against the cutoffs of its base combination for
+    the interaction in interactions, by default its basepair annotation
+    without the leading n of near pairs.  Pairs are evaluated in groups
+    with the same base combination and interaction; pairs with no
+    interaction or no cutoffs get an empty best_interaction and distance
+    9999.
+    """
+
+    n = number_of_rows(columns)
+    if interactions is None:
+        if 'basepair' in columns:
+            interactions = np.array([bp[1:] if bp.startswith('n') else bp for bp in columns['basepair'].tolist()], dtype=str)
+        else:
+            interactions = np.full(n, '', dtype=str)
+
+    combination = np.char.add(np.char.add(columns['sequence1'], ','), columns['sequence2'])
+
+    evaluation = {'best_interaction': np.full(n, '', dtype=object),
+                  'best_subcategory': np.full(n, -1, dtype=np.int64),
+                  'best_cutoff_distance': np.full(n, 9999.0),
+                  'reasons': np.zeros(n, dtype=np.int64),
+                  'disqualified_hbond': np.zeros(n, dtype=bool),
+                  'new_python_annotation': np.full(n, '', dtype=object)}
+
+    groups = OrderedDict()
+    for i, key in enumerate(zip(combination.tolist(), np.asarray(interactions).tolist())):
+        groups.setdefault(key, []).append(i)
+
+    for (base_combination, interaction), rows in groups.items():
+        if not interaction or interaction == 'N/A' or not base_combination in nt_nt_cutoffs:
+            continue
+        rows = np.array(rows, dtype=np.int64)
+        result = evaluate_cutoffs(select_rows(columns, rows), interaction, nt_nt_cutoffs[base_combination])
+        for name, values in result.items():
+            evaluation[name][rows] = values
+
+    return evaluation
@@ -36,6 +36,9 @@ from fr3d.localpath import outputHTML
 from fr3d.localpath import fr3d_pickle_path
 
 from fr3d.data.base import EntitySelector
+from fr3d.classifiers.datapoint_store import datapoints_to_columns
+from fr3d.classifiers.datapoint_store import save_columns
+from fr3d.manifest import Manifest
 
 #from fr3d.pdb import pdb_reader
 
@@ -136,6 +139,9 @@ PDB_list = ['2IZN']   # gets an interaction called p_1??
 OverwriteDataFiles = False   # to save time, if a data file exists, skip annotation
 OverwriteDataFiles = True    # even if a data file already exists, annotate and overwrite
 
+IncrementalUpdate = True     # only annotate files whose structure, version or classification tables changed
+IncrementalUpdate = False    # annotate according to OverwriteDataFiles
+
 base_seq_list = ['A','U','C','G']      # for RNA
 base_seq_list = ['DA','DT','DC','DG']  # for DNA
 base_seq_list = []                     # for all nucleic acids, modified or not
@@ -190,11 +196,15 @@ else:
 
 # restrict dictionary of cutoffs to just the basepairs needed here
 Leontis_Westhof_basepairs = ['cWW', 'cSS', 'cHH', 'cHS', 'cHW', 'cSH', 'cSW', 'cWH', 'cWS', 'tSS', 'tHH', 'tHS', 'tHW', 'tSH', 'tSW', 'tWH', 'tWS', 'tWW', 'cWB', 'cBW']
-focused_basepair_cutoffs = focus_basepair_cutoffs(nt_nt_cutoffs,Leontis_Westhof_basepairs)
+focused_basepair_cutoffs = focus_basepair_cutoffs(load_nt_nt_cutoffs(),Leontis_Westhof_basepairs)
 ideal_hydrogen_bonds = load_ideal_basepair_hydrogen_bonds()
 
 PDBs = sorted(PDBs)
 
+# record inputs and outputs of each file, to skip unchanged files on the next run
+manifest = Manifest(os.path.join(outputNAPairwiseInteractions,"FR3D_develop_manifest.json"))
+manifest_options = "categories=%s" % ",".join(sorted(categories))
+
 
 # python311 develop_NA_pairwise_interactions.py
 
@@ -240,7 +250,16 @@ for i in range(worker[0],worker[1],worker[2]):
         pair_file = "%s_pairs_%s.pickle" % (PDB,fr3d_classification_version)
         pair_to_data_output_file = outputNAPairwiseInteractions + pair_file
 
-        if not os.path.exists(pair_to_data_output_file) or len(PDBs) <= 10 or OverwriteDataFiles:
+        if IncrementalUpdate:
+            update, reason = manifest.needs_update(PDB,find_structure_file(os.path.join(inputPath,PDB)),fr3d_classification_version,classification_tables(),manifest_options)
+        else:
+            update = not os.path.exists(pair_to_data_output_file) or len(PDBs) <= 10 or OverwriteDataFiles
+            reason = ""
+
+        if not update:
+            manifest.skip(PDB)
+
+        else:
 
             print("Reading file %s, which is number %d out of %d" % (PDB,i+1,len(PDB_IFE_Dict)))
             timerData = myTimer("Reading CIF files",timerData)
@@ -279,7 +298,7 @@ for i in range(worker[0],worker[1],worker[2]):
 
             # write out data file of nucleotide centers and rotations that can be used by FR3D for searches
             # need to be able to identify each chain that is available
-            write_unit_data_file(PDB,fr3d_pickle_path,structure)
+            unit_data_files = write_unit_data_file(PDB,fr3d_pickle_path,structure)
 
             # annotate interactions and return pair_to_data
             interaction_to_list_of_tuples, category_to_interactions, timerData, pair_to_data = annotate_nt_nt_in_structure(structure,categories,focused_basepair_cutoffs,ideal_hydrogen_bonds,[],timerData,True)
@@ -296,12 +315,19 @@ for i in range(worker[0],worker[1],worker[2]):
             timerData = myTimer("Recording interactions",timerData)
             pickle.dump(pair_to_data,open(pair_to_data_output_file,"wb"),2)
             print('  Wrote classification data file %s' % pair_to_data_output_file)
+            pair_columns_output_file = pair_to_data_output_file.replace(".pickle",".npz")
+            save_columns(pair_columns_output_file,datapoints_to_columns(pair_to_data))
 
             write_txt_output_file(outputNAPairwiseInteractions,PDB,interaction_to_list_of_tuples,categories, category_to_interactions)
             print('  Wrote CSV file(s) to %s' % outputNAPairwiseInteractions)
 
+            outputs = [pair_to_data_output_file, pair_columns_output_file, outputDataFilePickle] + unit_data_files + annotation_output_files(outputNAPairwiseInteractions,PDB,categories,'txt')
+            manifest.record(PDB,find_structure_file(os.path.join(inputPath,PDB)),fr3d_classification_version,classification_tables(),manifest_options,outputs,reason)
+            if len(manifest.updated) % 100 == 0:
+                manifest.save()
+
             if len(PDBs) > 10:
-                myTimer("summary",timerData)
+                print(myTimer("summary",timerData))
 
 
     else:
@@ -392,13 +418,14 @@ for i in range(worker[0],worker[1],worker[2]):
         timerData = myTimer("Recording interactions",timerData)
         pickle.dump(pair_to_data,open(pair_to_data_output_file,"wb"),2)
         print('  Wrote classification data file %s' % pair_to_data_output_file)
+        save_columns(pair_to_data_output_file.replace(".pickle",".npz"),datapoints_to_columns(pair_to_data))
 
         write_txt_output_file(outputNAPairwiseInteractions,PDB,interaction_to_list_of_tuples,categories, category_to_interactions)
         print('  Wrote CSV file(s) to %s' % outputNAPairwiseInteractions)
 
         if len(PDBs) > 10:
-            myTimer("summary",timerData)
-        myTimer("summary",timerData)
+            print(myTimer("summary",timerData))
+        print(myTimer("summary",timerData))
 
 # when appropriate, write out HTML files
 """
@@ -409,5 +436,8 @@ if len(PDB_IFE_Dict) > 100:
     writeInteractionsHTML(allInteractionDictionary,outputHTML,version)
 """
 
-myTimer("summary",timerData)
+print(myTimer("summary",timerData))
+
+manifest.save()
+manifest.report()
 
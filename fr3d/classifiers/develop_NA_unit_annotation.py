@@ -10,6 +10,7 @@ from fr3d.modified_parent_mapping import modified_nucleotides
 
 from fr3d.cif.reader import Cif
 from fr3d.definitions import RNAconnections
+from fr3d.instrumentation import timer as myTimer
 from fr3d.definitions import NAbaseheavyatoms
 from fr3d.definitions import NAbasehydrogens
 from fr3d.definitions import nt_sugar
@@ -63,32 +64,6 @@ HB_donor_hydrogens['G'] = {"N1":["H1"], "N2":["2H2","1H2"], "C8":["H8"], "O2'":[
 HB_donor_hydrogens['C'] = {"N4":["1H4","2H4"], "C5":["H5"], "C6":["H6"], "O2'":[]}
 HB_donor_hydrogens['U'] = {"N3":["H3"], "C5":["H5"], "C6":["H6"], "O2'":[]}
 
-def myTimer(state,data={}):
-
-    # add elapsed time to the current state of the timer
-    if "currentState" in data:
-        currentState = data["currentState"]
-        data[currentState] += time() - data["lastTime"]
-
-    if state == "summary":
-        print("Summary of time taken:")
-        for state in data["allStates"]:
-            if not state == "lastTime" and not state == "currentState":
-                print("%-31s: %10.3f seconds %10.3f minutes" % (state,data[state],data[state]/60))
-    elif not state in data:
-        data[state] = 0
-        # keep track of states and the order in which they were seen
-        if "allStates" in data:
-            data["allStates"].append(state)
-        else:
-            data["allStates"] = [state]
-
-    # change to the state just starting now
-    data["currentState"] = state
-    data["lastTime"] = time()
-
-    return data
-
 def get_structure(filename,PDB):
 
     if ".pdb" in filename:
@@ -0,0 +1,167 @@
+"""
+Annotation of multi-model structures, such as NMR ensembles, as one
+topology shared by every model.
+
+The residues of all models are matched by chain, sequence, number,
+insertion code, alternate id and symmetry.  The reference points of the
+matched residues are stored in an (n_models, n_residues, 3) array and
+screening for pairs that are close enough to interact is done for all
+models at once.  Only the screening is shared: each model is then
+classified on its own screened pairs by the same per-pair code as a
+single structure, so classification still takes about as long as
+annotating each model separately.  The interactions found in each model
+are counted across models.  Residues that are not present in every model
+are listed in missing and are not annotated.
+
+    ensemble = Ensemble(bases)
+    points = ensemble.reference_points("base")
+    first, second, distances = ensemble.close_pairs(points, 10)
+"""
+
+from collections import OrderedDict
+from collections import defaultdict
+
+import numpy as np
+
+
+def topology_key(residue):
+    return (residue.chain, residue.sequence, residue.number,
+            residue.insertion_code, residue.alt_id, residue.symmetry)
+
+
+class Ensemble(object):
+    """
+    Residues of several models that share one topology.  residues[m][r]
+    is residue r of model m; only residues present in every model are
+    kept, in the order of the first model.  missing lists the unit ids
+    of the residues that were left out because some model lacks them.
+    """
+
+    def __init__(self, residues):
+        by_model = OrderedDict()
+        for residue in residues:
+            by_model.setdefault(residue.model, OrderedDict())
+            by_model[residue.model].setdefault(topology_key(residue), residue)
+
+        self.models = list(by_model.keys())
+        if self.models:
+            common = set(by_model[self.models[0]].keys())
+            for model in self.models[1:]:
+                common &= set(by_model[model].keys())
+            self.keys = [key for key in by_model[self.models[0]] if key in common]
+        else:
+            self.keys = []
+
+        self.residues = [[by_model[model][key] for key in self.keys] for model in self.models]
+
+        # residues that some model lacks cannot be compared across models
+        kept = set(self.keys)
+        self.missing = []
+        for model in self.models:
+            for key, residue in by_model[model].items():
+                if not key in kept:
+                    self.missing.append(residue.unit_id())
+
+    def __len__(self):
+        return len(self.keys)
+
+    def reference_points(self, name):
+        """
+        The named center of every residue in every model, as an
+        (n_models, n_residues, 3) array with NaN where it is undefined.
+        """
+
+        points = np.full((len(self.models), len(self.keys), 3), np.nan)
+        for m, residues in enumerate(self.residues):
+            for r, residue in enumerate(residues):
+                center = residue.centers[name]
+                if len(center) == 3:
+                    points[m, r] = center
+        return points
+
+    def close_pairs(self, points, cutoff):
+        """
+        Pairs of residues whose points are within cutoff of each other in
+        at least one model.  Returns arrays first and second with
+        first < second, and the (n_models, n_pairs) array of distances
+        between the points of each pair in each model.
+        """
+
+        from scipy.spatial import cKDTree
+
+        n = len(self.keys)
+        found = []
+        for m in range(len(self.models)):
+            defined = np.nonzero(~np.isnan(points[m, :, 0]))[0]
+            if len(defined) < 2:
+                continue
+            pairs = cKDTree(points[m, defined]).query_pairs(cutoff, output_type="ndarray")
+            i = defined[pairs[:, 0]]
+            j = defined[pairs[:, 1]]
+            found.append(np.minimum(i, j) * n + np.maximum(i, j))
+
+        if found:
+            codes = np.unique(np.concatenate(found))
+        else:
+            codes = np.zeros(0, dtype=np.int64)
+        first = codes // max(n, 1)
+        second = codes % max(n, 1)
+
+        distances = np.linalg.norm(points[:, first] - points[:, second], axis=2)
+        return first, second, distances
+
+    def residue_positions(self, m):
+        """
+        Dictionary from unit id to residue position for model m.
+        """
+
+        return dict((residue.unit_id(), r) for r, residue in enumerate(self.residues[m]))
+
+
+def pair_cubes(residues, first, second):
+    """
+    Cube lists in the form annotate_nt_nt_interactions loops over, made
+    from pairs that have already been screened: each residue is in a cube
+    of its own and the neighbors of its cube are its partners, so that
+    each pair is visited once.
+    """
+
+    cube_list = {}
+    cube_neighbors = {}
+    for i, j in zip(first.tolist(), second.tolist()):
+        for k in [i, j]:
+            if not k in cube_list:
+                cube_list[k] = [residues[k]]
+                cube_neighbors[k] = []
+        cube_neighbors[i].append(j)
+    return cube_list, cube_neighbors
+
+
+def interaction_frequencies(ensemble, model_interactions):
+    """
+    Count the models in which each interaction is found.  model_interactions
+    has one dictionary from interaction to a list of (unit id, unit id, ...)
+    tuples per model.  Returns a dictionary from interaction to a list of
+    (unit id, unit id, number of models), with the unit ids of the first
+    model, in order of residue positions.
+    """
+
+    counts = defaultdict(lambda: defaultdict(int))
+    for m, interaction_to_list_of_tuples in enumerate(model_interactions):
+        positions = ensemble.residue_positions(m)
+        for interaction, pairs in interaction_to_list_of_tuples.items():
+            seen = set()
+            for pair in pairs:
+                if pair[0] in positions and pair[1] in positions:
+                    key = (positions[pair[0]], positions[pair[1]])
+                    # count each pair once per model
+                    if not key in seen:
+                        seen.add(key)
+                        counts[interaction][key] += 1
+
+    first_model = ensemble.residues[0] if ensemble.residues else []
+    frequencies = {}
+    for interaction, pair_counts in counts.items():
+        frequencies[interaction] = [(first_model[a].unit_id(), first_model[b].unit_id(), count)
+                                    for (a, b), count in sorted(pair_counts.items())]
+    return frequencies
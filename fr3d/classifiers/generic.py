@@ -1,4 +1,60 @@
 import abc
+import itertools as it
+
+import numpy as np
+
+from fr3d.geometry.coordinates import gather_coordinates
+
+
+class PairBatch(object):
+    """A batch of candidate pairs handed to Classifier.classify_batch. The
+    pairs are kept as two lists of components, and the coordinates of any
+    atoms of the pairs can be gathered into arrays with one row per pair, so
+    that a classifier can work on all pairs at once.
+    """
+
+    def __init__(self, first, second):
+        self.first = list(first)
+        self.second = list(second)
+
+    def __len__(self):
+        return len(self.first)
+
+    def coordinates(self, names, which='second'):
+        """Gather the coordinates of the named atoms of the first or second
+        component of every pair.
+
+        :names: A list of atom names, or a list with one list of names per
+        pair.
+        :which: 'first' or 'second'.
+        :returns: An array of shape (pairs, names, 3), NaN for missing atoms.
+        """
+
+        residues = self.first if which == 'first' else self.second
+        if names and not isinstance(names[0], (list, tuple)):
+            names = [names] * len(residues)
+        return gather_coordinates(residues, names)
+
+    def transformed(self, names, which='second'):
+        """Coordinates of the named atoms, as for coordinates, moved by the
+        translation and rotation that bring the base of the first component
+        of each pair to its standard position, as translate_rotate_atom does.
+        Pairs whose first component has no base frame give NaN.
+
+        :returns: An array of shape (pairs, names, 3).
+        """
+
+        coordinates = self.coordinates(names, which=which)
+        centers = np.full((len(self), 3), np.nan)
+        rotations = np.full((len(self), 3, 3), np.nan)
+        for i, first in enumerate(self.first):
+            rotation = getattr(first, 'rotation_matrix', None)
+            center = getattr(first, 'base_center', None)
+            if rotation is not None and center is not None:
+                rotations[i] = np.asarray(rotation)
+                centers[i] = np.asarray(center).flatten()
+
+        return np.einsum('nkj,nji->nki', coordinates - centers[:, None, :], rotations)
 
 
 class Classifier(object):
@@ -34,7 +90,23 @@ class Classifier(object):
         """
         pass
 
-    def classify(self, structure):
+    def classify_batch(self, batch):
+        """Compute the classification for every pair in a PairBatch. This
+        default calls classification one pair at a time, so every classifier
+        works through the batched interface; classifiers that can work on
+        arrays of coordinates override this to handle the whole batch at once.
+
+        :batch: A PairBatch.
+        :returns: An array with one entry per pair, the classification or a
+        false value if there is none.
+        """
+
+        classified = np.empty(len(batch), dtype=object)
+        for i, (first, second) in enumerate(zip(batch.first, batch.second)):
+            classified[i] = self.classification(first, second)
+        return classified
+
+    def classify(self, structure, batch_size=None):
         """Classify all pairs in a structure. This will select all pairs which
         match the given first, second and distance filters and then attempt to
         classify each one. If we cannot classify them or if there is no
@@ -42,16 +114,29 @@ class Classifier(object):
         list of tuples. Each entry in the list is (component1, component2,
         classification).
 
+        The pairs are given to classify_batch, all at once or in batches of
+        batch_size pairs to limit the memory used for large structures.
+
         :structure: A structure object to classify all pairs of.
+        :batch_size: The largest number of pairs to classify at once.
         :returns: A list of tuples of the classification.
         """
 
-        pairs = structure.pairs(first=self.first, second=self.second,
-                                distance=self.distance)
+        pairs = iter(structure.pairs(first=self.first, second=self.second,
+                                     distance=self.distance))
         classified = []
-        for (first, second) in pairs:
-            classification = self.classification(first, second)
-            if classification:
-                classified.append((first.unit_id(), second.unit_id(), classification))
+        while True:
+            # take the pairs one batch at a time, never all of them at once
+            if batch_size:
+                chunk = list(it.islice(pairs, batch_size))
+            else:
+                chunk = list(pairs)
+            if not chunk:
+                break
+            batch = PairBatch([p[0] for p in chunk], [p[1] for p in chunk])
+            results = self.classify_batch(batch)
+            for first, second, classification in zip(batch.first, batch.second, results):
+                if classification:
+                    classified.append((first.unit_id(), second.unit_id(), classification))
 
         return classified
@@ -12,6 +12,7 @@
 """
 
 from collections import defaultdict
+from collections import OrderedDict
 import json
 import math
 import matplotlib.pyplot as plt
@@ -61,6 +62,21 @@ from fr3d.data.mapping import modified_base_atom_list,parent_atom_to_modified,mo
 from fr3d.ordering.orderBySimilarity import treePenalizedPathLength
 from fr3d.ordering.orderBySimilarity import standardOrder
 
+from fr3d.classifiers.datapoint_store import datapoints_to_columns
+from fr3d.classifiers.datapoint_store import evaluate_cutoffs
+from fr3d.classifiers.datapoint_store import load_columns
+from fr3d.classifiers.datapoint_store import reason_text
+from fr3d.classifiers.datapoint_store import row_datapoints
+from fr3d.classifiers.datapoint_store import rows_in_chains
+
+from fr3d.classifiers.annotation_comparison import UnitIds
+from fr3d.classifiers.annotation_comparison import AnnotationTable
+from fr3d.classifiers.annotation_comparison import agreement_matrix
+from fr3d.classifiers.annotation_comparison import compared_keys
+from fr3d.classifiers.annotation_comparison import disagreements
+from fr3d.classifiers.annotation_comparison import join
+from fr3d.classifiers.annotation_comparison import match_counts
+
 JS1 = '  <script src="./js/JSmol.min.nojq.js"></script>'
 JS2 = '  <script src="./js/jquery.jmolTools.bp.js"></script>'               # special version, superimpose first base
 JS3 = '  <script src="./js/imagehandlinglocal.js"></script>'
@@ -643,79 +659,56 @@ def load_basepair_annotations(filename,all_pair_types):
 
 def compare_annotations(pairs_1,pairs_2,all_pair_types,filename):
     """
-    Old code to compare annotation systems
+    Old code to compare annotation systems, now done as joins of
+    annotation tables.  Like before, only pairs annotated in pairs_1
+    are reported on.
     """
 
-    allkeys = set(pairs_1.keys()) | set(pairs_1.keys())
-
-    with open(filename, mode='w') as file:
-
-        file.write("Unit id 1"+"\t"+"Unit id 2"+"\t"+"Base Combination"+"\t"+"Annotation 1"+"\t"+"Annotation 2"+"\t"+"Match Count"+"\t"+"url"+"\n")
-
-        total_annotations  = 0
-        count_agreements = 0
-        for key in allkeys:
-            #print(key)
-            x = key[0].split("|")
-            y = key[1].split("|")
-            base_combination = x[3]+y[3]
+    units = UnitIds()
+    table_1 = AnnotationTable(units)
+    table_1.add_pair_to_interaction(pairs_1)
+    table_2 = AnnotationTable(units)
+    table_2.add_pair_to_interaction(pairs_2)
 
-            pair_type=""
-            if key in pairs_1:
-                pair_type = pairs_1[key].replace("n","")
+    keys, (codes_1, codes_2) = join([table_1,table_2],compared_keys(table_1))
 
-            elif key in pairs_2:
-                pair_type = pairs_2[key]
+    ## Keep track of how often ann1 and ann2 agree over all pairs
+    ## New python_fr3d annotations use upper and lowercase to indicate
+    ## details of which part of the edge is used with cWw and tHh and such,
+    ## so change to lowercase to compare
+    match_count = match_counts(units,codes_1,codes_2)
+    total_annotations = int(np.sum((codes_1 >= 0) | (codes_2 >= 0)))
+    count_agreements = int(np.sum(match_count == 1))
 
-            #print([pair_type])
-            if pair_type in ['cHW', 'tHW', 'cSH', 'tSH', 'cSW', 'tSW']:
-                continue
-
-            if pair_type in ['cWW', 'tWW','cSS', 'tSS', 'cHH', 'tHH', '0  ']:
-                if base_combination in ['UA', 'CG', 'UG', 'GA', 'CA', 'UC']:
-                    continue
-                if base_combination in ['AA', 'CC', 'GG', 'UU']:
-                    if int(x[4])>=int(y[4]):
-                        continue
-
-            if key in pairs_1:
-                ann1 = pairs_1[key]
-            else:
-                ann1 = ""
-            if key in pairs_2:
-                ann2 = pairs_2[key]
-            else:
-                ann2 = ""
-
-            ## Keep track of how often ann1 and ann2 agree over all pairs
-            ## New python_fr3d annotations use upper and lowercase to indicate
-            ## details of which part of the edge is used with cWw and tHh and such,
-            ## so change to lowercase to compare
-
-            if len(ann1) > 0 or len(ann2) > 0:
-                total_annotations += 1
-
-            if ann1.lower() == ann2.lower() and len(ann2) > 0:
-                count_agreements +=  1
-
-            ## Counting the number of times the annotations match with each other
-            ## for this particular pair of neucleotides
-            count = 0
-            if ann1.lower() == ann2.lower()  and len(ann2) > 0:
-                count = 1
-            elif ann2.lower() in ann1.lower() and len(ann2) > 0:
-                count += 0.6
+    with open(filename, mode='w') as file:
 
-            url= "http://rna.bgsu.edu/rna3dhub/display3D/unitid/" + key[0] + "," +  key[1]
+        file.write("Unit id 1"+"\t"+"Unit id 2"+"\t"+"Base Combination"+"\t"+"Annotation 1"+"\t"+"Annotation 2"+"\t"+"Match Count"+"\t"+"url"+"\n")
 
-            if count < 1:
-                file.write(key[0]+"\t"+key[1]+"\t"+x[3]+y[3]+"\t"+ann1+"\t"+ann2+"\t"+str(count)+"\t"+url+"\n")
+        for u1,u2,ann1,ann2,count in disagreements(table_1,table_2,keys):
+            x = u1.split("|")
+            y = u2.split("|")
+            url= "http://rna.bgsu.edu/rna3dhub/display3D/unitid/" + u1 + "," +  u2
+            file.write(u1+"\t"+u2+"\t"+x[3]+y[3]+"\t"+ann1+"\t"+ann2+"\t"+str(count or 0)+"\t"+url+"\n")
 
     print("  Number of times ann1 and ann2 agree %d" % count_agreements)
     print("  Total number of ann1 or ann2 annotations %d" % total_annotations)
     print("  Percentage of times ann1 and ann2 agree %0.4f" % (count_agreements*100/total_annotations))
 
 
+def print_agreement_matrix(tables):
+    """
+    Number of pairs on which each two annotators agree, out of the pairs
+    annotated by either one.
+    """
+
+    agree, total = agreement_matrix(tables)
+    names = [table.name for table in tables]
+    print('Agreement between annotators, agreeing pairs / pairs annotated by either')
+    print('%-10s' % '' + ''.join('%18s' % name for name in names))
+    for i, name in enumerate(names):
+        print('%-10s' % name + ''.join('%18s' % ('%d/%d' % (agree[i,j],total[i,j])) for j in range(len(names))))
+
+
 def reverse(pair):
     return (pair[1],pair[0])
 
@@ -776,6 +769,10 @@ def print_datapoint(datapoint):
         if f in datapoint:
             print("  %20s = %11.6f" % (f,datapoint[f]))
 
+    if not 'hbond' in datapoint and 'hbond_max_badness' in datapoint:
+        # hydrogen bonds summarized in the columnar datapoint store
+        for f in ['hbond_max_badness','hbond_max_distance','hbond_min_angle']:
+            print("  %20s = %11.6f" % (f,datapoint[f]))
     if 'hbond' in datapoint:
         for hbond in datapoint['hbond']:
             print(hbond)
@@ -1212,6 +1209,11 @@ def evaluate_pair_from_datapoint(datapoint,interaction,nt_nt_cutoffs_bc):
     max_badness = -1.0
     max_distance = -1.0
     min_angle = 180
+    if not 'hbond' in datapoint and 'hbond_max_badness' in datapoint:
+        # hydrogen bonds summarized in the columnar datapoint store
+        max_badness = datapoint['hbond_max_badness']
+        max_distance = datapoint['hbond_max_distance']
+        min_angle = datapoint['hbond_min_angle']
     if 'hbond' in datapoint:
         for hbond in datapoint['hbond']:
             # hbond is like
@@ -1370,6 +1372,76 @@ def evaluate_pair_from_datapoint(datapoint,interaction,nt_nt_cutoffs_bc):
     return datapoint, pdata, angle_out_of_order
 
 
+def evaluate_pairs(pairs,pair_to_datapoint,interaction,nt_nt_cutoffs_bc):
+    """
+    Evaluate the datapoints of all pairs against the cutoffs for interaction
+    at once, with evaluate_cutoffs, instead of one pair at a time.
+    Returns a dictionary from pair to the results, for store_evaluation,
+    and whether the cutoffs have angle ranges that wrap around.
+    """
+
+    pairs = list(OrderedDict.fromkeys(pairs))
+    columns = datapoints_to_columns(OrderedDict((pair,pair_to_datapoint.get(pair,{})) for pair in pairs))
+    evaluation = evaluate_cutoffs(columns,interaction,nt_nt_cutoffs_bc)
+
+    names = ['best_interaction','best_subcategory','best_cutoff_distance','reasons','disqualified_hbond','new_python_annotation']
+    values = [evaluation[name].tolist() for name in names]
+    values += [columns[name].tolist() for name in ['hbond_max_badness','hbond_max_distance','hbond_min_angle']]
+    pair_to_result = dict((pair,result) for pair,result in zip(pairs,zip(*values)))
+
+    angle_out_of_order = False
+    for bp in nt_nt_cutoffs_bc.keys():
+        if interaction.lower() in bp.lower():
+            for cutoff in nt_nt_cutoffs_bc[bp].values():
+                if cutoff["anglemin"] > cutoff["anglemax"]:
+                    angle_out_of_order = True
+
+    return pair_to_result, angle_out_of_order
+
+
+def store_evaluation(datapoint,result):
+    """
+    Put the result of evaluate_pairs for one pair into its datapoint and
+    return the datapoint and pdata, as evaluate_pair_from_datapoint does.
+    """
+
+    best_interaction, best_subcategory, best_cutoff_distance, reasons, disqualified_hbond, new_python_annotation, max_badness, max_distance, min_angle = result
+
+    if not check_full_data(datapoint):
+        datapoint = make_pretend_datapoint(datapoint)
+
+    datapoint['maxgap'] = max(datapoint['gap21'],datapoint['gap12'])
+
+    if 'basepair' in datapoint:
+        python_annotation = datapoint['basepair']
+    else:
+        python_annotation = ''
+
+    datapoint['best_interaction'] = best_interaction
+    datapoint['best_subcategory'] = best_subcategory
+    datapoint['best_cutoff_distance'] = best_cutoff_distance
+    datapoint['keep_reasons'] = reason_text(reasons).split(",") if reasons else []
+    datapoint['disqualified_hbond'] = disqualified_hbond
+
+    # store data about this pair for output
+    pdata = datapoint
+    pdata['max_distance'] = max_distance
+    pdata['min_angle'] = min_angle
+    pdata['max_badness'] = max_badness
+    pdata['python_annotation'] = python_annotation          # original annotation from NA_pairwise_interactions
+    pdata['new_python_annotation'] = new_python_annotation
+    pdata['basepair_subcat'] = best_subcategory
+    pdata['best_cutoff_distance'] = best_cutoff_distance
+
+    if not 'sugar_ribose' in datapoint:
+        pdata['sugar_ribose'] = ''
+
+    if not 'angle_in_plane' in pdata:
+        pdata['angle_in_plane'] = 0.0  # so distance can be calculated
+
+    return datapoint, pdata
+
+
 #=========================================== Main block =============================
 
 if __name__=="__main__":
@@ -1507,40 +1579,53 @@ if __name__=="__main__":
         print("Loading FR3D     annotations from %s" % outputNAPairwiseInteractions)
         for PDB_id in all_PDB_ids:
             pair_to_datapoint_file = outputNAPairwiseInteractions + "%s_pairs_v1.pickle" % PDB_id
-            try:
-                if sys.version_info[0] < 3:
-                    new_dict = pickle.load(open(pair_to_datapoint_file,'rb'))
-                else:
-                    new_dict = pickle.load(open(pair_to_datapoint_file,'rb'),encoding = 'latin1')
-                if len(new_dict.keys()) > 0:
-                    # make sure at least one pair was annotated
-                    found_basepair = False
-                    for pair,datapoint in new_dict.items():
-                        if 'basepair' in datapoint and datapoint['basepair']:
-                            found_basepair = True
-
-                    if found_basepair:
-                        pdb_id_to_annotators[PDB_id].add('FR3D')
+            pair_columns_file = outputNAPairwiseInteractions + "%s_pairs_v1.npz" % PDB_id
+            if os.path.exists(pair_columns_file):
+                # columnar store written by develop_NA_pairwise_interactions
+                columns = load_columns(pair_columns_file)
+                if 'basepair' in columns and np.any(columns['basepair'] != ''):
+                    pdb_id_to_annotators[PDB_id].add('FR3D')
+                    if DNA:
+                        rows = None
+                    else:
+                        rows = np.nonzero(rows_in_chains(columns,representative_chains))[0]
+                    for pair,datapoint in row_datapoints(columns,rows):
+                        pair_to_datapoint[pair] = datapoint
+            else:
+                try:
+                    if sys.version_info[0] < 3:
+                        new_dict = pickle.load(open(pair_to_datapoint_file,'rb'))
+                    else:
+                        new_dict = pickle.load(open(pair_to_datapoint_file,'rb'),encoding = 'latin1')
+                    if len(new_dict.keys()) > 0:
+                        # make sure at least one pair was annotated
+                        found_basepair = False
                         for pair,datapoint in new_dict.items():
-                            # reduce memory usage by only storing pairs we will process
-                            u1,u2 = pair
+                            if 'basepair' in datapoint and datapoint['basepair']:
+                                found_basepair = True
 
-                            # only keep pairs from representative chains
-                            fields1 = u1.split("|")
-                            chain1 = "|".join(fields1[0:3])
-                            if not chain1 in representative_chains and not DNA:
-                                continue
+                        if found_basepair:
+                            pdb_id_to_annotators[PDB_id].add('FR3D')
+                            for pair,datapoint in new_dict.items():
+                                # reduce memory usage by only storing pairs we will process
+                                u1,u2 = pair
 
-                            fields2 = u2.split("|")
-                            chain2 = "|".join(fields2[0:3])
-                            if not chain2 in representative_chains and not DNA:
-                                continue
+                                # only keep pairs from representative chains
+                                fields1 = u1.split("|")
+                                chain1 = "|".join(fields1[0:3])
+                                if not chain1 in representative_chains and not DNA:
+                                    continue
 
-                            # pair_to_datapoint.update(new_dict)
-                            pair_to_datapoint[pair] = datapoint
+                                fields2 = u2.split("|")
+                                chain2 = "|".join(fields2[0:3])
+                                if not chain2 in representative_chains and not DNA:
+                                    continue
 
-            except:
-                print("Not able to load python_fr3d annotations for %s from %s" % (PDB_id,pair_to_datapoint_file))
+                                # pair_to_datapoint.update(new_dict)
+                                pair_to_datapoint[pair] = datapoint
+
+                except:
+                    print("Not able to load python_fr3d annotations for %s from %s" % (PDB_id,pair_to_datapoint_file))
 
 
             unit_annotation_file = os.path.join(outputNAPairwiseInteractions,"%s_glycosidic.txt" % PDB_id)
@@ -1645,6 +1730,15 @@ if __name__=="__main__":
                     all_annotate_counter += 1
             print('%d files are annotated by all %d annotators' % (all_annotate_counter,len(all_agree)))
 
+            # overall agreement between annotators, computed as joins over integer tables
+            units = UnitIds()
+            annotation_tables = [AnnotationTable(units,'FR3D')]
+            annotation_tables[0].add_pair_to_interaction(dict((pair,datapoint.get('basepair','')) for pair,datapoint in pair_to_datapoint.items()))
+            for name, pair_to_interaction in [('RNAview',pair_to_interaction_rnaview),('DSSR',pair_to_interaction_dssr),('PDB',pair_to_interaction_pdb),('contacts',pair_to_interaction_contacts)]:
+                annotation_tables.append(AnnotationTable(units,name))
+                annotation_tables[-1].add_pair_to_interaction(pair_to_interaction)
+            print_agreement_matrix(annotation_tables)
+
 
         # remove pairs with symmetry operators, alternate ids, insertion codes when comparing annotators
         complicated_unit_id = set()
@@ -1834,8 +1928,14 @@ if __name__=="__main__":
                 # store data to produce an HTML table
                 pair_data = []  # list of data dictionaries to print in a table
 
+                # evaluate all pairs of this base combination, and their reverses, against the cutoffs at once
+                bc_pairs = bc_to_pairs_in_order.get(base_combination,[])
+                pair_to_evaluation, angle_order = evaluate_pairs(bc_pairs + [reverse(pair) for pair in bc_pairs],pair_to_datapoint,interaction,nt_nt_cutoffs.get(base_combination,{}))
+                if angle_order:
+                    angle_out_of_order = True
+
                 # loop over pairs for which we have data, finding those with the interaction and base combination
-                for pair in bc_to_pairs_in_order.get(base_combination,[]):
+                for pair in bc_pairs:
 
                     if not pair in pair_to_datapoint:
                         print('Pair %s-%s does not have datapoint information' % (pair[0],pair[1]))
@@ -1931,7 +2031,7 @@ if __name__=="__main__":
                                 continue
                         elif rnaview_true or dssr or contacts or pdb:
                             print('Checking %s-%s for %s' % (pair[0],pair[1],interaction))
-                            datapoint, pdata, angle_order = evaluate_pair_from_datapoint(datapoint,interaction,nt_nt_cutoffs[base_combination])
+                            datapoint, pdata = store_evaluation(datapoint,pair_to_evaluation[pair])
                             #print("evaluated datapoint:")
                             #print_dictionary(datapoint)
                             if not interaction in datapoint['best_interaction']:
@@ -2001,15 +2101,12 @@ if __name__=="__main__":
 
                         # evaluate the quality of the match to the current pair, for scatterplots and all
                         #print('Evaluating pair %s - %s for interaction %s' % (pair[0],pair[1],interaction))
-                        datapoint, pdata, angle_order = evaluate_pair_from_datapoint(datapoint,interaction,nt_nt_cutoffs[base_combination])
-
-                        if angle_order:
-                            angle_out_of_order = True
+                        datapoint, pdata = store_evaluation(datapoint,pair_to_evaluation[pair])
 
                         # use the reversed pair here?
                         if nt1_seq == nt2_seq and interaction in symmetric_basepair_list and datapoint['best_cutoff_distance'] > 0:
                             #print('Evaluating reversed pair %s - %s' % reverse(pair))
-                            r_datapoint, r_pdata, angle_order = evaluate_pair_from_datapoint(r_datapoint,interaction,nt_nt_cutoffs[base_combination])
+                            r_datapoint, r_pdata = store_evaluation(r_datapoint,pair_to_evaluation[reverse(pair)])
                             # print_dictionary(r_datapoint)
                             # print()
                             # if new match is better and still matches interaction, reverse the pair, use r_datapoint, etc.
@@ -0,0 +1,75 @@
+"""
+Coordinates of residues in the standard frame of a base, as arrays.
+
+Component.translate_rotate_component moves a residue into the frame of a
+base by making new Atom objects and a new Component, which recomputes the
+rotation matrix and infers hydrogens again.  The classifiers only need the
+moved coordinates, so here the atoms of each residue are gathered into an
+array once, and moving a residue into the frame of a base is one matrix
+product.
+"""
+
+import numpy as np
+
+from fr3d.definitions import aa_fg
+from fr3d.definitions import aa_linker
+from fr3d.definitions import aa_backbone
+
+
+def residue_arrays(residue):
+    """
+    Names of the atoms of residue that have coordinates, and an n by 3
+    array of their coordinates.
+    """
+
+    names = []
+    coordinates = []
+    for atom in residue.atoms():
+        center = atom.coordinates()
+        if len(center) == 3:
+            names.append(atom.name)
+            coordinates.append(center)
+    return names, np.array(coordinates, dtype=float).reshape(-1, 3)
+
+
+def to_base_frame(base_residue, coordinates):
+    """
+    Translate and rotate an n by 3 array of coordinates the way that brings
+    base_residue to standard position at the origin.
+    """
+
+    return np.dot(coordinates - base_residue.base_center, np.asarray(base_residue.rotation_matrix))
+
+
+class StandardResidue(object):
+    """
+    A residue moved into the standard frame of a base, with just what the
+    annotation and its output use: the sequence, coordinates by atom name,
+    and centers of amino acid parts, so that centers[name] works as it does
+    for a Component.
+    """
+
+    parts = {"aa_fg": aa_fg, "aa_linker": aa_linker, "aa_backbone": aa_backbone}
+
+    def __init__(self, sequence, names, coordinates):
+        self.sequence = sequence
+        self.names = names
+        self.coordinates = coordinates
+        self.centers = self
+
+    def coordinates_by_name(self):
+        return dict(zip(self.names, self.coordinates))
+
+    def __getitem__(self, name):
+        # like AtomProxy, average the atoms in a part, or atoms listed twice
+        if name in self.parts:
+            definition = self.parts[name].get(self.sequence, [])
+        else:
+            definition = [name]
+
+        rows = [i for i, atom_name in enumerate(self.names) if atom_name in definition]
+        if not rows:
+            return np.array([])
+        if len(rows) == 1:
+            return self.coordinates[rows[0]]
+        return np.mean(self.coordinates[rows], axis=0)
@@ -0,0 +1,328 @@
+"""
+Annotation of trajectories: one topology with a stream of coordinate
+frames, such as a molecular dynamics run.
+
+The structure is read and its Components are built once.  For each frame
+the coordinates of the atoms are replaced in place, the base frames of all
+nucleotides are fitted at once, the inferred hydrogens are moved with
+their bases, and the centers are recomputed, so that the structure can be
+annotated as if it had been read from a file for that frame.
+
+    trajectory = Trajectory(structure)
+    for keys, coordinates in read_frames("run.npy"):
+        trajectory.set_frame(coordinates, keys)
+        ... annotate trajectory.structure ...
+
+Frames come from multi-model PDB files, one frame per model, or from NumPy
+.npy and .npz files holding an array of shape (frames, atoms, 3) with the
+atoms in the order of Trajectory.atoms.
+"""
+
+import gzip
+from collections import OrderedDict
+
+import numpy as np
+
+from fr3d import definitions as defs
+from fr3d.data import Structure
+from fr3d.data.mapping import modified_atom_to_parent
+from fr3d.data.mapping import modified_base_atom_list
+from fr3d.data.mapping import modified_base_to_parent
+from fr3d.geometry.superpositions import besttransformation_batch
+from fr3d.pdb.reader import residue_number
+
+
+def atom_key(chain, number, insertion_code, component_id, name, alt_id):
+    """
+    Key matching an atom of the topology to a line of a frame.
+    """
+
+    if insertion_code in ['', '?', '.']:
+        insertion_code = None
+    if alt_id in ['', '?', '.']:
+        alt_id = None
+    return (chain, number, insertion_code, component_id, name, alt_id)
+
+
+def base_fit_atoms(residue):
+    """
+    The atoms of residue that calculate_rotation_matrix superimposes on the
+    standard base, with their standard coordinates, and whether the base is
+    a standard one, whose base center is the mean of the atoms.  Only atoms
+    read from the file are fitted, as the rotation matrix is calculated
+    before hydrogen inference adds the base atoms of modified nucleotides.
+    """
+
+    if residue.sequence in defs.NAbaseheavyatoms:
+        standard = defs.NAbasecoordinates[residue.sequence]
+        atoms = [atom for atom in residue.atoms(name=defs.NAbaseheavyatoms[residue.sequence])
+                 if atom.component_id is not None]
+        return [(atom, standard[atom.name]) for atom in atoms], True
+
+    if residue.sequence in modified_base_to_parent:
+        parent = modified_base_to_parent[residue.sequence]
+        baseheavy = defs.NAbaseheavyatoms[parent]
+        standard = defs.NAbasecoordinates[parent]
+        found = []
+        for atom in residue.atoms(name=list(modified_base_atom_list[residue.sequence])):
+            if atom.component_id is None:
+                continue
+            parent_atom_name = modified_atom_to_parent[residue.sequence][atom.name]
+            if parent_atom_name in baseheavy:
+                found.append((atom, standard[parent_atom_name]))
+        return found, False
+
+    return [], False
+
+
+class Trajectory(object):
+    """
+    The residues of the first model of structure, whose atom coordinates
+    are replaced frame by frame.  atoms lists the atoms read from the file,
+    in the order that frames give their coordinates; inferred hydrogens, and
+    the base atoms inferred for modified nucleotides, are not in it and
+    follow their bases instead.
+    """
+
+    def __init__(self, structure):
+        residues = list(structure.residues(polymeric=None))
+        models = [r.model for r in residues]
+        if models:
+            residues = [r for r in residues if r.model == models[0]]
+        self.structure = Structure(residues, pdb=structure.pdb)
+        self.residues = residues
+
+        self.atoms = []
+        inferred = []
+        for r, residue in enumerate(residues):
+            for atom in residue.atoms():
+                # atoms made by hydrogen inference carry no residue data
+                if atom.component_id is None:
+                    inferred.append((r, atom))
+                else:
+                    self.atoms.append(atom)
+        self.keys = [atom_key(a.chain, a.component_number, a.insertion_code,
+                              a.component_id, a.name, a.alt_id) for a in self.atoms]
+        atom_position = dict((id(atom), i) for i, atom in enumerate(self.atoms))
+
+        # bases with the same number of fitted atoms are fitted together
+        self.base_groups = OrderedDict()
+        for r, residue in enumerate(residues):
+            if residue.rotation_matrix is None:
+                continue
+            fitted, standard = base_fit_atoms(residue)
+            rows = [atom_position[id(atom)] for atom, _ in fitted]
+            group = self.base_groups.setdefault(len(rows), {'residues': [], 'rows': [], 'standard': [], 'is_standard': []})
+            group['residues'].append(r)
+            group['rows'].append(rows)
+            group['standard'].append([s for _, s in fitted])
+            group['is_standard'].append(standard)
+        for group in self.base_groups.values():
+            group['residues'] = np.array(group['residues'], dtype=np.int64)
+            group['rows'] = np.array(group['rows'], dtype=np.int64).reshape(len(group['residues']), -1)
+            group['standard'] = np.array(group['standard'], dtype=float).reshape(len(group['residues']), -1, 3)
+            group['is_standard'] = np.array(group['is_standard'], dtype=bool)
+
+        # inferred atoms in the standard frame of their base
+        self.hydrogens = [atom for r, atom in inferred if residues[r].rotation_matrix is not None]
+        self.hydrogen_residue = np.array([r for r, atom in inferred if residues[r].rotation_matrix is not None], dtype=np.int64)
+        self.hydrogen_standard = np.zeros((len(self.hydrogens), 3))
+        for h, (r, atom) in enumerate(zip(self.hydrogen_residue, self.hydrogens)):
+            residue = residues[r]
+            rotation = np.asarray(residue.rotation_matrix)
+            center = np.asarray(residue.base_center).flatten()
+            self.hydrogen_standard[h] = np.dot(rotation.T, atom.coordinates() - center)
+
+        self._frame_keys = None
+        self._frame_rows = None
+
+    def frame_rows(self, keys):
+        """
+        Rows of a frame with the given atom keys that hold the coordinates
+        of each atom of the topology.  Atoms shared by alternate locations
+        are found under their key without an alternate id.
+        """
+
+        if keys is self._frame_keys or keys == self._frame_keys:
+            return self._frame_rows
+
+        row_of = {}
+        for row, key in enumerate(keys):
+            row_of.setdefault(key, row)
+
+        rows = np.zeros(len(self.keys), dtype=np.int64)
+        for i, key in enumerate(self.keys):
+            row = row_of.get(key)
+            if row is None:
+                row = row_of.get(key[:5] + (None,))
+            if row is None:
+                raise ValueError("Frame has no coordinates for atom %s" % (key,))
+            rows[i] = row
+
+        self._frame_keys = keys
+        self._frame_rows = rows
+        return rows
+
+    def set_frame(self, coordinates, keys=None):
+        """
+        Move the atoms of the topology to the coordinates of a frame, an
+        n by 3 array.  Without keys, row i holds atom i of self.atoms;
+        otherwise keys gives the atom key of each row.
+        """
+
+        coordinates = np.asarray(coordinates, dtype=float).reshape(-1, 3)
+        if keys is not None:
+            coordinates = coordinates[self.frame_rows(keys)]
+        if len(coordinates) != len(self.atoms):
+            raise ValueError("Frame has %d atoms, topology has %d" % (len(coordinates), len(self.atoms)))
+
+        for atom, (x, y, z) in zip(self.atoms, coordinates.tolist()):
+            atom.x = x
+            atom.y = y
+            atom.z = z
+
+        centers = np.zeros((len(self.residues), 3))
+        rotations = np.zeros((len(self.residues), 3, 3))
+        for group in self.base_groups.values():
+            observed = coordinates[group['rows']]
+            U, mean_observed, mean_standard = besttransformation_batch(observed, group['standard'])
+            center = mean_observed.copy()
+            # bases missing heavy atoms are centered where the standard origin goes
+            modified = ~group['is_standard']
+            center[modified] -= np.einsum('kij,kj->ki', U[modified], mean_standard[modified])
+            centers[group['residues']] = center
+            rotations[group['residues']] = U
+
+        if len(self.hydrogens) > 0:
+            moved = centers[self.hydrogen_residue] + \
+                np.einsum('kij,kj->ki', rotations[self.hydrogen_residue], self.hydrogen_standard)
+            for atom, (x, y, z) in zip(self.hydrogens, moved.tolist()):
+                atom.x = x
+                atom.y = y
+                atom.z = z
+
+        for group in self.base_groups.values():
+            for r in group['residues'].tolist():
+                residue = self.residues[r]
+                residue.rotation_matrix = np.matrix(rotations[r])
+                residue.base_center = centers[r]
+
+        for residue in self.residues:
+            residue.define_centers()
+
+        # coordinate trees of the structure are out of date
+        self.structure.reindex()
+
+
+class InteractionOccupancy(object):
+    """
+    Which interactions are present in each frame.  Frames are added one at
+    a time as dictionaries from interaction to a list of (unit id, unit id,
+    ...) tuples, and the occupancy of each (unit id, interaction, unit id)
+    is available as counts or as a time series.
+    """
+
+    def __init__(self):
+        self.keys = []
+        self._index = {}
+        self._frames = []
+
+    def __len__(self):
+        return len(self._frames)
+
+    def add(self, interaction_to_list_of_tuples):
+        present = set()
+        for interaction, tuples in interaction_to_list_of_tuples.items():
+            for pair in tuples:
+                key = (pair[0], interaction, pair[1])
+                if key not in self._index:
+                    self._index[key] = len(self.keys)
+                    self.keys.append(key)
+                present.add(self._index[key])
+        self._frames.append(np.array(sorted(present), dtype=np.int64))
+
+    def counts(self):
+        """
+        Number of frames in which each key is present, in order of keys.
+        """
+
+        counts = np.zeros(len(self.keys), dtype=np.int64)
+        for present in self._frames:
+            counts[present] += 1
+        return counts
+
+    def series(self):
+        """
+        Boolean array of shape (keys, frames), True where key is present.
+        """
+
+        series = np.zeros((len(self.keys), len(self._frames)), dtype=bool)
+        for f, present in enumerate(self._frames):
+            series[present, f] = True
+        return series
+
+
+def pdb_frames(handle):
+    """
+    Frames of a multi-model PDB file, one per model, as (keys, coordinates).
+    The file is read one model at a time.
+    """
+
+    keys = []
+    coordinates = []
+    for line in handle:
+        if not isinstance(line, str):
+            line = line.decode('latin-1')
+        record = line[0:6]
+        if record == 'ATOM  ' or record == 'HETATM':
+            keys.append(atom_key(line[21:22].strip() or line[72:76].strip(),
+                                 residue_number(line[22:26]),
+                                 line[26:27].strip() or None,
+                                 line[17:21].strip(),
+                                 line[12:16].strip(),
+                                 line[16:17].strip() or None))
+            coordinates.append((line[30:38], line[38:46], line[46:54]))
+        elif record == 'ENDMDL' and keys:
+            yield keys, np.array(coordinates, dtype=float)
+            keys = []
+            coordinates = []
+    if keys:
+        yield keys, np.array(coordinates, dtype=float)
+
+
+def numpy_frames(filename):
+    """
+    Frames of a .npy file, or of the 'coordinates' array of a .npz file
+    (its first array if there is none), as (None, coordinates).  .npy files
+    are memory mapped rather than read at once.
+    """
+
+    if filename.endswith('.npz'):
+        data = np.load(filename)
+        name = 'coordinates' if 'coordinates' in data.files else data.files[0]
+        frames = data[name]
+    else:
+        frames = np.load(filename, mmap_mode='r')
+
+    if frames.ndim == 2:
+        frames = frames[np.newaxis]
+    for frame in frames:
+        yield None, np.asarray(frame, dtype=float)
+
+
+def read_frames(filename):
+    """
+    Frames of a trajectory file, chosen by its extension.
+    """
+
+    if filename.endswith('.npy') or filename.endswith('.npz'):
+        for frame in numpy_frames(filename):
+            yield frame
+    elif filename.endswith('.gz'):
+        with gzip.open(filename, 'rb') as handle:
+            for frame in pdb_frames(handle):
+                yield frame
+    else:
+        with open(filename, 'r') as handle:
+            for frame in pdb_frames(handle):
+                yield frame
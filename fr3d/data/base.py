@@ -15,8 +15,6 @@ import operator as op
 
 import numpy as np
 
-from scipy import spatial as sp
-
 
 class EntitySelector(object):
     """This serves as a generic container for entities. We always want to
@@ -211,7 +209,9 @@ class AtomProxy(col.MutableMapping):
 
 class CoordinateTree(object):
     """This is a simple wrapper around scipy's KDTree to return components
-    instead of just indexes in a list.
+    instead of just indexes in a list. The pairs_array and neighbor_arrays
+    methods give the same results as index and distance arrays, without
+    making a Python object for each pair.
     """
 
     def __init__(self, generator):
@@ -226,12 +226,113 @@ class CoordinateTree(object):
         self._residues = []
         coordinates = []
         self.tree = None
+
+        # entities holds each residue once; owner maps each point to it
+        self.entities = []
+        owner = []
+        positions = {}
         for residue, coordinate in generator:
             if len(coordinate) > 0:
                 coordinates.append(coordinate)
                 self._residues.append(residue)
+                key = id(residue)
+                if key not in positions:
+                    positions[key] = len(self.entities)
+                    self.entities.append(residue)
+                owner.append(positions[key])
+        self.owner = np.array(owner, dtype=np.int64)
+        self.coordinates = np.array(coordinates, dtype=float).reshape(-1, 3)
         if coordinates:
-            self.tree = sp.cKDTree(coordinates)
+            # scipy takes longer to import than most annotations take to
+            # run, so only import it when a tree is actually built
+            from scipy import spatial as sp
+            self.tree = sp.cKDTree(self.coordinates)
+
+    def __unique_arrays__(self, first, second, distance):
+        """Reduce pairs of points to pairs of entities, keeping the shortest
+        distance for each pair, sorted by first and then second entity.
+        """
+
+        order = np.lexsort((distance, second, first))
+        first = first[order]
+        second = second[order]
+        distance = distance[order]
+        keep = np.ones(len(first), dtype=bool)
+        keep[1:] = (first[1:] != first[:-1]) | (second[1:] != second[:-1])
+        return first[keep], second[keep], distance[keep]
+
+    def pair_arrays(self, distance, unique=False):
+        """Find all pairs of points in this tree which are within the given
+        distance cutoff, as arrays.
+
+        :param float distance: The cutoff.
+        :param bool unique: Give each pair of entities once, with the
+        shortest distance between their points, instead of each pair of points.
+        :returns: Arrays first, second and distance. first and second are
+        positions in self.entities.
+        """
+
+        if not self.tree:
+            empty = np.zeros(0, dtype=np.int64)
+            return empty, empty, np.zeros(0)
+
+        pairs = self.tree.query_pairs(distance, output_type='ndarray')
+        i = pairs[:, 0]
+        j = pairs[:, 1]
+        lengths = np.linalg.norm(self.coordinates[i] - self.coordinates[j], axis=1)
+        first = self.owner[i]
+        second = self.owner[j]
+        if unique:
+            # pairs of entities are unordered here, so put the lower first
+            different = first != second
+            first, second = np.minimum(first, second), np.maximum(first, second)
+            return self.__unique_arrays__(first[different], second[different], lengths[different])
+        return first, second, lengths
+
+    def neighbor_arrays(self, other, distance, unique=False):
+        """Find all pairs of points within the given distance cutoff between
+        this tree and another one, as arrays.
+
+        :param CoordinateTree other: The other tree.
+        :param float distance: The cutoff.
+        :param bool unique: Give each pair of entities once, with the
+        shortest distance between their points, instead of each pair of points.
+        :returns: Arrays first and second of positions in self.entities and
+        other.entities, and the distances.
+        """
+
+        if not self.tree or not other.tree:
+            empty = np.zeros(0, dtype=np.int64)
+            return empty, empty, np.zeros(0)
+
+        found = self.tree.sparse_distance_matrix(other.tree, distance, output_type='ndarray')
+        first = self.owner[found['i']]
+        second = other.owner[found['j']]
+        lengths = found['v']
+        if unique:
+            return self.__unique_arrays__(first, second, lengths)
+        return first, second, lengths
+
+    def neighbors_within(self, other, distances, unique=True):
+        """Find neighbors between this tree and another one for several
+        cutoffs with a single query at the largest cutoff.
+
+        :param CoordinateTree other: The other tree.
+        :param list distances: The cutoffs.
+        :param bool unique: As for neighbor_arrays.
+        :returns: A list with the (first, second, distance) arrays for each
+        cutoff, in the order given.
+        """
+
+        distances = list(distances)
+        if not distances:
+            return []
+        first, second, lengths = self.neighbor_arrays(other, max(distances), unique=unique)
+        found = []
+        for cutoff in distances:
+            keep = lengths <= cutoff
+            found.append((first[keep], second[keep], lengths[keep]))
+        return found
 
     def count_neighbors(self, other, r, *p):
         """Return the counts of neighbors in the other tree. Arguments are as
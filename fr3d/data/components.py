@@ -158,6 +158,14 @@ class Component(EntitySelector):
         # do not routinely add hydrogen atoms to amino acids
         # self.infer_amino_acid_hydrogens()
 
+        self.define_centers()
+
+    def define_centers(self):
+        """Set up the centers of this component from its atoms, including
+        inferred hydrogens. Centers are computed when first used and then
+        kept, so call this again after moving the atoms.
+        """
+
         # initialize centers again to include hydrogens
         self.centers = AtomProxy(self._atoms)
 
@@ -15,6 +15,7 @@
     # modified_base_atom_list['PSU']: list of names of all atoms in PSU
 
 from fr3d import definitions as defs
+from fr3d.table_cache import load_table
 import os
 import sys
 
@@ -79,8 +80,16 @@ def create_modified_nucleotide_to_parent_mappings():
 
     return modified_base_to_hydrogens, modified_atom_to_parent, parent_atom_to_modified, modified_base_to_parent, modified_base_atom_list,  modified_base_to_hydrogens_coordinates
 
+def load_modified_nucleotide_to_parent_mappings():
+    # parsing atom_mappings.txt is slow, so load the dictionaries from the
+    # table cache when it is turned on; it is rebuilt when the mapping file
+    # or definitions change
+    current_path,current_program = os.path.split(os.path.abspath(__file__))
+    sources = [os.path.join(current_path,"atom_mappings.txt"), os.path.abspath(defs.__file__)]
+    return load_table("atom_mappings", sources, create_modified_nucleotide_to_parent_mappings)
+
 try:
-    modified_base_to_hydrogens, modified_atom_to_parent, parent_atom_to_modified, modified_base_to_parent, modified_base_atom_list,  modified_base_to_hydrogens_coordinates = create_modified_nucleotide_to_parent_mappings()
+    modified_base_to_hydrogens, modified_atom_to_parent, parent_atom_to_modified, modified_base_to_parent, modified_base_atom_list,  modified_base_to_hydrogens_coordinates = load_modified_nucleotide_to_parent_mappings()
     # print("Modified nucleotide mappings read successfully.")
 except Exception as e:
     print("mapping.py is unable to load mappings for modified nucleotides.")
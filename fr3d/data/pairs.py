@@ -4,6 +4,8 @@
 import itertools as it
 import sys
 
+import numpy as np
+
 if sys.version_info[0] < 3:
     from itertools import ifilter as filter    # old name
 #else:
@@ -80,6 +82,61 @@ class Pairs(object):
             if second_atoms is None:
                 self._distance['second_atoms'] = '*'
 
+    def __trees__(self):
+        """Get the coordinate trees for the first and second residues. The
+        structure keeps the trees, so iterating again, or over other Pairs of
+        the same structure with the same selections, does not rebuild them.
+        """
+
+        if 'cutoff' not in self._distance:
+            raise ValueError("Cannot filter by distance without cutoff")
+
+        if self._distance.get('use') == 'atoms':
+            # Create trees for the first and second residues and then query
+            # to for unique residues within the distance cutoff.
+            a1 = {}
+            if 'first_atoms' in self._distance:
+                a1 = {'name': self._distance['first_atoms']}
+
+            a2 = {}
+            if 'second_atoms' in self._distance:
+                a2 = {'name': self._distance['second_atoms']}
+            tree1 = self.structure.atom_distances(residues=self._first,
+                                                  atoms=a1)
+            tree2 = self.structure.atom_distances(residues=self._second,
+                                                  atoms=a2)
+        else:
+            # Create trees for the first and second atoms in the specified
+            # residues and then query to for points within the distance
+            # cutoff.
+            first_atoms = self._distance.get('first_atoms', None)
+            tree1 = self.structure.distances(atoms=first_atoms,
+                                             **self._first)
+
+            second_atoms = self._distance.get('second_atoms', None)
+            tree2 = self.structure.distances(atoms=second_atoms,
+                                             **self._second)
+        return tree1, tree2
+
+    def arrays(self):
+        """Find the pairs within the distance cutoff as arrays instead of
+        pairs of components.
+
+        :returns: A tuple (first_residues, second_residues, first, second,
+        distance), where first and second are arrays of positions in the
+        lists of residues and distance is the shortest distance found between
+        each pair, sorted by first and then second.
+        """
+
+        tree1, tree2 = self.__trees__()
+        first, second, distance = tree1.neighbor_arrays(tree2, self._distance['cutoff'], unique=True)
+
+        # Exclude pairs of 1 component
+        ids1 = np.array([r.unit_id() for r in tree1.entities], dtype=object)
+        ids2 = np.array([r.unit_id() for r in tree2.entities], dtype=object)
+        keep = ids1[first] != ids2[second]
+        return tree1.entities, tree2.entities, first[keep], second[keep], distance[keep]
+
     def __iter__(self):
         """Create the iterator.
 
@@ -92,42 +149,14 @@ class Pairs(object):
         """
 
         if self._distance:
-            if 'cutoff' not in self._distance:
-                raise ValueError("Cannot filter by distance without cutoff")
-
-            cutoff = self._distance['cutoff']
-            if self._distance.get('use') == 'atoms':
-                # Create trees for the first and second residues and then query
-                # to for unique residues within the distance cutoff.
-                a1 = {}
-                if 'first_atoms' in self._distance:
-                    a1 = {'name': self._distance['first_atoms']}
-
-                a2 = {}
-                if 'second_atoms' in self._distance:
-                    a2 = {'name': self._distance['second_atoms']}
-                tree1 = self.structure.atom_distances(residues=self._first,
-                                                      atoms=a1)
-                tree2 = self.structure.atom_distances(residues=self._second,
-                                                      atoms=a2)
-            else:
-                # Create trees for the first and second atoms in the specified
-                # residues and then query to for points within the distance
-                # cutoff.
-                first_atoms = self._distance.get('first_atoms', None)
-                tree1 = self.structure.distances(atoms=first_atoms,
-                                                 **self._first)
-
-                second_atoms = self._distance.get('second_atoms', None)
-                tree2 = self.structure.distances(atoms=second_atoms,
-                                                 **self._second)
-            pairs = tree1.neighbors(tree2, cutoff, unique=True)
-        else:
-            # Lazily compute all possible pairs
-            pairs = it.product(self.structure.residues(**self._first),
-                               self.structure.residues(**self._second))
+            residues1, residues2, first, second, _ = self.arrays()
+            return ((residues1[i], residues2[j]) for i, j in zip(first.tolist(), second.tolist()))
+
+        # Lazily compute all possible pairs
+        pairs = it.product(self.structure.residues(**self._first),
+                           self.structure.residues(**self._second))
 
         # Exclude pairs of 1 component
-        pairs = filter(lambda a, b: a != b, pairs)
+        pairs = filter(lambda pair: pair[0] != pair[1], pairs)
 
         return pairs
@@ -3,6 +3,7 @@ represent an entire structure or selected parts of it.
 """
 
 import itertools as it
+from collections import OrderedDict
 
 from fr3d.data.base import EntitySelector
 from fr3d.data.base import CoordinateTree
@@ -10,13 +11,62 @@ from fr3d.data.pairs import Pairs
 from fr3d.unit_ids import encode
 
 
+class ResidueList(list):
+    """A list of residues that counts changes to itself, so that a Structure
+    can tell when the indexes it keeps over the residues are out of date.
+    """
+
+    def __init__(self, *args):
+        super(ResidueList, self).__init__(*args)
+        self.version = 0
+
+    def _changed(method):
+        def fn(self, *args, **kwargs):
+            self.version += 1
+            return method(self, *args, **kwargs)
+        fn.__name__ = method.__name__
+        return fn
+
+    append = _changed(list.append)
+    extend = _changed(list.extend)
+    insert = _changed(list.insert)
+    pop = _changed(list.pop)
+    remove = _changed(list.remove)
+    reverse = _changed(list.reverse)
+    sort = _changed(list.sort)
+    __setitem__ = _changed(list.__setitem__)
+    __delitem__ = _changed(list.__delitem__)
+    __iadd__ = _changed(list.__iadd__)
+    __imul__ = _changed(list.__imul__)
+    if hasattr(list, 'clear'):
+        clear = _changed(list.clear)
+    if hasattr(list, '__setslice__'):
+        __setslice__ = _changed(list.__setslice__)
+        __delslice__ = _changed(list.__delslice__)
+
+    del _changed
+
+
 class Structure(object):
     """This is a container for a group of residues in a structure. It can serve
     to contain a whole structure with several models and chains or can be
     filtered down to only have selected subsets. It provides useful utility
     methods for grouping and dealing with a collection of components.
+
+    Selecting residues by unit id, chain, model, sequence, type and the other
+    attributes in INDEXED uses hash indexes over the residues, built the
+    first time each attribute is used, so repeated selections take time
+    proportional to the number of residues found rather than the size of the
+    structure. The indexes are rebuilt when the list of residues changes;
+    call reindex() after changing these attributes of a residue in place.
     """
 
+    INDEXED = ('unit_id', 'chain', 'model', 'sequence', 'type', 'polymeric',
+               'symmetry', 'number', 'insertion_code', 'alt_id')
+
+    # coordinate trees kept for reuse, least recently used dropped first
+    MAX_TREES = 8
+
     def __init__(self, residues, pdb=None, model=None, chain=None,
                  symmetry=None, breaks=None, operators=None):
 
@@ -41,9 +91,82 @@ class Structure(object):
         self._known_names = set([op['name'] for op in values])
         self._sequence = None
 
+    @property
+    def _residues(self):
+        return self.__residues
+
+    @_residues.setter
+    def _residues(self, residues):
+        if not isinstance(residues, ResidueList):
+            residues = ResidueList(residues)
+        self.__residues = residues
+        self.reindex()
+
+    def reindex(self):
+        """Discard the indexes and coordinate trees over the residues. They are
+        rebuilt as needed. Call this after moving atoms of the residues.
+        """
+
+        self._indexes = {}
+        self._trees = OrderedDict()
+        self._indexed_version = self.__residues.version
+
+    def _index(self, key):
+        """Get the index for one attribute of the residues, a dictionary from
+        each value of the attribute to the positions of the residues with
+        that value, in order, and the list of the value for each residue.
+        """
+
+        if self._indexed_version != self.__residues.version:
+            self.reindex()
+
+        if key not in self._indexes:
+            values = []
+            positions = {}
+            for position, residue in enumerate(self.__residues):
+                attr = getattr(residue, key, None)
+                if callable(attr):
+                    attr = attr()
+                values.append(attr)
+                try:
+                    positions.setdefault(attr, []).append(position)
+                except TypeError:
+                    # unhashable values cannot equal the hashable values looked up
+                    pass
+            self._indexes[key] = (positions, values)
+        return self._indexes[key]
+
+    def _indexed_positions(self, criteria):
+        """Find the positions of the residues that match all of the given
+        indexed criteria. The criteria with the fewest candidates give the
+        positions to check, the others are checked against the stored values.
+        """
+
+        candidates = []
+        for key, value in criteria:
+            positions, values = self._index(key)
+            if isinstance(value, (list, set, tuple)):
+                value = set(value)
+                found = []
+                for val in value:
+                    found.extend(positions.get(val, []))
+                if len(value) > 1:
+                    found.sort()
+            else:
+                value = set([value])
+                found = positions.get(next(iter(value)), [])
+            candidates.append((len(found), found, value, values))
+
+        candidates.sort(key=lambda candidate: candidate[0])
+        found = candidates[0][1]
+        for _, _, value, values in candidates[1:]:
+            found = [position for position in found if values[position] in value]
+        return found
+
     def residues(self, **kwargs):
         """Get residues from this structure. The keyword arguments work as
-        described by EntitySelector.
+        described by EntitySelector. Keywords in INDEXED with a hashable value
+        or a list, set or tuple of hashable values are answered from indexes.
 
         :kwargs: Keywords for filtering and ordering
         :returns: The requested residues.
@@ -53,7 +176,29 @@ class Structure(object):
         if kwargs.get('polymeric', False) is None:
             kwargs.pop('polymeric')
 
-        return EntitySelector(self._residues, **kwargs)
+        criteria = []
+        for key in self.INDEXED:
+            if key in kwargs and self._can_index(kwargs[key]):
+                criteria.append((key, kwargs.pop(key)))
+
+        if not criteria:
+            return EntitySelector(self.__residues, **kwargs)
+
+        residues = self.__residues
+        found = [residues[position] for position in self._indexed_positions(criteria)]
+        return EntitySelector(found, **kwargs)
+
+    @staticmethod
+    def _can_index(value):
+        values = value if isinstance(value, (list, set, tuple)) else [value]
+        for val in values:
+            if callable(val):
+                return False
+            try:
+                hash(val)
+            except TypeError:
+                return False
+        return True
 
     def calculate_rotation_matrix(self):
         """ Calculate rotation matrix for bases, modified bases, ...
@@ -152,6 +297,46 @@ class Structure(object):
             self._sequence = [r.sequence for r in self.residues()]
         return self._sequence
 
+    @staticmethod
+    def _tree_key(*parts):
+        """A hashable key for the arguments used to build a coordinate tree,
+        or None if they cannot be used as a key. Selectors that are functions
+        are not used as keys, since a new lambda in every call would add a
+        new tree every time.
+        """
+
+        def freeze(value):
+            if isinstance(value, dict):
+                return tuple(sorted((k, freeze(v)) for k, v in value.items()))
+            if isinstance(value, (list, tuple)):
+                return tuple(freeze(v) for v in value)
+            if isinstance(value, (set, frozenset, type({}.keys()))):
+                return frozenset(freeze(v) for v in value)
+            if callable(value):
+                raise TypeError("functions are not cached")
+            hash(value)
+            return value
+
+        try:
+            return freeze(parts)
+        except TypeError:
+            return None
+
+    def _cached_tree(self, key, build):
+        if self._indexed_version != self._residues.version:
+            self.reindex()
+        if key is None:
+            return build()
+        if key in self._trees:
+            tree = self._trees.pop(key)
+        else:
+            tree = build()
+        # most recently used last; the oldest tree is dropped first
+        self._trees[key] = tree
+        while len(self._trees) > self.MAX_TREES:
+            del self._trees[next(iter(self._trees))]
+        return tree
+
     def distances(self, atoms=None, **kwargs):
         """Create a coordinate tree for the selected residues. Residues are
         selected using the argumetns from kwargs as for the residues method.
@@ -162,7 +347,7 @@ class Structure(object):
         :param dict atoms: The center to use. If none is given the defaults are
         used.
         :param dict kwargs: The filter to use.
-        :returns: A coordinate tree.
+        :returns: A coordinate tree, shared by calls with the same arguments.
         """
 
         def fn():
@@ -185,7 +370,9 @@ class Structure(object):
 #                    print("fr3d-python structures.py residue %s has no centers" % residue.unit_id())
 #                    print(residue.centers['*'])
                     yield residue, residue.centers['*']
-        return CoordinateTree(fn())
+
+        key = self._tree_key('distances', atoms, kwargs)
+        return self._cached_tree(key, lambda: CoordinateTree(fn()))
 
     def atom_distances(self, residues={}, atoms={}):
         """Create a tree for the atom distances. This will filter the residues
@@ -196,14 +383,16 @@ class Structure(object):
 
         :param dict atoms: A filter for the atoms to select
         :param dict residues: The filter for the residues to select.
-        :returns: A coordinate tree.
+        :returns: A coordinate tree, shared by calls with the same arguments.
         """
 
         def fn():
             for residue in self.residues(**residues):
                 for atom in residue.atoms(**atoms):
                     yield residue, atom.coordinates()
-        return CoordinateTree(fn())
+
+        key = self._tree_key('atom_distances', residues, atoms)
+        return self._cached_tree(key, lambda: CoordinateTree(fn()))
 
     def __len__(self):
         """Compute the length of this Structure. That is the number of residues
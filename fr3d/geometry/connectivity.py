@@ -0,0 +1,150 @@
+"""
+Covalent backbone connectivity of nucleotides, as integer arrays.
+
+The O3' and P coordinates of all nucleotides are gathered into arrays and
+every O3'-P bond is found with one KD-tree query, whatever chain, symmetry
+operator or kind of nucleotide the two atoms belong to.  Links are returned
+as arrays of indices into the list of nucleotides, so the rest of the
+annotation can look up the nucleotide before or after any other one
+without comparing unit ids.
+
+    links = backbone_links(nucleotides)
+    previous = previous_nucleotide(len(nucleotides), links)
+"""
+
+import numpy as np
+
+from fr3d.data.mapping import parent_atom_to_modified
+
+# longest O3'-P distance accepted as a covalent bond; the bond is about 1.6
+MAX_O3P_BOND = 2.0
+
+
+def atom_coordinates(nucleotides, atom_name):
+    """
+    n by 3 array of the coordinates of the named atom in each nucleotide,
+    using the corresponding atom of modified nucleotides, NaN if missing.
+    """
+
+    coordinates = np.full((len(nucleotides), 3), np.nan)
+    for i, nt in enumerate(nucleotides):
+        name = parent_atom_to_modified.get(nt.sequence, {}).get(atom_name, atom_name)
+        for atom in nt.atoms():
+            if atom.name == name:
+                center = atom.coordinates()
+                if len(center) == 3:
+                    coordinates[i] = center
+                break
+    return coordinates
+
+
+def backbone_links(nucleotides, max_distance=MAX_O3P_BOND, O3=None, P=None):
+    """
+    All O3'-P bonds between nucleotides of the same model.  Returns arrays
+    first, second and distance, where the O3' atom of nucleotides[first]
+    is bonded to the P atom of nucleotides[second], sorted by first.
+    O3 and P can be given when the coordinates are already gathered.
+    """
+
+    nucleotides = list(nucleotides)
+    if O3 is None:
+        O3 = atom_coordinates(nucleotides, "O3'")
+    if P is None:
+        P = atom_coordinates(nucleotides, "P")
+
+    has_O3 = np.nonzero(~np.isnan(O3[:, 0]))[0]
+    has_P = np.nonzero(~np.isnan(P[:, 0]))[0]
+
+    if len(has_O3) == 0 or len(has_P) == 0:
+        empty = np.zeros(0, dtype=np.int64)
+        return empty, empty, np.zeros(0)
+
+    from scipy.spatial import cKDTree
+
+    pairs = cKDTree(O3[has_O3]).sparse_distance_matrix(cKDTree(P[has_P]), max_distance, output_type="ndarray")
+    first = has_O3[pairs["i"]]
+    second = has_P[pairs["j"]]
+    distance = pairs["v"]
+
+    # models can be numbers or strings; compare them as integer codes
+    model_code = {}
+    model = np.array([model_code.setdefault(nt.model, len(model_code)) for nt in nucleotides], dtype=np.int64)
+    keep = (model[first] == model[second]) & (first != second)
+
+    first = first[keep]
+    second = second[keep]
+    distance = distance[keep]
+
+    order = np.lexsort((second, first))
+    return first[order], second[order], distance[order]
+
+
+def previous_nucleotide(n, links):
+    """
+    For each of n nucleotides, the index of the nucleotide whose O3' is
+    bonded to its P, or -1.  When there are several, the closest is used.
+    """
+
+    first, second, distance = links
+    previous = np.full(n, -1, dtype=np.int64)
+
+    # assign the farthest first so that the closest is the one that remains
+    order = np.argsort(-distance, kind="stable")
+    previous[second[order]] = first[order]
+    return previous
+
+
+def next_nucleotide(n, links):
+    """
+    For each of n nucleotides, the index of the nucleotide whose P is
+    bonded to its O3', or -1.  When there are several, the closest is used.
+    """
+
+    first, second, distance = links
+    following = np.full(n, -1, dtype=np.int64)
+
+    order = np.argsort(-distance, kind="stable")
+    following[first[order]] = second[order]
+    return following
+
+
+def successive_nucleotides(nucleotides):
+    """
+    Pairs of nucleotides that follow one another among the observed
+    nucleotides of each model, symmetry operator and chain, in order of
+    index.  Nucleotides with the same index, such as alternate locations,
+    are each paired with all nucleotides at the next observed index.
+    Returns arrays first, second and the difference in index between them.
+    """
+
+    nucleotides = list(nucleotides)
+    if not nucleotides:
+        empty = np.zeros(0, dtype=np.int64)
+        return empty, empty, empty
+
+    group_code = {}
+    group = np.array([group_code.setdefault((nt.model, nt.symmetry, nt.chain), len(group_code))
+                      for nt in nucleotides], dtype=np.int64)
+    nt_index = np.array([nt.index for nt in nucleotides], dtype=np.int64)
+
+    order = np.lexsort((nt_index, group))
+    group = group[order]
+    index = nt_index[order]
+
+    # runs of nucleotides with the same group and index
+    new_run = np.ones(len(order), dtype=bool)
+    new_run[1:] = (group[1:] != group[:-1]) | (index[1:] != index[:-1])
+    starts = np.nonzero(new_run)[0]
+    ends = np.append(starts[1:], len(order))
+
+    first = []
+    second = []
+    for r in np.nonzero(group[starts[1:]] == group[starts[:-1]])[0].tolist():
+        for a in order[starts[r]:ends[r]].tolist():
+            for b in order[starts[r+1]:ends[r+1]].tolist():
+                first.append(a)
+                second.append(b)
+
+    first = np.array(first, dtype=np.int64)
+    second = np.array(second, dtype=np.int64)
+    return first, second, nt_index[second] - nt_index[first]
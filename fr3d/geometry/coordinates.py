@@ -0,0 +1,36 @@
+"""
+Coordinates of named atoms of many residues, gathered into one array.
+
+Code that works on arrays of coordinates, such as the torsion angles and
+the batched classifiers, starts by collecting the atoms it needs from
+each residue; gather_coordinates does that in one pass over the atoms of
+each residue, with NaN where an atom is missing.
+"""
+
+import numpy as np
+
+
+def gather_coordinates(residues, atom_names):
+    """
+    For each residue, the coordinates of the atom named in the same row of
+    atom_names, which is a list with one tuple of names per residue.
+    Several atoms with the same name, such as the observed and inferred
+    base atoms of modified nucleotides, are averaged, as residue.centers
+    does.  Returns an array of shape (residues, names, 3) with NaN for
+    missing atoms.
+    """
+
+    width = max([len(names) for names in atom_names] + [0])
+    coordinates = np.full((len(atom_names), width, 3), np.nan)
+
+    for i, (residue, names) in enumerate(zip(residues, atom_names)):
+        # one pass over the atoms instead of one lookup per name
+        positions = {}
+        for atom in residue.atoms():
+            if atom.name in names:
+                positions.setdefault(atom.name, []).append(atom.coordinates())
+        for j, name in enumerate(names):
+            if name in positions:
+                coordinates[i, j] = np.mean(positions[name], axis=0)
+
+    return coordinates
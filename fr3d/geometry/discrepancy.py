@@ -3,6 +3,7 @@
 import numpy as np
 from fr3d.geometry.angleofrotation import angle_of_rotation
 from fr3d.geometry.superpositions import besttransformation
+from fr3d.geometry.superpositions import besttransformation_batch
 from fr3d.geometry.superpositions import besttransformation_weighted
 
 class MissingBaseException(Exception):
@@ -187,50 +188,14 @@ def matrix_discrepancy(centers1, rotations1, centers2, rotations2,
     if not angle_weight:
         angle_weight = 1.0
 
-    if not center_weight:
-        center_weight = [1.0] * n
-
-    if n > 2:
-        rotation_matrix, new1, mean1, RMSD, sse = \
-            besttransformation_weighted(centers1, centers2, center_weight)
-
-        orientation_error = 0
-        angles = []
-        for r1, r2 in zip(rotations1, rotations2):
-            if r1.shape[0] > 0 and r2.shape[0] > 0:
-                angle = angle_of_rotation(np.dot(np.dot(rotation_matrix, r2),
-                                                 np.transpose(r1)))
-                orientation_error += np.square(angle)
-        discrepancy = np.sqrt(sse + angle_weight * orientation_error) / n
-
-    else:
-
-        R1 = np.dot(np.transpose(rotations1[1]),rotations1[0])  # rotation from nt 0 to nt1 of 1st motif
-        R2 = np.dot(np.transpose(rotations2[0]),rotations2[1])  # rotation from nt 0 to nt1 of 2nd motif
-
-        rot1 = np.dot(R1,R2)
-        ang1 = angle_of_rotation(rot1)
-
-        rot2 = np.dot(np.transpose(R1),np.transpose(R2))
-        ang2 = angle_of_rotation(rot2)
-
-        T1 = np.dot(centers1[1] - centers1[0],rotations1[0])
-        T2 = np.dot(centers1[0] - centers1[1],rotations1[1])
-
-        S1 = np.dot(centers2[1] - centers2[0],rotations2[0])
-        S2 = np.dot(centers2[0] - centers2[1],rotations2[1])
-
-        D1 = T1-S1
-        D2 = T2-S2
-
-        discrepancy  = np.sqrt(D1[0]**2 + D1[1]**2 + D1[2]**2 + (angle_weight*ang1)**2)
-        discrepancy += np.sqrt(D2[0]**2 + D2[1]**2 + D2[2]**2 + (angle_weight*ang2)**2)
-
-#        factor = 1/(4*np.sqrt(2))    # factor to multiply by discrepancy; faster to precompute?
-
-        discrepancy  = discrepancy * 0.17677669529663687
-
-    return discrepancy
+    centers, rotations, valid = stack_centers_rotations([centers1, centers2],
+                                                        [rotations1, rotations2])
+    d = matrix_discrepancy_batch(centers[:1], rotations[:1],
+                                 centers[1:], rotations[1:],
+                                 valid[:1], valid[1:],
+                                 angle_weight=angle_weight,
+                                 center_weight=center_weight)
+    return d[0]
 
 def matrix_discrepancy_cutoff(centers1, rotations1, centers2, rotations2, cutoff,
                        angle_weight=None, center_weight=None):
@@ -258,56 +223,360 @@ def matrix_discrepancy_cutoff(centers1, rotations1, centers2, rotations2, cutoff
     if not angle_weight:
         angle_weight = [1] * n
 
-    if not center_weight:
-        center_weight = [1] * n
+    centers, rotations, valid = stack_centers_rotations([centers1, centers2],
+                                                        [rotations1, rotations2])
 
     if n > 2:
-        # solve np.sqrt(sse + orientation_error) / n > cutoff to give sse + orientation_error > (n*cutoff)**2
-        temp_cutoff = (n * cutoff)**2
+        # the angles are not weighted for more than two nucleotides
+        d = matrix_discrepancy_batch(centers[:1], rotations[:1],
+                                     centers[1:], rotations[1:],
+                                     valid[:1], valid[1:],
+                                     center_weight=center_weight,
+                                     cutoff=cutoff)
+        if np.isinf(d[0]):
+            return None
+    else:
+        # two nucleotides are not screened by the cutoff
+        d = matrix_discrepancy_batch(centers[:1], rotations[:1],
+                                     centers[1:], rotations[1:],
+                                     angle_weight=angle_weight[0])
+    return d[0]
+
+
+def stack_centers_rotations(centers_list, rotations_list):
+    """Stack the centers and rotation matrices of many instances of the same
+    size into arrays, so that discrepancies can be computed in batches.
+    Missing rotation matrices (None or empty, as for amino acids) are replaced
+    by the identity and flagged as invalid so they do not contribute to the
+    orientation error.
+
+    :param list centers_list: K lists of n centers each.
+    :param list rotations_list: K lists of n rotation matrices each.
+    :returns: centers of shape (K, n, 3), rotations of shape (K, n, 3, 3) and
+    a boolean array of shape (K, n) telling which rotations are present.
+    """
 
-        rotation_matrix, new1, mean1, RMSD, sse = \
-            besttransformation_weighted(centers1, centers2, center_weight)
+    K = len(centers_list)
+    n = len(centers_list[0]) if K > 0 else 0
 
-        total_error = sse
-        if total_error > temp_cutoff:
-            return None
+    centers = np.zeros((K, n, 3))
+    rotations = np.zeros((K, n, 3, 3))
+    rotations[:, :] = np.identity(3)
+    valid = np.zeros((K, n), dtype=bool)
+
+    for k in range(K):
+        centers[k] = np.asarray(centers_list[k], dtype=float).reshape(n, 3)
+        for m, r in enumerate(rotations_list[k]):
+            if r is not None and np.shape(r) == (3, 3):
+                rotations[k, m] = r
+                valid[k, m] = True
+
+    return centers, rotations, valid
+
+
+def _rotation_angles(traces):
+    """Angles of rotation matrices given their traces, as in
+    angle_of_rotation.
+    """
+    return np.arccos(np.clip((traces - 1.0) / 2.0, -1, 1))
+
+
+def _superposition_batch(centers1, centers2, center_weight=None):
+    """Best rotations superimposing K pairs of instances, as
+    besttransformation_weighted does for one pair, and the sum of squared
+    errors after superposition.
+
+    :returns: Rotations U of shape (K, 3, 3) and an array of K errors.
+    """
+
+    U, mean1, mean2 = besttransformation_batch(centers1, centers2, center_weight)
+    dev1 = centers1 - mean1[:, np.newaxis, :]
+    dev2 = centers2 - mean2[:, np.newaxis, :]
+
+    new1 = np.matmul(dev1, U)
+    sse = np.sum(np.square(new1 - dev2), axis=(1, 2))
+    return U, sse
+
+
+def matrix_discrepancy_batch(centers1, rotations1, centers2, rotations2,
+                             valid1=None, valid2=None, angle_weight=1.0,
+                             center_weight=None, cutoff=None):
+    """Compute the discrepancies of K pairs of instances at once. This is the
+    vectorized form of matrix_discrepancy; instance k of the first arrays is
+    compared to instance k of the second arrays.
+
+    :param array centers1: Centers of shape (K, n, 3).
+    :param array rotations1: Rotation matrices of shape (K, n, 3, 3).
+    :param array centers2: Centers of shape (K, n, 3).
+    :param array rotations2: Rotation matrices of shape (K, n, 3, 3).
+    :param array valid1: Optional (K, n) mask of rotations that are present.
+    :param array valid2: Optional (K, n) mask of rotations that are present.
+    :param float angle_weight: The weight to give to the angle component.
+    :param list center_weight: Optional weight of each center in the
+    superposition, as for besttransformation_weighted.
+    :param float cutoff: Optional cutoff; discrepancies above it are returned
+    as infinity, and for more than two nucleotides the orientation error is
+    only computed for pairs whose centers alone are within the cutoff.
+    :returns: An array of K discrepancies.
+    """
 
-        angles = []
-        for r1, r2 in zip(rotations1, rotations2):
-            if r1.shape[0] > 0 and r2.shape[0] > 0:
-                angle = angle_of_rotation(np.dot(np.dot(rotation_matrix, r2),
-                                                 np.transpose(r1)))
-                total_error += np.square(angle)
-                if total_error > temp_cutoff:
-                    return None
+    centers1 = np.asarray(centers1, dtype=float)
+    centers2 = np.asarray(centers2, dtype=float)
+    rotations1 = np.asarray(rotations1, dtype=float)
+    rotations2 = np.asarray(rotations2, dtype=float)
 
-        discrepancy = np.sqrt(total_error) / n
+    K, n = centers1.shape[0:2]
+
+    assert centers2.shape == centers1.shape
+    assert rotations1.shape == (K, n, 3, 3)
+    assert rotations2.shape == (K, n, 3, 3)
+    assert n >= 2
+
+    if n > 2:
+        U, sse = _superposition_batch(centers1, centers2, center_weight)
+
+        discrepancy = np.full(K, np.inf)
+        if cutoff is None:
+            keep = np.arange(K)
+        else:
+            # same test as matrix_discrepancy_cutoff, without taking roots
+            limit = (n * cutoff)**2
+            keep = np.nonzero(sse <= limit)[0]
+
+        # trace of U * r2 * r1' for each nucleotide
+        M = np.einsum('kab,knbc->knac', U[keep], rotations2[keep])
+        angles = _rotation_angles(np.sum(M * rotations1[keep], axis=(2, 3)))
+        if valid1 is not None:
+            angles = np.where(valid1[keep], angles, 0.0)
+        if valid2 is not None:
+            angles = np.where(valid2[keep], angles, 0.0)
+        total = sse[keep] + angle_weight * np.sum(np.square(angles), axis=1)
+
+        if cutoff is not None:
+            within = total <= limit
+            keep = keep[within]
+            total = total[within]
+
+        discrepancy[keep] = np.sqrt(total) / n
+        return discrepancy
 
     else:
+        r10, r11 = rotations1[:, 0], rotations1[:, 1]
+        r20, r21 = rotations2[:, 0], rotations2[:, 1]
 
-        R1 = np.dot(np.transpose(rotations1[1]),rotations1[0])  # rotation from nt 0 to nt1 of 1st motif
-        R2 = np.dot(np.transpose(rotations2[0]),rotations2[1])  # rotation from nt 0 to nt1 of 2nd motif
+        R1 = np.matmul(np.transpose(r11, (0, 2, 1)), r10)
+        R2 = np.matmul(np.transpose(r20, (0, 2, 1)), r21)
 
-        rot1 = np.dot(R1,R2)                                    #
-        ang1 = angle_of_rotation(rot1)
+        # trace(R1 R2) equals trace(R1' R2') so both angles are the same
+        ang = _rotation_angles(np.sum(R1 * np.transpose(R2, (0, 2, 1)),
+                                      axis=(1, 2)))
 
-        rot2 = np.dot(np.transpose(R1),np.transpose(R2))
-        ang2 = angle_of_rotation(rot2)
+        T1 = np.einsum('ki,kij->kj', centers1[:, 1] - centers1[:, 0], r10)
+        T2 = np.einsum('ki,kij->kj', centers1[:, 0] - centers1[:, 1], r11)
+        S1 = np.einsum('ki,kij->kj', centers2[:, 1] - centers2[:, 0], r20)
+        S2 = np.einsum('ki,kij->kj', centers2[:, 0] - centers2[:, 1], r21)
 
-        T1 = np.dot(centers1[1] - centers1[0],rotations1[0])
-        T2 = np.dot(centers1[0] - centers1[1],rotations1[1])
+        angle_term = np.square(angle_weight * ang)
+        discrepancy = np.sqrt(np.sum(np.square(T1 - S1), axis=1) + angle_term)
+        discrepancy += np.sqrt(np.sum(np.square(T2 - S2), axis=1) + angle_term)
+        discrepancy = discrepancy * 0.17677669529663687
 
-        S1 = np.dot(centers2[1] - centers2[0],rotations2[0])
-        S2 = np.dot(centers2[0] - centers2[1],rotations2[1])
+        if cutoff is not None:
+            discrepancy[discrepancy > cutoff] = np.inf
+        return discrepancy
 
-        D1 = T1-S1
-        D2 = T2-S2
 
-        discrepancy  = np.sqrt(D1[0]**2 + D1[1]**2 + D1[2]**2 + (angle_weight[0]*ang1)**2)
-        discrepancy += np.sqrt(D2[0]**2 + D2[1]**2 + D2[2]**2 + (angle_weight[0]*ang2)**2)
+def _as_stacked(centers, rotations, valid):
+    """Stack lists of instances into arrays, as stack_centers_rotations does,
+    unless they are arrays already.
+    """
 
-#        factor = 1/(4*np.sqrt(2))    # factor to multiply by discrepancy; faster to precompute?
+    if not isinstance(centers, np.ndarray) or \
+            not isinstance(rotations, np.ndarray):
+        centers, rotations, valid = stack_centers_rotations(centers, rotations)
+    if valid is None:
+        valid = np.ones(centers.shape[0:2], dtype=bool)
+    return centers, rotations, valid
+
+
+def matrix_discrepancy_one_vs_many(centers, rotations, many_centers,
+                                   many_rotations, valid=None, many_valid=None,
+                                   cutoff=None, angle_weight=1.0,
+                                   center_weight=None, chunk_size=20000):
+    """Compute the discrepancies between one instance, such as a query motif,
+    and each of K instances of the same size. The K instances are compared in
+    chunks of at most chunk_size so memory use stays bounded.
+
+    :param array centers: Centers of the one instance, shape (n, 3).
+    :param array rotations: Its rotation matrices, shape (n, 3, 3), or a list
+    that may contain None for missing rotations.
+    :param array many_centers: Centers of shape (K, n, 3), or a list of K lists.
+    :param array many_rotations: Rotations of shape (K, n, 3, 3), or a list of
+    K lists.
+    :param array valid: Optional (n) mask of rotations that are present.
+    :param array many_valid: Optional (K, n) mask of rotations that are present.
+    :param float cutoff: Optional cutoff, as for matrix_discrepancy_batch.
+    :returns: An array of K discrepancies, infinity above the cutoff.
+    """
 
-        discrepancy  = discrepancy * 0.17677669529663687
+    centers, rotations, valid = _as_stacked([centers], [rotations],
+                                            None if valid is None else np.asarray([valid]))
+    many_centers, many_rotations, many_valid = _as_stacked(many_centers,
+                                                           many_rotations,
+                                                           many_valid)
+
+    K, n = many_centers.shape[0:2]
+    discrepancy = np.full(K, np.inf)
+
+    for first in range(0, K, chunk_size):
+        last = min(first + chunk_size, K)
+        m = last - first
+        discrepancy[first:last] = matrix_discrepancy_batch(
+            np.broadcast_to(centers, (m, n, 3)),
+            np.broadcast_to(rotations, (m, n, 3, 3)),
+            many_centers[first:last], many_rotations[first:last],
+            np.broadcast_to(valid, (m, n)), many_valid[first:last],
+            angle_weight=angle_weight, center_weight=center_weight,
+            cutoff=cutoff)
 
     return discrepancy
+
+
+def matrix_discrepancy_many_vs_many(centers1, rotations1, centers2, rotations2,
+                                    valid1=None, valid2=None, cutoff=None,
+                                    angle_weight=1.0, center_weight=None,
+                                    chunk_size=20000):
+    """Compute the (K1, K2) matrix of discrepancies between each of K1
+    instances and each of K2 instances of the same size, in chunks of about
+    chunk_size pairs.
+
+    :param array centers1: Centers of shape (K1, n, 3), or a list of K1 lists.
+    :param array rotations1: Rotations of shape (K1, n, 3, 3), or list of lists.
+    :param array centers2: Centers of shape (K2, n, 3), or a list of K2 lists.
+    :param array rotations2: Rotations of shape (K2, n, 3, 3), or list of lists.
+    :param array valid1: Optional (K1, n) mask of rotations that are present.
+    :param array valid2: Optional (K2, n) mask of rotations that are present.
+    :param float cutoff: Optional cutoff, as for matrix_discrepancy_batch.
+    :returns: A (K1, K2) numpy array, infinity above the cutoff.
+    """
+
+    centers1, rotations1, valid1 = _as_stacked(centers1, rotations1, valid1)
+    centers2, rotations2, valid2 = _as_stacked(centers2, rotations2, valid2)
+
+    K1 = centers1.shape[0]
+    K2 = centers2.shape[0]
+    matrix = np.full((K1, K2), np.inf)
+    if K1 == 0 or K2 == 0:
+        return matrix
+
+    rows = max(1, chunk_size // K2)
+    for first in range(0, K1, rows):
+        last = min(first + rows, K1)
+        i = np.repeat(np.arange(first, last), K2)
+        j = np.tile(np.arange(K2), last - first)
+        d = matrix_discrepancy_batch(centers1[i], rotations1[i],
+                                     centers2[j], rotations2[j],
+                                     valid1[i], valid2[j],
+                                     angle_weight=angle_weight,
+                                     center_weight=center_weight,
+                                     cutoff=cutoff)
+        matrix[first:last] = d.reshape(last - first, K2)
+
+    return matrix
+
+
+# arrays shared with worker processes by matrix_discrepancy_all_vs_all
+_all_vs_all_data = {}
+
+
+def _all_vs_all_init(centers, rotations, valid):
+    _all_vs_all_data['centers'] = centers
+    _all_vs_all_data['rotations'] = rotations
+    _all_vs_all_data['valid'] = valid
+
+
+def _all_vs_all_rows(rows):
+    """Discrepancies between instances in rows first:last and all later
+    instances. Returns the indices and values of the upper triangle.
+    """
+
+    first, last = rows
+    centers = _all_vs_all_data['centers']
+    rotations = _all_vs_all_data['rotations']
+    valid = _all_vs_all_data['valid']
+    K = centers.shape[0]
+
+    i = np.concatenate([np.full(K - r - 1, r) for r in range(first, last)])
+    j = np.concatenate([np.arange(r + 1, K) for r in range(first, last)])
+
+    d = matrix_discrepancy_batch(centers[i], rotations[i],
+                                 centers[j], rotations[j],
+                                 valid[i], valid[j])
+    return i, j, d
+
+
+def _all_vs_all_chunks(K, chunk_size):
+    """Split rows 0 to K-1 into consecutive blocks whose number of upper
+    triangle pairs is about chunk_size.
+    """
+
+    first = 0
+    count = 0
+    for r in range(K - 1):
+        count += K - r - 1
+        if count >= chunk_size:
+            yield first, r + 1
+            first = r + 1
+            count = 0
+    if first < K - 1:
+        yield first, K - 1
+
+
+def matrix_discrepancy_all_vs_all(centers, rotations, valid=None,
+                                  chunk_size=20000, processes=1):
+    """Compute the symmetric matrix of discrepancies between all pairs of K
+    instances. Work is done in chunks of about chunk_size pairs so memory use
+    stays bounded, and chunks can be spread over several worker processes.
+
+    :param array centers: Centers of shape (K, n, 3), or a list of K lists.
+    :param array rotations: Rotations of shape (K, n, 3, 3), or list of lists.
+    :param array valid: Optional (K, n) mask of rotations that are present.
+    :param int chunk_size: Approximate number of pairs to compute at once.
+    :param int processes: Number of worker processes; None means one per CPU.
+    :returns: A (K, K) numpy array.
+    """
+
+    centers, rotations, valid = _as_stacked(centers, rotations, valid)
+
+    K = centers.shape[0]
+    matrix = np.zeros((K, K))
+    if K < 2:
+        return matrix
+
+    chunks = list(_all_vs_all_chunks(K, chunk_size))
+
+    if processes is None:
+        import multiprocessing
+        processes = multiprocessing.cpu_count()
+
+    if processes > 1 and len(chunks) > 1:
+        import multiprocessing
+        pool = multiprocessing.Pool(min(processes, len(chunks)),
+                                    _all_vs_all_init,
+                                    (centers, rotations, valid))
+        try:
+            for i, j, d in pool.imap_unordered(_all_vs_all_rows, chunks):
+                matrix[i, j] = d
+                matrix[j, i] = d
+        finally:
+            pool.close()
+            pool.join()
+    else:
+        _all_vs_all_init(centers, rotations, valid)
+        for chunk in chunks:
+            i, j, d = _all_vs_all_rows(chunk)
+            matrix[i, j] = d
+            matrix[j, i] = d
+        _all_vs_all_data.clear()
+
+    return matrix
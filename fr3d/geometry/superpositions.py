@@ -89,6 +89,41 @@ def besttransformation(set1, set2):
     return U, new1, mean1, rmsd, sse, mean2
 
 
+def besttransformation_batch(set1, set2, weights=None):
+    """This is besttransformation for K pairs of point sets at once. Row k
+    of set1 is superimposed onto row k of set2; set2 can also be a single
+    (n, 3) set used for every row of set1.
+
+    :set1: A numpy array of shape (K, n, 3).
+    :set2: A numpy array of shape (K, n, 3) or (n, 3).
+    :weights: Optional weights of the n points, as for
+    besttransformation_weighted.
+    :returns: The K rotation matrices as a (K, 3, 3) array, and the
+    (K, 3) means of set1 and set2.
+    """
+
+    set1 = numpy.asarray(set1, dtype=float)
+    set2 = numpy.asarray(set2, dtype=float)
+    if set2.ndim == 2:
+        set2 = numpy.broadcast_to(set2, set1.shape)
+
+    mean1 = set1.mean(axis=1)
+    mean2 = set2.mean(axis=1)
+    dev1 = set1 - mean1[:, numpy.newaxis, :]
+    dev2 = set2 - mean2[:, numpy.newaxis, :]
+    if weights is not None and len(weights) == set1.shape[1]:
+        A = numpy.einsum('kni,n,knj->kij', dev2, numpy.asarray(weights, dtype=float), dev1)
+    else:
+        A = numpy.einsum('kni,knj->kij', dev2, dev1)
+    V, diagS, Wt = numpy.linalg.svd(A)
+    # correct for reflections to keep a right-handed coordinate system
+    d = numpy.linalg.det(numpy.matmul(numpy.transpose(Wt, (0, 2, 1)),
+                                      numpy.transpose(V, (0, 2, 1))))
+    Wt[:, 2, :] *= numpy.where(numpy.isclose(d, -1.0), d, 1.0)[:, numpy.newaxis]
+    U = numpy.matmul(numpy.transpose(Wt, (0, 2, 1)), numpy.transpose(V, (0, 2, 1)))
+    return U, mean1, mean2
+
+
 def besttransformation_weighted(set1, set2, weights=[1.0]):
     """This finds the besttransformation rotation matrix with predetermined
     weights.  The weights are used to give some coordinates more influence than
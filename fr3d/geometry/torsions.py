@@ -0,0 +1,201 @@
+"""
+Torsion angles for many nucleotides at once.
+
+The coordinates of the atoms that define each angle are gathered for all
+nucleotides into n by 3 arrays, with NaN where an atom is missing, and
+every angle is computed in one pass over the arrays.  Angles that involve
+a missing atom come out as NaN.
+
+Backbone torsions alpha and epsilon, zeta reach into the previous and the
+next nucleotide; those are only used when the O3'-P bond between the two
+nucleotides is present.
+"""
+
+import numpy as np
+
+from fr3d.data.mapping import modified_base_to_parent
+from fr3d.data.mapping import parent_atom_to_modified
+from fr3d.geometry.connectivity import MAX_O3P_BOND
+from fr3d.geometry.coordinates import gather_coordinates
+
+# atoms of each torsion; -1 and +1 mark atoms of the previous and next nucleotide
+BACKBONE_TORSIONS = [
+    ("alpha",   [("O3'", -1), ("P", 0), ("O5'", 0), ("C5'", 0)]),
+    ("beta",    [("P", 0), ("O5'", 0), ("C5'", 0), ("C4'", 0)]),
+    ("gamma",   [("O5'", 0), ("C5'", 0), ("C4'", 0), ("C3'", 0)]),
+    ("delta",   [("C5'", 0), ("C4'", 0), ("C3'", 0), ("O3'", 0)]),
+    ("epsilon", [("C4'", 0), ("C3'", 0), ("O3'", 0), ("P", 1)]),
+    ("zeta",    [("C3'", 0), ("O3'", 0), ("P", 1), ("O5'", 1)]),
+]
+
+SUGAR_TORSIONS = [
+    ("nu0", ["C4'", "O4'", "C1'", "C2'"]),
+    ("nu1", ["O4'", "C1'", "C2'", "C3'"]),
+    ("nu2", ["C1'", "C2'", "C3'", "C4'"]),
+    ("nu3", ["C2'", "C3'", "C4'", "O4'"]),
+    ("nu4", ["C3'", "C4'", "O4'", "C1'"]),
+]
+
+
+def dihedral_angles(p0, p1, p2, p3):
+    """
+    Torsion angles in degrees, from -180 to 180, for rows of four n by 3
+    arrays of points.  Rows with NaN coordinates give NaN.
+    """
+
+    b0 = p0 - p1
+    b1 = p2 - p1
+    b2 = p3 - p2
+
+    with np.errstate(invalid="ignore", divide="ignore"):
+        b1 = b1 / np.linalg.norm(b1, axis=1)[:, None]
+
+        # components of b0 and b2 perpendicular to b1
+        v = b0 - np.sum(b0 * b1, axis=1)[:, None] * b1
+        w = b2 - np.sum(b2 * b1, axis=1)[:, None] * b1
+
+        x = np.sum(v * w, axis=1)
+        y = np.sum(np.cross(b1, v) * w, axis=1)
+
+    return np.degrees(np.arctan2(y, x))
+
+
+def chi_atom_names(sequence, present=None):
+    """
+    Names of the O4', C1', N9/N1 and C4/C2 atoms that define chi for a
+    nucleotide with this sequence; modified nucleotides use the names
+    that correspond to the atoms of their parent.  present is the set of
+    atom names in the residue, used when there is no known parent.
+    Returns the names and a message, or None, None when chi is undefined.
+    """
+
+    if sequence in ['A','G','DA','DG']:
+        return ("O4'", "C1'", "N9", "C4"), None
+    if sequence in ['C','U','DC','DT']:
+        return ("O4'", "C1'", "N1", "C2"), None
+
+    parent = modified_base_to_parent.get(sequence)
+    if parent in ['A','G','DA','DG']:
+        glycosidic, base = "N9", "C4"
+    elif parent in ['C','U','DC','DT']:
+        glycosidic, base = "N1", "C2"
+    else:
+        # no parent; use whichever of N9 or N1 is present
+        if present is not None and not "N9" in present:
+            return ("O4'", "C1'", "N1", "C2"), "no identified parent"
+        return ("O4'", "C1'", "N9", "C4"), "no identified parent"
+
+    mapping = parent_atom_to_modified[sequence]
+    for atom in [glycosidic, base]:
+        if not atom in mapping:
+            return None, 'No %s atom correspondence in %s, parent is %s' % (atom, sequence, parent)
+
+    return ("O4'", "C1'", mapping[glycosidic], mapping[base]), None
+
+
+def chi_angles(nucleotides):
+    """
+    Chi angle of each nucleotide in degrees, NaN when it cannot be
+    computed, and a list of (index, message) for unusual nucleotides.
+    """
+
+    atom_names = []
+    messages = []
+    for i, nt in enumerate(nucleotides):
+        present = None
+        if not nt.sequence in modified_base_to_parent and not nt.sequence in ['A','C','G','U','DA','DC','DG','DT']:
+            present = set(atom.name for atom in nt.atoms())
+        names, message = chi_atom_names(nt.sequence, present)
+        if message:
+            messages.append((i, message))
+        atom_names.append(names or ())
+
+    coordinates = gather_coordinates(nucleotides, atom_names)
+    if coordinates.shape[1] < 4:
+        return np.full(len(nucleotides), np.nan), messages
+
+    chi = dihedral_angles(coordinates[:, 0], coordinates[:, 1], coordinates[:, 2], coordinates[:, 3])
+    return chi, messages
+
+
+def classify_chi(chi):
+    """
+    anti, syn or int_syn for each chi angle, and "" where chi is NaN.
+    """
+
+    classification = np.full(len(chi), "anti", dtype=object)
+    with np.errstate(invalid="ignore"):
+        classification[(chi > -90) & (chi < -45)] = "int_syn"
+        classification[(chi >= -45) & (chi < 90)] = "syn"
+    classification[np.isnan(chi)] = ""
+    return classification
+
+
+def pseudorotation(nu):
+    """
+    Pseudorotation phase P in degrees from 0 to 360 and amplitude, from
+    a (nucleotides, 5) array of the sugar torsions nu0 to nu4, following
+    Altona and Sundaralingam.
+    """
+
+    nu = np.radians(nu)
+    numerator = (nu[:, 4] + nu[:, 1]) - (nu[:, 3] + nu[:, 0])
+    denominator = 2 * nu[:, 2] * (np.sin(np.radians(36)) + np.sin(np.radians(72)))
+
+    phase = np.degrees(np.arctan2(numerator, denominator)) % 360
+    with np.errstate(invalid="ignore", divide="ignore"):
+        amplitude = np.degrees(nu[:, 2] / np.cos(np.radians(phase)))
+    return phase, amplitude
+
+
+def nucleotide_torsions(nucleotides):
+    """
+    Chi, backbone torsions alpha to zeta, sugar torsions nu0 to nu4,
+    pseudorotation phase and amplitude for a list of nucleotides in
+    chain order.  Returns a dictionary from name to an array with one
+    angle per nucleotide, in degrees, NaN where it is not defined, and
+    the list of messages about unusual nucleotides.
+    """
+
+    nucleotides = list(nucleotides)
+    n = len(nucleotides)
+
+    names = ["P", "O5'", "C5'", "C4'", "C3'", "O3'", "C2'", "C1'", "O4'"]
+    column = dict((name, j) for j, name in enumerate(names))
+    coordinates = gather_coordinates(nucleotides, [names] * n).reshape(n, len(names), 3)
+
+    # the next nucleotide is bonded when its P is close to this O3'
+    bonded_to_next = np.zeros(n, dtype=bool)
+    if n > 1:
+        O3P = coordinates[:-1, column["O3'"]]
+        P = coordinates[1:, column["P"]]
+        with np.errstate(invalid="ignore"):
+            bonded_to_next[:-1] = np.linalg.norm(O3P - P, axis=1) <= MAX_O3P_BOND
+        same_chain = np.array([a.chain == b.chain and a.model == b.model
+                               for a, b in zip(nucleotides[:-1], nucleotides[1:])])
+        bonded_to_next[:-1] &= same_chain
+
+    previous = np.full((n, len(names), 3), np.nan)
+    following = np.full((n, len(names), 3), np.nan)
+    if n > 1:
+        previous[1:][bonded_to_next[:-1]] = coordinates[:-1][bonded_to_next[:-1]]
+        following[:-1][bonded_to_next[:-1]] = coordinates[1:][bonded_to_next[:-1]]
+    source = {-1: previous, 0: coordinates, 1: following}
+
+    torsions = {}
+    chi, messages = chi_angles(nucleotides)
+    torsions["chi"] = chi
+
+    for name, atoms in BACKBONE_TORSIONS:
+        points = [source[offset][:, column[atom]] for atom, offset in atoms]
+        torsions[name] = dihedral_angles(*points)
+
+    nu = np.empty((n, 5))
+    for k, (name, atoms) in enumerate(SUGAR_TORSIONS):
+        points = [coordinates[:, column[atom]] for atom in atoms]
+        torsions[name] = dihedral_angles(*points)
+        nu[:, k] = torsions[name]
+
+    torsions["pseudorotation"], torsions["amplitude"] = pseudorotation(nu)
+
+    return torsions, messages
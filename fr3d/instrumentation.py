@@ -0,0 +1,404 @@
+"""Instrumentation for annotation and search: nested spans, flat phases
+like the old myTimer, and named counters, with export to JSON and to the
+Chrome trace format that chrome://tracing and Perfetto read.
+
+Recording a span or a phase costs a couple of calls to perf_counter and a
+dictionary update, so it can stay enabled in production.  Totals per name
+are always exact; individual events are kept for the trace only when they
+last at least min_event_seconds, and at most max_events of them are kept.
+
+Memory is sampled only at phase boundaries, where reading /proc once per
+phase costs nothing next to the phase itself: the resident set size of
+the process, its peak so far, and the growth since the previous phase.
+Spans, which can be entered many times in inner loops, record time only.
+Memory budgets are checked with
+check_memory_budget, which raises MemoryBudgetExceeded with a message
+that says what was being done and how much memory was in use.
+
+    from fr3d import instrumentation
+
+    with instrumentation.span("annotate", pdb="4V9F"):
+        ...
+        instrumentation.count("pairs screened", n)
+    instrumentation.recorder.write_json("4V9F_instrumentation.json")
+"""
+
+import json
+import os
+from collections import OrderedDict
+from time import perf_counter
+
+try:
+    import resource
+except ImportError:
+    resource = None      # not available on Windows
+
+MEGABYTE = 1024.0 * 1024.0
+
+
+class MemoryBudgetExceeded(Exception):
+    """Raised when a structure or a query would use more memory than its
+    budget allows.
+    """
+    pass
+
+
+def memory_usage():
+    """Return the current and the peak resident set size of this process
+    in bytes.  Either can be None where the operating system does not
+    provide it.
+    """
+
+    current = None
+    try:
+        with open("/proc/self/statm") as f:
+            current = int(f.read().split()[1]) * os.sysconf("SC_PAGE_SIZE")
+    except (IOError, OSError, ValueError, AttributeError):
+        pass
+
+    peak = None
+    if resource is not None:
+        peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+        if os.uname()[0] != "Darwin":
+            peak *= 1024     # kilobytes on Linux, bytes on macOS
+        if current is None:
+            current = peak
+
+    return current, peak
+
+
+def memory_available(budget_mb):
+    """Megabytes left before the process reaches budget_mb; infinite when
+    there is no budget or memory use cannot be measured.
+    """
+
+    if budget_mb is None or budget_mb == float("inf"):
+        return float("inf")
+    current, peak = memory_usage()
+    if current is None:
+        return float("inf")
+    return budget_mb - current / MEGABYTE
+
+
+def check_memory_budget(budget_mb, what="", needed_mb=0):
+    """Raise MemoryBudgetExceeded if the process uses, or would use after
+    another needed_mb megabytes, more than budget_mb megabytes.
+    """
+
+    available = memory_available(budget_mb)
+    if available < needed_mb:
+        message = "Memory budget of %0.0f MB exceeded" % budget_mb
+        if what:
+            message += " while %s" % what
+        message += ": %0.0f MB in use" % (budget_mb - available)
+        if needed_mb > 0:
+            message += " and about %0.0f MB more needed" % needed_mb
+        raise MemoryBudgetExceeded(message)
+
+
+class Recorder(object):
+    """Keep totals, counters and trace events for one program run.
+    """
+
+    def __init__(self, enabled=True, min_event_seconds=0.001, max_events=100000, track_memory=True):
+        self.enabled = enabled
+        self.min_event_seconds = min_event_seconds
+        self.max_events = max_events
+        self.track_memory = track_memory
+        self.reset()
+
+    def reset(self):
+        self.origin = perf_counter()
+        self.totals = OrderedDict()      # name -> [seconds, calls]
+        self.counters = OrderedDict()    # name -> number
+        self.events = []                 # (name, start, seconds, depth, args, (rss, growth) or None)
+        self.dropped_events = 0
+        self.stack = []                  # open spans: (name, start, args)
+        self.phase_name = None
+        self.phase_start = None
+        self.phase_names = OrderedDict() # phases in the order first seen
+        self.memory = OrderedDict()      # name -> [peak bytes, largest growth in bytes]
+        self.last_rss = None
+
+    # ------------------------------------------------------------------
+    # recording
+
+    def _record(self, name, start, seconds, depth, args, sample_memory=False):
+        if name in self.totals:
+            total = self.totals[name]
+            total[0] += seconds
+            total[1] += 1
+        else:
+            self.totals[name] = [seconds, 1]
+
+        memory = None
+        if sample_memory and self.track_memory:
+            memory = self._record_memory(name)
+
+        if seconds >= self.min_event_seconds:
+            if len(self.events) < self.max_events:
+                self.events.append((name, start - self.origin, seconds, depth, args, memory))
+            else:
+                self.dropped_events += 1
+
+    def _record_memory(self, name):
+        rss, peak = memory_usage()
+        if rss is None:
+            return None
+
+        if self.last_rss is None:
+            growth = 0
+        else:
+            growth = rss - self.last_rss
+        self.last_rss = rss
+
+        if name in self.memory:
+            memory = self.memory[name]
+            memory[0] = max(memory[0], peak or rss)
+            memory[1] = max(memory[1], growth)
+        else:
+            self.memory[name] = [peak or rss, growth]
+
+        return (rss, growth)
+
+    def begin(self, name, **args):
+        if not self.enabled:
+            return
+        self.stack.append((name, perf_counter(), args))
+
+    def end(self):
+        if not self.enabled or not self.stack:
+            return
+        name, start, args = self.stack.pop()
+        self._record(name, start, perf_counter() - start, len(self.stack) + 1, args)
+
+    def span(self, name, **args):
+        """Context manager that records the time spent inside it.
+        """
+
+        return _Span(self, name, args)
+
+    def phase(self, name):
+        """End the current phase and start the named one.  Phases do not
+        nest; they divide a run into consecutive parts, as myTimer did.
+        """
+
+        if not self.enabled:
+            return
+        now = perf_counter()
+        if self.phase_name is not None:
+            self._record(self.phase_name, self.phase_start, now - self.phase_start, 0, None, True)
+        elif self.track_memory and self.last_rss is None:
+            self.last_rss = memory_usage()[0]
+        self.phase_name = name
+        self.phase_start = now
+        self.phase_names[name] = True
+
+    def end_phase(self):
+        if self.phase_name is not None:
+            now = perf_counter()
+            self._record(self.phase_name, self.phase_start, now - self.phase_start, 0, None, True)
+            self.phase_name = None
+
+    def count(self, name, n=1):
+        if not self.enabled:
+            return
+        if name in self.counters:
+            self.counters[name] += n
+        else:
+            self.counters[name] = n
+
+    def snapshot(self):
+        """Copy of the totals and counters, and the number of events so far,
+        to report on one part of a run with the since argument.
+        """
+
+        return {"totals": OrderedDict((k, list(v)) for k, v in self.totals.items()),
+                "counters": OrderedDict(self.counters),
+                "events": len(self.events)}
+
+    # ------------------------------------------------------------------
+    # reporting
+
+    def _current_totals(self):
+        totals = OrderedDict((k, list(v)) for k, v in self.totals.items())
+        if self.phase_name is not None:
+            seconds = perf_counter() - self.phase_start
+            if self.phase_name in totals:
+                totals[self.phase_name][0] += seconds
+            else:
+                totals[self.phase_name] = [seconds, 1]
+        return totals
+
+    def phase_summary(self):
+        """Text table of the time in each phase, in the order first seen,
+        then the time in spans and the counters.
+        """
+
+        totals = self._current_totals()
+        total = 0.000000000001
+        for name in self.phase_names:
+            total += totals[name][0]
+
+        outtext = "Summary of time taken:\n"
+        for name in self.phase_names:
+            seconds = totals[name][0]
+            outtext += "%-31s: %10.3f seconds, %10.3f minutes, %10.2f percent%s\n" % (name,seconds,seconds/60,100*seconds/total,self._memory_text(name))
+        outtext += "%-31s: %10.3f seconds, %10.3f minutes\n" % ("Total",total,total/60)
+
+        for name in totals:
+            if not name in self.phase_names:
+                outtext += "%-31s: %10.3f seconds in %d calls%s\n" % (name,totals[name][0],totals[name][1],self._memory_text(name))
+
+        for name in self.counters:
+            outtext += "%-31s: %10d\n" % (name,self.counters[name])
+
+        return outtext
+
+    def _memory_text(self, name):
+        if name in self.memory:
+            return ", peak %8.1f MB, grew %8.1f MB" % (self.memory[name][0] / MEGABYTE, self.memory[name][1] / MEGABYTE)
+        return ""
+
+    def to_dict(self, since=None, **metadata):
+        """Totals, counters and spans as plain data; with since, only what
+        happened after that snapshot.
+        """
+
+        totals = self._current_totals()
+        counters = OrderedDict(self.counters)
+        first_event = 0
+
+        if since is not None:
+            for name in since["totals"]:
+                if name in totals:
+                    totals[name][0] -= since["totals"][name][0]
+                    totals[name][1] -= since["totals"][name][1]
+            totals = OrderedDict((k, v) for k, v in totals.items() if v[1] > 0 or v[0] > 0)
+            for name in since["counters"]:
+                if name in counters:
+                    counters[name] -= since["counters"][name]
+            counters = OrderedDict((k, v) for k, v in counters.items() if v != 0)
+            first_event = since["events"]
+
+        data = OrderedDict()
+        data.update(metadata)
+        data["totals"] = OrderedDict((k, {"seconds": v[0], "calls": v[1]}) for k, v in totals.items())
+        for name in data["totals"]:
+            if name in self.memory:
+                data["totals"][name]["peakMB"] = self.memory[name][0] / MEGABYTE
+                data["totals"][name]["largestGrowthMB"] = self.memory[name][1] / MEGABYTE
+        current, peak = memory_usage()
+        if peak is not None:
+            data["peakMB"] = peak / MEGABYTE
+        data["counters"] = counters
+        data["spans"] = []
+        for name, start, seconds, depth, args, memory in self.events[first_event:]:
+            span = {"name": name, "start": start, "seconds": seconds, "depth": depth, "args": args or {}}
+            if memory is not None:
+                span["rssMB"] = memory[0] / MEGABYTE
+                span["growthMB"] = memory[1] / MEGABYTE
+            data["spans"].append(span)
+        data["droppedSpans"] = self.dropped_events
+
+        return data
+
+    def write_json(self, filename, since=None, **metadata):
+        with open(filename, "w") as f:
+            json.dump(self.to_dict(since, **metadata), f, indent=1, default=str)
+
+    def write_chrome_trace(self, filename, since=None):
+        """Write complete events ("ph": "X") with times in microseconds,
+        and the final counter values as counter events.
+        """
+
+        if since is None:
+            first_event = 0
+        else:
+            first_event = since["events"]
+
+        pid = os.getpid()
+        trace = []
+        for name, start, seconds, depth, args, memory in self.events[first_event:]:
+            event = {"name": name, "ph": "X", "ts": start * 1e6, "dur": seconds * 1e6,
+                     "pid": pid, "tid": 0}
+            if depth == 0:
+                event["cat"] = "phase"
+                event["tid"] = 1
+            else:
+                event["cat"] = "span"
+            if args or memory is not None:
+                event["args"] = dict(args or {})
+            if memory is not None:
+                event["args"]["rssMB"] = round(memory[0] / MEGABYTE, 1)
+                event["args"]["growthMB"] = round(memory[1] / MEGABYTE, 1)
+            trace.append(event)
+
+        end = (perf_counter() - self.origin) * 1e6
+        for name in self.counters:
+            trace.append({"name": name, "ph": "C", "ts": end, "pid": pid,
+                          "args": {"value": self.counters[name]}})
+
+        with open(filename, "w") as f:
+            json.dump({"traceEvents": trace, "displayTimeUnit": "ms"}, f, default=str)
+
+
+class _Span(object):
+    __slots__ = ("recorder", "name", "args")
+
+    def __init__(self, recorder, name, args):
+        self.recorder = recorder
+        self.name = name
+        self.args = args
+
+    def __enter__(self):
+        self.recorder.begin(self.name, **self.args)
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        self.recorder.end()
+        return False
+
+
+# one recorder shared by the whole program
+recorder = Recorder()
+
+
+def span(name, **args):
+    return recorder.span(name, **args)
+
+
+def count(name, n=1):
+    recorder.count(name, n)
+
+
+def phase(name):
+    recorder.phase(name)
+
+
+def timer_phase(state, data=None):
+    """Implementation behind the myTimer functions: start the named phase
+    and return the recorder, which callers pass back in as timerData.
+    """
+
+    if not isinstance(data, Recorder):
+        data = recorder
+    data.phase(state)
+    return data
+
+
+def timer_summary(data=None):
+    if not isinstance(data, Recorder):
+        data = recorder
+    return data.phase_summary()
+
+
+def timer(state, data=None):
+    """The myTimer function of the annotation and search programs: start
+    the named phase and return the recorder, or with "summary", return the
+    text of the phase summary.
+    """
+
+    if state == "summary":
+        return timer_summary(data)
+    return timer_phase(state, data)
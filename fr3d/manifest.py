@@ -0,0 +1,164 @@
+"""Manifest of annotation output files, for incremental re-annotation.
+
+For each structure that has been annotated, the manifest records the hash of
+the input structure file, the classifier version, the hashes of the tables
+that the classification used, such as class_limits_2023.py, the options of
+the run and the output files written.  On the next run, a structure is only
+annotated again when one of those has changed or an output file is missing;
+the others are skipped and listed in the report.
+
+    manifest = Manifest(os.path.join(outputPath, MANIFEST_NAME))
+    update, reason = manifest.needs_update(pdbid, filename, version, tables, options)
+    if update:
+        ... annotate and write the output files ...
+        manifest.record(pdbid, filename, version, tables, options, outputs)
+    manifest.save()
+    manifest.report()
+
+Hashes of files are kept in the manifest together with the size and time of
+modification of the file, in nanoseconds, so that unchanged files are not
+read again.
+"""
+
+import hashlib
+import json
+import os
+import tempfile
+
+MANIFEST_NAME = "FR3D_manifest.json"
+
+# change this when the format of the manifest changes
+MANIFEST_VERSION = 1
+
+
+def file_hash(filename):
+    """
+    SHA-1 hash of the contents of a file.
+    """
+
+    digest = hashlib.sha1()
+    with open(filename, "rb") as f:
+        for block in iter(lambda: f.read(1 << 20), b""):
+            digest.update(block)
+    return digest.hexdigest()
+
+
+class Manifest(object):
+    """
+    Entries for annotated structures, read from filename if it exists.
+    """
+
+    def __init__(self, filename):
+        self.filename = filename
+        self.entries = {}
+        self._hashes = {}
+        self.skipped = []
+        self.updated = []
+
+        if os.path.exists(filename):
+            try:
+                with open(filename, "r") as f:
+                    data = json.load(f)
+                if data.get("version") == MANIFEST_VERSION:
+                    self.entries = data.get("entries", {})
+                    self._hashes = data.get("hashes", {})
+            except ValueError:
+                pass    # damaged; annotate everything again
+
+    def hash(self, filename):
+        """
+        Hash of a file, reused while its size and time of modification
+        are unchanged.
+        """
+
+        path = os.path.abspath(filename)
+        status = os.stat(path)
+        stamp = [status.st_size, status.st_mtime_ns]
+        known = self._hashes.get(path)
+        if known and known[0:2] == stamp:
+            return known[2]
+        digest = file_hash(path)
+        self._hashes[path] = stamp + [digest]
+        return digest
+
+    def table_hashes(self, tables):
+        """
+        Dictionary from table name to the hash of its source file, for a
+        dictionary from table name to file name.
+        """
+
+        return dict((name, self.hash(source)) for name, source in tables.items())
+
+    def needs_update(self, key, input_filename, version, tables, options=""):
+        """
+        Whether the outputs for key have to be made again, and why.
+        """
+
+        entry = self.entries.get(key)
+        if entry is None:
+            return True, "not annotated before"
+        if not input_filename or not os.path.exists(input_filename):
+            return True, "input file not found"
+        if entry["input_hash"] != self.hash(input_filename):
+            return True, "input file changed"
+        if entry["version"] != version:
+            return True, "classifier version changed from %s" % entry["version"]
+        if entry["options"] != options:
+            return True, "options changed"
+        hashes = self.table_hashes(tables)
+        changed = sorted(name for name in set(hashes) | set(entry["tables"])
+                         if hashes.get(name) != entry["tables"].get(name))
+        if changed:
+            return True, "tables changed: %s" % ", ".join(changed)
+        missing = [output for output in entry["outputs"] if not os.path.exists(output)]
+        if missing:
+            return True, "output file missing: %s" % missing[0]
+        return False, "unchanged"
+
+    def skip(self, key, reason="unchanged"):
+        self.skipped.append((key, reason))
+
+    def record(self, key, input_filename, version, tables, options, outputs, reason=""):
+        """
+        Note that the outputs for key were made from these inputs.  Nothing
+        is recorded when the input file is not found.
+        """
+
+        if not input_filename or not os.path.exists(input_filename):
+            return
+
+        self.entries[key] = {
+            "input": os.path.abspath(input_filename),
+            "input_hash": self.hash(input_filename),
+            "version": version,
+            "tables": self.table_hashes(tables),
+            "options": options,
+            "outputs": sorted(os.path.abspath(output) for output in outputs),
+        }
+        self.updated.append((key, reason))
+
+    def save(self):
+        """
+        Write the manifest, through a temporary file so that an interrupted
+        run never leaves half a manifest.
+        """
+
+        directory = os.path.dirname(os.path.abspath(self.filename))
+        data = {"version": MANIFEST_VERSION, "entries": self.entries, "hashes": self._hashes}
+        handle, temporary = tempfile.mkstemp(dir=directory, suffix=".tmp")
+        with os.fdopen(handle, "w") as f:
+            json.dump(data, f, indent=1, sort_keys=True)
+        os.replace(temporary, self.filename)
+
+    def report(self):
+        """
+        Print which structures were annotated, and why, and which were
+        skipped.
+        """
+
+        print("Annotated %d structures, skipped %d unchanged" % (len(self.updated), len(self.skipped)))
+        for key, reason in self.updated:
+            if reason:
+                print("  annotated %s: %s" % (key, reason))
+        if self.skipped:
+            print("  skipped %s" % ",".join(key for key, reason in self.skipped))
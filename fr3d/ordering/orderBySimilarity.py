@@ -9,109 +9,144 @@ import random
 
 def treePenalty(distance):
     from scipy.cluster.hierarchy import linkage
+    from scipy.cluster.hierarchy import cophenet
     from scipy.spatial.distance import squareform
 
-    # set up groups to track hierarchical clustering
-    group = []
-    for i in range(0,distance.shape[0]):
-        group.append([i])
-
     # hierarchical clustering with average linkage
-    Z = linkage(squareform(distance), "average")
-
-    # penalty matrix
-    penalty = np.zeros(distance.shape)
+    Z = linkage(squareform(distance, checks=False), "average")
 
-    for merger in Z:
-        a = int(merger[0])
-        b = int(merger[1])
-        group.append(group[a]+group[b])
-        for i in group[a]:
-            for j in group[b]:
-                penalty[i][j] = merger[2]
-                penalty[j][i] = merger[2]
-
-    """
-    for i in range(0,distance.shape[0]):
-        for j in range(0,distance.shape[0]):
-            print("%6.3f" % penalty[i][j]),
-        print("")
-    """
+    # penalty for i and j is the height at which their groups merge in the
+    # tree, which is the cophenetic distance between them
+    penalty = squareform(cophenet(Z))
 
     return penalty
 
 def normalizePenaltyMatrix(distance,penalty):
     # normalize the penalty matrix as described in the tpPL article
-    dsum = 0.0
-    psum = 0.0
-
-    newpenalty = np.zeros(distance.shape)
-
-    for i in range(0,distance.shape[0]):
-        for j in range(0,distance.shape[0]):
-            dsum = dsum + distance[i][j]
-            psum = psum + penalty[i][j]
+    dsum = np.sum(distance)
+    psum = np.sum(penalty)
 
     if psum > 0:
-        for i in range(0,distance.shape[0]):
-            for j in range(0,distance.shape[0]):
-                newpenalty[i][j] = penalty[i][j] * dsum / psum
+        newpenalty = penalty * (dsum / psum)
     else:
         # in case of a distance matrix of all zeros
         newpenalty = penalty
 
     return newpenalty
 
-def twoOptSwap(distance,order):
-    # simple 2-opt swap where you check every possible swap and make the swap if it improves the score
-    # do large-scale swaps first
+def pathLength(distance,order):
+    # total length of the path visiting points in the given order
+    order = np.asarray(order)
+    if len(order) < 2:
+        return 0.0
+    return np.sum(distance[order[:-1],order[1:]])
+
+def twoOptSwap(distance,order,maxPasses=10):
+    # 2-opt: reverse a segment of the path when that shortens the path
+    # for each i, the change in path length from reversing order[i+1:j] is
+    # computed for all j at once from the four edges involved, and the best
+    # reversal is made; passes are repeated until nothing improves
+    distance = np.asarray(distance)
+    order = np.array(order, dtype=int)
     n = len(order)
-    distance_reduction = 0
-    for i in range(0,n):
-        for p in range(n-i-1,1,-1):
-            j = i + p
-            # compute new path length minus old if you change the path
-            distance_change = distance[order[i]][order[j-1]] + distance[order[i+1]][order[j]] - distance[order[i]][order[i+1]] - distance[order[j-1]][order[j]]
-            if distance_change < -0.0000000000001:  # avoid changes due to roundoff error
-                distance_reduction = distance_reduction + distance_change
-                order = order[:i+1] + order[j-1:i:-1] + order[j:]  
-    return order, distance_reduction
+    distance_reduction = 0.0
+    tolerance = -0.0000000000001   # avoid changes due to roundoff error
+
+    if n < 3:
+        return list(order), distance_reduction
+
+    for passes in range(0,maxPasses):
+        improved = False
+        for i in range(0,n-1):
+            while True:
+                # reverse order[i+1:j] for j = i+2, ..., n
+                a = order[i]
+                b = order[i+1]
+                c = order[i+1:n-1]    # order[j-1] for j < n
+                d = order[i+2:n]      # order[j] for j < n
+                change = distance[a,c] + distance[b,d] - distance[a,b] - distance[c,d]
+                # reversing the whole tail only replaces edge a,b
+                change = np.append(change, distance[a,order[n-1]] - distance[a,b])
+                k = np.argmin(change)
+                if change[k] >= tolerance:
+                    break
+                j = i + 2 + k
+                order[i+1:j] = order[i+1:j][::-1].copy()
+                distance_reduction += change[k]
+                improved = True
+        # reversing order[0:j] only replaces edge order[j-1],order[j]
+        change = distance[order[0],order[2:n]] - distance[order[1:n-1],order[2:n]]
+        k = np.argmin(change)
+        if change[k] < tolerance:
+            order[0:k+2] = order[0:k+2][::-1].copy()
+            distance_reduction += change[k]
+            improved = True
+        if not improved:
+            break
+
+    return list(order), distance_reduction
 
 def greedyInsertionPathLength(distance, order=[]):
     # if no starting ordering, put points in random order
+    distance = np.asarray(distance)
     if len(order) == 0:
         order = list(range(0,distance.shape[0]))
         random.shuffle(order)          # random starting ordering
 
     # make a path from the first two points of the ordering
-    path = order[:2]
+    path = list(order[:2])
     score = distance[path[0], path[1]]
 
+    # keep the path and the lengths of its edges as arrays, with room to grow
+    n = len(order)
+    pathArray = np.zeros(n, dtype=int)
+    pathArray[0:2] = path
+    edges = np.zeros(n)
+    edges[0] = score
+    m = 2
+
     # insert the remaining points into the path one by one
-    for p in range(2, len(order)):
-        # score inserting point order[p] at beginning of path
-        bestScore = distance[order[p]][path[0]]
+    for p in range(2, n):
+        q = order[p]
+        row = distance[q]
+        current = pathArray[:m]
+
+        # score inserting point q at beginning of path
+        bestScore = row[current[0]]
         bestPosition = 0
 
-        # score inserting point order[p] at end of path
-        currentScore = distance[path[-1]][order[p]]
+        # score inserting point q at end of path
+        currentScore = distance[current[-1], q]
         if currentScore < bestScore:
-            bestScore = distance[path[-1]][order[p]]
-            bestPosition = len(path)
-
-        # score inserting point order[p] at various points within the path
-        for position in range(1, len(path)):
-            currentScore = distance[path[position-1]][order[p]] + distance[order[p]][path[position]] - distance[path[position-1]][path[position]]
-
-            if currentScore < bestScore:
-                bestScore = currentScore
-                bestPosition = position
-
-        # insert where the score is the lowest
-        path.insert(bestPosition, order[p])
+            bestScore = currentScore
+            bestPosition = m
+
+        # score inserting point q at all points within the path at once
+        costs = distance[current[:-1], q] + row[current[1:]] - edges[:m-1]
+        position = np.argmin(costs)
+        if costs[position] < bestScore:
+            bestScore = costs[position]
+            bestPosition = position + 1
+
+        # insert where the score is the lowest, updating the edge lengths
+        if bestPosition == 0:
+            pathArray[1:m+1] = current.copy()
+            pathArray[0] = q
+            edges[1:m] = edges[0:m-1].copy()
+            edges[0] = row[pathArray[1]]
+        elif bestPosition == m:
+            pathArray[m] = q
+            edges[m-1] = distance[pathArray[m-1], q]
+        else:
+            pathArray[bestPosition+1:m+1] = current[bestPosition:].copy()
+            pathArray[bestPosition] = q
+            edges[bestPosition+1:m] = edges[bestPosition:m-1].copy()
+            edges[bestPosition-1] = distance[pathArray[bestPosition-1], q]
+            edges[bestPosition] = row[pathArray[bestPosition+1]]
+        m += 1
         score += bestScore
 
-    return path, score
+    return list(pathArray[:m]), score
 
 def multipleGreedyInsertionPathLength(distance, repetitions=100, seed=None):
     # repeat greedy insertion multiple times and keep the best ordering
@@ -162,7 +197,46 @@ def multipleGreedyInsertionPathLengthTwoOpt(distance, repetitions=10, seed=None,
 
     return bestOrder, bestScore
 
-def treePenalizedPathLength(distance,repetitions=10,seed=None,penaltyStrength=0.5):
+def chooseLandmarks(distance,numLandmarks):
+    # farthest point sampling, so that landmarks spread over all clusters
+    n = distance.shape[0]
+    landmarks = [random.randrange(n)]
+    nearest = np.array(distance[landmarks[0]], dtype=float)
+    for k in range(1,min(numLandmarks,n)):
+        nextLandmark = int(np.argmax(nearest))
+        landmarks.append(nextLandmark)
+        nearest = np.minimum(nearest, distance[nextLandmark])
+    return landmarks
+
+def landmarkPathLengthTwoOpt(distance, numLandmarks=400, repetitions=10, seed=None):
+    # approximate ordering for large sets; order a set of landmarks with
+    # several greedy insertion and 2-opt repetitions, insert all other points
+    # into that path once, then improve the whole path with 2-opt
+
+    n = distance.shape[0]
+    if n <= numLandmarks:
+        return multipleGreedyInsertionPathLengthTwoOpt(distance,repetitions,seed)
+
+    if seed:
+        random.seed(seed)
+
+    landmarks = chooseLandmarks(distance,numLandmarks)
+    landmarkDistance = distance[np.ix_(landmarks,landmarks)]
+    landmarkOrder, score = multipleGreedyInsertionPathLengthTwoOpt(landmarkDistance,repetitions)
+
+    # insert the remaining points in random order after the ordered landmarks
+    isLandmark = np.zeros(n, dtype=bool)
+    isLandmark[landmarks] = True
+    others = list(np.nonzero(~isLandmark)[0])
+    random.shuffle(others)
+    order = [landmarks[i] for i in landmarkOrder] + others
+
+    order, score = greedyInsertionPathLength(distance,order)
+    order, distance_reduction = twoOptSwap(distance,order)
+
+    return order, score + distance_reduction
+
+def treePenalizedPathLength(distance,repetitions=10,seed=None,penaltyStrength=0.5,maxExactSize=1000,numLandmarks=400):
 
     n = distance.shape[0]
 
@@ -178,10 +252,15 @@ def treePenalizedPathLength(distance,repetitions=10,seed=None,penaltyStrength=0.
         penaltyMatrix = treePenalty(distance)
         penaltyMatrix = normalizePenaltyMatrix(distance,penaltyMatrix)
         penalizedDistance = distance + penaltyStrength * penaltyMatrix
-        order, score = multipleGreedyInsertionPathLengthTwoOpt(penalizedDistance,repetitions,seed)
     else:
         # standard path length
-        order, score = multipleGreedyInsertionPathLengthTwoOpt(distance,repetitions,seed)
+        penalizedDistance = distance
+
+    if n > maxExactSize:
+        # approximate ordering through landmarks for very large sets
+        order, score = landmarkPathLengthTwoOpt(penalizedDistance,numLandmarks,repetitions,seed)
+    else:
+        order, score = multipleGreedyInsertionPathLengthTwoOpt(penalizedDistance,repetitions,seed)
 
     return order
 
@@ -229,19 +308,13 @@ def standardOrder(distance,order):
 def setDiagonalToZero(distance):
     # linkage functions require a matrix whose diagonal is zero
     new_distance = np.copy(distance)
-    for i in range(0,len(new_distance)):
-        new_distance[i][i] = 0.0
+    np.fill_diagonal(new_distance, 0.0)
     return new_distance
 
 def reorderSymmetricMatrix(distance, newOrder):
     # apply the new ordering to a distance matrix, returning a copy
-    newDistance = np.zeros(distance.shape)
-    for i in range(0,newDistance.shape[0]):
-        for j in range(i,newDistance.shape[1]):
-            d = distance[newOrder[i]][newOrder[j]]
-            newDistance[i][j] = d
-            newDistance[j][i] = d
-    return newDistance
+    newOrder = np.asarray(newOrder, dtype=int)
+    return np.array(distance[np.ix_(newOrder,newOrder)], dtype=float)
 
 def reorderList(oldList,newOrder):
     # apply the new ordering to a list, returning a copy
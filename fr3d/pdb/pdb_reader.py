@@ -4,6 +4,7 @@ Preliminary Reader for PDB formatted files using the BioPython PDBParser and cre
 07-27-2022: Indexing needs updated to account for missing residues. Start by using 'missing_residues' in structure.header
 07-27-2022: Does not support complex symmetries yet (or any symmetries other than identity) 
 This reader works for common structure files but may be error prone to structure files that are not typical
+fr3d.pdb.reader.PDB reads the same files without Biopython, much faster, and applies BIOMT operators
 """
 #from importlib.resources import path
 
@@ -23,7 +24,7 @@ import sys
 from fr3d.data import Atom
 from fr3d.data import Component
 from fr3d.data import Structure
-from fr3d.modified_parent_mapping import modified_nucleotides
+from fr3d.pdb.reader import check_linking
 
 ###################################################################
 # PDBStructure Class ##############################################
@@ -192,25 +193,3 @@ class PDBStructure(object):
         pdb = self.name
         residues = self.__residues__(pdb)
         return Structure(list(residues), pdb=pdb)
-
-def check_linking(seq):  
-    """
-    Function to return the type of linking present
-    Cif files contain information that declares if the type is RNA linking, DNA linking, L-peptide linking
-    This information isn't listed in this writing in a PDB file. So in order to match how our cif reader
-    deals with this, this function will check to see if it's an RNA nt, a DNA nt, an amino acid, or a
-    modified nt and return the correct linkage to be used.
-    """
-
-    if seq in ['A', 'C', 'G', 'U']: 
-        type = "RNA linking"
-    elif seq in ['DA', 'DC', 'DG', 'DT']:
-        type = "DNA linking"
-    elif seq in ["ALA", "ARG", "ASN", "ASP", "CYS", "GLN", "GLU", "GLY", "HIS", "ILE", "LEU", "LYS", "MET", "PHE", "PRO", "SER", "THR", "TRP", "TYR", "VAL"]:
-        type = "L-peptide linking"
-    elif seq in list(modified_nucleotides.keys()):
-        if modified_nucleotides[seq]['standard'] in ['A', 'C', 'G', 'U']:
-            type = 'RNA linking'
-    else:
-        type = "Unknown"
-    return type
\ No newline at end of file
@@ -0,0 +1,292 @@
+"""
+reader.py
+Native reader for PDB formatted files. Lines are read by their fixed columns
+without going through Biopython, the atoms are kept as columns, one list per
+field, and the structure is built from those columns the same way the Cif
+reader builds it: one Component per residue and alternate location, sorted
+the same way, with the same atom, model and symmetry naming.
+
+Multiple models (MODEL/ENDMDL), alternate locations and the biological
+assembly operators in REMARK 350 BIOMT records are supported.
+"""
+
+import collections as coll
+import copy
+import re
+
+import numpy as np
+
+from fr3d.data import Atom
+from fr3d.data import Component
+from fr3d.data import Structure
+from fr3d.modified_parent_mapping import modified_nucleotides
+
+WATER = set(['HOH', 'WAT', 'DOD', 'H2O'])
+
+
+class PDB(object):
+    """Container for the data in a PDB file. fileid is used as the pdb id,
+    so that unit ids follow the name given to the file; without it, the
+    HEADER id code is used.
+    handle can give lines as text or bytes, for example a gzip file.
+    """
+
+    def __init__(self, handle, fileid=None):
+        self.pdb = None
+        self.columns = coll.defaultdict(list)
+        self._biomt = coll.OrderedDict()
+        self._biomt_chains = coll.defaultdict(list)
+        self.__read__(handle)
+
+        if fileid:
+            self.pdb = fileid
+
+        self._operators = self.__load_operators__()
+
+    def __read__(self, handle):
+        columns = self.columns
+        model = '1'
+        biomolecule = None
+        block = 0
+        chains = []
+
+        for line in handle:
+            if not isinstance(line, str):
+                line = line.decode('latin-1')
+            record = line[0:6]
+
+            if record == 'ATOM  ' or record == 'HETATM':
+                columns['group'].append(record.strip())
+                columns['name'].append(line[12:16].strip())
+                columns['alt_id'].append(line[16:17].strip() or None)
+                columns['component_id'].append(line[17:21].strip())
+                columns['chain'].append(line[21:22].strip() or line[72:76].strip())
+                columns['component_number'].append(line[22:26])
+                columns['insertion_code'].append(line[26:27].strip() or None)
+                columns['x'].append(line[30:38])
+                columns['y'].append(line[38:46])
+                columns['z'].append(line[46:54])
+                columns['element'].append(line[76:78].strip())
+                columns['model'].append(model)
+
+            elif record == 'MODEL ':
+                model = line[10:14].strip() or line[6:].strip()
+
+            elif record == 'HEADER':
+                self.pdb = line[62:66].strip()
+
+            elif record == 'REMARK' and line[7:10] == '350':
+                text = line[11:].strip()
+                if text.startswith('BIOMOLECULE:'):
+                    biomolecule = text.split(':')[1].strip()
+                    chains = []
+                elif 'CHAINS:' in text:
+                    if text.startswith('APPLY'):
+                        # serials restart in each block of an assembly
+                        block += 1
+                        chains = []
+                    names = text.split('CHAINS:')[1]
+                    chains.extend([c.strip() for c in names.split(',') if c.strip()])
+                elif text.startswith('BIOMT'):
+                    fields = text.split()
+                    row = int(fields[0][5]) - 1
+                    key = (biomolecule, block, fields[1])
+                    if key not in self._biomt:
+                        self._biomt[key] = np.zeros((3, 4))
+                        self._biomt_chains[key] = list(chains)
+                    self._biomt[key][row] = [float(v) for v in fields[2:6]]
+
+        # convert numeric columns once, instead of field by field
+        n = len(columns['name'])
+        coordinates = np.zeros((n, 3))
+        for j, axis in enumerate(['x', 'y', 'z']):
+            coordinates[:, j] = np.array(columns.pop(axis, []), dtype=float)
+        columns['coordinates'] = coordinates
+        columns['component_number'] = [residue_number(number) for number in columns['component_number']]
+
+    def __load_operators__(self):
+        """Operators to apply to each chain, from the BIOMT records of all
+        biological assemblies, without repeating an operator for a chain.
+        Chains not listed in any assembly get the identity operator.
+        BIOMT numbers restart in each assembly and in each block of chains
+        of an assembly, so operators are numbered
+        across the whole file instead, with one number for each distinct
+        transformation.
+        """
+
+        operators = coll.defaultdict(list)
+        distinct = []
+        for key, matrix in self._biomt.items():
+            operator = self.__operator__(matrix, distinct)
+            for chain in self._biomt_chains[key]:
+                known = [np.allclose(op['transform'], operator['transform']) for op in operators[chain]]
+                if not any(known):
+                    operators[chain].append(operator)
+        return operators
+
+    def __operator__(self, matrix, distinct):
+        transform = np.identity(4)
+        transform[0:3, :] = matrix
+        for number, known in enumerate(distinct, 1):
+            if np.allclose(known, transform):
+                break
+        else:
+            distinct.append(transform)
+            number = len(distinct)
+        if np.allclose(transform, np.identity(4)):
+            name = '1_555'
+        else:
+            name = 'ASM_%d' % number
+        return {'id': str(number), 'name': name, 'transform': transform}
+
+    def __identity_operator__(self):
+        return {'id': 'I', 'name': '1_555', 'transform': np.identity(4)}
+
+    def has_symmetry(self):
+        """True if the file has BIOMT operators other than the identity.
+        """
+        return any(op['name'] != '1_555' for ops in self._operators.values() for op in ops)
+
+    def operators(self, chain):
+        return self._operators.get(chain) or [self.__identity_operator__()]
+
+    def __atoms__(self, pdb):
+        """Create Atoms from the columns, one copy for each operator of the
+        chain, grouped by residue in the order the Cif reader uses.
+        """
+
+        columns = self.columns
+        residues = coll.defaultdict(list)
+
+        chain_rows = coll.defaultdict(list)
+        for i, chain in enumerate(columns['chain']):
+            chain_rows[chain].append(i)
+
+        for chain, rows in chain_rows.items():
+            for operator in self.operators(chain):
+                transform = operator['transform']
+                moved = np.dot(columns['coordinates'][rows], transform[0:3, 0:3].T) + transform[0:3, 3]
+                symmetry = operator['name']
+
+                for i, (x, y, z) in zip(rows, moved.tolist()):
+                    component_id = columns['component_id'][i]
+                    number = columns['component_number'][i]
+                    polymeric = not component_id in WATER and \
+                        (columns['group'][i] == 'ATOM' or check_linking(component_id) != "Unknown")
+                    atom = Atom(pdb=pdb,
+                                model=columns['model'][i],
+                                chain=chain,
+                                component_id=component_id,
+                                component_number=number,
+                                component_index=number,
+                                insertion_code=columns['insertion_code'][i],
+                                alt_id=columns['alt_id'][i],
+                                x=x, y=y, z=z,
+                                group=columns['group'][i],
+                                type=columns['element'][i] or atom_type(columns['name'][i]),
+                                name=columns['name'][i],
+                                symmetry=symmetry,
+                                polymeric=polymeric)
+                    key = (pdb, atom.model, chain, component_id, number, atom.insertion_code or '', symmetry)
+                    residues[key].append(atom)
+
+        return residues
+
+    def __group_alt_atoms__(self, atoms):
+        def ordering_key(atoms):
+            return atoms[0].alt_id
+
+        alt_ids = coll.defaultdict(list)
+        for atom in atoms:
+            alt_ids[atom.alt_id].append(atom)
+
+        if len(alt_ids) == 1:
+            return list(alt_ids.values())
+
+        if None in alt_ids:
+            common = alt_ids.pop(None)
+            for alt_id, specific_atoms in list(alt_ids.items()):
+                for common_atom in common:
+                    copied = copy.deepcopy(common_atom)
+                    copied.alt_id = alt_id
+                    specific_atoms.append(copied)
+
+        return sorted(list(alt_ids.values()), key=ordering_key)
+
+    def __residues__(self, pdb):
+        residues = self.__atoms__(pdb)
+
+        for key in sorted(residues.keys()):
+            for atoms in self.__group_alt_atoms__(residues[key]):
+                first = atoms[0]
+                yield Component(
+                    atoms,
+                    pdb=first.pdb,
+                    model=first.model,
+                    type=check_linking(first.component_id),
+                    alt_id=first.alt_id,
+                    chain=first.chain,
+                    symmetry=first.symmetry,
+                    sequence=first.component_id,
+                    number=first.component_number,
+                    index=first.component_index,
+                    insertion_code=first.insertion_code,
+                    polymeric=first.polymeric,
+                )
+
+    def structure(self):
+        """Get the structure from the PDB file.
+        :returns: The structure in the pdb file.
+        """
+        pdb = self.pdb
+        residues = self.__residues__(pdb)
+        return Structure(list(residues), pdb=pdb)
+
+
+def residue_number(text):
+    """
+    Residue number from columns 23-26; files with more residues than fit
+    there can have other characters, which are dropped as the Cif reader does.
+    """
+
+    try:
+        return int(text)
+    except ValueError:
+        return int(re.sub(r'\D', '', text) or 0)
+
+
+def atom_type(name):
+    """
+    Element of an atom from its name, for files without the element column.
+    """
+
+    for letter in name:
+        if letter.isalpha():
+            if letter in 'CONPS':
+                return letter
+            break
+    return name
+
+
+def check_linking(seq):
+    """
+    Function to return the type of linking present
+    Cif files contain information that declares if the type is RNA linking, DNA linking, L-peptide linking
+    This information isn't listed in this writing in a PDB file. So in order to match how our cif reader
+    deals with this, this function will check to see if it's an RNA nt, a DNA nt, an amino acid, or a
+    modified nt and return the correct linkage to be used.
+    """
+
+    if seq in ['A', 'C', 'G', 'U']:
+        type = "RNA linking"
+    elif seq in ['DA', 'DC', 'DG', 'DT']:
+        type = "DNA linking"
+    elif seq in ["ALA", "ARG", "ASN", "ASP", "CYS", "GLN", "GLU", "GLY", "HIS", "ILE", "LEU", "LYS", "MET", "PHE", "PRO", "SER", "THR", "TRP", "TYR", "VAL"]:
+        type = "L-peptide linking"
+    elif seq in modified_nucleotides and modified_nucleotides[seq]['standard'] in ['A', 'C', 'G', 'U']:
+        type = 'RNA linking'
+    elif seq in modified_nucleotides and modified_nucleotides[seq]['standard'] in ['DA', 'DC', 'DG', 'DT']:
+        type = 'DNA linking'
+    else:
+        type = "Unknown"
+    return type
@@ -8,6 +8,10 @@ import urllib
 import sys
 from fr3d.search.fr3d_configuration import DATAPATH
 from fr3d.search.fr3d_configuration import SERVER
+from fr3d.search.pairs_index import compileNAPairsIndex
+from fr3d.search.pairs_index import readNAPairsIndex
+from fr3d.search.pairs_index import writeNAPairsIndex
+from fr3d.search.pairs_index import indexPairsForIFE
 
 # import the version of urlretrieve appropriate to the Python version
 if sys.version_info[0] < 3:
@@ -510,6 +514,38 @@ def readNAPairsFileRaw(Q, PDBID, alternate = ""):
     return Q, interactionToTriples
 
 
+def readNAPairsIndexFile(Q, PDBID, alternate = ""):
+    """
+    Memory-map the compiled integer index of the pairs file for a PDB id.
+    The index is compiled from the .pickle file the first time it is needed
+    and again whenever the .pickle file is newer.
+    Returns the table and its description, or None, None and the triples
+    if the annotations cannot be stored as integers.
+    """
+
+    pairsFileName = PDBID + '_RNA_pairs.pickle'
+    pathAndFileName = os.path.join(DATAPATH,'pairs'+alternate,pairsFileName)
+
+    table, description = readNAPairsIndex(pathAndFileName)
+    if table is not None:
+        return Q, table, description, None
+
+    Q, interactionToTriples = readNAPairsFileRaw(Q, PDBID, alternate)
+
+    try:
+        table, description = compileNAPairsIndex(interactionToTriples)
+    except (TypeError, ValueError):
+        return Q, None, None, interactionToTriples
+
+    if len(interactionToTriples) > 0:
+        try:
+            writeNAPairsIndex(pathAndFileName, table, description)
+        except (IOError, OSError):
+            print("Could not write the pairs index for %s" % pairsFileName)
+
+    return Q, table, description, None
+
+
 def readNAPairsFile(Q, PDBID, id_to_index, alternate = ""):
     """
     We need to read the pairwise interactions whether or not there are
@@ -518,7 +554,22 @@ def readNAPairsFile(Q, PDBID, id_to_index, alternate = ""):
     The alternate .pickle files must be stored in a parallel directory.
     """
 
-    Q, interactionToTriples = readNAPairsFileRaw(Q, PDBID, alternate)
+    Q, table, description, interactionToTriples = readNAPairsIndexFile(Q, PDBID, alternate)
+
+    return indexNAPairs(Q, table, description, interactionToTriples, id_to_index, alternate)
+
+
+def indexNAPairs(Q, table, description, interactionToTriples, id_to_index, alternate = ""):
+    """
+    Pairs of indices of the active interactions of the query, from the
+    integer index of the pairs file or, if there is none, from the triples.
+    """
+
+    if table is not None:
+        # integer index; no unit id strings are handled per pair
+        interactionToIndexPairs, pairToInteractions, pairToCrossingNumber = indexPairsForIFE(
+            table, description, id_to_index, Q["activeInteractions"], alternate)
+        return Q, interactionToIndexPairs, pairToInteractions, pairToCrossingNumber
 
     # interactionToTriples has this structure:
     # interactionToTriples['cWW'] is a list of triples, each triple being (unit_id_1,unit_id_2,range)
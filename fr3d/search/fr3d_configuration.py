@@ -8,8 +8,9 @@ if "vtnguye" in os.getcwd():
 	TEMPLATEPATH = "./"
 	MAXTIME = 20
 	MAXTIME = float('inf')
-	MAXCANDIDATESHEATMAP = 300
+	MAXCANDIDATESHEATMAP = 2000
 	MAXCANDIDATES = 10000
+	MAXMEMORY = float('inf')     # megabytes
 	REFRESHTIME = 20
 
 	JS1 = '  <script src="./js/JSmol.min.nojq.js"></script>'
@@ -26,8 +27,9 @@ elif "monke" in os.getcwd():
 	TEMPLATEPATH = "./"
 	MAXTIME = 20
 	MAXTIME = float('inf')
-	MAXCANDIDATESHEATMAP = 300
+	MAXCANDIDATESHEATMAP = 2000
 	MAXCANDIDATES = 10000
+	MAXMEMORY = float('inf')     # megabytes
 	REFRESHTIME = 20
 
 	JS1 = '  <script src="./js/JSmol.min.nojq.js"></script>'
@@ -45,8 +47,9 @@ elif "zirbel" in os.getcwd():
 	TEMPLATEPATH = "./"
 	MAXTIME = 20
 	MAXTIME = float('inf')
-	MAXCANDIDATESHEATMAP = 300
+	MAXCANDIDATESHEATMAP = 2000
 	MAXCANDIDATES = 100000
+	MAXMEMORY = float('inf')     # megabytes
 	REFRESHTIME = 20
 
 	JS1 = '  <script src="./js/JSmol.min.nojq.js"></script>'
@@ -62,8 +65,9 @@ else:
 	JSONPATH = "/var/www/web-fr3d/Results/"
 	TEMPLATEPATH = "/var/www/web-fr3d/python/"
 	MAXTIME = 1200             # seconds
-	MAXCANDIDATESHEATMAP = 300
+	MAXCANDIDATESHEATMAP = 1000
 	MAXCANDIDATES = 1000
+	MAXMEMORY = 4000           # megabytes
 	REFRESHTIME = 2
 
 	JS1 = '  <script src="http://rna.bgsu.edu/rna3dhub/js/jsmol/JSmol.min.nojq.js"></script>'
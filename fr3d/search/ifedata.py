@@ -15,7 +15,29 @@ def combine_dicts(x,y):
     z.update(y)
     return z
 
-def readPositionsAndInteractions(Q, ifename, alternate=""):
+
+def requiredMoleculeTypesOf(Q):
+    """
+    The set of all molecule types that some unit of the query can have.
+    """
+
+    requiredMoleculeTypes = set()
+    for types in Q["requiredMoleculeType"]:
+        requiredMoleculeTypes.update(types)
+    return requiredMoleculeTypes
+
+
+def needsUnitAnnotations(Q):
+    return "glycosidicBondOrientation" in Q or "chiAngle" in Q or "showGlycosidicBondOrientation" in Q
+
+
+def readPositions(Q, ifename, requiredMoleculeTypes):
+    """
+    Read the centers and rotations of the units of an IFE, without the
+    unit annotations and the pairs, which depend on the query.
+    Also returns the id_to_index of the nucleotides alone, which is what
+    the pairs are mapped with.
+    """
 
     fields =  ifename.split('|')
     PDBID = fields[0]
@@ -32,15 +54,8 @@ def readPositionsAndInteractions(Q, ifename, alternate=""):
     ifedata['centers'] = np.empty((0, 3))
     ifedata['models'] = []
 
-    # accumulate the set of all requiredMoleculeType lists
-    requiredMoleculeTypes = []
-    for index in range(len(Q["requiredMoleculeType"])):
-        requiredMoleculeTypes += Q["requiredMoleculeType"][index]
-    requiredMoleculeTypes = list(set(requiredMoleculeTypes))
-
     # check to see if RNA or DNA is a required unit type, and if so, read NA data
     if "RNA" in requiredMoleculeTypes or "DNA" in requiredMoleculeTypes:
-
         # split chains in an IFE, which are separated by the + character
         for chainString in NA_positions_file_name.split("+"):
 
@@ -77,55 +92,7 @@ def readPositionsAndInteractions(Q, ifename, alternate=""):
 
                 starting_index += len(centers)
 
-        if "glycosidicBondOrientation" in Q or "chiAngle" in Q or "showGlycosidicBondOrientation" in Q:
-            Q, unit_id_to_annotation = readUnitAnnotations(Q,ifename)
-
-            for index in range(0,len(ifedata["units"])):
-                unitID = ifedata['index_to_id'][index]
-                if unitID in unit_id_to_annotation:
-                    gly = unit_id_to_annotation[unitID]['orientation']
-                    chi = unit_id_to_annotation[unitID]['chi_degree']
-                else:
-                    gly = ""
-                    chi = None
-                    fields = unitID.split("|")
-                    while len(fields) < 7:
-                        fields.append('')
-                    for alternate_id in ['A','B','C','O']:
-                        fields[6] = alternate_id
-                        newID = "|".join(fields)
-                        if not 'server' in Q:
-                            print("Trying unit id %s" % newID)
-                        if newID in unit_id_to_annotation:
-                            gly = unit_id_to_annotation[newID]['orientation']
-                            chi = unit_id_to_annotation[newID]['chi_degree']
-                            break
-                if gly:
-                    ifedata["units"][index]["glycosidicBondOrientation"] = gly
-                    try:
-                        chi = float(chi)
-                        chi = round(chi)  # round to nearest integer to match the display
-                        ifedata["units"][index]["chiDegree"] = chi
-                    except:
-                        if not 'server' in Q:
-                            Q["errorMessage"].append("No chi angle for %s" % unitID)
-                        ifedata["units"][index]["chiDegree"] = None
-                else:
-                    Q["errorMessage"].append("No glycosidic bond orientation for %s" % unitID)
-                    ifedata["units"][index]["glycosidicBondOrientation"] = None
-                    ifedata["units"][index]["chiDegree"] = None
-
-    # load NA pair data; even if not part of the query, it's part of the results
-    if "RNA" in requiredMoleculeTypes or "DNA" in requiredMoleculeTypes:
-        if len(ifedata['units']) > 1:
-            Q, interactionToPairs, pairToInteractions, pairToCrossingNumber = readNAPairsFile(Q, PDBID, ifedata["id_to_index"], alternate)
-            ifedata['interactionToPairs'] = interactionToPairs
-            ifedata['pairToInteractions'] = pairToInteractions
-            ifedata['pairToCrossingNumber'] = pairToCrossingNumber
-        else:
-            ifedata['interactionToPairs'] = {}
-            ifedata['pairToInteractions'] = {}
-            ifedata['pairToCrossingNumber'] = {}
+    NA_id_to_index = dict(ifedata['id_to_index'])
 
     # also read protein position file if necessary and append to centers, rotations, ids, ...
     if "protein" in requiredMoleculeTypes:
@@ -150,4 +117,73 @@ def readPositionsAndInteractions(Q, ifename, alternate=""):
                 ifedata["units"].append(unit_information) #append center and rotation information for each unit ID
             starting_index += len(centers)
 
+    return Q, ifedata, NA_id_to_index
+
+
+def addUnitAnnotations(Q, ifedata, unit_id_to_annotation):
+    """
+    Add the glycosidic bond orientation and chi angle to each nucleotide.
+    """
+
+    for index in range(0,len(ifedata["units"])):
+        if ifedata["units"][index]["moleculeType"] == "protein":
+            continue
+        unitID = ifedata['index_to_id'][index]
+        if unitID in unit_id_to_annotation:
+            gly = unit_id_to_annotation[unitID]['orientation']
+            chi = unit_id_to_annotation[unitID]['chi_degree']
+        else:
+            gly = ""
+            chi = None
+            fields = unitID.split("|")
+            while len(fields) < 7:
+                fields.append('')
+            for alternate_id in ['A','B','C','O']:
+                fields[6] = alternate_id
+                newID = "|".join(fields)
+                if not 'server' in Q:
+                    print("Trying unit id %s" % newID)
+                if newID in unit_id_to_annotation:
+                    gly = unit_id_to_annotation[newID]['orientation']
+                    chi = unit_id_to_annotation[newID]['chi_degree']
+                    break
+        if gly:
+            ifedata["units"][index]["glycosidicBondOrientation"] = gly
+            try:
+                chi = float(chi)
+                chi = round(chi)  # round to nearest integer to match the display
+                ifedata["units"][index]["chiDegree"] = chi
+            except:
+                if not 'server' in Q:
+                    Q["errorMessage"].append("No chi angle for %s" % unitID)
+                ifedata["units"][index]["chiDegree"] = None
+        else:
+            Q["errorMessage"].append("No glycosidic bond orientation for %s" % unitID)
+            ifedata["units"][index]["glycosidicBondOrientation"] = None
+            ifedata["units"][index]["chiDegree"] = None
+
+    return Q
+
+
+def readPositionsAndInteractions(Q, ifename, alternate=""):
+
+    PDBID = ifename.split('|')[0]
+    requiredMoleculeTypes = requiredMoleculeTypesOf(Q)
+
+    Q, ifedata, NA_id_to_index = readPositions(Q, ifename, requiredMoleculeTypes)
+
+    if "RNA" in requiredMoleculeTypes or "DNA" in requiredMoleculeTypes:
+        if needsUnitAnnotations(Q):
+            Q, unit_id_to_annotation = readUnitAnnotations(Q,ifename)
+            Q = addUnitAnnotations(Q, ifedata, unit_id_to_annotation)
+
+        # load NA pair data; even if not part of the query, it's part of the results
+        if len(NA_id_to_index) > 1:
+            Q, interactionToPairs, pairToInteractions, pairToCrossingNumber = readNAPairsFile(Q, PDBID, NA_id_to_index, alternate)
+        else:
+            interactionToPairs, pairToInteractions, pairToCrossingNumber = {}, {}, {}
+        ifedata['interactionToPairs'] = interactionToPairs
+        ifedata['pairToInteractions'] = pairToInteractions
+        ifedata['pairToCrossingNumber'] = pairToCrossingNumber
+
     return Q, ifedata
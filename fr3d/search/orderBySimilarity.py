@@ -6,38 +6,20 @@ from myTimer import myTimer
 # see https://matplotlib.org/users/pyplot_tutorial.html
 # from tspy import TSP
 
-def treePenalty(distance):
-    Z = linkage(squareform(distance), "average")
-#    print("regular",Z)
-
-    penalty = np.zeros(distance.shape)
-
-    group = []
-    for i in range(0,distance.shape[0]):
-        group.append([i])
-
-    for merger in Z:
-        a = int(merger[0])
-        b = int(merger[1])
-        group.append(group[a]+group[b])
-        for i in group[a]:
-            for j in group[b]:
-                penalty[i][j] = merger[2]
-                penalty[j][i] = merger[2]
-
-#    print(group)
-
-    if 0 > 1:
-        for i in range(0,len(distance)):
-            for j in range(0,len(distance)):
-                print("%6.3f" % penalty[i][j]),
-            print("")
-
-    return penalty
-
-def treePenalizedPathLength(distance,repetitions=100,seed=None):
+# penalty construction and greedy insertion are shared
+# with the vectorized versions in fr3d.ordering
+from fr3d.ordering.orderBySimilarity import treePenalty
+from fr3d.ordering.orderBySimilarity import greedyInsertionPathLength
+from fr3d.ordering.orderBySimilarity import multipleGreedyInsertionPathLength
+from fr3d.ordering.orderBySimilarity import landmarkPathLengthTwoOpt
+
+def treePenalizedPathLength(distance,repetitions=100,seed=None,maxExactSize=1000):
     penalizedMatrix = distance + 5*treePenalty(distance)
-    order = multipleGreedyInsertionPathLength(penalizedMatrix,repetitions,seed)
+    if distance.shape[0] > maxExactSize:
+        # approximate ordering through landmarks for large heat maps
+        order, score = landmarkPathLengthTwoOpt(penalizedMatrix,400,10,seed)
+    else:
+        order = multipleGreedyInsertionPathLength(penalizedMatrix,repetitions,seed)
     return order
 
 def optimalLeafOrder(distance):
@@ -47,60 +29,10 @@ def optimalLeafOrder(distance):
 
     return dn['leaves']
 
-def greedyInsertionPathLength(distance, order=[], verbose=False):
-
-    # if no starting ordering
-    if len(order) == 0:
-        order = list(range(0,len(distance)))
-        random.shuffle(order)          # random starting ordering
-    path = order[:2]            # first two points of the current ordering
-    score = distance[path[0], path[1]]
-
-    for p in range(2, len(order)):
-        # score inserting point order[p] at beginning of path
-        bestScore = distance[order[p]][path[0]]
-        bestPosition = 0
-
-        # score inserting point order[p] at end of path
-        currentScore = distance[path[-1]][order[p]]
-        if currentScore < bestScore:
-            bestScore = distance[path[-1]][order[p]]
-            bestPosition = len(path)
-
-        # score inserting point order[p] at various points within the path
-        for position in range(1, len(path)):
-            currentScore = distance[path[position-1]][order[p]] + distance[order[p]][path[position]] - distance[path[position-1]][path[position]]
-
-            if currentScore < bestScore:
-                bestScore = currentScore
-                bestPosition = position
-
-        path.insert(bestPosition, order[p])
-        score += bestScore
-
-    return path, score
-
-def multipleGreedyInsertionPathLength(distance, repetitions=100, seed=None):
-
-    if seed:
-        random.seed(seed)
-
-    bestScore = float("inf")
-    for rep in range(0,repetitions):
-        path, score = greedyInsertionPathLength(distance)
-        if score < bestScore:
-            bestScore = score
-            bestPath = path
-
-    return bestPath
-
 def reorderSymmetricMatrix(distance, newOrder):
 
-    newDistance = np.zeros(distance.shape)
-    for i in range(0,newDistance.shape[0]):
-        for j in range(i+1,newDistance.shape[1]):
-           newDistance[i][j] = distance[newOrder[i]][newOrder[j]]
-           newDistance[j][i] = newDistance[i][j]
+    newDistance = np.array(distance[np.ix_(newOrder,newOrder)], dtype=float)
+    np.fill_diagonal(newDistance, 0.0)
 
     return newDistance
 
@@ -151,11 +83,13 @@ def testRuntime():
     for method in methods:
         times[method] = []
 
+    totals = timerData.to_dict()["totals"]
+
     minmin = 0
     maxmax = 0
     for size in sizes:
         for method in methods:
-            newTime = timerData[method+"_"+str(size)]/numReplications
+            newTime = totals[method+"_"+str(size)]["seconds"]/numReplications
             times[method].append(newTime)
             maxmax = max(maxmax,newTime)
             minmin = min(minmin,newTime)
@@ -4,12 +4,15 @@ import math
 from collections import defaultdict
 
 
-def get_pairlist(Q, models, centers, alt_index = False):
+def get_pairlist(Q, models, centers, alt_index = False, neighbor_cache = None):
     """
     Use a fast technique to find all pairs of units whose centers have
     distances within given distance ranges.
     For each pair of positions, return a list of indices whose distances
     are within the min to max range for that pair of positions.
+    neighbor_cache is an optional dictionary kept with the IFE data; the
+    sorted list of nearby pairs is stored there and reused by later queries
+    whose largest distance is the same or smaller.
     """
 
     pairlist = defaultdict(dict)
@@ -20,21 +23,34 @@ def get_pairlist(Q, models, centers, alt_index = False):
             min_coord = np.nanmin(centers)
             max_coord = np.nanmax(centers)
 
-            # square_size is used to map cubes to integers; it's a nice integer larger than the diameter of the coordinates
-            square_size = np.power(10, np.floor(np.log10(max_coord - min_coord))) * np.ceil((max_coord-min_coord)/np.power(10,np.floor(np.log10(max_coord- min_coord))))
-
-            # get all triples of (index1,index2,distance) where distance is below Q["largestMaxRange"]
-            max_pair_list = fixed_radius_search(len(centers), models, centers, Q["largestMaxRange"], square_size)
-
-            # sort these triples by distance
-            max_pair_list = sorted(max_pair_list, key = lambda x : x[2])
+            if neighbor_cache is not None and neighbor_cache.get("radius", -1) >= Q["largestMaxRange"]:
+                # a previous query used a larger radius; keep the closest pairs
+                k = int(np.searchsorted(neighbor_cache["distances"], Q["largestMaxRange"]**2, side = "left"))
+                max_pair_list = neighbor_cache["max_pair_list"][:k]
+                both_pairs_list = neighbor_cache["both_pairs_list"][:(2*k)]
 
-            # we want to return indices in both orders, so make such a list once, then pull slices from it later
-            # that's much, much quicker than building lists of pairs over and over again
-            both_pairs_list = []
-            for a,b,c in max_pair_list:
-                both_pairs_list.append((a,b))
-                both_pairs_list.append((b,a))
+            else:
+                # square_size is used to map cubes to integers; it's a nice integer larger than the diameter of the coordinates
+                square_size = np.power(10, np.floor(np.log10(max_coord - min_coord))) * np.ceil((max_coord-min_coord)/np.power(10,np.floor(np.log10(max_coord- min_coord))))
+
+                # get all triples of (index1,index2,distance) where distance is below Q["largestMaxRange"]
+                max_pair_list = fixed_radius_search(len(centers), models, centers, Q["largestMaxRange"], square_size)
+
+                # sort these triples by distance
+                max_pair_list = sorted(max_pair_list, key = lambda x : x[2])
+
+                # we want to return indices in both orders, so make such a list once, then pull slices from it later
+                # that's much, much quicker than building lists of pairs over and over again
+                both_pairs_list = []
+                for a,b,c in max_pair_list:
+                    both_pairs_list.append((a,b))
+                    both_pairs_list.append((b,a))
+
+                if neighbor_cache is not None:
+                    neighbor_cache["radius"] = Q["largestMaxRange"]
+                    neighbor_cache["distances"] = np.array([c for a,b,c in max_pair_list])
+                    neighbor_cache["max_pair_list"] = max_pair_list
+                    neighbor_cache["both_pairs_list"] = both_pairs_list
 
             if alt_index == False:
                 for i in range(0,Q['numpositions']):
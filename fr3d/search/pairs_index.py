@@ -0,0 +1,324 @@
+"""
+Compiled integer index of the pairwise interactions in one PDB file.
+
+The {PDB}_RNA_pairs.pickle files map each interaction to a list of
+(unit_id_1, unit_id_2, crossing number) triples.  Converting those strings
+to indices on every query is slow for large structures, so the triples are
+compiled once into a table of integer columns, sorted by interaction and
+then by unit, and saved next to the pickle file:
+
+    {PDB}_RNA_pairs_index.npy    unit1, unit2, crossing; memory-mapped
+    {PDB}_RNA_pairs_index.json   unit ids, interaction names, row offsets,
+                                 number of rows and hash of the table
+
+unit1 and unit2 are positions in the list of unit ids of the index, and a
+crossing number of -1 means None.  For each IFE, one array gather maps
+index unit numbers to IFE indices, and pair lookups are binary searches
+in sorted arrays instead of dictionary lookups on tuples.
+"""
+
+import hashlib
+import json
+import os
+import tempfile
+import numpy as np
+
+INDEX_DTYPE = np.dtype([("unit1", np.int32), ("unit2", np.int32), ("crossing", np.int32)])
+
+# pairs of IFE indices are combined into one integer key
+KEY_BASE = np.int64(2**31)
+
+
+def compileNAPairsIndex(interactionToTriples):
+    """
+    Convert a dictionary from interaction to (unit_id_1, unit_id_2, crossing)
+    triples into a table and a dictionary describing it.
+    """
+
+    unit_to_code = {}
+    unit_ids = []
+    interactions = []
+    offsets = [0]
+    blocks = []
+
+    for interaction in interactionToTriples:
+        triples = interactionToTriples[interaction]
+        columns = ([], [], [])
+        for triple in triples:
+            for column in (0, 1):
+                unit_id = triple[column]
+                if not unit_id in unit_to_code:
+                    unit_to_code[unit_id] = len(unit_ids)
+                    unit_ids.append(unit_id)
+                columns[column].append(unit_to_code[unit_id])
+            if triple[2] is None:
+                columns[2].append(-1)
+            else:
+                columns[2].append(int(triple[2]))
+
+        block = np.empty(len(triples), dtype=INDEX_DTYPE)
+        block["unit1"] = columns[0]
+        block["unit2"] = columns[1]
+        block["crossing"] = columns[2]
+
+        # stable sort keeps the original order of repeated pairs
+        block = block[np.lexsort((block["unit2"], block["unit1"]))]
+
+        interactions.append(interaction)
+        blocks.append(block)
+        offsets.append(offsets[-1] + len(block))
+
+    if len(blocks) > 0:
+        table = np.concatenate(blocks)
+    else:
+        table = np.empty(0, dtype=INDEX_DTYPE)
+
+    description = {"unit_ids": unit_ids, "interactions": interactions, "offsets": offsets}
+
+    return table, description
+
+
+def indexFileNames(pathAndFileName):
+    """
+    Names of the two index files that go with a pairs .pickle file.
+    """
+
+    base = pathAndFileName.replace(".pickle", "")
+    return base + "_index.npy", base + "_index.json"
+
+
+def tableHash(table):
+    return hashlib.sha1(np.ascontiguousarray(table).tobytes()).hexdigest()
+
+
+def writeNAPairsIndex(pathAndFileName, table, description):
+    """
+    Write the two index files.  Both are written to temporary files and
+    renamed into place, the description first; the description records
+    the number of rows and a hash of the table, which readNAPairsIndex
+    checks, so a table is never used with the description of another.
+    """
+
+    tableFileName, descriptionFileName = indexFileNames(pathAndFileName)
+    directory = os.path.dirname(os.path.abspath(tableFileName))
+
+    description = dict(description)
+    description["rows"] = len(table)
+    description["sha1"] = tableHash(table)
+
+    temporaryFiles = []
+    try:
+        handle, temporaryTable = tempfile.mkstemp(dir=directory, suffix=".tmp")
+        temporaryFiles.append(temporaryTable)
+        with os.fdopen(handle, "wb") as f:
+            np.save(f, table)
+
+        handle, temporaryDescription = tempfile.mkstemp(dir=directory, suffix=".tmp")
+        temporaryFiles.append(temporaryDescription)
+        with os.fdopen(handle, "w") as f:
+            json.dump(description, f)
+
+        os.replace(temporaryDescription, descriptionFileName)
+        os.replace(temporaryTable, tableFileName)
+    finally:
+        for temporary in temporaryFiles:
+            if os.path.exists(temporary):
+                os.remove(temporary)
+
+
+def readNAPairsIndex(pathAndFileName):
+    """
+    Memory-map the index for a pairs .pickle file if it exists, is newer
+    than the .pickle file and matches its description; otherwise return
+    None, None.
+    """
+
+    tableFileName, descriptionFileName = indexFileNames(pathAndFileName)
+
+    if not os.path.exists(tableFileName) or not os.path.exists(descriptionFileName):
+        return None, None
+
+    if os.path.exists(pathAndFileName):
+        if os.path.getmtime(tableFileName) < os.path.getmtime(pathAndFileName):
+            return None, None
+
+    try:
+        table = np.load(tableFileName, mmap_mode="r")
+        with open(descriptionFileName) as f:
+            description = json.load(f)
+        rows = description.pop("rows", None)
+        digest = description.pop("sha1", None)
+        if rows != len(table) or digest != tableHash(table):
+            return None, None
+    except Exception:
+        return None, None
+
+    return table, description
+
+
+def pairKeys(index1, index2):
+    return np.asarray(index1, dtype=np.int64) * KEY_BASE + np.asarray(index2, dtype=np.int64)
+
+
+class IndexedPairMapping(object):
+    """
+    Mapping from a pair of IFE indices to a value, stored as a sorted array
+    of pair keys.  It supports the dictionary operations that the search
+    uses; values that are assigned later are kept in a small dictionary.
+    """
+
+    def __init__(self, keys):
+        self.sortedKeys = keys
+        self.assigned = {}
+
+    def _row(self, pair):
+        key = pairKeys(pair[0], pair[1])
+        row = np.searchsorted(self.sortedKeys, key)
+        if row < len(self.sortedKeys) and self.sortedKeys[row] == key:
+            return row
+        return None
+
+    def _value(self, row):
+        raise NotImplementedError
+
+    def _missing(self, pair):
+        raise KeyError(pair)
+
+    def __contains__(self, pair):
+        return pair in self.assigned or self._row(pair) is not None
+
+    def __getitem__(self, pair):
+        if pair in self.assigned:
+            return self.assigned[pair]
+        row = self._row(pair)
+        if row is None:
+            return self._missing(pair)
+        return self._value(row)
+
+    def __setitem__(self, pair, value):
+        self.assigned[pair] = value
+
+    def get(self, pair, default=None):
+        if pair in self:
+            return self[pair]
+        return default
+
+    def keys(self):
+        for key in self.sortedKeys:
+            pair = (int(key // KEY_BASE), int(key % KEY_BASE))
+            if not pair in self.assigned:
+                yield pair
+        for pair in self.assigned:
+            yield pair
+
+    def __iter__(self):
+        return self.keys()
+
+    def __len__(self):
+        return len(self.sortedKeys) + sum(1 for pair in self.assigned if self._row(pair) is None)
+
+    def __copy__(self):
+        new = self.__class__.__new__(self.__class__)
+        new.__dict__.update(self.__dict__)
+        new.assigned = dict(self.assigned)
+        return new
+
+
+class PairToInteractions(IndexedPairMapping):
+    """
+    Like a defaultdict(list) from a pair of IFE indices to the list of
+    interaction names between them.
+    """
+
+    def __init__(self, keys, starts, names, nameCodes):
+        IndexedPairMapping.__init__(self, keys)
+        self.starts = starts
+        self.names = names
+        self.nameCodes = nameCodes
+
+    def _value(self, row):
+        return [self.names[c] for c in self.nameCodes[self.starts[row]:self.starts[row+1]]]
+
+    def _missing(self, pair):
+        return []
+
+
+class PairToCrossingNumber(IndexedPairMapping):
+    """
+    Mapping from a pair of IFE indices to its crossing number or None.
+    """
+
+    def __init__(self, keys, crossing):
+        IndexedPairMapping.__init__(self, keys)
+        self.crossing = crossing
+
+    def _value(self, row):
+        if self.crossing[row] < 0:
+            return None
+        return int(self.crossing[row])
+
+
+def indexPairsForIFE(table, description, id_to_index, activeInteractions, alternate=""):
+    """
+    Map an index to the units of one IFE.  Return the same three structures
+    as readNAPairsFile: interaction to (pairs, crossing numbers) for the
+    interactions in the query, and mappings from pairs to interactions and
+    to crossing numbers for all interactions.
+    """
+
+    # gather IFE indices of the units in the index; -1 for units not in the IFE
+    unit_ids = description["unit_ids"]
+    code_to_index = np.full(len(unit_ids) + 1, -1, dtype=np.int64)
+    for code, unit_id in enumerate(unit_ids):
+        if unit_id in id_to_index:
+            code_to_index[code] = id_to_index[unit_id]
+
+    index1 = code_to_index[table["unit1"]]
+    index2 = code_to_index[table["unit2"]]
+    crossing = np.asarray(table["crossing"])
+
+    offsets = description["offsets"]
+    interactions = description["interactions"]
+    nameCodes = np.repeat(np.arange(len(interactions)), np.diff(offsets))
+    keep = (index1 >= 0) & (index2 >= 0)
+
+    interactionToIndexPairs = {}
+
+    for code, interaction in enumerate(interactions):
+        name = interaction + alternate
+        if not name in activeInteractions:
+            continue
+
+        rows = np.arange(offsets[code], offsets[code+1])
+        rows = rows[keep[rows]]
+        pairs = list(zip(index1[rows].tolist(), index2[rows].tolist()))
+        numbers = [None if c < 0 else c for c in crossing[rows].tolist()]
+
+        if "BPh" in interaction or "BR" in interaction:
+            # 0BPh and maybe others can make self interactions
+            isSelf = index1[rows] == index2[rows]
+            interactionToIndexPairs[name] = ([p for p, s in zip(pairs, isSelf) if not s],
+                                             [n for n, s in zip(numbers, isSelf) if not s])
+            interactionToIndexPairs[name + "_self"] = ([p for p, s in zip(pairs, isSelf) if s],
+                                                       [n for n, s in zip(numbers, isSelf) if s])
+        else:
+            interactionToIndexPairs[name] = (pairs, numbers)
+
+    # sort all kept rows by pair, keeping the order of interactions within a pair
+    rows = np.nonzero(keep)[0]
+    keys = pairKeys(index1[rows], index2[rows])
+    order = np.argsort(keys, kind="stable")
+    rows = rows[order]
+    keys = keys[order]
+
+    uniqueKeys, starts = np.unique(keys, return_index=True)
+    starts = np.append(starts, len(keys))
+
+    # as with a dictionary, the crossing number of the last interaction is kept
+    lastRows = rows[starts[1:] - 1]
+
+    names = [interaction + alternate for interaction in interactions]
+    pairToInteractions = PairToInteractions(uniqueKeys, starts, names, nameCodes[rows])
+    pairToCrossingNumber = PairToCrossingNumber(uniqueKeys, crossing[lastRows])
+
+    return interactionToIndexPairs, pairToInteractions, pairToCrossingNumber
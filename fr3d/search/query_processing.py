@@ -1065,6 +1065,7 @@ def calculateQueryConstraints(Q):
                     if len(chains) == 0:
                         # no pre-computed pairwise annotations found
                         # attempt to annotate pairs from the .cif file
+                        pass
 
 
                 else:
@@ -1084,7 +1085,10 @@ def calculateQueryConstraints(Q):
 
             # read the units folder to see what chains are available and list those
             if not unit_data_file:
-                unit_data_file = readUnitFileNames(Q["PDB_data_file"])
+                if "unit_data_file" in Q:
+                    unit_data_file = Q["unit_data_file"]
+                else:
+                    unit_data_file = readUnitFileNames(Q["PDB_data_file"])
 
             #print("  query_processing: list of local chain files found:")
             #print(unit_data_file)
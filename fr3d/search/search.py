@@ -4,8 +4,9 @@ Created on Sun Nov 10 3:00:00 2021
 
 """
 
-from discrepancy import matrix_discrepancy_cutoff
+from fr3d.geometry.discrepancy import matrix_discrepancy_one_vs_many
 from myTimer import myTimer
+from fr3d.instrumentation import count as count_event
 from copy import copy
 from collections import defaultdict
 import numpy as np
@@ -592,6 +593,7 @@ def FR3D_search(Q, ifedata, ifename, timerData):
 
     IFEStartTime = time()
     CPUStartTime = cputime()
+    count_event("search IFEs", 1)
 
     numpositions = Q['numpositions']
     interactionToPairs = ifedata['interactionToPairs']
@@ -670,7 +672,9 @@ def FR3D_search(Q, ifedata, ifename, timerData):
     # Impose pairwise distance constraints for geometric and mixed searches
     # This can take 20% or more of the runtime in geometric and mixed searches
     timerData = myTimer("Calculating pairwise distances")
-    listOfPairs = get_pairlist(Q, ifedata["models"], ifedata["centers"])
+    listOfPairs = get_pairlist(Q, ifedata["models"], ifedata["centers"],
+                               neighbor_cache = ifedata.get("neighborCache"))
+    count_event("search unit pairs within distance", sum(len(p) for row in listOfPairs.values() for p in row.values() if p != "full"))
 
 
     # define the initial universe for each position in the query; they are sets
@@ -1056,6 +1060,7 @@ def FR3D_search(Q, ifedata, ifename, timerData):
     # screen to make sure that no possibility has units with different alternate id (typically A or B)
     timerData = myTimer("Same alternate id")
     possibilities = sameAlternateId(Q, ifedata, possibilities)
+    count_event("search possibilities", len(possibilities))
 
     if not SERVER and len(possibilities) > 0:
         print("Found %5d possibilities from %s in %10.4f seconds" % (len(possibilities),ifename,(time() - IFEStartTime)))
@@ -1069,20 +1074,22 @@ def FR3D_search(Q, ifedata, ifename, timerData):
         queryrotations = [Q["rotations"][i] for i in perm]
         timerData = myTimer("Discrepancy from query")
 
-        possibility_to_discrepancy = {}
+        # compare the query to all possibilities at once
+        possibilities = list(possibilities)
+        possibilitycenters = []
+        possibilityrotations = []
         for possibility in possibilities:
-            possibilitycenters = []
-            for i in range(0, numpositions):
-                possibilitycenters.append(units[possibility[i]]["centers"])
-            possibilityrotations = []
-            for i in range(0, numpositions):
-                possibilityrotations.append(units[possibility[i]]["rotations"])
+            possibilitycenters.append([units[possibility[i]]["centers"] for i in range(0, numpositions)])
+            possibilityrotations.append([units[possibility[i]]["rotations"] for i in range(0, numpositions)])
 
-            d = matrix_discrepancy_cutoff(querycenters, queryrotations, possibilitycenters,
-                possibilityrotations, Q["discrepancy"])
+        possibility_to_discrepancy = {}
+        if possibilities:
+            discrepancies = matrix_discrepancy_one_vs_many(querycenters, queryrotations,
+                possibilitycenters, possibilityrotations, cutoff=Q["discrepancy"])
 
-            if d is not None and d < Q["discrepancy"]:
-                possibility_to_discrepancy[possibility] = d
+            for possibility, d in zip(possibilities, discrepancies.tolist()):
+                if d < Q["discrepancy"]:
+                    possibility_to_discrepancy[possibility] = d
 
         # turns out, it's faster to calculate discrepancies than to compare symmetry operators
         # since the comparison is like O(n^2) and calculating discripancies is like O(n)
@@ -1120,5 +1127,7 @@ def FR3D_search(Q, ifedata, ifename, timerData):
             newcandidate['interactions'] = lookUpInteractions(Q,indices,
                 pairToInteractions, pairToCrossingNumber, units)
             candidates.append(newcandidate)
-    
+
+    count_event("search candidates", len(candidates))
+
     return Q, candidates, cputime()-CPUStartTime
\ No newline at end of file
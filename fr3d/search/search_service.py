@@ -0,0 +1,311 @@
+"""
+Run FR3D as a long-lived local service so that data files stay in memory
+between queries.
+
+Each request is one line of JSON sent over a Unix socket or a localhost
+port.  A request is either a query in the same format that
+readQueryFromJSON reads from a file, an object {"queryFile": "Query_x.json"}
+naming such a file, or a command {"command": "stats"}, {"command": "clear"}
+or {"command": "shutdown"}.  The reply is one line of JSON with the unit
+ids of the candidates, the messages from the search, and cache statistics.
+
+Queries are run one at a time; FR3D keeps some state in module-level
+variables and is not safe to run in several threads at once.
+
+Start the service with
+    python search_service.py --socket /tmp/fr3d.sock
+or
+    python search_service.py --port 8765
+"""
+
+import argparse
+import json
+import os
+import socket
+import socketserver
+import sys
+import threading
+from collections import OrderedDict
+from time import time
+
+from FR3D import initializeQuery
+from FR3D import runQuery
+from fr3d.instrumentation import recorder
+from fr3d.instrumentation import memory_available
+from file_reading import indexNAPairs
+from file_reading import readNAPairsIndexFile
+from file_reading import readPDBDatafile
+from file_reading import readUnitAnnotations
+from ifedata import addUnitAnnotations
+from ifedata import needsUnitAnnotations
+from ifedata import readPositions
+from ifedata import requiredMoleculeTypesOf
+from query_processing import readQueryFromJSON
+from query_processing import readUnitFileNames
+
+
+class IFECache(object):
+    """
+    Least recently used cache of the data that readPositionsAndInteractions
+    reads for each IFE, plus the PDB data file and the list of unit files,
+    which are the same for every query.
+    What is cached is the data that does not depend on the query: the
+    positions of the units, the integer index of the pairs file and the
+    unit annotations.  The pairs of the active interactions and the
+    glycosidic bond orientations are added for each query.
+    Each cached IFE also keeps the list of nearby pairs computed by
+    get_pairlist, so a repeat query does not search for neighbors again.
+    When the process uses more than maxmemory megabytes, the least recently
+    used IFEs are dropped until it does not or the cache is empty.
+    """
+
+    def __init__(self, maxsize=200, maxmemory=float('inf')):
+        self.maxsize = maxsize
+        self.maxmemory = maxmemory
+        self.evictedForMemory = 0
+        self.ifedata = OrderedDict()
+        self.datafiles = {}
+        self.hits = {"ifedata": 0, "datafiles": 0}
+        self.misses = {"ifedata": 0, "datafiles": 0}
+
+    def _entry(self, Q, ifename, requiredMoleculeTypes):
+        """
+        The cached positions of the units of an IFE, read the first time.
+        """
+
+        # which molecule types are loaded depends on the query
+        key = (ifename, tuple(sorted(requiredMoleculeTypes)))
+
+        if key in self.ifedata:
+            self.hits["ifedata"] += 1
+            self.ifedata.move_to_end(key)
+            entry = self.ifedata[key]
+            # messages about missing files are repeated on every hit
+            Q["errorMessage"].extend(entry["messages"])
+            return Q, entry
+
+        self.misses["ifedata"] += 1
+        numMessages = len(Q["errorMessage"])
+        Q, ifedata, NA_id_to_index = readPositions(Q, ifename, requiredMoleculeTypes)
+        entry = {"ifedata": ifedata, "NA_id_to_index": NA_id_to_index,
+                 "neighborCache": {}, "pairs": {}, "unitAnnotations": None,
+                 "messages": Q["errorMessage"][numMessages:]}
+
+        self.ifedata[key] = entry
+        while len(self.ifedata) > self.maxsize:
+            self.ifedata.popitem(last=False)
+        while len(self.ifedata) > 1 and memory_available(self.maxmemory) < 0:
+            self.ifedata.popitem(last=False)
+            self.evictedForMemory += 1
+
+        return Q, entry
+
+    def readPositionsAndInteractions(self, Q, ifename, alternate=""):
+        """
+        Same arguments and return values as readPositionsAndInteractions,
+        but files are read from disk only the first time.
+        """
+
+        PDBID = ifename.split('|')[0]
+        requiredMoleculeTypes = requiredMoleculeTypesOf(Q)
+        Q, entry = self._entry(Q, ifename, requiredMoleculeTypes)
+
+        # units get query-specific annotations, so each query has its own copies
+        ifedata = dict(entry["ifedata"])
+        ifedata["units"] = [dict(unit) for unit in ifedata["units"]]
+        ifedata["neighborCache"] = entry["neighborCache"]
+
+        if "RNA" in requiredMoleculeTypes or "DNA" in requiredMoleculeTypes:
+            if needsUnitAnnotations(Q):
+                if entry["unitAnnotations"] is None:
+                    Q, entry["unitAnnotations"] = readUnitAnnotations(Q, ifename)
+                Q = addUnitAnnotations(Q, ifedata, entry["unitAnnotations"])
+
+            NA_id_to_index = entry["NA_id_to_index"]
+            if len(NA_id_to_index) > 1:
+                if alternate not in entry["pairs"]:
+                    Q, table, description, interactionToTriples = readNAPairsIndexFile(Q, PDBID, alternate)
+                    entry["pairs"][alternate] = (table, description, interactionToTriples)
+                table, description, interactionToTriples = entry["pairs"][alternate]
+                Q, interactionToPairs, pairToInteractions, pairToCrossingNumber = indexNAPairs(
+                    Q, table, description, interactionToTriples, NA_id_to_index, alternate)
+            else:
+                interactionToPairs, pairToInteractions, pairToCrossingNumber = {}, {}, {}
+            ifedata['interactionToPairs'] = interactionToPairs
+            ifedata['pairToInteractions'] = pairToInteractions
+            ifedata['pairToCrossingNumber'] = pairToCrossingNumber
+
+        return Q, ifedata
+
+    def _datafile(self, name, reader):
+        if name in self.datafiles:
+            self.hits["datafiles"] += 1
+        else:
+            self.misses["datafiles"] += 1
+            self.datafiles[name] = reader()
+        return self.datafiles[name]
+
+    def PDBDatafile(self):
+        return self._datafile("PDB_data_file", readPDBDatafile)
+
+    def unitFileNames(self):
+        return self._datafile("unit_data_file",
+            lambda: readUnitFileNames(self.PDBDatafile()))
+
+    def clear(self):
+        self.ifedata.clear()
+        self.datafiles.clear()
+
+    def stats(self):
+        """
+        Return the number of cached IFEs and units and the hit rates.
+        """
+
+        stats = {}
+        stats["maxsize"] = self.maxsize
+        if self.maxmemory < float('inf'):
+            stats["maxmemory"] = self.maxmemory
+        else:
+            stats["maxmemory"] = None
+        stats["evictedForMemory"] = self.evictedForMemory
+        stats["ifes"] = len(self.ifedata)
+        stats["units"] = sum(len(entry["ifedata"]["units"]) for entry in self.ifedata.values())
+        stats["neighborLists"] = sum(1 for entry in self.ifedata.values() if entry["neighborCache"])
+        stats["datafiles"] = sorted(self.datafiles.keys())
+        for kind in ["ifedata", "datafiles"]:
+            total = self.hits[kind] + self.misses[kind]
+            stats[kind + "Hits"] = self.hits[kind]
+            stats[kind + "Misses"] = self.misses[kind]
+            if total > 0:
+                stats[kind + "HitRate"] = float(self.hits[kind]) / total
+            else:
+                stats[kind + "HitRate"] = 0.0
+        return stats
+
+
+def handleRequest(request, cache):
+    """
+    Run one request and return the reply as a dictionary.
+    """
+
+    if "command" in request:
+        if request["command"] == "stats":
+            return {"cache": cache.stats()}
+        elif request["command"] == "clear":
+            cache.clear()
+            return {"cache": cache.stats()}
+        elif request["command"] == "shutdown":
+            return {"shutdown": True, "cache": cache.stats()}
+        else:
+            return {"errorMessage": ["Unknown command %s" % request["command"]]}
+
+    startTime = time()
+
+    # timings and counters are reported per query, so do not let them pile up
+    recorder.reset()
+
+    if "queryFile" in request:
+        Q = readQueryFromJSON(request["queryFile"])
+    else:
+        Q = request
+        if not "name" in Q or not Q["name"]:
+            Q["name"] = Q.get("queryID", "")
+
+    Q = initializeQuery(Q)
+    Q, candidates, allvsallmatrix = runQuery(Q, cache)
+
+    reply = {}
+    reply["name"] = Q["name"]
+    reply["numFilesSearched"] = Q.get("numFilesSearched", 0)
+    reply["candidates"] = []
+    for candidate in candidates:
+        c = {"unitids": candidate["unitids"]}
+        if "discrepancy" in candidate:
+            c["discrepancy"] = float(candidate["discrepancy"])
+        reply["candidates"].append(c)
+    reply["userMessage"] = Q["userMessage"]
+    reply["errorMessage"] = Q["errorMessage"]
+    reply["elapsedClockTime"] = time() - startTime
+    reply["cache"] = cache.stats()
+
+    return reply
+
+
+class FR3DRequestHandler(socketserver.StreamRequestHandler):
+    """
+    Read one line of JSON, run it, and write one line of JSON back.
+    """
+
+    def handle(self):
+        line = self.rfile.readline()
+        if not line:
+            return
+
+        try:
+            reply = handleRequest(json.loads(line.decode("utf-8")), self.server.cache)
+        except Exception as e:
+            reply = {"errorMessage": ["%s: %s" % (type(e).__name__, e)]}
+
+        self.wfile.write((json.dumps(reply) + "\n").encode("utf-8"))
+
+        if reply.get("shutdown"):
+            # shutdown() waits for serve_forever to return, so it needs its own thread
+            threading.Thread(target=self.server.shutdown).start()
+
+
+def makeServer(cache, socketPath=None, port=None):
+    """
+    Make a server listening on a Unix socket if socketPath is given,
+    otherwise on the given port of localhost.
+    """
+
+    if socketPath:
+        if os.path.exists(socketPath):
+            os.remove(socketPath)
+        server = socketserver.UnixStreamServer(socketPath, FR3DRequestHandler)
+    else:
+        server = socketserver.TCPServer(("127.0.0.1", port), FR3DRequestHandler)
+    server.cache = cache
+    return server
+
+
+def sendRequest(request, socketPath=None, port=None):
+    """
+    Send one request to a running service and return its reply.
+    """
+
+    if socketPath:
+        s = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+        s.connect(socketPath)
+    else:
+        s = socket.create_connection(("127.0.0.1", port))
+
+    with s:
+        s.sendall((json.dumps(request) + "\n").encode("utf-8"))
+        f = s.makefile("rb")
+        reply = json.loads(f.readline().decode("utf-8"))
+
+    return reply
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Serve FR3D queries from memory")
+    parser.add_argument("--socket", default=None, help="Path of a Unix socket to listen on")
+    parser.add_argument("--port", type=int, default=8765, help="Port on localhost to listen on")
+    parser.add_argument("--cachesize", type=int, default=200, help="Number of IFEs to keep in memory")
+    parser.add_argument("--maxmemory", type=float, default=float('inf'), help="Megabytes the service may use before dropping cached IFEs")
+    args = parser.parse_args()
+
+    server = makeServer(IFECache(args.cachesize, args.maxmemory), args.socket, args.port)
+    if args.socket:
+        print("FR3D search service listening on %s" % args.socket)
+    else:
+        print("FR3D search service listening on 127.0.0.1:%d" % args.port)
+    sys.stdout.flush()
+
+    try:
+        server.serve_forever()
+    finally:
+        server.server_close()
+        if args.socket and os.path.exists(args.socket):
+            os.remove(args.socket)
@@ -1,7 +1,10 @@
 # write the list of candidate ids and all against all discrepancies to an .html file
 
+import gzip
+import json
 import numpy as np
 import os
+import shutil
 from collections import defaultdict
 from fr3d_configuration import SERVER
 from fr3d_configuration import OUTPUTPATH
@@ -40,169 +43,243 @@ def format_resolution(data):
             s = "NA"
     return s
 
-def writeHTMLOutput(Q,candidates,allvsallmatrix=np.empty( shape=(0, 0) )):
-    """ Write the list of candidates in an HTML format that also shows
-    the coordinate window and a heat map of all-against-all distances.
+def getOutputFilename(Q):
+    """ Name of the output files without extension, relative to OUTPUTPATH
     """
 
-    pairTypes = ['glycosidicBondOrientation','chiDegree','pairsStacks','coplanar','BPh','BR','sO','crossingNumber']
-    pairsToPrint = defaultdict(list)
+    if SERVER:
+        filename = Q['queryID'] + "/" + Q['queryID']
+    else:
+        filename = Q['name'].replace(" ","_")
 
-    # record which of the many possible pairwise interaction columns contain data
-    for pairType in pairTypes:
-        for candidate in candidates:
-            interactions = candidate["interactions"]
-            for a in range(0,len(candidate['indices'])):        # first position
-                for b in range(0,len(candidate['indices'])):    # second position
+    return filename
+
+def findPairsToPrint(candidates, pairTypes, skipEmptyCrossing):
+    """ Record which of the many possible pairwise interaction columns contain data
+    """
+
+    pairsToPrint = defaultdict(set)
+
+    for candidate in candidates:
+        interactions = candidate["interactions"]
+        n = len(candidate['indices'])
+        for pairType in pairTypes:
+            for a in range(0,n):          # first position
+                for b in range(0,n):      # second position
                     if (a,b,pairType) in interactions:
-                        if not pairType == 'crossingNumber':
-                            pairsToPrint[pairType].append((a,b))
+                        if not skipEmptyCrossing or not pairType == 'crossingNumber':
+                            pairsToPrint[pairType].add((a,b))
                         elif len(interactions[(a,b,pairType)]) > 0 \
                          and interactions[(a,b,pairType)][0] != '0' \
                          and interactions[(a,b,pairType)][0] != 'None':
-                            pairsToPrint[pairType].append((a,b))
+                            pairsToPrint[pairType].add((a,b))
 
-    pagetitle = "FR3D %s" % Q['name'].encode('ascii','ignore')
+    return pairsToPrint
 
-    if SERVER:
-        htmlfilename = Q['queryID'] + "/" + Q['queryID']
+def interactionColumns(pairsToPrint, pairTypes):
+    """ List of (pairType,(a,b)) for the interaction columns, in output order
+    """
+
+    columns = []
+    for pairType in pairTypes:
+        for c in sorted(pairsToPrint[pairType]):
+            if c[0] < c[1] or (c[0] != c[1] and pairType in ["BPh","BR","sO"]) or (c[0]==c[1] and pairType in ["glycosidicBondOrientation","chiDegree"]):
+                columns.append((pairType,c))
+    return columns
+
+def candidateSequence(candidate, numPositions, separators):
+    """ Nucleotide sequence of a candidate with symbols showing backbone connectivity;
+    separators are the symbols for successive, later, earlier and different chains
+    """
+
+    sequence = ""
+    for j in range(0,numPositions):
+        fields = candidate["unitids"][j].split("|")
+        sequence += fields[3]
+
+        if len(fields) == 9:     # symmetry operator present
+            symm = fields[8]
+        else:
+            symm = ""
+
+        if j+1 < numPositions:
+            # if same chain and same symmetry operator, if present
+            cfields = candidate["unitids"][j+1].split("|")
+            if len(cfields) == 9:     # symmetry operator present
+                csymm = cfields[8]
+            else:
+                csymm = ""
+
+            if fields[2] == cfields[2] and symm == csymm:
+                if candidate['chainindices'][j] + 1 == candidate['chainindices'][j+1]: # successive
+                    sequence += separators[0]
+                elif candidate['chainindices'][j] + 1 < candidate['chainindices'][j+1]: # later
+                    sequence += separators[1]
+                else:
+                    sequence += separators[2]
+            else:
+                sequence += separators[3]
+
+    return sequence
+
+def candidateInteraction(interactions, pairType, c):
+    """ Comma separated interactions of one type, or None if there are none
+    """
+
+    key = (c[0],c[1],pairType)
+    if key in interactions and len(interactions[key]) > 0 and interactions[key][0] != "None":
+        return ",".join(interactions[key])
+    return None
+
+def resolutionText(Q, candidate):
+    PDB_id = candidate["unitids"][0][0:4]
+    if PDB_id in Q["PDB_data_file"]:
+        return format_resolution(Q["PDB_data_file"][PDB_id])
     else:
-        htmlfilename = Q['name'].replace(" ","_").encode('ascii', 'ignore')
-        htmlfilename = Q['name'].replace(" ","_")
+        return "NA"
 
-    candidatelist = '<table id="instances"; style="white-space:nowrap;">\n'
+def htmlCandidateRow(Q, i, candidate, columns):
+    """ One row of the HTML table of candidates
+    """
 
     numPositions = Q["numpositions"]
 
-    # write header line, with instructions about how to sort each column
-    candidatelist += "<tr><th onclick=\"sortTable(0,\'instances\',\'numeric\')\">S.</th><th onclick=\"sortTable(1,\'instances\',\'checkbox\')\">Show</th>"
-    header_column = 2
-    if Q["type"] == "geometric" or Q["type"] == "mixed":
-        candidatelist += "<th onclick=\"sortTable(2,\'instances\',\'numeric\')\">Discrepancy</th>"
-        header_column = 3
-    candidatelist += "<th onclick=\"sortTable(%d,\'instances\',\'numeric\')\">Res. &#8491;</th>" % header_column # or try  &#x212B;
-    header_column += 1
+    row = ['<tr><td>',str(i+1),'.</td><td><label><input type="checkbox" id="',str(i),'" class="jmolInline" data-coord="']
+    row.append(",".join(candidate["unitids"][0:numPositions]))
+    row.append('">&nbsp</label></td>')
+    if(Q["type"] == "geometric" or Q["type"] == "mixed"):
+        row.append("<td>%0.4f" % candidate["discrepancy"] + "</td>")
+
+    row.append("<td>%s</td>" % resolutionText(Q, candidate))
+
+    # write unit ids
     for j in range(0,numPositions):
-        candidatelist += "<th onclick=\"sortTable(%d,\'instances\',\'alpha\')\">Position %d</th>" % (header_column,j+1)
-        header_column += 1
-    candidatelist += "<th onclick=\"sortTable(%d,\'instances\',\'alpha\')\">Sequence</th>" % header_column
-    header_column += 1
-    sequence_column = header_column
-    for pairType in pairTypes:
-        for c in sorted(list(set(pairsToPrint[pairType]))):
-            if c[0] < c[1] or (c[0] != c[1] and pairType in ["BPh","BR","sO"]) or (c[0]==c[1] and pairType in ["glycosidicBondOrientation","chiDegree"]):
-                if c[0] == c[1] and pairType == 'glycosidicBondOrientation':
-                    candidatelist += "<th onclick=\"sortTable(%d,\'instances\',\'alpha\')\">Conf. %d</th>" % (header_column,c[0]+1)
-                    header_column += 1
-                elif c[0] == c[1] and pairType == 'chiDegree':
-                    candidatelist += "<th onclick=\"sortTable(%d,\'instances\',\'numeric\')\">Chi %d</th>" % (header_column,c[0]+1)
-                    header_column += 1
-                elif pairType == 'crossingNumber':
-                    candidatelist += "<th onclick=\"sortTable(%d,\'instances\',\'alpha\')\">Crossing %d--%d</th>" % (header_column,c[0]+1,c[1]+1)
-                    header_column += 1
-                else:
-                    candidatelist += "<th onclick=\"sortTable(%d,\'instances\',\'alpha\')\">%d--%d</td>" % (header_column,c[0]+1,c[1]+1)
-                    header_column += 1
-    candidatelist += "</tr>\n"
-
-    # write one row for each candidate
-    for i in range(0,len(candidates)):
-        candidate = candidates[i]
-        candidatelist += '<tr><td>'+str(i+1)+'.</td><td><label><input type="checkbox" id="'+str(i)+'" class="jmolInline" data-coord="'
-        for j in range(0,numPositions):
-            candidatelist += candidate["unitids"][j]
-            if j < numPositions-1:
-                candidatelist += ','
-        candidatelist += '">&nbsp</label></td>'
-        if(Q["type"] == "geometric" or Q["type"] == "mixed"):
-            candidatelist += "<td>%0.4f" % candidate["discrepancy"] + "</td>"
-
-        PDB_id = candidate["unitids"][0][0:4]
-        if PDB_id in Q["PDB_data_file"]:
-            candidatelist += "<td>%s</td>" % format_resolution(Q["PDB_data_file"][PDB_id])
+        row.append("<td>"+candidate["unitids"][j]+"</td>")
+
+    # write nucleotide sequence with helpful separator symbols
+    row.append("<td>"+candidateSequence(candidate, numPositions, ["-","&#8594;","&#8592;","."])+"</td>")
+
+    # write interactions by group
+    # multiple interactions of the same type separated by commas
+    interactions = candidate["interactions"]
+    for pairType, c in columns:
+        text = candidateInteraction(interactions, pairType, c)
+        if text is None:
+            row.append("<td></td>")
         else:
-            candidatelist += "<td>NA</td>"
+            row.append("<td>"+text+"</td>")
 
-        # write unit ids
-        for j in range(0,numPositions):
-            candidatelist += "<td>"+candidate["unitids"][j]+"</td>"
+    row.append('</tr>\n')
+    return "".join(row)
 
-        # write nucleotide sequence with helpful separator symbols
-        sequence = ""
-        for j in range(0,numPositions):
-            fields = candidate["unitids"][j].split("|")
-            sequence += fields[3]
+def csvCandidateRow(Q, i, candidate, columns):
+    """ One line of the CSV file of candidates
+    """
 
-            if len(fields) == 9:     # symmetry operator present
-                symm = fields[8]
-            else:
-                symm = ""
+    numPositions = Q["numpositions"]
 
-            if j+1 < numPositions:
-                # if same chain and same symmetry operator, if present
-                cfields = candidate["unitids"][j+1].split("|")
-                if len(cfields) == 9:     # symmetry operator present
-                    csymm = cfields[8]
-                else:
-                    csymm = ""
-
-                if fields[2] == cfields[2] and symm == csymm:
-                    if candidate['chainindices'][j] + 1 == candidate['chainindices'][j+1]: # successive
-                        sequence += "-"
-                    elif candidate['chainindices'][j] + 1 < candidate['chainindices'][j+1]: # later
-                        sequence += "&#8594;"
-                    else:
-                        sequence += "&#8592;"
-                else:
-                    sequence += "."
-        candidatelist += "<td>"+sequence+"</td>"
+    row = [str(i+1)+',']
+    if(Q["type"] == "geometric" or Q["type"] == "mixed"):
+        row.append("%0.4f," % candidate["discrepancy"])
 
-        # write interactions by group
-        interactions = candidate["interactions"]
-        for pairType in pairTypes:
-            for c in sorted(list(set(pairsToPrint[pairType]))):
-                if c[0] < c[1] or (c[0] != c[1] and pairType in ["BPh","BR","sO"]) or (c[0]==c[1] and pairType in ["glycosidicBondOrientation","chiDegree"]):
-                    if (c[0],c[1],pairType) in interactions and len(interactions[(c[0],c[1],pairType)]) > 0 and interactions[(c[0],c[1],pairType)][0] != "None":
-                        # multiple interactions of the same type separated by commas
-                        candidatelist += "<td>"+",".join(interactions[(c[0],c[1],pairType)])+"</td>"
-                    else:
-                        candidatelist += "<td></td>"
+    row.append(resolutionText(Q, candidate) + ",")
+
+    # write unit ids
+    for j in range(0,numPositions):
+        row.append(candidate["unitids"][j]+",")
 
-        candidatelist += '</tr>\n'
-    candidatelist += '</table>\n'
+    # write nucleotide sequence with helpful separator symbols
+    row.append(candidateSequence(candidate, numPositions, ["--","->","<-",".."]) + ",")
 
-    discrepancydata = "var data =  []\n"
+    # write interactions by group
+    interactions = candidate["interactions"]
+    for pairType, c in columns:
+        text = candidateInteraction(interactions, pairType, c)
+        if text is None:
+            row.append(",")
+        else:
+            row.append('"'+text+'",')
 
-    if np.size(allvsallmatrix) > 0:
-        # write discrepancy data in new 2022 list format
-        # first element is a reference to the div in which the heatmap should appear
-        discrepancydata = 'var data = ["#heatmap",[\n'            # start a list, start a matrix
-
-        # second element is a matrix with the numerical values of the discrepancy
-        # writing both upper and lower triangles of the matrix
-        s = allvsallmatrix.shape[0]
-        for c in range(0,s):
-            discrepancydata += '['     # start a row of the discrepancy matrix
-            ife1 = candidates[c]["unitids"][0]
-            for d in range(0,s):
-                ife2 = candidates[d]["unitids"][0]
-                discrepancydata += "%.4f" % allvsallmatrix[c][d]  # one entry
-                if d < s-1:
-                    discrepancydata += ','  # commas between entries in a row
-                else:
-                    discrepancydata += '],\n'  # end a row, newline
+    # make list of unit ids
+    unit_id_list = ",".join(candidate["unitids"][0:numPositions])
 
-        discrepancydata += '],\n'           # end the matrix, continue the list
+    # make link to view
+    row.append('"http://rna.bgsu.edu/rna3dhub/display3D/unitid/' + unit_id_list + '",')
 
-        # third element is a list of labels of instances
-        discrepancydata += '['              # start list of instances
-        for c in range(0,s):
-            ife1 = candidates[c]["unitids"][0]
-            discrepancydata += '"' + ife1 + '"'    # write one instance name in quotes
-            if c < s-1:
-                discrepancydata += ","  # commas between instances
-            else:
-                discrepancydata += "]\n]" # end list of instances, end list of data
+    # make link to coordinates
+    row.append('"http://rna.bgsu.edu/rna3dhub/rest/getCoordinates?coord=' + unit_id_list + '",')
+
+    # make link to sequence variability server
+    row.append('"http://rna.bgsu.edu/correspondence/variability?id=' + unit_id_list + '&format=unique",')
+
+    row.append('\n')
+    return "".join(row)
+
+def writeDiscrepancyData(myfile, candidates, allvsallmatrix):
+    """ Write discrepancy data in new 2022 list format, one row at a time
+    """
+
+    myfile.write('<script type="text/javascript">\n')
+
+    # first element is a reference to the div in which the heatmap should appear
+    myfile.write('var data = ["#heatmap",[\n')            # start a list, start a matrix
+
+    # second element is a matrix with the numerical values of the discrepancy
+    # writing both upper and lower triangles of the matrix
+    s = allvsallmatrix.shape[0]
+    for c in range(0,s):
+        myfile.write('[' + ",".join(["%.4f" % x for x in allvsallmatrix[c]]) + '],\n')
+
+    myfile.write('],\n')           # end the matrix, continue the list
+
+    # third element is a list of labels of instances
+    myfile.write('[' + ",".join(['"' + candidates[c]["unitids"][0] + '"' for c in range(0,s)]) + "]\n]")
+
+    myfile.write('\n</script>')
+
+def htmlPageParts(Q,candidates,allvsallmatrix=np.empty( shape=(0, 0) )):
+    """ The parts of the HTML page around the candidate rows: the name of
+    the output file, the interaction columns, the page up to the candidate
+    table, the table header, and the page before and after the discrepancy
+    data.
+    """
+
+    pairTypes = ['glycosidicBondOrientation','chiDegree','pairsStacks','coplanar','BPh','BR','sO','crossingNumber']
+    pairsToPrint = findPairsToPrint(candidates, pairTypes, True)
+    columns = interactionColumns(pairsToPrint, pairTypes)
+
+    pagetitle = "FR3D %s" % Q['name'].encode('ascii','ignore')
+
+    htmlfilename = getOutputFilename(Q)
+
+    numPositions = Q["numpositions"]
+
+    # write header line, with instructions about how to sort each column
+    header = '<table id="instances"; style="white-space:nowrap;">\n'
+    header += "<tr><th onclick=\"sortTable(0,\'instances\',\'numeric\')\">S.</th><th onclick=\"sortTable(1,\'instances\',\'checkbox\')\">Show</th>"
+    header_column = 2
+    if Q["type"] == "geometric" or Q["type"] == "mixed":
+        header += "<th onclick=\"sortTable(2,\'instances\',\'numeric\')\">Discrepancy</th>"
+        header_column = 3
+    header += "<th onclick=\"sortTable(%d,\'instances\',\'numeric\')\">Res. &#8491;</th>" % header_column # or try  &#x212B;
+    header_column += 1
+    for j in range(0,numPositions):
+        header += "<th onclick=\"sortTable(%d,\'instances\',\'alpha\')\">Position %d</th>" % (header_column,j+1)
+        header_column += 1
+    header += "<th onclick=\"sortTable(%d,\'instances\',\'alpha\')\">Sequence</th>" % header_column
+    header_column += 1
+    sequence_column = header_column
+    for pairType, c in columns:
+        if c[0] == c[1] and pairType == 'glycosidicBondOrientation':
+            header += "<th onclick=\"sortTable(%d,\'instances\',\'alpha\')\">Conf. %d</th>" % (header_column,c[0]+1)
+        elif c[0] == c[1] and pairType == 'chiDegree':
+            header += "<th onclick=\"sortTable(%d,\'instances\',\'numeric\')\">Chi %d</th>" % (header_column,c[0]+1)
+        elif pairType == 'crossingNumber':
+            header += "<th onclick=\"sortTable(%d,\'instances\',\'alpha\')\">Crossing %d--%d</th>" % (header_column,c[0]+1,c[1]+1)
+        else:
+            header += "<th onclick=\"sortTable(%d,\'instances\',\'alpha\')\">%d--%d</td>" % (header_column,c[0]+1,c[1]+1)
+        header_column += 1
+    header += "</tr>\n"
 
     # get the path of the current program
     current_path,current_program = os.path.split(os.path.abspath(__file__))
@@ -217,11 +294,11 @@ def writeHTMLOutput(Q,candidates,allvsallmatrix=np.empty( shape=(0, 0) )):
     template = template.replace("###PAGETITLE###",pagetitle)
     template = template.replace("###sequencecolumn###",str(sequence_column))
 
-    if len(candidates) == 1:
-        queryNote = "Query name: %s.  Found %d candidate from %d of %d files in %0.0f seconds." % (Q['name'].encode('ascii','ignore'),len(candidates),Q["numFilesSearched"],len(Q["searchFiles"]),Q["elapsedClockTime"])
+    if "reloadOutputPage" in Q and Q["reloadOutputPage"]:
+        queryNote = "Query name: %s.  Search in progress; candidates are added to this page as they are found." % Q['name']
+    elif len(candidates) == 1:
         queryNote = "Query name: %s.  Found %d candidate from %d of %d files in %0.0f seconds." % (Q['name'],len(candidates),Q["numFilesSearched"],len(Q["searchFiles"]),Q["elapsedClockTime"])
     else:
-        queryNote = "Query name: %s.  Found %d candidates from %d of %d files in %0.0f seconds." % (Q['name'].encode('ascii','ignore'),len(candidates),Q["numFilesSearched"],len(Q["searchFiles"]),Q["elapsedClockTime"])
         queryNote = "Query name: %s.  Found %d candidates from %d of %d files in %0.0f seconds." % (Q['name'],len(candidates),Q["numFilesSearched"],len(Q["searchFiles"]),Q["elapsedClockTime"])
 
     if len(Q["errorMessage"]) > 0:
@@ -252,9 +329,6 @@ def writeHTMLOutput(Q,candidates,allvsallmatrix=np.empty( shape=(0, 0) )):
 
     template = template.replace("###DESCRIPTION###",description)
 
-    # replace ###CANDIDATELIST### with candidatelist
-    template = template.replace("###CANDIDATELIST###",candidatelist)
-
     template = template.replace("###JS1###",JS1)
     template = template.replace("###JS2###",JS2)
     template = template.replace("###JS3###",JS3)
@@ -267,16 +341,9 @@ def writeHTMLOutput(Q,candidates,allvsallmatrix=np.empty( shape=(0, 0) )):
 
     if np.size(allvsallmatrix) > 0:
         template = template.replace("###JS5###",JS5)    # include heatmap.js code
-        discrepancydata = '<script type="text/javascript">\n' + discrepancydata + '\n</script>'
-        template = template.replace("###DISCREPANCYDATA###",discrepancydata)
     else:
-        template = template.replace("###DISCREPANCYDATA###","")
         template = template.replace("###JS5###","")    # do not display a heat map
 
-    outputfilename = os.path.join(OUTPUTPATH,htmlfilename+".html")
-
-    print("Writing to %s" % outputfilename)
-
     messages = ""
 
     messages += "\n<br>"
@@ -289,8 +356,38 @@ def writeHTMLOutput(Q,candidates,allvsallmatrix=np.empty( shape=(0, 0) )):
 
     template = template.replace("###MESSAGES###",messages)
 
+    # the candidate list and the discrepancy data are streamed into these places
+    beforeCandidates, afterCandidates = template.split("###CANDIDATELIST###",1)
+    beforeData, afterData = afterCandidates.split("###DISCREPANCYDATA###",1)
+
+    outputfilename = os.path.join(OUTPUTPATH,htmlfilename+".html")
+
+    return outputfilename, columns, beforeCandidates, header, beforeData, afterData
+
+def writeHTMLOutput(Q,candidates,allvsallmatrix=np.empty( shape=(0, 0) )):
+    """ Write the list of candidates in an HTML format that also shows
+    the coordinate window and a heat map of all-against-all distances.
+    Rows are written to the file as they are formatted, so the time is
+    linear in the number of candidates and the page is never held in memory.
+    """
+
+    outputfilename, columns, beforeCandidates, header, beforeData, afterData = htmlPageParts(Q, candidates, allvsallmatrix)
+
+    print("Writing to %s" % outputfilename)
+
     with open(outputfilename, 'w') as myfile:
-        myfile.write(template)
+        myfile.write(beforeCandidates)
+
+        # write one row for each candidate
+        myfile.write(header)
+        for i, candidate in enumerate(candidates):
+            myfile.write(htmlCandidateRow(Q, i, candidate, columns))
+        myfile.write('</table>\n')
+
+        myfile.write(beforeData)
+        if np.size(allvsallmatrix) > 0:
+            writeDiscrepancyData(myfile, candidates, allvsallmatrix)
+        myfile.write(afterData)
 
     if SERVER:
         os.system("rm %s.gz" % outputfilename)
@@ -298,129 +395,50 @@ def writeHTMLOutput(Q,candidates,allvsallmatrix=np.empty( shape=(0, 0) )):
 
 
 
-def writeCSVOutput(Q,candidates):
-    """Write the list of candidates in comma separated value format
+def writeGzipCopy(filename):
+    """ Replace filename.gz by a compressed copy of filename, through a
+    temporary file so that the server never sends part of a page
     """
 
-    pairTypes = ['glycosidicBondOrientation','chiDegree','pairsStacks','BPh','BR','sO','crossingNumber']
-    pairsToPrint = defaultdict(list)
+    temporaryfilename = filename + ".gz.tmp"
+    with open(filename, 'rb') as source:
+        with gzip.open(temporaryfilename, 'wb') as target:
+            shutil.copyfileobj(source, target)
+    os.replace(temporaryfilename, filename + ".gz")
 
-    # record which of the many possible columns contain data
-    for pairType in pairTypes:
-        for candidate in candidates:
-            interactions = candidate["interactions"]
-            for a in range(0,len(candidate['indices'])):        # first position
-                for b in range(0,len(candidate['indices'])):    # second position
-                    if (a,b,pairType) in interactions:
-                        pairsToPrint[pairType].append((a,b))
-
-    pagetitle = "FR3D %s" % Q['name'].encode('ascii','ignore')
+def writeCSVOutput(Q,candidates):
+    """Write the list of candidates in comma separated value format,
+    one line at a time
+    """
 
-    candidatelist = ''
+    pairTypes = ['glycosidicBondOrientation','chiDegree','pairsStacks','BPh','BR','sO','crossingNumber']
+    pairsToPrint = findPairsToPrint(candidates, pairTypes, False)
+    columns = interactionColumns(pairsToPrint, pairTypes)
 
     numPositions = Q["numpositions"]
 
     # write header line
-    candidatelist += "Similarity order,"
+    header = "Similarity order,"
     if(Q["type"] == "geometric" or Q["type"] == "mixed"):
-        candidatelist += "Discrepancy,"
-    candidatelist += "Resolution,"
+        header += "Discrepancy,"
+    header += "Resolution,"
 
     for j in range(0,numPositions):
-        candidatelist += "Position %d," % (j+1)
-    candidatelist += "Sequence,"  # list sequence of candidate
-    for pairType in pairTypes:
-        for c in sorted(list(set(pairsToPrint[pairType]))):
-            if c[0] < c[1] or (c[0] != c[1] and pairType in ["BPh","BR","sO"]) or (c[0]==c[1] and pairType in ["glycosidicBondOrientation","chiDegree"]):
-                if c[0] == c[1] and pairType == 'glycosidicBondOrientation':
-                    candidatelist += "Orient "+str(c[0]+1)+","
-                elif c[0] == c[1] and pairType == 'chiDegree':
-                    candidatelist += "Chi "+str(c[0]+1)+","
-                elif pairType == 'crossingNumber':
-                    candidatelist += "Cross "+str(c[0]+1)+"--"+str(c[1]+1)+","
-                else:
-                    candidatelist += str(c[0]+1)+"--"+str(c[1]+1)+","
-
-    candidatelist += "View,Coordinates,Sequence variability"  # link to view, link for coordinates
-
-    candidatelist += "\n"
-
-    # write one row for each candidate
-    for i in range(0,len(candidates)):
-        candidate = candidates[i]
-        candidatelist += str(i+1)+','
-        if(Q["type"] == "geometric" or Q["type"] == "mixed"):
-            candidatelist += "%0.4f," % candidate["discrepancy"]
-
-        PDB_id = candidate["unitids"][0][0:4]
-        if PDB_id in Q["PDB_data_file"]:
-            candidatelist += format_resolution(Q["PDB_data_file"][PDB_id]) + ","
+        header += "Position %d," % (j+1)
+    header += "Sequence,"  # list sequence of candidate
+    for pairType, c in columns:
+        if c[0] == c[1] and pairType == 'glycosidicBondOrientation':
+            header += "Orient "+str(c[0]+1)+","
+        elif c[0] == c[1] and pairType == 'chiDegree':
+            header += "Chi "+str(c[0]+1)+","
+        elif pairType == 'crossingNumber':
+            header += "Cross "+str(c[0]+1)+"--"+str(c[1]+1)+","
         else:
-            candidatelist += "NA,"
-
-        # write unit ids
-        for j in range(0,numPositions):
-            candidatelist += candidate["unitids"][j]+","
-
-        # write nucleotide sequence with helpful separator symbols
-        sequence = ""
-        for j in range(0,numPositions):
-            fields = candidate["unitids"][j].split("|")
-            sequence += fields[3]
-
-            if len(fields) == 9:     # symmetry operator present
-                symm = fields[8]
-            else:
-                symm = ""
+            header += str(c[0]+1)+"--"+str(c[1]+1)+","
 
-            if j+1 < numPositions:
-                # if same chain and same symmetry operator, if present
-                cfields = candidate["unitids"][j+1].split("|")
-                if len(cfields) == 9:     # symmetry operator present
-                    csymm = cfields[8]
-                else:
-                    csymm = ""
-
-                if fields[2] == cfields[2] and symm == csymm:
-                    if candidate['chainindices'][j] + 1 == candidate['chainindices'][j+1]: # successive
-                        sequence += "--"
-                    elif candidate['chainindices'][j] + 1 < candidate['chainindices'][j+1]: # later
-                        sequence += "->"
-                    else:
-                        sequence += "<-"
-                else:
-                    sequence += ".."
+    header += "View,Coordinates,Sequence variability"  # link to view, link for coordinates
 
-        candidatelist += sequence + ","
-
-        # write interactions by group
-        interactions = candidate["interactions"]
-        for pairType in pairTypes:
-            for c in sorted(list(set(pairsToPrint[pairType]))):
-                if c[0] < c[1] or (c[0] != c[1] and pairType in ["BPh","BR","sO"]) or (c[0]==c[1] and pairType in ["glycosidicBondOrientation","chiDegree"]):
-                    if (c[0],c[1],pairType) in interactions and len(interactions[(c[0],c[1],pairType)]) > 0 and interactions[(c[0],c[1],pairType)][0] != "None":
-                        # multiple interactions of the same type separated by commas
-                        candidatelist += '"'+",".join(interactions[(c[0],c[1],pairType)])+'",'
-                    else:
-                        candidatelist += ","
-
-        # make list of unit ids
-        unit_id_list = ''
-        for j in range(0,numPositions):
-            unit_id_list += candidate["unitids"][j]
-            if j < numPositions-1:
-                unit_id_list += ','
-
-        # make link to view
-        candidatelist += '"http://rna.bgsu.edu/rna3dhub/display3D/unitid/' + unit_id_list + '",'
-
-        # make link to coordinates
-        candidatelist += '"http://rna.bgsu.edu/rna3dhub/rest/getCoordinates?coord=' + unit_id_list + '",'
-
-        # make link to sequence variability server
-        candidatelist += '"http://rna.bgsu.edu/correspondence/variability?id=' + unit_id_list + '&format=unique",'
-
-        candidatelist += '\n'
+    header += "\n"
 
     csvfilename,csvlink = getCSVfilename(Q)
 
@@ -430,7 +448,11 @@ def writeCSVOutput(Q,candidates):
         print("Writing to %s" % outputfilename)
 
     with open(outputfilename, 'w') as myfile:
-        myfile.write(candidatelist)
+        myfile.write(header)
+
+        # write one row for each candidate
+        for i, candidate in enumerate(candidates):
+            myfile.write(csvCandidateRow(Q, i, candidate, columns))
 
     """
     # Unfortunately, this doesn't work in practice, because the downloaded file is
@@ -441,6 +463,133 @@ def writeCSVOutput(Q,candidates):
         os.system("gzip %s" % (OUTPUTPATH+csvfilename))
     """
 
+def candidateToDict(candidate):
+    """ Plain version of a candidate that can be written as JSON
+    """
+
+    c = {}
+    c["unitids"] = list(candidate["unitids"])
+    if "discrepancy" in candidate:
+        c["discrepancy"] = float(candidate["discrepancy"])
+    c["chainindices"] = [int(x) for x in candidate["chainindices"]]
+    interactions = []
+    for key in sorted(candidate["interactions"].keys(), key = str):
+        values = candidate["interactions"][key]
+        if len(values) > 0 and values[0] != "None":
+            interactions.append([key[0]+1, key[1]+1, key[2], [str(v) for v in values]])
+    c["interactions"] = interactions
+    return c
+
+def writeJSONOutput(Q,candidates):
+    """Write the list of candidates as JSON, one candidate per line
+    """
+
+    outputfilename = os.path.join(OUTPUTPATH,getOutputFilename(Q)+".json")
+
+    if not 'server' in Q:
+        print("Writing to %s" % outputfilename)
+
+    with open(outputfilename, 'w') as myfile:
+        myfile.write('{"name": %s,\n' % json.dumps(Q['name']))
+        myfile.write(' "numFilesSearched": %d,\n' % Q["numFilesSearched"])
+        myfile.write(' "candidates": [\n')
+        for i, candidate in enumerate(candidates):
+            if i > 0:
+                myfile.write(',\n')
+            myfile.write(json.dumps(candidateToDict(candidate)))
+        myfile.write('\n]}\n')
+
+class CandidateStream(object):
+    """ Progress of a running search, kept on disk.
+    Candidates are appended to a .jsonl file as they are accepted, and a
+    small status file is replaced after each IFE, so the cost of reporting
+    progress does not grow with the number of candidates found so far.
+    Every refreshTime seconds of CPU time, the candidates found since the
+    last refresh are appended as rows to a provisional HTML page that
+    reloads itself; the page is only started once, and its columns are
+    those of the candidates found by then.  On the server, a gzipped copy
+    of the page is written after each refresh, as the server expects.
+    writeHTMLOutput replaces it with the final page, in similarity order,
+    at the end of the search, gzipped on the server as before.
+    """
+
+    def __init__(self, Q, refreshTime=REFRESHTIME, clock=None):
+        basename = os.path.join(OUTPUTPATH,getOutputFilename(Q))
+        self.candidatefilename = basename + "_candidates.jsonl"
+        self.statusfilename = basename + "_status.json"
+        self.numCandidates = 0
+        open(self.candidatefilename, 'w').close()
+        self.writeStatus(Q, "running")
+
+        if clock is None:
+            from time import process_time as clock
+        self.clock = clock
+        self.refreshTime = refreshTime
+        self.lastRefresh = clock()
+        self.htmlfilename = None        # provisional page, once started
+        self.htmlColumns = None
+        self.htmlPending = []           # candidates not yet on the page
+        self.htmlRows = 0
+
+    def add(self, Q, newCandidates):
+        """ Append newly accepted candidates and update the status file
+        and, when it is time, the provisional HTML page
+        """
+
+        with open(self.candidatefilename, 'a') as myfile:
+            for candidate in newCandidates:
+                myfile.write(json.dumps(candidateToDict(candidate)) + "\n")
+        self.numCandidates += len(newCandidates)
+        self.writeStatus(Q, "running")
+
+        self.htmlPending.extend(newCandidates)
+        if self.clock() - self.lastRefresh > self.refreshTime:
+            self.refreshHTML(Q)
+            self.lastRefresh = self.clock()
+
+    def refreshHTML(self, Q):
+        """ Start the provisional HTML page, or append the rows of the
+        candidates found since the last refresh
+        """
+
+        if self.htmlfilename is None:
+            if not self.htmlPending:
+                return
+            Q["reloadOutputPage"] = True
+            self.htmlfilename, self.htmlColumns, beforeCandidates, header, beforeData, afterData = htmlPageParts(Q, self.htmlPending)
+            Q["reloadOutputPage"] = False
+            with open(self.htmlfilename, 'w') as myfile:
+                myfile.write(beforeCandidates)
+                myfile.write(header)
+
+        with open(self.htmlfilename, 'a') as myfile:
+            for candidate in self.htmlPending:
+                myfile.write(htmlCandidateRow(Q, self.htmlRows, candidate, self.htmlColumns))
+                self.htmlRows += 1
+        self.htmlPending = []
+
+        # the server serves pages gzipped; rows are appended to the plain page
+        if SERVER:
+            writeGzipCopy(self.htmlfilename)
+
+    def writeStatus(self, Q, state):
+        status = {}
+        status["state"] = state
+        status["numCandidates"] = self.numCandidates
+        status["numFilesSearched"] = Q.get("numFilesSearched", 0)
+        status["numFiles"] = len(Q.get("searchFiles", []))
+        status["elapsedClockTime"] = Q.get("elapsedClockTime", 0)
+        status["userMessage"] = Q.get("userMessage", [])
+
+        # write then rename, so readers never see a partial file
+        temporaryfilename = self.statusfilename + ".tmp"
+        with open(temporaryfilename, 'w') as myfile:
+            json.dump(status, myfile)
+        os.replace(temporaryfilename, self.statusfilename)
+
+    def close(self, Q):
+        self.writeStatus(Q, "done")
+
 def writeCandidateOutput(candidates, Q, ifedata):
     queryName = Q['name']
     fileName =   '../output/' + queryName.encode('ascii','ignore') + '_python_output.txt'
@@ -0,0 +1,370 @@
+"""
+Synthetic structures of any size, for profiling FR3D on large inputs.
+
+Nucleotides and amino acids are copied from a template file, each copy is
+turned and moved as a rigid body, and the copies are written as an mmCIF
+file that load_structure reads like a file from the PDB.  The default
+templates in fr3d/data/synthetic_templates.pdb are nucleotides of 1S72 and
+1GID and amino acids of ideal geometry; any .cif or .pdb file can be used
+instead with --templates.
+
+Units follow random walks with steps of about the distance between
+neighboring nucleotides, folded back into a cube whose size gives the
+requested density in units per cubic nanometer.  A fraction of the units
+can have two alternate locations of the base or side chain, a fraction of
+the nucleotides can be 2'-O-methylated, as OMG, OMC, OMU and A2M, and
+further models repeat the first with the units slightly moved.  The same
+seed always gives the same file.
+
+    python -m fr3d.synthetic SYN1.cif.gz --nucleotides 100000 --amino_acids 20000
+    python benchmarks/stage_benchmark.py SYN1.cif.gz
+"""
+
+import argparse
+import gzip
+import itertools
+import os
+import string
+import time
+
+import numpy as np
+
+from fr3d.definitions import NAbaseheavyatoms
+from fr3d.definitions import aa_fg
+from fr3d.definitions import aa_linker
+
+TEMPLATE_FILE = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'data', 'synthetic_templates.pdb')
+
+NUCLEOTIDES = ['A', 'C', 'G', 'U']
+AMINO_ACIDS = ['ALA', 'ARG', 'ASN', 'ASP', 'CYS', 'GLN', 'GLU', 'GLY', 'HIS', 'ILE',
+               'LEU', 'LYS', 'MET', 'PHE', 'PRO', 'SER', 'THR', 'TRP', 'TYR', 'VAL']
+
+# 2'-O-methylated nucleotides and the name of the methyl carbon on O2'
+MODIFIED = {'A': ('A2M', "CM'"), 'C': ('OMC', 'CM2'), 'G': ('OMG', 'CM2'), 'U': ('OMU', 'CM2')}
+
+STEP = 6.0          # distance between consecutive units in a chain
+ALT_ANGLE = 20.0    # rotation of the second alternate location about C1' or CA
+MODEL_SHIFT = 0.3   # standard deviation of the shift of units in later models
+
+ATOM_SITE = ['group_PDB', 'id', 'type_symbol', 'label_atom_id', 'label_alt_id',
+             'label_comp_id', 'label_asym_id', 'label_entity_id', 'label_seq_id',
+             'pdbx_PDB_ins_code', 'Cartn_x', 'Cartn_y', 'Cartn_z', 'occupancy',
+             'B_iso_or_equiv', 'auth_seq_id', 'auth_comp_id', 'auth_asym_id',
+             'auth_atom_id', 'pdbx_PDB_model_num']
+
+ROW = "%s %d %s %s %s %s %s %s %d ? %.3f %.3f %.3f %s 20.00 %d %s %s %s %s\n"
+
+
+def bonded_position(a, b, c, length, angle, torsion):
+    """
+    Position of an atom bonded to c, with the given bond length, angle
+    b-c-atom and torsion a-b-c-atom in degrees.
+    """
+
+    angle = np.radians(angle)
+    torsion = np.radians(torsion)
+    bc = (c - b) / np.linalg.norm(c - b)
+    n = np.cross(b - a, bc)
+    n = n / np.linalg.norm(n)
+    m = np.cross(n, bc)
+    return c - length * np.cos(angle) * bc + length * np.sin(angle) * (np.cos(torsion) * m + np.sin(torsion) * n)
+
+
+def cif_value(text):
+    """
+    Quote atom names such as C1' for mmCIF.
+    """
+
+    if "'" in text:
+        return '"%s"' % text
+    return text
+
+
+class Template(object):
+    """
+    Heavy atoms of one nucleotide or amino acid, centered on C1' or CA.
+    The base or side chain atoms are the ones given alternate locations.
+    """
+
+    def __init__(self, sequence, names, elements, coordinates):
+        self.sequence = sequence
+        self.names = [cif_value(name) for name in names]
+        self.elements = list(elements)
+        center = "C1'" if sequence in NUCLEOTIDES else 'CA'
+        coordinates = np.array(coordinates, dtype=float)
+        self.coordinates = coordinates - coordinates[names.index(center)]
+
+        varying = set(NAbaseheavyatoms.get(sequence, []) + aa_linker.get(sequence, []) + aa_fg.get(sequence, []))
+        self.alternate = [i for i, name in enumerate(names) if name in varying]
+        self.fixed = [i for i, name in enumerate(names) if name not in varying]
+
+        # position of the methyl carbon of the 2'-O-methylated nucleotide
+        self.methyl = None
+        if sequence in MODIFIED and all(name in names for name in ["C1'", "C2'", "O2'"]):
+            a, b, c = [self.coordinates[names.index(name)] for name in ["C1'", "C2'", "O2'"]]
+            self.methyl = bonded_position(a, b, c, 1.42, 116.0, 180.0)
+
+
+def load_templates(filename=TEMPLATE_FILE):
+    """
+    Templates of nucleotides and of amino acids from the first model and
+    first alternate location of a .cif or .pdb file, as two lists.
+    Hydrogens are left out, including the ones FR3D infers.
+    """
+
+    from fr3d.classifiers.NA_pairwise_interactions import load_structure
+
+    structure, messages = load_structure(filename)
+    if structure is None:
+        raise ValueError("Could not read templates from %s: %s" % (filename, "; ".join(messages)))
+
+    nucleotides = []
+    amino_acids = []
+    first_model = None
+    for residue in structure.residues():
+        if first_model is None:
+            first_model = residue.model
+        if residue.model != first_model or residue.alt_id not in (None, 'A'):
+            continue
+        if residue.sequence not in NUCLEOTIDES and residue.sequence not in AMINO_ACIDS:
+            continue
+        atoms = [atom for atom in residue.atoms()
+                 if atom.pdb is not None and atom.type not in ('H', 'D')]
+        names = [atom.name for atom in atoms]
+        if ("C1'" if residue.sequence in NUCLEOTIDES else 'CA') not in names:
+            continue
+        template = Template(residue.sequence, names, [atom.type for atom in atoms],
+                            [atom.coordinates() for atom in atoms])
+        if residue.sequence in NUCLEOTIDES:
+            nucleotides.append(template)
+        else:
+            amino_acids.append(template)
+
+    return nucleotides, amino_acids
+
+
+def random_rotations(count, random):
+    """
+    count rotation matrices, uniformly distributed.
+    """
+
+    q = random.normal(size=(count, 4))
+    q /= np.linalg.norm(q, axis=1)[:, None]
+    w, x, y, z = q.T
+    return np.stack([
+        np.stack([1 - 2*(y*y + z*z), 2*(x*y - z*w), 2*(x*z + y*w)], axis=1),
+        np.stack([2*(x*y + z*w), 1 - 2*(x*x + z*z), 2*(y*z - x*w)], axis=1),
+        np.stack([2*(x*z - y*w), 2*(y*z + x*w), 1 - 2*(x*x + y*y)], axis=1),
+    ], axis=1)
+
+
+def small_rotations(count, degrees, random):
+    """
+    count rotations by the given angle about random axes.
+    """
+
+    axes = random.normal(size=(count, 3))
+    axes /= np.linalg.norm(axes, axis=1)[:, None]
+    angle = np.radians(degrees)
+    K = np.zeros((count, 3, 3))
+    K[:, 0, 1], K[:, 0, 2], K[:, 1, 2] = -axes[:, 2], axes[:, 1], -axes[:, 0]
+    K -= np.transpose(K, (0, 2, 1))
+    return np.identity(3) + np.sin(angle) * K + (1 - np.cos(angle)) * np.matmul(K, K)
+
+
+def random_walk(count, box, random):
+    """
+    Positions of count units in a random walk with steps of length STEP,
+    reflected at the walls of a cube of side box.
+    """
+
+    steps = random.normal(size=(count, 3))
+    steps *= STEP / np.linalg.norm(steps, axis=1)[:, None]
+    steps[0] = random.uniform(0, box, 3)
+    positions = np.mod(np.cumsum(steps, axis=0), 2 * box)
+    return np.where(positions > box, 2 * box - positions, positions)
+
+
+def chain_names():
+    """
+    A to Z, then AA, AB and so on.
+    """
+
+    for length in itertools.count(1):
+        for letters in itertools.product(string.ascii_uppercase, repeat=length):
+            yield "".join(letters)
+
+
+class Chain(object):
+    """
+    Layout of the units of one chain, the same each time for the same seed.
+    """
+
+    def __init__(self, name, entity, templates, count, box, alt_fraction, modified_fraction, seed, index):
+        self.name = name
+        self.entity = entity
+        self.seed = seed
+        self.index = index
+
+        random = np.random.RandomState([seed, index])
+        self.templates = [templates[i] for i in random.randint(len(templates), size=count)]
+        self.rotations = random_rotations(count, random)
+        self.positions = random_walk(count, box, random)
+        self.alternates = small_rotations(count, ALT_ANGLE, random)
+        draws = random.uniform(size=(count, 2))
+        self.has_alt = [draw < alt_fraction and len(t.alternate) > 0
+                        for draw, t in zip(draws[:, 0], self.templates)]
+        self.is_modified = [draw < modified_fraction and t.methyl is not None
+                            for draw, t in zip(draws[:, 1], self.templates)]
+
+    def sequences(self):
+        return set(MODIFIED[t.sequence][0] if modified else t.sequence
+                   for t, modified in zip(self.templates, self.is_modified))
+
+    def write(self, handle, model, serial):
+        """
+        Write the atom_site rows of the chain in one model, numbering atoms
+        from serial, and return the next serial number.
+        """
+
+        positions = self.positions
+        if model > 1:
+            random = np.random.RandomState([self.seed, self.index, model])
+            positions = positions + random.normal(scale=MODEL_SHIFT, size=positions.shape)
+
+        name = self.name
+        entity = self.entity
+        for i, template in enumerate(self.templates):
+            number = i + 1
+            rotation = self.rotations[i].T
+            xyz = np.dot(template.coordinates, rotation) + positions[i]
+            if self.is_modified[i]:
+                sequence, methyl = MODIFIED[template.sequence]
+                group = 'HETATM'
+            else:
+                sequence = template.sequence
+                group = 'ATOM'
+
+            rows = [(j, '.', '1.00', xyz) for j in template.fixed]
+            if self.has_alt[i]:
+                moved = np.dot(np.dot(template.coordinates, self.alternates[i].T), rotation) + positions[i]
+                rows += [(j, 'A', '0.50', xyz) for j in template.alternate]
+                rows += [(j, 'B', '0.50', moved) for j in template.alternate]
+            else:
+                rows += [(j, '.', '1.00', xyz) for j in template.alternate]
+
+            for j, alt_id, occupancy, coordinates in rows:
+                atom = template.names[j]
+                x, y, z = coordinates[j]
+                handle.write(ROW % (group, serial, template.elements[j], atom, alt_id, sequence, name, entity,
+                                    number, x, y, z, occupancy, number, sequence, name, atom, model))
+                serial += 1
+
+            if self.is_modified[i]:
+                x, y, z = np.dot(template.methyl, rotation) + positions[i]
+                atom = cif_value(methyl)
+                handle.write(ROW % (group, serial, 'C', atom, '.', sequence, name, entity,
+                                    number, x, y, z, '1.00', number, sequence, name, atom, model))
+                serial += 1
+
+        return serial
+
+
+def chem_comp_type(sequence):
+    if sequence in AMINO_ACIDS:
+        return "'peptide linking'" if sequence == 'GLY' else "'L-peptide linking'"
+    return "'RNA linking'"
+
+
+def write_structure(filename, nucleotides=1000, amino_acids=0, density=1.4, alt_fraction=0.0,
+                    modified_fraction=0.0, models=1, chain_length=1000, seed=1,
+                    templates=TEMPLATE_FILE, pdbid=None):
+    """
+    Write a synthetic structure to a .cif or .cif.gz file.  density is in
+    units per cubic nanometer; 1.4 is about that of a ribosome.  Returns
+    the number of chains and atoms and the side of the cube in Angstroms.
+    """
+
+    if not pdbid:
+        pdbid = os.path.basename(filename).replace(".gz", "").replace(".cif", "")
+
+    nt_templates, aa_templates = load_templates(templates)
+    if nucleotides > 0 and not nt_templates:
+        raise ValueError("No nucleotide templates in %s" % templates)
+    if amino_acids > 0 and not aa_templates:
+        raise ValueError("No amino acid templates in %s" % templates)
+
+    box = 10.0 * (max(nucleotides + amino_acids, 1) / float(density)) ** (1.0 / 3)
+
+    chains = []
+    names = chain_names()
+    for entity, templates, total in [('1', nt_templates, nucleotides),
+                                     ('2', aa_templates, amino_acids)]:
+        for start in range(0, total, chain_length):
+            count = min(chain_length, total - start)
+            chains.append(Chain(next(names), entity, templates, count, box, alt_fraction,
+                                modified_fraction if entity == '1' else 0.0, seed, len(chains)))
+
+    sequences = sorted(set().union(*[chain.sequences() for chain in chains]))
+    entities = sorted(set(chain.entity for chain in chains))
+
+    if filename.endswith(".gz"):
+        handle = gzip.open(filename, "wt")
+    else:
+        handle = open(filename, "w")
+
+    with handle:
+        handle.write("data_%s\n#\n_entry.id %s\n#\n" % (pdbid, pdbid))
+        handle.write("loop_\n_entity.id\n_entity.type\n_entity.pdbx_description\n")
+        for entity in entities:
+            handle.write("%s polymer '%s'\n" % (entity, 'synthetic RNA' if entity == '1' else 'synthetic protein'))
+        handle.write("#\nloop_\n_chem_comp.id\n_chem_comp.type\n")
+        for sequence in sequences:
+            handle.write("%s %s\n" % (sequence, chem_comp_type(sequence)))
+        handle.write("#\nloop_\n_pdbx_struct_assembly_gen.assembly_id\n"
+                     "_pdbx_struct_assembly_gen.oper_expression\n_pdbx_struct_assembly_gen.asym_id_list\n")
+        for chain in chains:
+            handle.write("1 1 %s\n" % chain.name)
+        handle.write("#\n_pdbx_struct_oper_list.id 1\n_pdbx_struct_oper_list.type 'identity operation'\n"
+                     "_pdbx_struct_oper_list.name 1_555\n")
+        for row in range(1, 4):
+            for column in range(1, 4):
+                handle.write("_pdbx_struct_oper_list.matrix[%d][%d] %s\n" % (row, column, '1.0' if row == column else '0.0'))
+            handle.write("_pdbx_struct_oper_list.vector[%d] 0.0\n" % row)
+        handle.write("#\nloop_\n")
+        for field in ATOM_SITE:
+            handle.write("_atom_site.%s\n" % field)
+
+        serial = 1
+        for model in range(1, models + 1):
+            for chain in chains:
+                serial = chain.write(handle, model, serial)
+        handle.write("#\n")
+
+    return {'chains': len(chains), 'atoms': serial - 1, 'box': box}
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Write a synthetic structure for scaling tests")
+    parser.add_argument("output", help=".cif or .cif.gz file to write")
+    parser.add_argument("--nucleotides", type=int, default=10000, help="Number of nucleotides")
+    parser.add_argument("--amino_acids", type=int, default=0, help="Number of amino acids")
+    parser.add_argument("--density", type=float, default=1.4, help="Units per cubic nanometer")
+    parser.add_argument("--alt_fraction", type=float, default=0.0, help="Fraction of units with alternate locations")
+    parser.add_argument("--modified_fraction", type=float, default=0.0, help="Fraction of nucleotides that are 2'-O-methylated")
+    parser.add_argument("--models", type=int, default=1, help="Number of models")
+    parser.add_argument("--chain_length", type=int, default=1000, help="Units per chain")
+    parser.add_argument("--seed", type=int, default=1, help="Seed of the random layout")
+    parser.add_argument("--templates", default=TEMPLATE_FILE, help=".cif or .pdb file with the nucleotides and amino acids to copy")
+    args = parser.parse_args()
+
+    start = time.time()
+    summary = write_structure(args.output, args.nucleotides, args.amino_acids, args.density,
+                              args.alt_fraction, args.modified_fraction, args.models,
+                              args.chain_length, args.seed, args.templates)
+    print("Wrote %d atoms in %d chains, in a cube of side %.0f Angstroms, to %s in %.1f seconds" %
+          (summary['atoms'], summary['chains'], summary['box'], args.output, time.time() - start))
+
+
+if __name__ == "__main__":
+    main()
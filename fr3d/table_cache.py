@@ -0,0 +1,128 @@
+"""Cache for tables that FR3D builds from large source files.
+
+Tables such as the modified nucleotide mappings read from atom_mappings.txt
+and the basepair cutoffs in class_limits_2023.py take longer to build than
+to load from a saved copy.  load_table builds a table once, saves it in
+the cache directory, and loads the saved copy on later runs for as long as
+the source files are unchanged.
+
+The cache is off unless the environment variable FR3D_CACHE_DIR names the
+directory to keep it in; without it, tables are built each time and
+nothing is written.  Tables are saved as JSON, with tuples and dictionaries
+with keys that are not strings tagged so that they are loaded back as they
+were, so that loading a cached table never runs code.  If the cache cannot
+be read or written, the table is simply built each time.
+"""
+
+import hashlib
+import json
+import os
+import sys
+import tempfile
+
+# change this when the format of a cached table changes
+CACHE_VERSION = 2
+
+
+def cache_directory():
+    """
+    Directory of the cache, or None when caching is off.
+    """
+
+    return os.environ.get("FR3D_CACHE_DIR") or None
+
+
+def table_key(name, sources):
+    """
+    Name of the cache file for a table, which changes whenever one of the
+    source files or the Python major version changes.
+    """
+
+    digest = hashlib.sha1()
+    digest.update(("%s %d %d" % (name, CACHE_VERSION, sys.version_info[0])).encode("utf-8"))
+    for source in sources:
+        status = os.stat(source)
+        digest.update(("%s %d %d" % (os.path.abspath(source), status.st_size, status.st_mtime_ns)).encode("utf-8"))
+    return "%s-%s.json" % (name, digest.hexdigest()[:16])
+
+
+def encode_table(value):
+    """
+    Plain JSON data for a table of dictionaries, lists, tuples, strings
+    and numbers.  Every dictionary and tuple is tagged.
+    """
+
+    if isinstance(value, dict):
+        if all(isinstance(key, str) for key in value):
+            return {"dict": dict((key, encode_table(v)) for key, v in value.items())}
+        return {"items": [[encode_table(key), encode_table(v)] for key, v in value.items()]}
+    if isinstance(value, tuple):
+        return {"tuple": [encode_table(v) for v in value]}
+    if isinstance(value, list):
+        return [encode_table(v) for v in value]
+    if value is None or isinstance(value, (str, bool, int, float)):
+        return value
+    raise TypeError("cannot cache a value of type %s" % type(value).__name__)
+
+
+def decode_table(data):
+    if isinstance(data, dict):
+        if "dict" in data:
+            return dict((key, decode_table(v)) for key, v in data["dict"].items())
+        if "items" in data:
+            return dict((decode_table(key), decode_table(v)) for key, v in data["items"])
+        return tuple(decode_table(v) for v in data["tuple"])
+    if isinstance(data, list):
+        return [decode_table(v) for v in data]
+    return data
+
+
+def load_table(name, sources, build):
+    """
+    Return the table made by calling build(), from the cache when caching
+    is on and the source files have not changed since it was saved.
+    """
+
+    directory = cache_directory()
+    if directory is None:
+        return build()
+
+    try:
+        filename = os.path.join(directory, table_key(name, sources))
+    except OSError:
+        return build()
+
+    if os.path.exists(filename):
+        try:
+            with open(filename, "r") as f:
+                return decode_table(json.load(f))
+        except Exception:
+            pass    # damaged or incompatible; rebuild it
+
+    table = build()
+
+    try:
+        if not os.path.exists(directory):
+            os.makedirs(directory)
+        data = encode_table(table)
+        # write to a temporary file so that other processes never read half a table
+        handle, temporary = tempfile.mkstemp(dir=directory, suffix=".tmp")
+        with os.fdopen(handle, "w") as f:
+            json.dump(data, f)
+        os.replace(temporary, filename)
+    except (OSError, IOError, TypeError, ValueError):
+        pass
+
+    return table
+
+
+def clear_cache():
+    """
+    Remove all cached tables.
+    """
+
+    directory = cache_directory()
+    if directory is not None and os.path.isdir(directory):
+        for filename in os.listdir(directory):
+            if filename.endswith(".json"):
+                os.remove(os.path.join(directory, filename))
@@ -11,5 +11,5 @@ setup(
     install_requires=["numpy", "scipy", "mmcif-pdbx; python_version >= '3.0'"],
     description='Python implementation of FR3D',
     long_description="",
-    data_files=[('fr3d/data',['fr3d/data/atom_mappings.txt']),('fr3d/classifiers', ['fr3d/classifiers/template.html','fr3d/classifiers/H_bonding_Atoms_from_Isostericity_Table.csv'])]
+    data_files=[('fr3d/data',['fr3d/data/atom_mappings.txt','fr3d/data/synthetic_templates.pdb']),('fr3d/classifiers', ['fr3d/classifiers/template.html','fr3d/classifiers/H_bonding_Atoms_from_Isostericity_Table.csv'])]
 )
\ No newline at end of file
@@ -0,0 +1,65 @@
+from unittest import TestCase
+
+import numpy as np
+
+from fr3d.classifiers.annotation_comparison import AnnotationTable
+from fr3d.classifiers.annotation_comparison import UnitIds
+from fr3d.classifiers.annotation_comparison import agreement_matrix
+from fr3d.classifiers.annotation_comparison import compared_keys
+from fr3d.classifiers.annotation_comparison import confusion_counts
+from fr3d.classifiers.annotation_comparison import disagreements
+from fr3d.classifiers.annotation_comparison import join
+
+G1 = '1ABC|1|A|G|1'
+C2 = '1ABC|1|A|C|2'
+A3 = '1ABC|1|A|A|3'
+A4 = '1ABC|1|A|A|4'
+U5 = '1ABC|1|A|U|5'
+
+
+class AnnotationComparisonTest(TestCase):
+    def setUp(self):
+        self.units = UnitIds()
+        self.fr3d = AnnotationTable(self.units, 'FR3D')
+        self.fr3d.add_pair_to_interaction({(G1, C2): 'cWW', (A3, U5): 'ncWW', (A3, A4): 'tHH', (A4, A3): 'tHH', (C2, G1): ''})
+        self.dssr = AnnotationTable(self.units, 'DSSR')
+        self.dssr.add_interaction_to_pairs({'cWW': [(G1, C2, 0), (A3, U5, 0)], 'cWH': [(A4, U5, 0)], 's35': [(G1, A3, 0)]})
+
+    def test_tables_share_unit_numbers(self):
+        self.assertEqual(4, len(self.fr3d))
+        self.assertEqual(3, len(self.dssr))
+        self.assertEqual(sorted([G1, C2, A3, A4, U5]), sorted(self.units.unit_ids))
+        first, second = self.dssr.pairs()
+        self.assertEqual(set([(G1, C2), (A3, U5), (A4, U5)]), set(zip(first, second)))
+
+    def test_later_annotation_wins(self):
+        self.dssr.add_pair_to_interaction({(G1, C2): 'tWW'})
+        keys, (codes,) = join([self.dssr])
+        annotations = dict(zip(zip(*self.dssr.pairs(keys)), self.units.annotations.lookup(codes)))
+        self.assertEqual({(G1, C2): 'tWW', (A3, U5): 'cWW', (A4, U5): 'cWH'}, annotations)
+
+    def test_agreement_matrix(self):
+        agree, total = agreement_matrix([self.fr3d, self.dssr])
+        self.assertEqual([[4, 1], [1, 3]], agree.tolist())
+        self.assertEqual([[4, 5], [5, 3]], total.tolist())
+
+    def test_confusion_counts(self):
+        counts = confusion_counts(self.fr3d, self.dssr)
+        self.assertEqual(1, counts[('cww', 'cww')])
+        self.assertEqual(1, counts[('ncww', 'cww')])
+        self.assertEqual(2, counts[('thh', '')])
+        self.assertEqual(1, counts[('', 'cwh')])
+        self.assertEqual(5, sum(counts.values()))
+
+    def test_disagreements(self):
+        rows = disagreements(self.fr3d, self.dssr)
+        self.assertIn((A3, U5, 'ncWW', 'cWW', 0.6), rows)
+        self.assertIn((A4, U5, '', 'cWH', 0.0), rows)
+        self.assertFalse(any(row[0] == G1 for row in rows))
+
+    def test_compared_keys_drop_repeated_symmetric_pairs(self):
+        keys = compared_keys(self.fr3d)
+        first, second = self.fr3d.pairs(keys)
+        # tHH between two A is reported once, with the lower number first
+        self.assertEqual(set([(G1, C2), (A3, U5), (A3, A4)]), set(zip(first, second)))
+        np.testing.assert_array_equal(np.sort(keys), keys)
@@ -0,0 +1,80 @@
+import os
+import shutil
+import tempfile
+from unittest import TestCase
+
+from fr3d.classifiers.annotation_store import AnnotationStore
+from fr3d.classifiers.annotation_store import output_rows
+from fr3d.classifiers.annotation_store import unit_fields
+
+G1 = '1ABC|1|A|G|1'
+C2 = '1ABC|1|A|C|2'
+OMG3 = '1ABC|1|A|OMG|3'
+A4 = '1ABC|1|B|A|4'
+U5 = '1ABC|1|B|U|5'
+G6 = '2XYZ|1|A|G|6'
+C7 = '2XYZ|1|A|C|7'
+
+
+class AnnotationStoreTest(TestCase):
+    def setUp(self):
+        self.directory = tempfile.mkdtemp()
+        self.filename = os.path.join(self.directory, "annotations.sqlite")
+        self.store = AnnotationStore(self.filename)
+        self.store.write("1ABC", [
+            ("basepair", "cWW", G1, C2, 0),
+            ("basepair", "tSH", OMG3, A4, 2),
+            ("basepair", "ntSH", U5, G1, 0),
+            ("stacking", "s35", G1, C2, 0),
+        ], ["basepair", "stacking"], "v1")
+        self.store.write("2XYZ", [("basepair", "cWW", G6, C7, 5)], ["basepair"], "v1")
+
+    def tearDown(self):
+        self.store.close()
+        shutil.rmtree(self.directory)
+
+    def test_unit_fields(self):
+        self.assertEqual(('1ABC', '1', 'A', 'OMG', 3, 'G', 1), unit_fields(OMG3))
+        self.assertEqual(('1ABC', '1', 'A', 'G', 1, 'G', 0), unit_fields(G1))
+
+    def test_output_rows_follow_categories(self):
+        interaction_to_list_of_tuples = {'cWw': [(G1, C2, 0)], 'tHH': [(A4, U5, 1)], 'ncWW': [(U5, G1, 0)], 's35': [(G1, C2, 0)]}
+        category_to_interactions = {'basepair': set(['cWw', 'tHH', 'ncWW']), 'stacking': set(['s35'])}
+        categories = {'basepair': ['cWW'], 'stacking': []}
+        self.assertEqual([('basepair', 'cWW', G1, C2, 0), ('stacking', 's35', G1, C2, 0)],
+                         list(output_rows(interaction_to_list_of_tuples, categories, category_to_interactions)))
+        categories['near'] = []
+        self.assertIn(('basepair', 'ncWW', U5, G1, 0),
+                      list(output_rows(interaction_to_list_of_tuples, categories, category_to_interactions)))
+
+    def test_query_by_family_and_modified_parent(self):
+        self.assertEqual([(OMG3, 'tSH', A4, 2), (U5, 'ntSH', G1, 0)], self.store.query(family='tSH'))
+        self.assertEqual([(OMG3, 'tSH', A4, 2)], self.store.query(family='tSH', parent='G', modified=True))
+        self.assertEqual([(U5, 'ntSH', G1, 0)], self.store.query(family='tSH', parent='G', modified=False))
+
+    def test_query_by_pdb_chain_and_crossing(self):
+        self.assertEqual([(G6, 'cWW', C7, 5)], self.store.query(pdb='2XYZ'))
+        self.assertEqual(set([(OMG3, 'tSH', A4, 2), (U5, 'ntSH', G1, 0)]),
+                         set(self.store.query(pdb='1ABC', chain='B')))
+        self.assertEqual([(OMG3, 'tSH', A4, 2), (G6, 'cWW', C7, 5)], self.store.query(min_crossing=1))
+        self.assertEqual([(G1, 'cWW', C2, 0), (G6, 'cWW', C7, 5)], self.store.query(interaction=['cWW']))
+        self.assertEqual([(G1, 's35', C2, 0)], self.store.query(category='stacking', unit=C2))
+
+    def test_write_replaces_structure(self):
+        self.store.write("1ABC", [("basepair", "tWW", G1, C2, 1)], ["basepair"], "v2")
+        self.assertEqual([(G1, 'tWW', C2, 1)], self.store.query(pdb='1ABC'))
+        self.assertEqual(['1ABC', '2XYZ'], self.store.structures())
+        self.assertEqual(['2XYZ'], self.store.structures(version="v1"))
+        self.assertEqual(['1ABC', '2XYZ'], self.store.structures({"basepair": []}))
+        self.assertEqual([], self.store.structures(["basepair", "stacking"], "v2"))
+
+    def test_reader_sees_committed_annotation_while_writing(self):
+        reader = AnnotationStore(self.filename)
+        try:
+            with self.store.connection:
+                self.store.connection.execute("DELETE FROM interactions WHERE pdb = '2XYZ'")
+                # the reader is not blocked and still sees the old annotation
+                self.assertEqual([(G6, 'cWW', C7, 5)], reader.query(pdb='2XYZ'))
+            self.assertEqual([], reader.query(pdb='2XYZ'))
+        finally:
+            reader.close()
@@ -0,0 +1,87 @@
+from unittest import TestCase
+
+import numpy as np
+
+from fr3d.data.atoms import Atom
+from fr3d.data.components import Component
+from fr3d.classifiers.atom_contacts import AtomTable
+from fr3d.classifiers.atom_contacts import contact_lines
+from fr3d.classifiers.atom_contacts import find_contacts
+from fr3d.classifiers.atom_contacts import interacting_atoms_by_residue_pair
+from fr3d.classifiers.atom_contacts import residue_contacts
+
+
+def residue(sequence, chain, number, atoms, model=1):
+    return Component([Atom(pdb='1ABC', model=model, chain=chain, component_id=sequence,
+                           component_number=number, name=name, x=x, y=y, z=z)
+                      for name, x, y, z in atoms],
+                     pdb='1ABC', model=model, chain=chain, sequence=sequence, number=number)
+
+
+class AtomContactsTest(TestCase):
+    def setUp(self):
+        self.bases = [
+            residue('G', 'A', 1, [('N1', 0.0, 0.0, 0.0), ('O6', 1.0, 0.0, 0.0), ("C1'", 4.0, 4.0, 4.0)]),
+            residue('G', 'A', 2, [('N1', 20.0, 0.0, 0.0)]),
+            residue('G', 'A', 1, [('N1', 0.0, 0.0, 0.0)], model=2),
+        ]
+        self.amino_acids = [
+            residue('LYS', 'B', 5, [('NZ', 3.0, 0.0, 0.0), ('CA', 6.0, 0.0, 0.0)]),
+            residue('ARG', 'B', 6, [('NH1', 20.0, 4.0, 0.0)]),
+        ]
+        self.nt_atoms = AtomTable(self.bases)
+        self.aa_atoms = AtomTable(self.amino_acids)
+
+    def brute_force(self, distance):
+        pairs = []
+        for i, nt_atom in enumerate(self.nt_atoms.atoms):
+            for j, aa_atom in enumerate(self.aa_atoms.atoms):
+                if self.nt_atoms.model[i] != self.aa_atoms.model[j]:
+                    continue
+                d = np.linalg.norm(nt_atom.coordinates() - aa_atom.coordinates())
+                if d <= distance:
+                    pairs.append((i, j, d))
+        return pairs
+
+    def test_contacts_match_brute_force(self):
+        nt_index, aa_index, distances = find_contacts(self.nt_atoms, self.aa_atoms, 4.5)
+        found = list(zip(nt_index.tolist(), aa_index.tolist(), distances.tolist()))
+        expected = self.brute_force(4.5)
+        self.assertEqual([(i, j) for i, j, d in expected], [(i, j) for i, j, d in found])
+        np.testing.assert_allclose([d for i, j, d in expected], [d for i, j, d in found])
+
+    def test_other_models_are_not_in_contact(self):
+        nt_index, aa_index, distances = find_contacts(self.nt_atoms, self.aa_atoms, 4.5)
+        models = set(self.bases[self.nt_atoms.residue[i]].model for i in nt_index)
+        self.assertEqual(set([1]), models)
+
+    def test_residue_summary(self):
+        contacts = find_contacts(self.nt_atoms, self.aa_atoms, 4.5)
+        nt_residue, aa_residue, counts, smallest = residue_contacts(self.nt_atoms, self.aa_atoms, *contacts)[:4]
+        # hydrogens are added to the bases, so count with brute force
+        expected = {}
+        for i, j, d in self.brute_force(4.5):
+            pair = (self.nt_atoms.residue[i], self.aa_atoms.residue[j])
+            count, least = expected.get(pair, (0, d))
+            expected[pair] = (count + 1, min(least, d))
+        self.assertEqual([0, 1], nt_residue.tolist())
+        self.assertEqual([0, 1], aa_residue.tolist())
+        self.assertEqual([expected[(0, 0)][0], expected[(1, 1)][0]], counts.tolist())
+        np.testing.assert_allclose([expected[(0, 0)][1], expected[(1, 1)][1]], smallest)
+
+    def test_interacting_atoms_by_part(self):
+        nt_atoms = AtomTable(self.bases, parts=["base"])
+        aa_atoms = AtomTable(self.amino_acids, parts=["aa_fg"])
+        contacts = find_contacts(nt_atoms, aa_atoms, 4.5)
+        by_pair = interacting_atoms_by_residue_pair(nt_atoms, aa_atoms, *contacts)
+        interacting_atoms = by_pair[(id(self.bases[0]), id(self.amino_acids[0]))]
+        self.assertEqual([("base", "aa_fg")], list(interacting_atoms.keys()))
+        names = [(a.name, b.name) for a, b, d in interacting_atoms[("base", "aa_fg")]]
+        self.assertTrue(("N1", "NZ") in names)
+        self.assertTrue(("O6", "NZ") in names)
+        self.assertFalse(any(b == "CA" for a, b in names))
+
+    def test_contact_lines(self):
+        contacts = find_contacts(self.nt_atoms, self.aa_atoms, 2.5)
+        lines = contact_lines(self.nt_atoms, self.aa_atoms, *contacts)
+        self.assertEqual(["1ABC|1|A|G|1\tbase\tO6\t1ABC|1|B|LYS|5\taa_fg\tNZ\t  2.0000\n"], lines)
@@ -0,0 +1,86 @@
+from unittest import TestCase
+
+import numpy as np
+
+from fr3d.data.atoms import Atom
+from fr3d.data.components import Component
+from fr3d.geometry.connectivity import backbone_links
+from fr3d.geometry.connectivity import next_nucleotide
+from fr3d.geometry.connectivity import previous_nucleotide
+from fr3d.geometry.connectivity import successive_nucleotides
+
+
+def nucleotide(chain, number, index, P, O3, model=1, symmetry='1_555', alt_id=None, sequence='A'):
+    atoms = []
+    for name, xyz in [("P", P), ("O3'", O3)]:
+        if xyz is not None:
+            atoms.append(Atom(pdb='1ABC', model=model, chain=chain, component_id=sequence,
+                              component_number=number, name=name, x=xyz[0], y=xyz[1], z=xyz[2]))
+    return Component(atoms, pdb='1ABC', model=model, chain=chain, sequence=sequence, number=number,
+                     index=index, symmetry=symmetry, alt_id=alt_id)
+
+
+class BackboneLinksTest(TestCase):
+    def setUp(self):
+        self.nts = [
+            nucleotide('A', 1, 0, None, (0.0, 0.0, 0.0)),
+            nucleotide('A', 2, 1, (1.6, 0.0, 0.0), (6.0, 0.0, 0.0)),
+            # chain B continues chain A covalently
+            nucleotide('B', 1, 0, (6.0, 1.6, 0.0), (12.0, 0.0, 0.0)),
+            # chain break: next index but far away
+            nucleotide('B', 2, 1, (30.0, 0.0, 0.0), (36.0, 0.0, 0.0)),
+            # same position in another model is not linked
+            nucleotide('A', 2, 1, (1.6, 0.0, 0.0), None, model=2),
+            # a modified nucleotide in a symmetry copy
+            nucleotide('A', 3, 2, (37.5, 0.0, 0.0), None, symmetry='2_555', sequence='PSU'),
+        ]
+
+    def test_links(self):
+        first, second, distance = backbone_links(self.nts)
+        self.assertEqual([(0, 1), (1, 2), (3, 5)], list(zip(first.tolist(), second.tolist())))
+        np.testing.assert_allclose([1.6, 1.6, 1.5], distance)
+
+    def test_previous_and_next(self):
+        links = backbone_links(self.nts)
+        self.assertEqual([-1, 0, 1, -1, -1, 3], previous_nucleotide(len(self.nts), links).tolist())
+        self.assertEqual([1, 2, -1, 5, -1, -1], next_nucleotide(len(self.nts), links).tolist())
+
+    def test_closest_previous_wins(self):
+        first = np.array([0, 1])
+        second = np.array([2, 2])
+        distance = np.array([1.5, 1.7])
+        self.assertEqual([-1, -1, 0], previous_nucleotide(3, (first, second, distance)).tolist())
+        self.assertEqual([-1, -1, 0], previous_nucleotide(3, (first[::-1], second, distance[::-1])).tolist())
+
+
+class SuccessiveNucleotidesTest(TestCase):
+    def test_gaps_and_alternate_locations(self):
+        nts = [
+            nucleotide('A', 5, 4, None, None),
+            nucleotide('A', 1, 0, None, None),
+            nucleotide('A', 2, 1, None, None, alt_id='A'),
+            nucleotide('A', 2, 1, None, None, alt_id='B'),
+            nucleotide('B', 1, 0, None, None),
+        ]
+        first, second, chain_distance = successive_nucleotides(nts)
+        self.assertEqual([(1, 2, 1), (1, 3, 1), (2, 0, 3), (3, 0, 3)],
+                         list(zip(first.tolist(), second.tolist(), chain_distance.tolist())))
+
+
+class PreviousO3Test(TestCase):
+    def test_stretched_link_falls_back_to_sequence_neighbor(self):
+        from fr3d.classifiers.NA_pairwise_interactions import map_unit_id_to_previous_O3
+
+        nts = [
+            nucleotide('A', 1, 0, None, (0.0, 0.0, 0.0)),
+            # O3'-P stretched to 2.8 Angstroms, as in low resolution structures
+            nucleotide('A', 2, 1, (2.8, 0.0, 0.0), (8.0, 0.0, 0.0)),
+            # bonded to chain A, not to its sequence neighbor
+            nucleotide('B', 1, 0, (8.0, 1.6, 0.0), None),
+            nucleotide('B', 3, 2, (50.0, 0.0, 0.0), None),
+        ]
+        previous = map_unit_id_to_previous_O3(nts)
+        np.testing.assert_allclose([0.0, 0.0, 0.0], previous[nts[1].unit_id()])
+        np.testing.assert_allclose([8.0, 0.0, 0.0], previous[nts[2].unit_id()])
+        self.assertEqual(0, len(previous[nts[0].unit_id()]))
+        self.assertEqual(0, len(previous[nts[3].unit_id()]))
@@ -68,3 +68,22 @@ class CoordinateTreeTest(TestCase):
     @pytest.mark.skip()
     def test_it_can_get_only_unique_pairs(self):
         pass
+
+    def test_it_can_get_neighbor_arrays(self):
+        first, second, distance = self.tree1.neighbor_arrays(self.tree2, 2.0)
+        assert first.tolist() == [0, 1]
+        assert second.tolist() == [0, 1]
+        assert distance.tolist() == [2.0, 2.0]
+
+    def test_it_can_get_unique_pair_arrays(self):
+        tree = CoordinateTree((r, a.coordinates()) for r, _ in self.first()
+                              for a in r.atoms())
+        assert len(tree.entities) == 2
+        first, second, distance = tree.pair_arrays(1.5, unique=True)
+        assert first.tolist() == [0]
+        assert second.tolist() == [1]
+        assert distance.tolist() == [1.0]
+
+    def test_it_can_query_many_cutoffs_at_once(self):
+        found = self.tree1.neighbors_within(self.tree2, [1.0, 2.1, 3.0])
+        assert [len(f[0]) for f in found] == [0, 2, 4]
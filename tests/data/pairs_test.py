@@ -82,3 +82,19 @@ class PairsTest(ut.TestCase):
         val = list(self.pairs)
         ans = [(self.nt1, self.nt4), (self.nt4, self.nt1)]
         self.assertEquals(ans, val)
+
+    def test_arrays_give_the_same_pairs(self):
+        self.pairs.distance(use='center', cutoff=3.0)
+        first_residues, second_residues, first, second, distance = self.pairs.arrays()
+        val = [(first_residues[i], second_residues[j]) for i, j in zip(first, second)]
+        self.assertEqual(list(self.pairs), val)
+        self.assertEqual(2, len(distance))
+        self.assertTrue((distance <= 3.0).all())
+
+    def test_trees_are_built_once(self):
+        structure = self.pairs.structure
+        tree = structure.distances(sequence=['A', 'U'])
+        self.assertTrue(tree is structure.distances(sequence=['A', 'U']))
+        self.assertFalse(tree is structure.distances(sequence=['A']))
+        structure.reindex()
+        self.assertFalse(tree is structure.distances(sequence=['A', 'U']))
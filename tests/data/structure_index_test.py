@@ -0,0 +1,87 @@
+import unittest as ut
+
+from fr3d.data import Atom
+from fr3d.data import Component
+from fr3d.data import Structure
+
+
+def residue(sequence, chain, number, model=1, type='RNA linking', polymeric=True):
+    return Component([Atom(pdb='1ABC', model=model, chain=chain, component_id=sequence,
+                           component_number=number, name='X', x=0.0, y=0.0, z=0.0)],
+                     pdb='1ABC', model=model, chain=chain, sequence=sequence,
+                     number=number, type=type, polymeric=polymeric)
+
+
+class IndexedSelectionTest(ut.TestCase):
+    def setUp(self):
+        self.residues = [residue('A', 'A', 1), residue('G', 'A', 2),
+                         residue('ARG', 'B', 1, type='L-peptide linking'),
+                         residue('A', 'B', 2), residue('A', 'A', 1, model=2),
+                         residue('HOH', 'A', 10, polymeric=False)]
+        self.structure = Structure(self.residues, pdb='1ABC')
+
+    def scan(self, **kwargs):
+        kwargs.setdefault('polymeric', True)
+        found = []
+        for r in self.residues:
+            for key, value in kwargs.items():
+                attr = getattr(r, key)
+                attr = attr() if callable(attr) else attr
+                if isinstance(value, list):
+                    if attr not in value:
+                        break
+                elif attr != value:
+                    break
+            else:
+                found.append(r)
+        return found
+
+    def test_selections_match_a_scan(self):
+        for kwargs in [dict(chain='A'), dict(sequence='A'), dict(chain='A', model=2),
+                       dict(sequence=['A', 'ARG']), dict(type='RNA linking', chain='B'),
+                       dict(chain='C'), dict(sequence='HOH', polymeric=False)]:
+            found = list(self.structure.residues(**kwargs))
+            self.assertEqual([id(r) for r in self.scan(**kwargs)], [id(r) for r in found])
+
+    def test_can_mix_indexed_and_other_filters(self):
+        found = list(self.structure.residues(chain='A', number=lambda n: n > 1))
+        self.assertEqual([self.residues[1]], found)
+
+    def test_finds_residue_by_unit_id(self):
+        unit_id = self.residues[3].unit_id()
+        self.assertTrue(self.structure.residue(unit_id) is self.residues[3])
+        self.assertRaises(IndexError, lambda: self.structure.residue('1ABC|1|C|A|5'))
+
+    def test_indexes_follow_changes_to_the_residues(self):
+        self.assertEqual(2, len(list(self.structure.residues(chain='B'))))
+        added = residue('U', 'B', 3)
+        self.structure._residues.append(added)
+        self.assertEqual(3, len(list(self.structure.residues(chain='B'))))
+        self.assertTrue(self.structure.residue(added.unit_id()) is added)
+
+        self.structure._residues.reverse()
+        found = list(self.structure.residues(chain='B'))
+        self.assertEqual([added, self.residues[3], self.residues[2]], found)
+
+        self.structure._residues = self.residues[:2]
+        self.assertEqual([], list(self.structure.residues(chain='B')))
+
+    def test_reindex_after_changing_a_residue(self):
+        list(self.structure.residues(chain='B'))
+        self.residues[0].chain = 'B'
+        self.structure.reindex()
+        self.assertEqual(3, len(list(self.structure.residues(chain='B'))))
+
+    def test_trees_are_shared_and_bounded(self):
+        tree = self.structure.distances(chain='A')
+        self.assertTrue(tree is self.structure.distances(chain='A'))
+
+        # a new function every call is not kept
+        self.structure.distances(number=lambda n: n > 1)
+        self.structure.distances(number=lambda n: n > 1)
+        self.assertEqual(1, len(self.structure._trees))
+
+        for number in range(Structure.MAX_TREES + 5):
+            self.structure.distances(number=number)
+        self.assertEqual(Structure.MAX_TREES, len(self.structure._trees))
+        self.assertFalse(tree is self.structure.distances(chain='A'))
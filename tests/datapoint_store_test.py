@@ -0,0 +1,137 @@
+import os
+import pickle
+from collections import OrderedDict
+import tempfile
+from unittest import TestCase
+
+import numpy as np
+
+from fr3d.classifiers.datapoint_store import concatenate_columns
+from fr3d.classifiers.datapoint_store import datapoints_to_columns
+from fr3d.classifiers.datapoint_store import evaluate_corpus
+from fr3d.classifiers.datapoint_store import evaluate_cutoffs
+from fr3d.classifiers.datapoint_store import load_columns
+from fr3d.classifiers.datapoint_store import read_datapoint_file
+from fr3d.classifiers.datapoint_store import reason_text
+from fr3d.classifiers.datapoint_store import row_datapoints
+from fr3d.classifiers.datapoint_store import rows_in_chains
+from fr3d.classifiers.datapoint_store import save_columns
+
+CUTOFFS = {
+    'cWW': {
+        0: {'xmin': -1.0, 'xmax': 1.0, 'ymin': -1.0, 'ymax': 1.0, 'zmin': -1.0, 'zmax': 1.0,
+            'normalmin': -1.1, 'normalmax': -0.7, 'anglemin': -30.0, 'anglemax': 30.0, 'gapmax': 1.0},
+        1: {'xmin': 2.0, 'xmax': 3.0, 'ymin': -1.0, 'ymax': 1.0, 'zmin': -1.0, 'zmax': 1.0,
+            'normalmin': -1.1, 'normalmax': -0.7, 'anglemin': 260.0, 'anglemax': -60.0, 'gapmax': 1.0,
+            'radiusmax': 3.5},
+    },
+    'tHS': {
+        0: {'xmin': 5.0, 'xmax': 6.0, 'ymin': 5.0, 'ymax': 6.0, 'zmin': -1.0, 'zmax': 1.0,
+            'normalmin': 0.7, 'normalmax': 1.1, 'anglemin': 0.0, 'anglemax': 90.0, 'gapmax': 1.0},
+    },
+}
+
+
+def datapoint(x, y, z=0.0, normal=-0.9, angle=0.0, gap=0.5, basepair='cWW', **values):
+    point = {'x': x, 'y': y, 'z': z, 'normal_Z': normal, 'gap12': gap, 'gap21': 0.0,
+             'basepair': basepair, 'basepair_subcategory': 0}
+    if angle is not None:
+        point['angle_in_plane'] = angle
+    point.update(values)
+    return point
+
+
+class DatapointStoreTest(TestCase):
+    def setUp(self):
+        self.pair_to_data = {
+            ('1ABC|1|A|G|1', '1ABC|1|A|C|9'): datapoint(0.0, 0.0),
+            ('1ABC|1|A|G|2', '1ABC|1|B|C|8'): datapoint(2.5, 0.0, angle=300.0, url='http://x'),
+            ('1ABC|1|A|G|3', '1ABC|1|A|C|7'): datapoint(1.5, 0.0, gap=1.5),
+            ('1ABC|1|A|G|4', '1ABC|1|A|C|6'): datapoint(0.0, 0.0, angle=None,
+                hbond=[{'bond_checked': True, 'badness': 3.5, 'distance': 3.0, 'angle': 150.0},
+                       {'bond_checked': False, 'badness': 9.0, 'distance': 9.0, 'angle': 10.0}]),
+            ('1ABC|1|A|G|5', '1ABC|1|A|C|5'): {'min_distance': 4.0},
+        }
+        self.columns = datapoints_to_columns(self.pair_to_data)
+
+    def test_typed_columns(self):
+        self.assertEqual(5, len(self.columns['unit_id1']))
+        self.assertEqual(['1ABC|1|A', '1ABC|1|B', '1ABC|1|A', '1ABC|1|A', '1ABC|1|A'], self.columns['chain2'].tolist())
+        self.assertEqual('f', self.columns['x'].dtype.kind)
+        self.assertEqual('U', self.columns['basepair'].dtype.kind)
+        self.assertTrue(np.isnan(self.columns['x'][4]))
+        self.assertEqual('', self.columns['url'][0])
+        self.assertEqual([0, 0, 0, 1, 0], self.columns['hbond_count'].tolist())
+        self.assertEqual(3.5, self.columns['hbond_max_badness'][3])
+        self.assertFalse('hbond' in self.columns)
+
+    def test_save_load_and_rows(self):
+        filename = os.path.join(tempfile.mkdtemp(), 'pairs.npz')
+        save_columns(filename, self.columns)
+        loaded = load_columns(filename)
+        self.assertEqual(list(self.columns.keys()), list(loaded.keys()))
+        np.testing.assert_array_equal(self.columns['x'], loaded['x'])
+
+        pairs = dict(row_datapoints(loaded))
+        point = pairs[('1ABC|1|A|G|2', '1ABC|1|B|C|8')]
+        self.assertEqual(2.5, point['x'])
+        self.assertEqual('http://x', point['url'])
+        self.assertEqual({'min_distance': 4.0, 'hbond_count': 0.0, 'hbond_max_badness': -1.0,
+                          'hbond_max_distance': -1.0, 'hbond_min_angle': 180.0},
+                         pairs[('1ABC|1|A|G|5', '1ABC|1|A|C|5')])
+
+        # hydrogen bond summaries survive a second conversion to columns
+        again = datapoints_to_columns(OrderedDict(row_datapoints(loaded)))
+        np.testing.assert_array_equal(self.columns['hbond_max_badness'], again['hbond_max_badness'])
+
+        mask = rows_in_chains(loaded, ['1ABC|1|A'])
+        self.assertEqual([True, False, True, True, True], mask.tolist())
+
+    def test_read_pickle_and_concatenate(self):
+        filename = os.path.join(tempfile.mkdtemp(), '1ABC_pairs_v1.pickle')
+        with open(filename, 'wb') as f:
+            pickle.dump(self.pair_to_data, f, 2)
+        columns = read_datapoint_file(filename)
+        other = datapoints_to_columns({('2XYZ|1|A|A|1', '2XYZ|1|A|U|2'): {'x': 1.0, 'BPh': '5BPh'}})
+
+        combined = concatenate_columns([columns, other])
+        self.assertEqual(6, len(combined['x']))
+        self.assertEqual(['', '', '', '', '', '5BPh'], combined['BPh'].tolist())
+        self.assertTrue(np.isnan(combined['gap12'][5]))
+        self.assertEqual('2XYZ', combined['pdb'][5])
+
+    def test_evaluate_cutoffs(self):
+        evaluation = evaluate_cutoffs(self.columns, 'cWW', CUTOFFS)
+        self.assertEqual(['cWW'] * 5, evaluation['best_interaction'].tolist())
+        self.assertEqual([0, 1, 0, 0, 0], evaluation['best_subcategory'].tolist())
+        np.testing.assert_allclose([0.0, 0.0, 0.5 + 4*0.5, 1.0, 3*0.7 + 1.0], evaluation['best_cutoff_distance'])
+        # missing data is treated as make_pretend_datapoint does
+        self.assertEqual(['cWW', 'cWW', 'xmax,gap', 'angle,hbond', 'nmax,angle'],
+                         evaluation['new_python_annotation'].tolist())
+        self.assertEqual([False, False, False, True, False], evaluation['disqualified_hbond'].tolist())
+        self.assertEqual('xmax,gap', reason_text(evaluation['reasons'][2]))
+
+    def test_nan_angle_is_not_a_missing_angle(self):
+        pair_to_data = OrderedDict([
+            (('1ABC|1|A|G|1', '1ABC|1|A|C|9'), datapoint(0.0, 0.0, angle=float('nan'))),
+            (('1ABC|1|A|G|2', '1ABC|1|A|C|8'), datapoint(0.0, 0.0, angle=None)),
+        ])
+        columns = datapoints_to_columns(pair_to_data)
+        evaluation = evaluate_cutoffs(columns, 'cWW', CUTOFFS)
+        # evaluate_pair_from_datapoint skips the angle test for NaN and penalizes a missing angle
+        np.testing.assert_allclose([0.0, 1.0], evaluation['best_cutoff_distance'])
+        self.assertEqual(['cWW', 'angle'], evaluation['new_python_annotation'].tolist())
+
+        rows = dict(row_datapoints(columns))
+        self.assertTrue(np.isnan(rows[('1ABC|1|A|G|1', '1ABC|1|A|C|9')]['angle_in_plane']))
+        self.assertFalse('angle_in_plane' in rows[('1ABC|1|A|G|2', '1ABC|1|A|C|8')])
+
+    def test_evaluate_corpus_by_annotation(self):
+        self.pair_to_data[('1ABC|1|A|G|1', '1ABC|1|A|C|9')]['basepair'] = 'ntHS'
+        columns = datapoints_to_columns(self.pair_to_data)
+        evaluation = evaluate_corpus(columns, {'G,C': CUTOFFS})
+        self.assertEqual(['tHS', 'cWW', 'cWW', 'cWW', ''], evaluation['best_interaction'].tolist())
+        self.assertEqual(9999.0, evaluation['best_cutoff_distance'][4])
+        # normals pointing the wrong way add 100 without a reason
+        self.assertEqual(110.0, evaluation['best_cutoff_distance'][0])
+        self.assertEqual('xmin,ymin', evaluation['new_python_annotation'][0])
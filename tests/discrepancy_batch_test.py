@@ -0,0 +1,141 @@
+from unittest import TestCase
+
+import numpy as np
+from numpy.testing import assert_almost_equal
+
+from fr3d.geometry.angleofrotation import angle_of_rotation
+from fr3d.geometry.superpositions import besttransformation_weighted
+from fr3d.geometry.discrepancy import matrix_discrepancy
+from fr3d.geometry.discrepancy import matrix_discrepancy_cutoff
+from fr3d.geometry.discrepancy import matrix_discrepancy_many_vs_many
+from fr3d.geometry.discrepancy import matrix_discrepancy_one_vs_many
+from fr3d.geometry.discrepancy import matrix_discrepancy_batch
+from fr3d.geometry.discrepancy import matrix_discrepancy_all_vs_all
+from fr3d.geometry.discrepancy import stack_centers_rotations
+
+
+def random_rotation(rng):
+    q, r = np.linalg.qr(rng.normal(size=(3, 3)))
+    q = q * np.sign(np.diag(r))
+    if np.linalg.det(q) < 0:
+        q[:, 2] = -q[:, 2]
+    return q
+
+
+def random_instances(rng, K, n):
+    centers = []
+    rotations = []
+    base = rng.normal(scale=6.0, size=(n, 3))
+    for k in range(K):
+        centers.append([c for c in base + rng.normal(scale=1.0, size=(n, 3))])
+        rotations.append([random_rotation(rng) for m in range(n)])
+    return centers, rotations
+
+
+def reference_discrepancy(centers1, rotations1, centers2, rotations2, weights):
+    """The calculation matrix_discrepancy made one pair at a time."""
+    n = len(centers1)
+    rotation_matrix, new1, mean1, RMSD, sse = \
+        besttransformation_weighted(np.array(centers1), np.array(centers2), weights)
+    orientation_error = 0
+    for r1, r2 in zip(rotations1, rotations2):
+        angle = angle_of_rotation(np.dot(np.dot(rotation_matrix, r2), np.transpose(r1)))
+        orientation_error += np.square(angle)
+    return np.sqrt(sse + orientation_error) / n
+
+
+class BatchDiscrepancyTest(TestCase):
+    def setUp(self):
+        self.rng = np.random.RandomState(17)
+
+    def scalar(self, centers, rotations, i, j):
+        return matrix_discrepancy(np.array(centers[i]), rotations[i],
+                                  np.array(centers[j]), rotations[j])
+
+    def test_batch_matches_scalar_for_several_nucleotides(self):
+        centers, rotations = random_instances(self.rng, 8, 5)
+        c, r, v = stack_centers_rotations(centers, rotations)
+        val = matrix_discrepancy_batch(c[:4], r[:4], c[4:], r[4:])
+        ans = [self.scalar(centers, rotations, k, k + 4) for k in range(4)]
+        assert_almost_equal(ans, val)
+
+    def test_batch_matches_scalar_for_two_nucleotides(self):
+        centers, rotations = random_instances(self.rng, 6, 2)
+        c, r, v = stack_centers_rotations(centers, rotations)
+        val = matrix_discrepancy_batch(c[:3], r[:3], c[3:], r[3:])
+        ans = [self.scalar(centers, rotations, k, k + 3) for k in range(3)]
+        assert_almost_equal(ans, val)
+
+    def test_missing_rotations_are_ignored(self):
+        centers, rotations = random_instances(self.rng, 2, 4)
+        rotations[0][2] = None
+        c, r, v = stack_centers_rotations(centers, rotations)
+        self.assertFalse(v[0, 2])
+        val = matrix_discrepancy_batch(c[:1], r[:1], c[1:], r[1:],
+                                       v[:1], v[1:])
+        rotations[1][2] = np.array([])
+        rotations[0][2] = np.array([])
+        ans = self.scalar(centers, rotations, 0, 1)
+        assert_almost_equal(ans, val[0])
+
+    def test_all_vs_all_matches_scalar(self):
+        centers, rotations = random_instances(self.rng, 12, 4)
+        val = matrix_discrepancy_all_vs_all(centers, rotations, chunk_size=7)
+        for i in range(12):
+            self.assertEqual(0.0, val[i, i])
+            for j in range(i + 1, 12):
+                ans = self.scalar(centers, rotations, i, j)
+                assert_almost_equal(ans, val[i, j])
+                assert_almost_equal(ans, val[j, i])
+
+    def test_all_vs_all_with_worker_processes(self):
+        centers, rotations = random_instances(self.rng, 10, 3)
+        one = matrix_discrepancy_all_vs_all(centers, rotations, chunk_size=5)
+        many = matrix_discrepancy_all_vs_all(centers, rotations, chunk_size=5,
+                                             processes=2)
+        assert_almost_equal(one, many)
+
+    def test_scalar_wrapper_matches_pairwise_calculation(self):
+        centers, rotations = random_instances(self.rng, 2, 5)
+        weights = [1.0, 2.0, 0.5, 1.0, 3.0]
+        ans = reference_discrepancy(centers[0], rotations[0], centers[1], rotations[1], weights)
+        val = matrix_discrepancy(np.array(centers[0]), rotations[0],
+                                 np.array(centers[1]), rotations[1],
+                                 center_weight=weights)
+        assert_almost_equal(ans, val)
+
+    def test_cutoff_wrapper_returns_none_above_cutoff(self):
+        centers, rotations = random_instances(self.rng, 2, 4)
+        d = self.scalar(centers, rotations, 0, 1)
+        args = (centers[0], rotations[0], centers[1], rotations[1])
+        assert_almost_equal(d, matrix_discrepancy_cutoff(*args, cutoff=d + 0.01))
+        self.assertEqual(None, matrix_discrepancy_cutoff(*args, cutoff=d - 0.01))
+
+    def test_one_vs_many_matches_scalar(self):
+        centers, rotations = random_instances(self.rng, 9, 4)
+        val = matrix_discrepancy_one_vs_many(centers[0], rotations[0],
+                                             centers[1:], rotations[1:],
+                                             chunk_size=3)
+        ans = [self.scalar(centers, rotations, 0, k) for k in range(1, 9)]
+        assert_almost_equal(ans, val)
+
+        cutoff = np.median(ans)
+        screened = matrix_discrepancy_one_vs_many(centers[0], rotations[0],
+                                                  centers[1:], rotations[1:],
+                                                  cutoff=cutoff, chunk_size=3)
+        for a, v in zip(ans, screened):
+            if a <= cutoff:
+                assert_almost_equal(a, v)
+            else:
+                self.assertTrue(np.isinf(v))
+
+    def test_many_vs_many_matches_scalar(self):
+        for n in [2, 4]:
+            centers, rotations = random_instances(self.rng, 7, n)
+            val = matrix_discrepancy_many_vs_many(centers[:3], rotations[:3],
+                                                  centers[3:], rotations[3:],
+                                                  chunk_size=5)
+            self.assertEqual((3, 4), val.shape)
+            for i in range(3):
+                for j in range(4):
+                    assert_almost_equal(self.scalar(centers, rotations, i, j + 3), val[i, j])
@@ -0,0 +1,59 @@
+from unittest import TestCase
+
+import numpy as np
+
+from fr3d.data.atoms import Atom
+from fr3d.data.components import Component
+from fr3d.classifiers.ensemble import Ensemble
+from fr3d.classifiers.ensemble import interaction_frequencies
+from fr3d.classifiers.ensemble import pair_cubes
+
+
+def residue(model, number, x, sequence='ARG'):
+    atoms = [Atom(pdb='1ABC', model=model, chain='A', component_id=sequence, component_number=number,
+                  name=name, x=x + dx, y=0.0, z=0.0) for name, dx in [('CA', 0.0), ('CB', 1.0)]]
+    return Component(atoms, pdb='1ABC', model=model, chain='A', sequence=sequence, number=number)
+
+
+class EnsembleTest(TestCase):
+    def setUp(self):
+        self.residues = []
+        for model, spacing in [(1, 3.0), (2, 3.0), (3, 20.0)]:
+            for number in range(1, 4):
+                self.residues.append(residue(model, number, number * spacing))
+        # only in model 1, so not part of the topology and reported
+        self.residues.append(residue(1, 9, 100.0))
+        self.ensemble = Ensemble(self.residues)
+
+    def test_shared_topology(self):
+        self.assertEqual([1, 2, 3], self.ensemble.models)
+        self.assertEqual(3, len(self.ensemble))
+        self.assertEqual([3, 3, 3], [len(residues) for residues in self.ensemble.residues])
+        self.assertEqual([self.residues[-1].unit_id()], self.ensemble.missing)
+        np.testing.assert_allclose([60.0, 0.0, 0.0], self.ensemble.reference_points('CA')[2, 2])
+
+    def test_close_pairs_match_brute_force(self):
+        points = self.ensemble.reference_points('CA')
+        first, second, distances = self.ensemble.close_pairs(points, 4.0)
+        self.assertEqual([(0, 1), (1, 2)], list(zip(first.tolist(), second.tolist())))
+        for m in range(3):
+            for k, (i, j) in enumerate(zip(first, second)):
+                self.assertAlmostEqual(np.linalg.norm(points[m, i] - points[m, j]), distances[m, k])
+        self.assertEqual([True, True, False], (distances[:, 0] <= 4.0).tolist())
+
+    def test_pair_cubes_visit_each_pair_once(self):
+        cube_list, cube_neighbors = pair_cubes(self.ensemble.residues[0], np.array([0, 1]), np.array([1, 2]))
+        visited = [(i, j) for i in cube_list for j in cube_neighbors[i] if j in cube_list]
+        self.assertEqual([(0, 1), (1, 2)], sorted(visited))
+
+    def test_interaction_frequencies(self):
+        model_interactions = []
+        for m in range(3):
+            u = [r.unit_id() for r in self.ensemble.residues[m]]
+            found = {'s35': [(u[0], u[1], 0)]}
+            if m < 2:
+                found['s35'].append((u[1], u[2], 0))
+            model_interactions.append(found)
+        u = [r.unit_id() for r in self.ensemble.residues[0]]
+        self.assertEqual({'s35': [(u[0], u[1], 3), (u[1], u[2], 2)]},
+                         interaction_frequencies(self.ensemble, model_interactions))
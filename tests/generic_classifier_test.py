@@ -0,0 +1,98 @@
+from unittest import TestCase
+
+import numpy as np
+
+from fr3d.data import Structure
+from fr3d.data.atoms import Atom
+from fr3d.data.components import Component
+from fr3d.definitions import NAbasecoordinates
+from fr3d.definitions import NAbaseheavyatoms
+from fr3d.classifiers.generic import Classifier
+from fr3d.classifiers.generic import PairBatch
+
+
+def residue(sequence, chain, number, atoms):
+    return Component([Atom(pdb='1ABC', model=1, chain=chain, component_id=sequence,
+                           component_number=number, name=name, x=x, y=y, z=z)
+                      for name, (x, y, z) in atoms],
+                     pdb='1ABC', model=1, chain=chain, sequence=sequence, number=number,
+                     polymeric=True)
+
+
+def base(number, shift):
+    return residue('G', 'A', number, [(name, NAbasecoordinates['G'][name] + shift)
+                                      for name in NAbaseheavyatoms['G']])
+
+
+def arginine(number, shift):
+    return residue('ARG', 'B', number, [('CZ', shift + [4.0, 1.5, 0.2]),
+                                        ('NH1', shift + [4.5, 2.5, 0.0])])
+
+
+class AboveBase(Classifier):
+    """Classify one pair at a time: is the CZ of the amino acid above the base."""
+
+    def __init__(self):
+        super(AboveBase, self).__init__(first={'sequence': 'G'}, second={'sequence': 'ARG'})
+
+    def classification(self, first, second):
+        moved = first.translate_rotate_component(second)
+        z = moved.centers['CZ'][2]
+        if z > 1:
+            return 'above'
+
+
+class BatchedAboveBase(AboveBase):
+    def classify_batch(self, batch):
+        z = batch.transformed(['CZ'])[:, 0, 2]
+        return np.where(z > 1, 'above', '')
+
+
+class GenericClassifierTest(TestCase):
+    def setUp(self):
+        self.structure = Structure([base(1, np.zeros(3)),
+                                    arginine(7, np.array([0.0, 0.0, 3.0])),
+                                    arginine(8, np.array([0.0, 0.0, -3.0])),
+                                    arginine(9, np.array([1.0, -2.0, 5.0]))], pdb='1ABC')
+
+    def test_transformed_matches_translate_rotate_component(self):
+        first = list(self.structure.residues(sequence='G'))
+        second = list(self.structure.residues(sequence='ARG'))
+        batch = PairBatch(first * len(second), second)
+        moved = batch.transformed(['CZ', 'NH1', 'XX'])
+        for i, aa in enumerate(second):
+            expected = first[0].translate_rotate_component(aa)
+            np.testing.assert_allclose(expected.centers['CZ'], moved[i, 0], atol=1e-10)
+            np.testing.assert_allclose(expected.centers['NH1'], moved[i, 1], atol=1e-10)
+        self.assertTrue(np.isnan(moved[:, 2]).all())
+
+    def test_per_pair_classifiers_work_through_the_adapter(self):
+        classified = AboveBase().classify(self.structure)
+        self.assertEqual(set(['1ABC|1|B|ARG|7', '1ABC|1|B|ARG|9']),
+                         set(second for _, second, _ in classified))
+        self.assertEqual(['above', 'above'], [c for _, _, c in classified])
+
+    def test_batched_and_per_pair_agree(self):
+        expected = sorted(AboveBase().classify(self.structure))
+        self.assertEqual(expected, sorted(BatchedAboveBase().classify(self.structure)))
+        self.assertEqual(expected, sorted(BatchedAboveBase().classify(self.structure, batch_size=2)))
+
+    def test_batches_are_taken_from_the_pairs_as_needed(self):
+        structure = self.structure
+        taken = []
+
+        class CountingStructure(object):
+            def pairs(self, **selectors):
+                for pair in structure.pairs(**selectors):
+                    taken.append(pair)
+                    yield pair
+
+        class Recording(BatchedAboveBase):
+            def classify_batch(self, batch):
+                sizes.append((len(batch), len(taken)))
+                return BatchedAboveBase.classify_batch(self, batch)
+
+        sizes = []
+        classified = Recording().classify(CountingStructure(), batch_size=2)
+        self.assertEqual([(2, 2), (1, 3)], sizes)
+        self.assertEqual(sorted(AboveBase().classify(self.structure)), sorted(classified))
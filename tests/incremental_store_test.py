@@ -0,0 +1,37 @@
+import os
+import shutil
+import tempfile
+from unittest import TestCase
+
+from fr3d.classifiers.NA_pairwise_interactions import generatePairwiseAnnotation
+from fr3d.classifiers.annotation_store import AnnotationStore
+from fr3d.synthetic import write_structure
+
+
+class IncrementalStoreTest(TestCase):
+    def setUp(self):
+        self.directory = tempfile.mkdtemp()
+        self.input = os.path.join(self.directory, "input")
+        self.output = os.path.join(self.directory, "output")
+        os.mkdir(self.input)
+        write_structure(os.path.join(self.input, "SYN1.cif"), nucleotides=30, density=8.0)
+        self.store = os.path.join(self.directory, "annotations.sqlite")
+
+    def tearDown(self):
+        shutil.rmtree(self.directory)
+
+    def annotate(self, store=""):
+        generatePairwiseAnnotation(["SYN1.cif"], "", self.input, self.output, "basepair", "txt",
+                                   incremental=True, annotationStore=store)
+
+    def test_store_added_to_an_up_to_date_output_folder(self):
+        self.annotate()
+        self.annotate(self.store)
+        with AnnotationStore(self.store) as store:
+            self.assertEqual(["SYN1"], store.structures())
+
+    def test_structures_already_stored_are_skipped(self):
+        self.annotate(self.store)
+        written = os.path.getmtime(os.path.join(self.output, "SYN1_basepair.txt"))
+        self.annotate(self.store)
+        self.assertEqual(written, os.path.getmtime(os.path.join(self.output, "SYN1_basepair.txt")))
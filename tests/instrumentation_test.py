@@ -0,0 +1,112 @@
+import json
+import os
+import shutil
+import tempfile
+from unittest import TestCase
+
+from fr3d.instrumentation import MemoryBudgetExceeded
+from fr3d.instrumentation import Recorder
+from fr3d.instrumentation import check_memory_budget
+from fr3d.instrumentation import memory_available
+from fr3d.instrumentation import memory_usage
+from fr3d.instrumentation import timer
+from fr3d.instrumentation import timer_phase
+from fr3d.instrumentation import timer_summary
+
+
+class RecorderTest(TestCase):
+    def setUp(self):
+        self.recorder = Recorder(min_event_seconds=0)
+        self.directory = tempfile.mkdtemp()
+
+    def tearDown(self):
+        shutil.rmtree(self.directory)
+
+    def test_spans_nest(self):
+        with self.recorder.span("outer", pdb="1ABC"):
+            with self.recorder.span("inner"):
+                pass
+        events = self.recorder.to_dict()["spans"]
+        self.assertEqual(["inner", "outer"], [e["name"] for e in events])
+        self.assertEqual([2, 1], [e["depth"] for e in events])
+        self.assertEqual({"pdb": "1ABC"}, events[1]["args"])
+
+    def test_phases_replace_each_other(self):
+        self.recorder.phase("Reading")
+        self.recorder.phase("Annotating")
+        self.recorder.phase("Reading")
+        self.recorder.end_phase()
+        totals = self.recorder.to_dict()["totals"]
+        self.assertEqual(["Reading", "Annotating"], list(totals.keys()))
+        self.assertEqual(2, totals["Reading"]["calls"])
+
+    def test_counters_since_a_snapshot(self):
+        self.recorder.count("pairs", 5)
+        before = self.recorder.snapshot()
+        self.recorder.count("pairs", 3)
+        self.recorder.count("checks")
+        counters = self.recorder.to_dict(before)["counters"]
+        self.assertEqual({"pairs": 3, "checks": 1}, dict(counters))
+
+    def test_disabled_recorder_keeps_nothing(self):
+        self.recorder.enabled = False
+        with self.recorder.span("outer"):
+            self.recorder.count("pairs")
+        self.assertEqual(0, len(self.recorder.to_dict()["spans"]))
+        self.assertEqual(0, len(self.recorder.counters))
+
+    def test_chrome_trace_file(self):
+        with self.recorder.span("outer"):
+            self.recorder.count("pairs", 2)
+        filename = os.path.join(self.directory, "trace.json")
+        self.recorder.write_chrome_trace(filename)
+        with open(filename) as f:
+            events = json.load(f)["traceEvents"]
+        self.assertEqual(["X", "C"], [e["ph"] for e in events])
+        self.assertEqual(2, events[1]["args"]["value"])
+
+    def test_timer_functions_use_the_given_recorder(self):
+        data = timer_phase("start", self.recorder)
+        self.assertTrue(data is self.recorder)
+        timer_phase("Reading CIF files", data)
+        summary = timer_summary(data)
+        self.assertTrue(summary.startswith("Summary of time taken:"))
+        self.assertTrue("Reading CIF files" in summary)
+        self.assertEqual(summary.splitlines()[0], timer("summary", data).splitlines()[0])
+        self.assertTrue(timer("Annotating", data) is self.recorder)
+
+
+class MemoryTest(TestCase):
+    def setUp(self):
+        self.recorder = Recorder(min_event_seconds=0)
+
+    def test_usage_is_measured(self):
+        current, peak = memory_usage()
+        if current is None:
+            self.skipTest("memory use is not available on this system")
+        self.assertTrue(current > 0)
+
+    def test_phases_record_memory_and_spans_do_not(self):
+        if memory_usage()[0] is None:
+            self.skipTest("memory use is not available on this system")
+        self.recorder.phase("allocate")
+        with self.recorder.span("inner"):
+            data = b"x" * (50 * 1024 * 1024)
+        self.recorder.end_phase()
+        spans = dict((span["name"], span) for span in self.recorder.to_dict()["spans"])
+        self.assertTrue(spans["allocate"]["growthMB"] > 40)
+        self.assertFalse("growthMB" in spans["inner"])
+        self.assertTrue(self.recorder.to_dict()["totals"]["allocate"]["peakMB"] > 40)
+        self.assertTrue("peak" in self.recorder.phase_summary())
+        del data
+
+    def test_no_budget_is_never_exceeded(self):
+        self.assertEqual(float("inf"), memory_available(float("inf")))
+        check_memory_budget(float("inf"), "reading", 10**9)
+
+    def test_budget_exceeded(self):
+        if memory_usage()[0] is None:
+            self.skipTest("memory use is not available on this system")
+        with self.assertRaises(MemoryBudgetExceeded) as context:
+            check_memory_budget(1, "reading 1ABC.cif")
+        self.assertTrue("reading 1ABC.cif" in str(context.exception))
@@ -0,0 +1,77 @@
+import os
+import shutil
+import tempfile
+from unittest import TestCase
+
+from fr3d.manifest import Manifest
+
+
+class ManifestTest(TestCase):
+    def setUp(self):
+        self.directory = tempfile.mkdtemp()
+        self.structure = self.write("1ABC.cif", "data_1ABC\n")
+        self.limits = self.write("limits.py", "cutoffs = {}\n")
+        self.output = self.write("1ABC_basepair.txt", "")
+        self.tables = {"limits": self.limits}
+        self.filename = os.path.join(self.directory, "manifest.json")
+
+    def tearDown(self):
+        shutil.rmtree(self.directory)
+
+    def write(self, name, text):
+        filename = os.path.join(self.directory, name)
+        with open(filename, "w") as f:
+            f.write(text)
+        return filename
+
+    def recorded(self):
+        manifest = Manifest(self.filename)
+        manifest.record("1ABC", self.structure, "v1", self.tables, "basepair", [self.output], "new")
+        manifest.save()
+        return Manifest(self.filename)
+
+    def test_new_structure_is_annotated(self):
+        self.assertEqual((True, "not annotated before"),
+                         Manifest(self.filename).needs_update("1ABC", self.structure, "v1", self.tables, "basepair"))
+
+    def test_unchanged_structure_is_skipped(self):
+        manifest = self.recorded()
+        self.assertEqual((False, "unchanged"), manifest.needs_update("1ABC", self.structure, "v1", self.tables, "basepair"))
+
+    def test_changes_are_detected(self):
+        manifest = self.recorded()
+        self.assertEqual((True, "classifier version changed from v1"),
+                         manifest.needs_update("1ABC", self.structure, "v2", self.tables, "basepair"))
+        self.assertEqual((True, "options changed"),
+                         manifest.needs_update("1ABC", self.structure, "v1", self.tables, "stacking"))
+
+        self.write("limits.py", "cutoffs = {'cWW': {}}\n")
+        self.assertEqual((True, "tables changed: limits"),
+                         manifest.needs_update("1ABC", self.structure, "v1", self.tables, "basepair"))
+
+        self.write("1ABC.cif", "data_1ABC\n# changed\n")
+        self.assertEqual((True, "input file changed"),
+                         manifest.needs_update("1ABC", self.structure, "v1", self.tables, "basepair"))
+
+    def test_missing_output_is_made_again(self):
+        manifest = self.recorded()
+        os.remove(self.output)
+        update, reason = manifest.needs_update("1ABC", self.structure, "v1", self.tables, "basepair")
+        self.assertTrue(update)
+        self.assertTrue(reason.startswith("output file missing"))
+
+    def test_missing_input_is_not_recorded(self):
+        manifest = Manifest(self.filename)
+        manifest.record("2XYZ", None, "v1", self.tables, "basepair", [])
+        self.assertEqual({}, manifest.entries)
+
+    def test_rewrite_within_the_same_second_is_detected(self):
+        second = 1700000000 * 10**9
+        os.utime(self.structure, ns=(second, second + 1000))
+        manifest = self.recorded()
+
+        # same size and the same whole second as before
+        self.write("1ABC.cif", "data_2XYZ\n")
+        os.utime(self.structure, ns=(second, second + 2000))
+        self.assertEqual((True, "input file changed"),
+                         manifest.needs_update("1ABC", self.structure, "v1", self.tables, "basepair"))
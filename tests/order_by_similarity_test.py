@@ -0,0 +1,76 @@
+import random
+from unittest import TestCase
+
+import numpy as np
+from numpy.testing import assert_almost_equal
+
+from fr3d.ordering import orderBySimilarity as obs
+
+
+def cluster_distances(seed, num_clusters, points_per_cluster):
+    np.random.seed(seed)
+    points = obs.generateClusterDataset(num_clusters, points_per_cluster, 2)
+    return obs.calculateDistanceMatrix(points)
+
+
+class TreePenaltyTest(TestCase):
+    def test_penalty_is_height_where_groups_merge(self):
+        distance = np.array([[0.0, 1.0, 4.0, 5.0],
+                             [1.0, 0.0, 4.0, 5.0],
+                             [4.0, 4.0, 0.0, 2.0],
+                             [5.0, 5.0, 2.0, 0.0]])
+        penalty = obs.treePenalty(distance)
+        self.assertEqual(1.0, penalty[0, 1])
+        self.assertEqual(2.0, penalty[2, 3])
+        self.assertEqual(4.5, penalty[0, 3])
+        self.assertEqual(4.5, penalty[3, 0])
+        self.assertEqual(0.0, penalty[2, 2])
+
+    def test_normalized_penalty_has_same_sum_as_distance(self):
+        distance = cluster_distances(1, 3, 5)
+        penalty = obs.normalizePenaltyMatrix(distance, obs.treePenalty(distance))
+        assert_almost_equal(np.sum(distance), np.sum(penalty))
+
+
+class PathLengthTest(TestCase):
+    def setUp(self):
+        self.distance = cluster_distances(2, 4, 10)
+
+    def test_greedy_insertion_score_is_path_length(self):
+        random.seed(5)
+        path, score = obs.greedyInsertionPathLength(self.distance)
+        self.assertEqual(list(range(40)), sorted(path))
+        assert_almost_equal(obs.pathLength(self.distance, path), score)
+
+    def test_two_opt_reduction_matches_new_path_length(self):
+        order = list(range(40))
+        random.seed(6)
+        random.shuffle(order)
+        before = obs.pathLength(self.distance, order)
+        new_order, reduction = obs.twoOptSwap(self.distance, order)
+        self.assertEqual(list(range(40)), sorted(new_order))
+        self.assertTrue(reduction < 0)
+        assert_almost_equal(before + reduction,
+                            obs.pathLength(self.distance, new_order))
+
+    def test_two_opt_finds_points_on_a_line(self):
+        points = np.arange(12, dtype=float)
+        distance = np.abs(points[:, np.newaxis] - points[np.newaxis, :])
+        order, reduction = obs.twoOptSwap(distance, [0, 5, 4, 3, 2, 1, 6, 7,
+                                                     11, 10, 9, 8])
+        self.assertEqual(11.0, obs.pathLength(distance, order))
+
+    def test_landmark_ordering_is_close_to_exact(self):
+        distance = cluster_distances(3, 6, 40)
+        exact = obs.treePenalizedPathLength(distance, 5, seed=1)
+        approximate = obs.treePenalizedPathLength(distance, 5, seed=1,
+                                                  maxExactSize=50,
+                                                  numLandmarks=40)
+        self.assertEqual(list(range(240)), sorted(approximate))
+        self.assertTrue(obs.pathLength(distance, approximate) <
+                        1.1 * obs.pathLength(distance, exact))
+
+    def test_reorder_symmetric_matrix(self):
+        val = obs.reorderSymmetricMatrix(self.distance, [2, 0, 1])
+        self.assertEqual(self.distance[2, 0], val[0, 1])
+        self.assertEqual(self.distance[1, 2], val[2, 0])
@@ -0,0 +1,89 @@
+import os
+import shutil
+import tempfile
+from copy import copy
+from unittest import TestCase
+
+from fr3d.search.pairs_index import compileNAPairsIndex
+from fr3d.search.pairs_index import indexPairsForIFE
+from fr3d.search.pairs_index import readNAPairsIndex
+from fr3d.search.pairs_index import writeNAPairsIndex
+
+
+def unit(n):
+    return "1ABC|1|A|G|%d" % n
+
+
+TRIPLES = {
+    "cWW": [(unit(5), unit(1), 0), (unit(1), unit(5), 0), (unit(2), unit(4), None)],
+    "s35": [(unit(1), unit(5), 3), (unit(9), unit(2), 1)],
+    "0BPh": [(unit(3), unit(3), 0), (unit(3), unit(4), 2)],
+}
+
+ID_TO_INDEX = dict((unit(n), n + 10) for n in range(1, 6))
+
+
+class PairsIndexTest(TestCase):
+    def setUp(self):
+        table, description = compileNAPairsIndex(TRIPLES)
+        self.result = indexPairsForIFE(table, description, ID_TO_INDEX,
+                                       ["cWW", "0BPh"])
+
+    def test_active_interactions_become_index_pairs(self):
+        interactionToPairs = self.result[0]
+        self.assertEqual(set([(11, 15), (15, 11), (12, 14)]),
+                         set(interactionToPairs["cWW"][0]))
+        self.assertEqual(([(13, 14)], [2]), interactionToPairs["0BPh"])
+        self.assertEqual(([(13, 13)], [0]), interactionToPairs["0BPh_self"])
+        self.assertFalse("s35" in interactionToPairs)
+
+    def test_units_outside_the_ife_are_dropped(self):
+        pairToInteractions = self.result[1]
+        self.assertFalse((19, 12) in pairToInteractions)
+        self.assertEqual([], pairToInteractions[(19, 12)])
+
+    def test_pair_lookups_match_a_dictionary(self):
+        pairToInteractions, pairToCrossingNumber = self.result[1], self.result[2]
+        self.assertEqual(["cWW", "s35"], pairToInteractions[(11, 15)])
+        self.assertEqual(3, pairToCrossingNumber[(11, 15)])
+        self.assertEqual(None, pairToCrossingNumber[(12, 14)])
+        self.assertEqual(5, len(pairToInteractions))
+        self.assertEqual(set([(11, 15), (15, 11), (12, 14), (13, 13), (13, 14)]),
+                         set(pairToInteractions.keys()))
+
+    def test_assignments_do_not_change_copies(self):
+        pairToInteractions = self.result[1]
+        other = copy(pairToInteractions)
+        other[(11, 15)] = other[(11, 15)] + ["cWW_exp"]
+        self.assertEqual(["cWW", "s35", "cWW_exp"], other[(11, 15)])
+        self.assertEqual(["cWW", "s35"], pairToInteractions[(11, 15)])
+
+    def test_index_files_are_memory_mapped(self):
+        directory = tempfile.mkdtemp()
+        try:
+            pathAndFileName = os.path.join(directory, "1ABC_RNA_pairs.pickle")
+            table, description = compileNAPairsIndex(TRIPLES)
+            writeNAPairsIndex(pathAndFileName, table, description)
+            mapped, mappedDescription = readNAPairsIndex(pathAndFileName)
+            self.assertEqual(description, mappedDescription)
+            self.assertEqual(table.tolist(), mapped.tolist())
+        finally:
+            shutil.rmtree(directory)
+
+    def test_index_that_does_not_match_its_description_is_not_used(self):
+        directory = tempfile.mkdtemp()
+        try:
+            first = os.path.join(directory, "1ABC_RNA_pairs.pickle")
+            second = os.path.join(directory, "2XYZ_RNA_pairs.pickle")
+            table, description = compileNAPairsIndex(TRIPLES)
+            writeNAPairsIndex(first, table, description)
+            table, description = compileNAPairsIndex({"cWW": TRIPLES["cWW"]})
+            writeNAPairsIndex(second, table, description)
+            self.assertEqual(4, len(os.listdir(directory)))
+
+            # the description of one index next to the table of another
+            shutil.copy(os.path.join(directory, "2XYZ_RNA_pairs_index.json"),
+                        os.path.join(directory, "1ABC_RNA_pairs_index.json"))
+            self.assertEqual((None, None), readNAPairsIndex(first))
+        finally:
+            shutil.rmtree(directory)
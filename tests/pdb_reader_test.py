@@ -0,0 +1,122 @@
+from unittest import TestCase
+
+import numpy as np
+
+from fr3d.pdb.reader import PDB
+from fr3d.pdb.reader import check_linking
+
+
+def atom_line(record, serial, name, resname, chain, number, x, y, z, alt=' ', icode=' ', element=''):
+    return "%-6s%5d %-4s%1s%3s %1s%4d%1s   %8.3f%8.3f%8.3f%6.2f%6.2f          %2s\n" % (
+        record, serial, name, alt, resname, chain, number, icode, x, y, z, 1.0, 0.0, element)
+
+
+TEXT = (
+    "HEADER    RNA                                     01-JAN-00   1ABC              \n"
+    "REMARK 350 BIOMOLECULE: 1                                                        \n"
+    "REMARK 350 APPLY THE FOLLOWING TO CHAINS: A                                      \n"
+    "REMARK 350   BIOMT1   1  1.000000  0.000000  0.000000        0.00000            \n"
+    "REMARK 350   BIOMT2   1  0.000000  1.000000  0.000000        0.00000            \n"
+    "REMARK 350   BIOMT3   1  0.000000  0.000000  1.000000        0.00000            \n"
+    "REMARK 350   BIOMT1   2 -1.000000  0.000000  0.000000       10.00000            \n"
+    "REMARK 350   BIOMT2   2  0.000000 -1.000000  0.000000        0.00000            \n"
+    "REMARK 350   BIOMT3   2  0.000000  0.000000  1.000000        0.00000            \n"
+    "MODEL        1                                                                  \n"
+    + atom_line("ATOM", 1, " P", "  G", "A", 1, 1.0, 2.0, 3.0, element="P")
+    + atom_line("ATOM", 2, " N1", "  G", "A", 1, 1.5, 2.5, 3.5, alt="A", element="N")
+    + atom_line("ATOM", 3, " N1", "  G", "A", 1, 1.6, 2.6, 3.6, alt="B", element="N")
+    + atom_line("ATOM", 4, " CA", "ARG", "B", 5, 4.0, 5.0, 6.0, icode="A", element="C")
+    + atom_line("HETATM", 5, " O", "HOH", "B", 100, 7.0, 8.0, 9.0, element="O")
+    + "ENDMDL\n"
+    "MODEL        2                                                                  \n"
+    + atom_line("ATOM", 1, " P", "  G", "A", 1, 1.0, 2.0, 4.0)
+    + "ENDMDL\n"
+    "END\n")
+
+
+class PDBReaderTest(TestCase):
+    def setUp(self):
+        self.reader = PDB(TEXT.splitlines(True))
+        self.structure = self.reader.structure()
+        self.residues = list(self.structure.residues(polymeric=None))
+
+    def test_pdb_id_from_header(self):
+        self.assertEqual('1ABC', self.structure.pdb)
+
+    def test_columns(self):
+        self.assertEqual(6, len(self.reader.columns['name']))
+        np.testing.assert_allclose([1.0, 2.0, 3.0], self.reader.columns['coordinates'][0])
+        self.assertEqual(['1', '1', '1', '1', '1', '2'], self.reader.columns['model'])
+
+    def test_unit_ids(self):
+        unit_ids = [r.unit_id() for r in self.residues]
+        self.assertEqual(['1ABC|1|A|G|1||A', '1ABC|1|A|G|1||B',
+                          '1ABC|1|A|G|1||A||ASM_2', '1ABC|1|A|G|1||B||ASM_2',
+                          '1ABC|1|B|ARG|5|||A', '1ABC|1|B|HOH|100',
+                          '1ABC|2|A|G|1', '1ABC|2|A|G|1||||ASM_2'], unit_ids)
+
+    def test_alternate_locations_share_common_atoms(self):
+        first, second = self.residues[0], self.residues[1]
+        self.assertTrue(set(['P', 'N1']) <= set(a.name for a in first.atoms()))
+        np.testing.assert_allclose([1.5, 2.5, 3.5], first.centers['N1'])
+        np.testing.assert_allclose([1.6, 2.6, 3.6], second.centers['N1'])
+
+    def test_biomt_operator_applied(self):
+        copy = self.structure.residue('1ABC|1|A|G|1||A||ASM_2')
+        np.testing.assert_allclose([9.0, -2.0, 3.0], copy.centers['P'])
+        self.assertTrue(self.reader.has_symmetry())
+
+    def test_types(self):
+        by_sequence = dict((r.sequence, r) for r in self.residues)
+        self.assertEqual('RNA linking', by_sequence['G'].type)
+        self.assertEqual('L-peptide linking', by_sequence['ARG'].type)
+        self.assertFalse(by_sequence['HOH'].polymeric)
+        self.assertEqual('P', list(by_sequence['G'].atoms())[0].type)
+
+    def test_bytes_and_no_header(self):
+        lines = [line.encode('latin-1') for line in TEXT.splitlines(True)[1:]]
+        structure = PDB(lines, 'model').structure()
+        self.assertEqual('model', structure.pdb)
+
+    def test_given_id_overrides_header(self):
+        self.assertEqual('renamed', PDB(TEXT.splitlines(True), 'renamed').structure().pdb)
+
+    def test_operators_of_different_assemblies_have_different_names(self):
+        text = "HEADER    RNA                                     01-JAN-00   1ABC              \n"
+        for biomolecule, shift in [(1, 10.0), (2, 20.0)]:
+            text += "REMARK 350 BIOMOLECULE: %d\n" % biomolecule
+            text += "REMARK 350 APPLY THE FOLLOWING TO CHAINS: A\n"
+            for number, x in [(1, 0.0), (2, shift)]:
+                for row, values in enumerate([(1, 0, 0, x), (0, 1, 0, 0), (0, 0, 1, 0)], 1):
+                    text += "REMARK 350   BIOMT%d   %d %9.6f %9.6f %9.6f %14.5f\n" % ((row, number) + values)
+        text += atom_line("ATOM", 1, " P", "  A", "A", 1, 1.0, 2.0, 3.0, element="P")
+        structure = PDB(text.splitlines(True)).structure()
+        residues = dict((r.unit_id(), r) for r in structure.residues())
+        self.assertEqual(['1ABC|1|A|A|1', '1ABC|1|A|A|1||||ASM_2', '1ABC|1|A|A|1||||ASM_3'], sorted(residues))
+        np.testing.assert_allclose([11.0, 2.0, 3.0], residues['1ABC|1|A|A|1||||ASM_2'].centers['P'])
+        np.testing.assert_allclose([21.0, 2.0, 3.0], residues['1ABC|1|A|A|1||||ASM_3'].centers['P'])
+
+    def test_check_linking(self):
+        self.assertEqual('RNA linking', check_linking('PSU'))
+        self.assertEqual('Unknown', check_linking('MG'))
+
+    def test_apply_blocks_keep_their_own_operators(self):
+        text = (
+            "REMARK 350 BIOMOLECULE: 1                                                        \n"
+            "REMARK 350 APPLY THE FOLLOWING TO CHAINS: A                                      \n"
+            "REMARK 350   BIOMT1   1  1.000000  0.000000  0.000000        0.00000            \n"
+            "REMARK 350   BIOMT2   1  0.000000  1.000000  0.000000        0.00000            \n"
+            "REMARK 350   BIOMT3   1  0.000000  0.000000  1.000000        0.00000            \n"
+            "REMARK 350 APPLY THE FOLLOWING TO CHAINS: B                                      \n"
+            "REMARK 350   BIOMT1   1  1.000000  0.000000  0.000000       50.00000            \n"
+            "REMARK 350   BIOMT2   1  0.000000  1.000000  0.000000        0.00000            \n"
+            "REMARK 350   BIOMT3   1  0.000000  0.000000  1.000000        0.00000            \n"
+            + atom_line("ATOM", 1, " P", "  G", "A", 1, 1.0, 2.0, 3.0, element="P")
+            + atom_line("ATOM", 2, " P", "  C", "B", 2, 4.0, 5.0, 6.0, element="P")
+            + "END\n")
+        reader = PDB(text.splitlines(True), '2ABC')
+        self.assertEqual(['1_555'], [op['name'] for op in reader.operators('A')])
+        self.assertEqual(['ASM_2'], [op['name'] for op in reader.operators('B')])
+        residues = dict((r.chain, r) for r in reader.structure().residues())
+        np.testing.assert_allclose([1.0, 2.0, 3.0], residues['A'].centers['P'])
+        np.testing.assert_allclose([54.0, 5.0, 6.0], residues['B'].centers['P'])
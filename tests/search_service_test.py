@@ -0,0 +1,87 @@
+import os
+import sys
+from unittest import TestCase
+from unittest import mock
+
+import numpy as np
+
+# the search modules import each other by module name
+sys.path.append(os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "fr3d", "search"))
+
+import search_service
+from fr3d.search.pairs_index import compileNAPairsIndex
+
+IFE = "1ABC|1|A"
+IDS = ["1ABC|1|A|G|%d" % n for n in range(1, 5)]
+
+TRIPLES = {
+    "cWW": [(IDS[0], IDS[3], 0), (IDS[3], IDS[0], 0)],
+    "tSH": [(IDS[1], IDS[2], 1)],
+}
+
+
+def positions(Q, ifename, requiredMoleculeTypes):
+    ifedata = {
+        "index_to_id": dict(enumerate(IDS)),
+        "id_to_index": dict((unit, i) for i, unit in enumerate(IDS)),
+        "ids": list(IDS),
+        "units": [{"centers": np.zeros(3), "rotations": np.identity(3), "unitType": "G",
+                   "moleculeType": "RNA", "chainindex": i} for i in range(len(IDS))],
+        "centers": np.zeros((len(IDS), 3)),
+        "models": ["1"] * len(IDS),
+    }
+    return Q, ifedata, dict(ifedata["id_to_index"])
+
+
+def pairs_index(Q, PDBID, alternate=""):
+    table, description = compileNAPairsIndex(TRIPLES)
+    return Q, table, description, None
+
+
+def unit_annotations(Q, ifename):
+    return Q, dict((unit, {"orientation": "anti", "chi_degree": "-160"}) for unit in IDS)
+
+
+def query(interactions, **options):
+    Q = {"requiredMoleculeType": [["RNA"], ["RNA"]], "activeInteractions": interactions,
+         "errorMessage": [], "userMessage": [], "server": True}
+    Q.update(options)
+    return Q
+
+
+class IFECacheTest(TestCase):
+    def setUp(self):
+        patches = [mock.patch.object(search_service, "readPositions", side_effect=positions),
+                   mock.patch.object(search_service, "readNAPairsIndexFile", side_effect=pairs_index),
+                   mock.patch.object(search_service, "readUnitAnnotations", side_effect=unit_annotations)]
+        self.mocks = [p.start() for p in patches]
+        for p in patches:
+            self.addCleanup(p.stop)
+        self.cache = search_service.IFECache()
+
+    def test_each_query_gets_its_own_interactions(self):
+        Q, first = self.cache.readPositionsAndInteractions(query(["cWW"]), IFE)
+        Q, second = self.cache.readPositionsAndInteractions(query(["tSH"]), IFE)
+
+        self.assertIn("cWW", first["interactionToPairs"])
+        self.assertNotIn("tSH", first["interactionToPairs"])
+        self.assertEqual([(1, 2)], list(second["interactionToPairs"]["tSH"][0]))
+        self.assertNotIn("cWW", second["interactionToPairs"])
+
+        # the files were read once
+        self.assertEqual(1, self.mocks[0].call_count)
+        self.assertEqual(1, self.mocks[1].call_count)
+        self.assertEqual(1, self.cache.stats()["ifedataHits"])
+
+    def test_unit_annotations_are_added_when_the_query_needs_them(self):
+        Q, plain = self.cache.readPositionsAndInteractions(query(["cWW"]), IFE)
+        self.assertNotIn("glycosidicBondOrientation", plain["units"][0])
+
+        Q, annotated = self.cache.readPositionsAndInteractions(query(["cWW"], glycosidicBondOrientation=[]), IFE)
+        self.assertEqual("anti", annotated["units"][0]["glycosidicBondOrientation"])
+        self.assertEqual(-160, annotated["units"][0]["chiDegree"])
+
+        # annotations of one query do not leak into the next
+        Q, again = self.cache.readPositionsAndInteractions(query(["cWW"]), IFE)
+        self.assertNotIn("glycosidicBondOrientation", again["units"][0])
+        self.assertEqual(1, self.mocks[2].call_count)
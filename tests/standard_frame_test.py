@@ -0,0 +1,57 @@
+from unittest import TestCase
+
+import numpy as np
+
+from fr3d.data.atoms import Atom
+from fr3d.data.components import Component
+from fr3d.definitions import NAbasecoordinates
+from fr3d.definitions import NAbaseheavyatoms
+from fr3d.classifiers.standard_frame import StandardResidue
+from fr3d.classifiers.standard_frame import residue_arrays
+from fr3d.classifiers.standard_frame import to_base_frame
+
+
+def residue(sequence, chain, number, atoms):
+    return Component([Atom(pdb='1ABC', model=1, chain=chain, component_id=sequence,
+                           component_number=number, name=name, x=x, y=y, z=z)
+                      for name, (x, y, z) in atoms],
+                     pdb='1ABC', model=1, chain=chain, sequence=sequence, number=number)
+
+
+class StandardFrameTest(TestCase):
+    def setUp(self):
+        # an ideal G, rotated about the z axis and moved away from the origin
+        angle = 0.7
+        rotation = np.array([[np.cos(angle), -np.sin(angle), 0.0],
+                             [np.sin(angle), np.cos(angle), 0.0],
+                             [0.0, 0.0, 1.0]])
+        shift = np.array([10.0, -4.0, 3.0])
+        atoms = []
+        for name in NAbaseheavyatoms['G']:
+            atoms.append((name, np.dot(rotation, NAbasecoordinates['G'][name]) + shift))
+        self.base = residue('G', 'A', 1, atoms)
+
+        self.aa = residue('ARG', 'B', 7, [('NE', shift + [3.0, 1.0, 0.5]),
+                                          ('CZ', shift + [4.0, 1.5, 0.2]),
+                                          ('NH1', shift + [4.5, 2.5, 0.0]),
+                                          ('NH2', shift + [4.8, 0.6, 0.1]),
+                                          ('CA', shift + [6.0, 0.0, 0.0])])
+
+    def test_same_coordinates_as_translate_rotate_component(self):
+        moved = self.base.translate_rotate_component(self.aa)
+        names, coordinates = residue_arrays(self.aa)
+        standard = StandardResidue(self.aa.sequence, names, to_base_frame(self.base, coordinates))
+        for atom in moved.atoms():
+            np.testing.assert_allclose(atom.coordinates(), standard.centers[atom.name], atol=1e-10)
+        np.testing.assert_allclose(moved.centers['aa_fg'], standard.centers['aa_fg'], atol=1e-10)
+
+    def test_base_moves_to_standard_position(self):
+        names, coordinates = residue_arrays(self.base)
+        standard = dict(zip(names, to_base_frame(self.base, coordinates)))
+        np.testing.assert_allclose(NAbasecoordinates['G']['N1'], standard['N1'], atol=1e-6)
+
+    def test_missing_atoms_give_empty_centers(self):
+        standard = StandardResidue('ARG', ['CA'], np.zeros((1, 3)))
+        self.assertEqual(0, len(standard.centers['NH1']))
+        self.assertEqual(0, len(standard.centers['aa_fg']))
+        self.assertEqual(3, len(standard.centers['aa_backbone']))
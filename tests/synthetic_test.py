@@ -0,0 +1,76 @@
+import collections
+import os
+import shutil
+import tempfile
+from unittest import TestCase
+
+from fr3d.classifiers.NA_pairwise_interactions import load_structure
+from fr3d.synthetic import MODIFIED
+from fr3d.synthetic import load_templates
+from fr3d.synthetic import write_structure
+
+
+class SyntheticStructureTest(TestCase):
+    def setUp(self):
+        self.directory = tempfile.mkdtemp()
+
+    def tearDown(self):
+        shutil.rmtree(self.directory)
+
+    def write(self, name, **options):
+        filename = os.path.join(self.directory, name)
+        summary = write_structure(filename, **options)
+        structure, messages = load_structure(filename)
+        return summary, structure
+
+    def test_templates_have_all_bases_and_no_hydrogens(self):
+        nucleotides, amino_acids = load_templates()
+        self.assertEqual(set(['A', 'C', 'G', 'U']), set(t.sequence for t in nucleotides))
+        self.assertIn('ARG', set(t.sequence for t in amino_acids))
+        for template in nucleotides + amino_acids:
+            self.assertNotIn('H', template.elements)
+        self.assertTrue(all(t.methyl is not None for t in nucleotides))
+
+    def test_counts_loaded_through_load_structure(self):
+        summary, structure = self.write("SYN1.cif", nucleotides=60, amino_acids=15, chain_length=25)
+        self.assertEqual(4, summary['chains'])
+        residues = list(structure.residues())
+        self.assertEqual(60, sum(1 for r in residues if r.sequence in ['A', 'C', 'G', 'U']))
+        self.assertEqual(15, sum(1 for r in residues if r.type == 'L-peptide linking' or r.sequence == 'GLY'))
+        self.assertEqual(['A', 'B', 'C', 'D'], sorted(set(r.chain for r in residues)))
+
+    def test_alternate_locations_modifications_and_models(self):
+        summary, structure = self.write("SYN2.cif.gz", nucleotides=80, amino_acids=20, chain_length=50,
+                                        alt_fraction=0.3, modified_fraction=0.3, models=2)
+        residues = list(structure.residues())
+        self.assertEqual(set(['1', '2']), set(r.model for r in residues))
+
+        units = collections.Counter((r.model, r.chain, r.number) for r in residues if r.model == '1')
+        self.assertEqual(100, len(units))
+        doubled = [unit for unit, count in units.items() if count == 2]
+        self.assertTrue(0 < len(doubled) < 100)
+
+        # the common atoms are copied into both alternate locations
+        alternate = [r for r in residues if r.alt_id == 'B' and r.sequence in MODIFIED]
+        self.assertTrue(alternate)
+        self.assertIn("C1'", [atom.name for atom in alternate[0].atoms()])
+
+        modified = set(name for name, methyl in MODIFIED.values())
+        methylated = [r for r in residues if r.sequence in modified]
+        self.assertTrue(methylated)
+        for residue in methylated:
+            self.assertEqual(1, sum(1 for atom in residue.atoms() if atom.name in ['CM2', "CM'"]))
+
+    def test_density_sets_the_box_and_seed_repeats_the_file(self):
+        dense = write_structure(os.path.join(self.directory, "A.cif"), nucleotides=100, density=8.0)
+        sparse = write_structure(os.path.join(self.directory, "B.cif"), nucleotides=100, density=1.0)
+        self.assertAlmostEqual(2.0, sparse['box'] / dense['box'])
+
+        write_structure(os.path.join(self.directory, "C.cif"), nucleotides=100, density=8.0, pdbid="A")
+        with open(os.path.join(self.directory, "A.cif")) as a, open(os.path.join(self.directory, "C.cif")) as c:
+            self.assertEqual(a.read(), c.read())
+
+        summary, structure = self.write("D.cif", nucleotides=100, density=8.0)
+        for residue in structure.residues():
+            for value in residue.centers["C1'"]:
+                self.assertTrue(-0.01 <= value <= summary['box'] + 0.01)
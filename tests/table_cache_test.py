@@ -0,0 +1,88 @@
+import os
+import shutil
+import tempfile
+from unittest import TestCase
+
+from fr3d import table_cache
+from fr3d.table_cache import load_table
+
+
+class TableCacheTest(TestCase):
+    def setUp(self):
+        self.directory = tempfile.mkdtemp()
+        self.previous = os.environ.get("FR3D_CACHE_DIR")
+        os.environ["FR3D_CACHE_DIR"] = os.path.join(self.directory, "cache")
+        self.source = os.path.join(self.directory, "source.txt")
+        with open(self.source, "w") as f:
+            f.write("A C G U\n")
+        self.builds = 0
+
+    def tearDown(self):
+        if self.previous is None:
+            del os.environ["FR3D_CACHE_DIR"]
+        else:
+            os.environ["FR3D_CACHE_DIR"] = self.previous
+        shutil.rmtree(self.directory)
+
+    def build(self):
+        self.builds += 1
+        with open(self.source) as f:
+            return {"bases": f.read().split()}
+
+    def test_table_is_built_once(self):
+        first = load_table("bases", [self.source], self.build)
+        second = load_table("bases", [self.source], self.build)
+        self.assertEqual({"bases": ["A", "C", "G", "U"]}, second)
+        self.assertEqual(first, second)
+        self.assertEqual(1, self.builds)
+
+    def test_changed_source_rebuilds_the_table(self):
+        load_table("bases", [self.source], self.build)
+        with open(self.source, "w") as f:
+            f.write("A C G U T\n")
+        os.utime(self.source, (0, 0))
+        table = load_table("bases", [self.source], self.build)
+        self.assertEqual(["A", "C", "G", "U", "T"], table["bases"])
+        self.assertEqual(2, self.builds)
+
+    def test_damaged_cache_file_is_rebuilt(self):
+        load_table("bases", [self.source], self.build)
+        cache = table_cache.cache_directory()
+        for filename in os.listdir(cache):
+            with open(os.path.join(cache, filename), "w") as f:
+                f.write("not a table")
+        self.assertEqual(["A", "C", "G", "U"], load_table("bases", [self.source], self.build)["bases"])
+        self.assertEqual(2, self.builds)
+
+    def test_clear_cache(self):
+        load_table("bases", [self.source], self.build)
+        table_cache.clear_cache()
+        self.assertEqual([], os.listdir(table_cache.cache_directory()))
+
+    def test_cached_atom_mappings_match_the_text_file(self):
+        from fr3d.data import mapping
+        mapping.load_modified_nucleotide_to_parent_mappings()   # fills the cache
+        cached = mapping.load_modified_nucleotide_to_parent_mappings()
+        self.assertEqual(mapping.create_modified_nucleotide_to_parent_mappings(), cached)
+
+    def test_tuples_and_number_keys_are_kept(self):
+        table = ({"cWW": {0: {"xmin": -1.5}, 1: {"xmin": 0.25}}}, {"PSU": ["C1'", ["N1", "C5"]]})
+        load_table("cutoffs", [self.source], lambda: table)
+        self.assertEqual(table, load_table("cutoffs", [self.source], self.build))
+        self.assertEqual(0, self.builds)
+
+    def test_nothing_is_written_unless_the_cache_is_turned_on(self):
+        del os.environ["FR3D_CACHE_DIR"]
+        home = os.environ.get("HOME")
+        os.environ["HOME"] = self.directory
+        try:
+            self.assertEqual(["A", "C", "G", "U"], load_table("bases", [self.source], self.build)["bases"])
+            load_table("bases", [self.source], self.build)
+        finally:
+            os.environ["FR3D_CACHE_DIR"] = os.path.join(self.directory, "cache")
+            if home is None:
+                del os.environ["HOME"]
+            else:
+                os.environ["HOME"] = home
+        self.assertEqual(2, self.builds)
+        self.assertEqual(["source.txt"], os.listdir(self.directory))
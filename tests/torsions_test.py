@@ -0,0 +1,123 @@
+import os
+import shutil
+import tempfile
+from unittest import TestCase
+
+import numpy as np
+
+from fr3d.classifiers.NA_pairwise_interactions import load_structure
+from fr3d.data.atoms import Atom
+from fr3d.data.components import Component
+from fr3d.geometry.torsions import chi_angles
+from fr3d.geometry.torsions import chi_atom_names
+from fr3d.geometry.torsions import classify_chi
+from fr3d.geometry.torsions import dihedral_angles
+from fr3d.geometry.torsions import nucleotide_torsions
+from fr3d.geometry.torsions import pseudorotation
+from fr3d.synthetic import write_structure
+
+
+def residue(sequence, chain, number, atoms):
+    return Component([Atom(pdb='1ABC', model=1, chain=chain, component_id=sequence,
+                           component_number=number, name=name, x=x, y=y, z=z)
+                      for name, (x, y, z) in atoms],
+                     pdb='1ABC', model=1, chain=chain, sequence=sequence, number=number)
+
+
+def points(*rows):
+    return [np.array([row], dtype=float) for row in rows]
+
+
+class DihedralAnglesTest(TestCase):
+    def test_cis_is_zero(self):
+        angle = dihedral_angles(*points([1, 0, 0], [0, 0, 0], [0, 1, 0], [1, 1, 0]))
+        self.assertAlmostEqual(0.0, angle[0])
+
+    def test_trans_is_180(self):
+        angle = dihedral_angles(*points([1, 0, 0], [0, 0, 0], [0, 1, 0], [-1, 1, 0]))
+        self.assertAlmostEqual(180.0, abs(angle[0]))
+
+    def test_sign(self):
+        plus = dihedral_angles(*points([1, 0, 0], [0, 0, 0], [0, 1, 0], [0, 1, -1]))
+        minus = dihedral_angles(*points([1, 0, 0], [0, 0, 0], [0, 1, 0], [0, 1, 1]))
+        self.assertAlmostEqual(90.0, plus[0])
+        self.assertAlmostEqual(-90.0, minus[0])
+
+    def test_missing_atom_gives_nan(self):
+        angle = dihedral_angles(*points([1, 0, 0], [0, 0, 0], [0, 1, 0], [np.nan] * 3))
+        self.assertTrue(np.isnan(angle[0]))
+
+
+class ClassifyChiTest(TestCase):
+    def test_boundaries(self):
+        chi = np.array([-170.0, -90.0, -60.0, -45.0, 0.0, 89.9, 90.0, np.nan])
+        self.assertEqual(["anti", "anti", "int_syn", "syn", "syn", "syn", "anti", ""],
+                         classify_chi(chi).tolist())
+
+
+class PseudorotationTest(TestCase):
+    def test_ideal_puckers(self):
+        # nu_j = amplitude * cos(P + 144 * (j - 2)) for an ideal ring
+        for phase in [18.0, 162.0, 300.0]:
+            nu = np.array([[38.0 * np.cos(np.radians(phase + 144.0 * (j - 2))) for j in range(5)]])
+            P, amplitude = pseudorotation(nu)
+            self.assertAlmostEqual(phase, P[0], places=6)
+            self.assertAlmostEqual(38.0, amplitude[0], places=6)
+
+
+class NucleotideTorsionsTest(TestCase):
+    def setUp(self):
+        # two stacked copies of a backbone, the second bonded to the first
+        backbone = [("P", (0.0, 0.0, 0.0)), ("O5'", (1.5, 0.2, 0.1)), ("C5'", (2.1, 1.5, 0.0)),
+                    ("C4'", (3.6, 1.4, 0.4)), ("O4'", (4.2, 2.6, 0.0)), ("C3'", (4.0, 0.4, -0.6)),
+                    ("C2'", (5.4, 0.9, -1.0)), ("C1'", (5.5, 2.3, -0.4)), ("O3'", (4.2, -0.9, 0.0)),
+                    ("N9", (6.6, 2.9, -1.2)), ("C4", (7.8, 2.4, -1.6))]
+        shift = np.array([4.2, -2.4, 0.8])
+        self.first = residue('A', 'A', 1, backbone)
+        self.second = residue('A', 'A', 2, [(name, np.array(xyz) + shift) for name, xyz in backbone])
+        self.far = residue('A', 'A', 3, [(name, np.array(xyz) + 10 * shift) for name, xyz in backbone])
+
+    def test_chi_matches_dihedral(self):
+        chi, messages = chi_angles([self.first])
+        expected = dihedral_angles(*points((4.2, 2.6, 0.0), (5.5, 2.3, -0.4), (6.6, 2.9, -1.2), (7.8, 2.4, -1.6)))
+        self.assertAlmostEqual(expected[0], chi[0])
+        self.assertEqual([], messages)
+
+    def test_neighbors_only_when_bonded(self):
+        torsions, messages = nucleotide_torsions([self.first, self.second, self.far])
+        # first has no previous nucleotide, far is not bonded to second
+        self.assertTrue(np.isnan(torsions["alpha"][0]))
+        self.assertFalse(np.isnan(torsions["alpha"][1]))
+        self.assertTrue(np.isnan(torsions["alpha"][2]))
+        self.assertFalse(np.isnan(torsions["epsilon"][0]))
+        self.assertTrue(np.isnan(torsions["zeta"][1]))
+        self.assertTrue(np.isnan(torsions["zeta"][2]))
+
+    def test_same_geometry_same_angles(self):
+        torsions, messages = nucleotide_torsions([self.first, self.second, self.far])
+        for name in ["beta", "gamma", "delta", "chi", "nu0", "nu4", "pseudorotation"]:
+            self.assertAlmostEqual(torsions[name][0], torsions[name][1])
+            self.assertAlmostEqual(torsions[name][0], torsions[name][2])
+
+
+class ModifiedChiTest(TestCase):
+    def setUp(self):
+        self.directory = tempfile.mkdtemp()
+
+    def tearDown(self):
+        shutil.rmtree(self.directory)
+
+    def test_observed_and_inferred_atoms_are_averaged(self):
+        filename = os.path.join(self.directory, "SYN.cif")
+        write_structure(filename, nucleotides=20, modified_fraction=1.0)
+        structure, messages = load_structure(filename)
+        modified = [r for r in structure.residues() if r.sequence in ['OMG', 'OMC']]
+        self.assertTrue(modified)
+
+        chi, messages = chi_angles(modified)
+        for nt, angle in zip(modified, chi):
+            names, message = chi_atom_names(nt.sequence)
+            # the glycosidic nitrogen is read from the file and inferred again
+            self.assertEqual(2, len(list(nt.atoms(name=names[2]))))
+            expected = dihedral_angles(*[np.array([nt.centers[name]]) for name in names])
+            self.assertAlmostEqual(expected[0], angle)
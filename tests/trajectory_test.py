@@ -0,0 +1,153 @@
+import os
+import shutil
+import tempfile
+from io import StringIO
+from unittest import TestCase
+
+import numpy as np
+
+from fr3d.data import Structure
+from fr3d.data.atoms import Atom
+from fr3d.data.components import Component
+from fr3d.definitions import NAbasecoordinates
+from fr3d.definitions import NAbaseheavyatoms
+from fr3d.synthetic import write_structure
+from fr3d.classifiers.NA_pairwise_interactions import load_structure
+from fr3d.classifiers.trajectory import InteractionOccupancy
+from fr3d.classifiers.trajectory import Trajectory
+from fr3d.classifiers.trajectory import atom_key
+from fr3d.classifiers.trajectory import numpy_frames
+from fr3d.classifiers.trajectory import pdb_frames
+
+
+def rotation(angle):
+    return np.array([[np.cos(angle), -np.sin(angle), 0.0],
+                     [np.sin(angle), np.cos(angle), 0.0],
+                     [0.0, 0.0, 1.0]])
+
+
+def nucleotide(sequence, number, angle, shift):
+    atoms = [Atom(pdb='1ABC', model=1, chain='A', component_id=sequence,
+                  component_number=number, name=name,
+                  x=xyz[0], y=xyz[1], z=xyz[2])
+             for name in NAbaseheavyatoms[sequence]
+             for xyz in [np.dot(rotation(angle), NAbasecoordinates[sequence][name]) + shift]]
+    return Component(atoms, pdb='1ABC', model=1, chain='A', sequence=sequence,
+                     number=number, type='RNA linking', polymeric=True)
+
+
+def read_atoms(residues):
+    return np.array([atom.coordinates() for residue in residues
+                     for atom in residue.atoms() if atom.component_id is not None])
+
+
+class TrajectoryTest(TestCase):
+    def setUp(self):
+        self.trajectory = Trajectory(Structure([nucleotide('G', 1, 0.1, np.zeros(3)),
+                                                nucleotide('C', 2, 2.0, np.array([0.0, 0.0, 3.4]))],
+                                               pdb='1ABC'))
+        self.moved = [nucleotide('G', 1, 0.7, np.array([1.0, 2.0, 3.0])),
+                      nucleotide('C', 2, -1.0, np.array([1.0, 2.0, 6.0]))]
+
+    def test_inferred_hydrogens_are_not_frame_atoms(self):
+        self.assertEqual(len(NAbaseheavyatoms['G']) + len(NAbaseheavyatoms['C']),
+                         len(self.trajectory.atoms))
+        self.assertTrue(len(self.trajectory.hydrogens) > 0)
+
+    def test_frame_gives_the_same_residues_as_reading_it(self):
+        self.trajectory.set_frame(read_atoms(self.moved))
+        for residue, expected in zip(self.trajectory.residues, self.moved):
+            np.testing.assert_allclose(np.asarray(expected.rotation_matrix),
+                                       np.asarray(residue.rotation_matrix), atol=1e-10)
+            np.testing.assert_allclose(expected.centers['base'], residue.centers['base'], atol=1e-10)
+            found = dict((atom.name, atom.coordinates()) for atom in residue.atoms())
+            for atom in expected.atoms():
+                np.testing.assert_allclose(atom.coordinates(), found[atom.name], atol=1e-10)
+
+    def test_frames_can_list_atoms_in_another_order(self):
+        frame = read_atoms(self.moved)
+        order = np.arange(len(frame))[::-1]
+        keys = [self.trajectory.keys[i] for i in order]
+        self.trajectory.set_frame(frame[order], keys)
+        np.testing.assert_allclose(self.moved[1].centers['base'],
+                                   self.trajectory.residues[1].centers['base'], atol=1e-10)
+
+    def test_wrong_number_of_atoms(self):
+        self.assertRaises(ValueError, self.trajectory.set_frame, np.zeros((3, 3)))
+
+
+class ModifiedTrajectoryTest(TestCase):
+    def setUp(self):
+        self.directory = tempfile.mkdtemp()
+        filename = os.path.join(self.directory, 'SYN.cif')
+        write_structure(filename, nucleotides=40, modified_fraction=0.5, models=2)
+        structure, messages = load_structure(filename)
+        residues = list(structure.residues(polymeric=None))
+        self.first = [r for r in structure.residues(polymeric=None) if r.model == residues[0].model]
+        self.second = [r for r in structure.residues(polymeric=None) if r.model != residues[0].model]
+        self.trajectory = Trajectory(Structure(self.first, pdb=structure.pdb))
+
+    def tearDown(self):
+        shutil.rmtree(self.directory)
+
+    def test_modified_nucleotides_follow_the_frame(self):
+        self.assertTrue(set(['OMG', 'OMC']) <= set(r.sequence for r in self.first))
+
+        atoms = [a for r in self.second for a in r.atoms() if a.component_id is not None]
+        keys = [atom_key(a.chain, a.component_number, a.insertion_code, a.component_id, a.name, a.alt_id)
+                for a in atoms]
+        self.trajectory.set_frame(np.array([a.coordinates() for a in atoms]), keys)
+
+        for residue, expected in zip(self.trajectory.residues, self.second):
+            if expected.rotation_matrix is None:
+                continue
+            np.testing.assert_allclose(np.asarray(expected.rotation_matrix),
+                                       np.asarray(residue.rotation_matrix), atol=1e-8)
+            np.testing.assert_allclose(expected.centers['base'], residue.centers['base'], atol=1e-8)
+            # the inferred base atoms and hydrogens move with the base
+            found = sorted((a.name, tuple(a.coordinates())) for a in residue.atoms())
+            wanted = sorted((a.name, tuple(a.coordinates())) for a in expected.atoms())
+            self.assertEqual([name for name, _ in wanted], [name for name, _ in found])
+            np.testing.assert_allclose([xyz for _, xyz in wanted], [xyz for _, xyz in found], atol=1e-6)
+
+
+class FramesTest(TestCase):
+    def test_pdb_models_are_frames(self):
+        lines = []
+        for model, z in [(1, 0.0), (2, 1.5)]:
+            lines.append("MODEL     %4d\n" % model)
+            lines.append("ATOM      1  N9    G A   1       1.000   2.000 %7.3f  1.00  0.00           N\n" % z)
+            lines.append("ATOM      2  C4    G A   1       2.000   2.000 %7.3f  1.00  0.00           C\n" % z)
+            lines.append("ENDMDL\n")
+        frames = list(pdb_frames(StringIO("".join(lines))))
+        self.assertEqual(2, len(frames))
+        keys, coordinates = frames[1]
+        self.assertEqual(('A', 1, None, 'G', 'C4', None), keys[1])
+        np.testing.assert_allclose([2.0, 2.0, 1.5], coordinates[1])
+
+    def test_numpy_frames(self):
+        path = tempfile.mkdtemp()
+        try:
+            data = np.arange(24, dtype=float).reshape(2, 4, 3)
+            np.save(os.path.join(path, 'run.npy'), data)
+            np.savez(os.path.join(path, 'run.npz'), coordinates=data)
+            for name in ['run.npy', 'run.npz']:
+                frames = list(numpy_frames(os.path.join(path, name)))
+                self.assertEqual(2, len(frames))
+                self.assertEqual(None, frames[0][0])
+                np.testing.assert_allclose(data[1], frames[1][1])
+        finally:
+            shutil.rmtree(path)
+
+
+class InteractionOccupancyTest(TestCase):
+    def test_counts_and_series(self):
+        occupancy = InteractionOccupancy()
+        occupancy.add({'s35': [('a', 'b', 0)], 'cWW': [('a', 'c', 0)]})
+        occupancy.add({'s35': [('a', 'b', 0)]})
+        occupancy.add({})
+        self.assertEqual(3, len(occupancy))
+        counts = dict(zip(occupancy.keys, occupancy.counts().tolist()))
+        self.assertEqual({('a', 's35', 'b'): 2, ('a', 'cWW', 'c'): 1}, counts)
+        series = dict(zip(occupancy.keys, occupancy.series().tolist()))
+        self.assertEqual([True, True, False], series[('a', 's35', 'b')])
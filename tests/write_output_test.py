@@ -0,0 +1,70 @@
+import gzip
+import os
+import shutil
+import sys
+import tempfile
+from unittest import TestCase
+from unittest import mock
+
+# the search modules import each other by module name
+sys.path.append(os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "fr3d", "search"))
+
+import write_output
+
+
+def candidate(n):
+    unitids = ["1ABC|1|A|G|%d" % n, "1ABC|1|A|C|%d" % (n + 1)]
+    return {"unitids": unitids, "indices": [n, n + 1], "chainindices": [n, n + 1], "discrepancy": 0.1,
+            "interactions": {(0, 1, "pairsStacks"): ["cWW"]}}
+
+
+class CandidateStreamTest(TestCase):
+    def setUp(self):
+        self.directory = tempfile.mkdtemp()
+        for patch in [mock.patch.object(write_output, "OUTPUTPATH", self.directory),
+                      mock.patch.object(write_output, "SERVER", False)]:
+            patch.start()
+            self.addCleanup(patch.stop)
+        self.Q = {"name": "stream", "numpositions": 2, "type": "geometric", "searchFiles": ["1ABC|1|A"] * 3,
+                  "errorMessage": [], "userMessage": [], "PDB_data_file": {}}
+        self.now = [0.0]
+        self.stream = write_output.CandidateStream(self.Q, 10, lambda: self.now[0])
+
+    def tearDown(self):
+        shutil.rmtree(self.directory)
+
+    def read_page(self):
+        with open(os.path.join(self.directory, "stream.html")) as f:
+            return f.read()
+
+    def test_new_candidates_are_appended_to_the_page(self):
+        self.stream.add(self.Q, [candidate(1)])
+        self.assertFalse(os.path.exists(os.path.join(self.directory, "stream.html")))
+
+        self.now[0] = 11.0
+        self.stream.add(self.Q, [candidate(3)])
+        page = self.read_page()
+        self.assertEqual(2, page.count("<tr><td>"))
+        self.assertIn('http-equiv="refresh"', page)
+        self.assertIn("Search in progress", page)
+
+        # the page is not rewritten, only the new rows are added at the end
+        self.now[0] = 22.0
+        self.stream.add(self.Q, [candidate(5)])
+        extended = self.read_page()
+        self.assertTrue(extended.startswith(page))
+        self.assertEqual('<tr><td>3.</td>', extended[len(page):len(page) + 15])
+        self.assertEqual(3, self.stream.numCandidates)
+
+    def test_server_page_is_gzipped(self):
+        os.mkdir(os.path.join(self.directory, "q1"))
+        self.Q["queryID"] = "q1"
+        with mock.patch.object(write_output, "SERVER", True):
+            stream = write_output.CandidateStream(self.Q, 10, lambda: self.now[0])
+            stream.add(self.Q, [candidate(1)])
+            self.now[0] = 11.0
+            stream.add(self.Q, [candidate(3)])
+
+        filename = os.path.join(self.directory, "q1", "q1.html")
+        with open(filename) as plain, gzip.open(filename + ".gz", "rt") as compressed:
+            self.assertEqual(plain.read(), compressed.read())